@@ -69,6 +69,10 @@ resource "google_cloudfunctions2_function" "default" {
     timeout_seconds       = 539
     max_instance_count    = 1
     service_account_email = data.google_service_account.default.email
+    environment_variables = {
+      # half of the instance memory for files in flight, see src/utils/memory_budget.py
+      MEMORY_BUDGET_BYTES = 268435456
+    }
   }
 
   event_trigger {
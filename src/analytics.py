@@ -0,0 +1,345 @@
+from array import array
+from dataclasses import dataclass, field
+import datetime as dt
+from itertools import chain, count, repeat
+from operator import mul, sub
+import struct
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from src import model
+
+PERIODS = ("month", "quarter", "year")
+# a double as bytes: runs of days are built as repeated bytes, at memcpy speed
+DOUBLE = struct.Struct("d")
+ZERO_DOUBLE = DOUBLE.pack(0.0)
+
+
+def _repeat(value: float, times: int) -> array:
+    """
+    Returns an array of doubles holding value times times, built at C speed.
+    """
+    return array("d", [value]) * times
+
+
+def _clamp(days: Sequence[int], first_day: int, length: int) -> List[int]:
+    """
+    Positions of sorted day ordinals within a range of length days from first_day, days
+    before the range at 0 and after it at length.
+    """
+    offsets = map(sub, days, repeat(first_day))
+    if days[0] >= first_day and days[-1] < first_day + length:
+        return list(offsets)
+
+    return list(map(min, map(max, offsets, repeat(0)), repeat(length)))
+
+
+@dataclass
+class _ProductObservations:
+    """
+    Valuations of a product as parallel typed arrays: day ordinal, creation timestamp
+    and value of each valuation, 24 bytes per valuation.
+    """
+
+    days: array = field(default_factory=lambda: array("l"))
+    created: array = field(default_factory=lambda: array("d"))
+    values: array = field(default_factory=lambda: array("d"))
+
+
+@dataclass(frozen=True)
+class DailySeries:
+    """
+    Daily valuation of each product and of the whole portfolio over a range of days, as
+    arrays of doubles indexed by day, day 0 being start. A product is valued at its
+    latest valuation up to each day, forward filled from the statement dates, and at 0
+    before its first valuation, or once its last valuation is older than the staleness
+    limit, if any.
+
+    Attributes:
+        start (dt.date): First day of the series.
+        end (dt.date): Last day of the series.
+        products (Dict[str, array]): Daily value of each product, by product name.
+    Methods:
+        date(index: int) -> dt.date:
+            Date of a day of the series.
+        index(date: dt.date) -> int:
+            Day of the series of a date.
+        totals() -> array:
+            Daily value of the whole portfolio.
+    """
+
+    start: dt.date
+    end: dt.date
+    products: Dict[str, array]
+
+    def __len__(self) -> int:
+        return (self.end - self.start).days + 1
+
+    def date(self, index: int) -> dt.date:
+        """
+        Date of a day of the series.
+
+        Args:
+            index (int): Day of the series, 0 for start.
+        Returns:
+            dt.date: The date.
+        """
+        return self.start + dt.timedelta(days=index)
+
+    def index(self, date: dt.date) -> int:
+        """
+        Day of the series of a date.
+
+        Args:
+            date (dt.date): A date within the series.
+        Returns:
+            int: The day, 0 for start.
+        Raises:
+            IndexError: Raised if the date is not within the series.
+        """
+        index = (date - self.start).days
+        if not 0 <= index < len(self):
+            raise IndexError(f"{date} is not within {self.start} and {self.end}")
+
+        return index
+
+    def totals(self) -> array:
+        """
+        Daily value of the whole portfolio: the sum of the products, day by day.
+
+        Returns:
+            array: Value of the portfolio of each day.
+        """
+        if not self.products:
+            return _repeat(0.0, len(self))
+
+        return array("d", map(sum, zip(*self.products.values())))
+
+
+@dataclass(frozen=True)
+class PeriodReturn:
+    """
+    Change of value over a period, e.g. a month.
+
+    Attributes:
+        start (dt.date): Day the period is measured from: the last day of the previous
+                         period, or the first day of the series.
+        end (dt.date): Last day of the period, or of the series if earlier.
+        start_value (float): Value on start.
+        end_value (float): Value on end.
+    """
+
+    start: dt.date
+    end: dt.date
+    start_value: float
+    end_value: float
+
+    @property
+    def simple_return(self) -> Optional[float]:
+        """
+        Relative change of value over the period, None if the start value is 0. As
+        contributions and withdrawals are not known, they count as gains and losses.
+        """
+        if not self.start_value:
+            return None
+
+        return self.end_value / self.start_value - 1
+
+
+class ValuationHistory:
+    """
+    In-memory history of Asset Valuations, fed by batches from any source, e.g. parsed
+    files or a table read back by source_repository.TableSourceAbstract, and turned
+    into daily series for reporting without querying the destination. Valuations are
+    kept as typed arrays per product, not as objects, so years of history of many
+    products fit in memory: 24 bytes per valuation.
+    When a product is valued several times on a date, the valuation created last wins,
+    as in the latest snapshot of the destination, and of those created at once, e.g.
+    read without creation dates, the one added last.
+
+    Attributes:
+        rows (int): Valuations added so far.
+    Methods:
+        add(asset_valuations: Iterable[model.AssetValuation]):
+            Adds a batch of Asset Valuations.
+        add_batches(batches: Iterable[Iterable[model.AssetValuation]]):
+            Adds batches of Asset Valuations, e.g. read from a table.
+        date_range() -> Optional[Tuple[dt.date, dt.date]]:
+            First and last dates valued.
+        daily_series(...) -> DailySeries:
+            Builds the forward filled daily series of each product.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self._products: Dict[str, _ProductObservations] = {}
+
+    def add(self, asset_valuations: Iterable[model.AssetValuation]):
+        """
+        Adds a batch of Asset Valuations.
+
+        Args:
+            asset_valuations (Iterable[model.AssetValuation]): The Asset Valuations.
+        """
+        products = self._products
+        for asset_valuation in asset_valuations:
+            observations = products.get(asset_valuation.product_name)
+            if observations is None:
+                observations = products[asset_valuation.product_name] = (
+                    _ProductObservations()
+                )
+            observations.days.append(asset_valuation.date.toordinal())
+            observations.created.append(asset_valuation.creation_date.timestamp())
+            observations.values.append(asset_valuation.value)
+            self.rows += 1
+
+    def add_batches(self, batches: Iterable[Iterable[model.AssetValuation]]):
+        """
+        Adds batches of Asset Valuations, e.g. from
+        TableSourceAbstract.iter_asset_valuation_batches(), one at a time.
+
+        Args:
+            batches (Iterable[Iterable[model.AssetValuation]]): The batches.
+        """
+        for batch in batches:
+            self.add(batch)
+
+    def date_range(self) -> Optional[Tuple[dt.date, dt.date]]:
+        """
+        First and last dates valued, over all products.
+
+        Returns:
+            Tuple[dt.date, dt.date], optional: The dates, None if the history is empty.
+        """
+        if not self.rows:
+            return None
+        first = min(min(obs.days) for obs in self._products.values() if obs.days)
+        last = max(max(obs.days) for obs in self._products.values() if obs.days)
+
+        return dt.date.fromordinal(first), dt.date.fromordinal(last)
+
+    def daily_series(
+        self,
+        start: Optional[dt.date] = None,
+        end: Optional[dt.date] = None,
+        max_staleness_days: Optional[int] = None,
+    ) -> DailySeries:
+        """
+        Builds the daily series of each product, forward filling each valuation until
+        the next one. Each column is built from the runs of days sharing a valuation as
+        repeated packed doubles, without a Python step per day nor per valuation.
+        Valuations before start carry into the series.
+
+        Args:
+            start (dt.date, optional): First day. Defaults to the first date valued.
+            end (dt.date, optional): Last day. Defaults to the last date valued.
+            max_staleness_days (int, optional): Days a valuation is carried forward at
+                                                most, e.g. for products sold. Forever if
+                                                not given.
+        Returns:
+            DailySeries: The series of each product, by product name.
+        Raises:
+            ValueError: Raised if the history is empty and no range given, or if the
+                        range is empty.
+        """
+        date_range = self.date_range()
+        if date_range is None and (start is None or end is None):
+            raise ValueError("cannot build daily series of an empty history")
+        start = start if start else date_range[0]  # type: ignore[index]
+        end = end if end else date_range[1]  # type: ignore[index]
+        if end < start:
+            raise ValueError(f"end {end} is before start {start}")
+
+        first_day, last_day = start.toordinal(), end.toordinal()
+        days = last_day - first_day + 1
+        products: Dict[str, array] = {}
+        for product_name, observations in self._products.items():
+            if not observations.days:
+                products[product_name] = _repeat(0.0, days)
+                continue
+            # sorted by day, creation then order added, never by value, so the last
+            # valuation of a day comes last and the others get runs of 0 days
+            valued_days, _, _, values = zip(
+                *sorted(
+                    zip(
+                        observations.days,
+                        observations.created,
+                        count(),
+                        observations.values,
+                    )
+                )
+            )
+            starts = _clamp(valued_days, first_day, days)
+            ends = starts[1:] + [days]
+            packed = map(DOUBLE.pack, values)
+            if max_staleness_days is None:
+                runs = map(mul, packed, map(sub, ends, starts))
+            else:
+                stale = _clamp(valued_days, first_day - max_staleness_days - 1, days)
+                valued_ends = list(map(max, starts, map(min, ends, stale)))
+                # each run is valued up to its staleness limit, then 0
+                runs = chain.from_iterable(
+                    zip(
+                        map(mul, packed, map(sub, valued_ends, starts)),
+                        map(mul, repeat(ZERO_DOUBLE), map(sub, ends, valued_ends)),
+                    )
+                )
+            column = array("d")
+            column.frombytes(ZERO_DOUBLE * starts[0] + b"".join(runs))
+            products[product_name] = column
+
+        return DailySeries(start, end, products)
+
+
+def _next_period_start(date: dt.date, period: str) -> dt.date:
+    """
+    First day of the period after the one of date.
+    """
+    if period == "year":
+        return dt.date(date.year + 1, 1, 1)
+    months = 1 if period == "month" else 3
+    month = (date.month - 1) // months * months + months
+
+    return dt.date(date.year + month // 12, month % 12 + 1, 1)
+
+
+def period_returns(
+    series: DailySeries, values: array, period: str = "month"
+) -> List[PeriodReturn]:
+    """
+    Change of value of a daily series over each month, quarter or year it covers. Each
+    period is measured from the last day of the previous one, the first period from the
+    first day of the series, so consecutive returns chain. Only the period boundaries
+    are visited, not every day.
+
+    Args:
+        series (DailySeries): The daily series values belong to.
+        values (array): Daily values, e.g. series.totals() or a product of the series.
+        period (str, optional): 'month', 'quarter' or 'year'. Defaults to 'month'.
+    Returns:
+        List[PeriodReturn]: Change of value of each period, in order.
+    Raises:
+        ValueError: Raised if period is not supported.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of {PERIODS}, not '{period}'")
+
+    returns: List[PeriodReturn] = []
+    start_index = 0
+    period_start = series.start
+    while period_start <= series.end:
+        period_end = min(
+            _next_period_start(period_start, period) - dt.timedelta(days=1), series.end
+        )
+        end_index = series.index(period_end)
+        returns.append(
+            PeriodReturn(
+                series.date(start_index),
+                period_end,
+                values[start_index],
+                values[end_index],
+            )
+        )
+        start_index = end_index
+        period_start = period_end + dt.timedelta(days=1)
+
+    return returns
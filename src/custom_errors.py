@@ -53,3 +53,58 @@ class HeaderNotMatchError(Exception):
         )
 
         super().__init__(message)
+
+
+class RowValidationError(Exception):
+    """
+    Implementation of Exception to be raised when rows of a source file fail validation.
+    All invalid rows of the file are reported at once.
+
+    Args:
+        file_path (str): The path to the file.
+        report_summary (str): compact description of all row errors found.
+    """
+
+    def __init__(self, file_path: str, report_summary: str):
+        message = (
+            f"RowValidationError. {report_summary}. "
+            f" File: '{file_path}' cannot be processed."
+        )
+
+        super().__init__(message)
+
+
+class SpoolLockedError(Exception):
+    """
+    Implementation of Exception to be raised when a spool directory is already written
+    into by another process, a spool having a single writer.
+
+    Args:
+        spool_dir (str): The directory of the spool.
+    """
+
+    def __init__(self, spool_dir: str):
+        message = (
+            f"SpoolLockedError. Spool '{spool_dir}' is written into by another process. "
+            f"Use another spool directory."
+        )
+
+        super().__init__(message)
+
+
+class SpoolFlushLockedError(Exception):
+    """
+    Implementation of Exception to be raised when a spool directory is already flushed by
+    another process, a spool having a single flusher.
+
+    Args:
+        spool_dir (str): The directory of the spool.
+    """
+
+    def __init__(self, spool_dir: str):
+        message = (
+            f"SpoolFlushLockedError. Spool '{spool_dir}' is flushed by another process. "
+            f"Wait for it to finish."
+        )
+
+        super().__init__(message)
@@ -0,0 +1,267 @@
+from abc import ABC, abstractmethod
+import datetime as dt
+import json
+from typing import Dict, List, Optional, Tuple
+from google.cloud import storage
+
+from src import model, destination_repository
+from src.utils.rate_limiting import get_rate_limiter
+
+
+class AbstractDeltaIndex(ABC):
+    """
+    An abstract base class for the index of the last known (date, value) of each product,
+    used to load only the Asset Valuations that changed since the last snapshot.
+    An Asset Valuation is unchanged, and so filtered out, if the index holds the same value
+    for its product at the same or an earlier date. Asset Valuations older than the last
+    known date of their product are kept, as they cannot be judged against the snapshot.
+    The index is persisted as compact JSON: {product_name: [date, value]}.
+
+    Attributes:
+        entries (Dict[str, Tuple[dt.date, float]]): Last known (date, value) by product name.
+    Methods:
+        load():
+            Reads the persisted index. An index never saved is empty.
+        save():
+            Persists the index.
+        filter_changed(asset_valuations: List[model.AssetValuation]) -> List[model.AssetValuation]:
+            Filters Asset Valuations down to the new or changed ones.
+        update(asset_valuations: List[model.AssetValuation]):
+            Updates the index with Asset Valuations loaded into the destination.
+        rebuild(destination_repo: destination_repository.AbstractDestinationRepository):
+            Rebuilds the index from the latest Asset Valuations of a destination.
+    """
+
+    def __init__(self):
+        self.entries: Dict[str, Tuple[dt.date, float]] = {}
+
+    @abstractmethod
+    def _read(self) -> Optional[str]:
+        """
+        Abstract method to read the persisted index. Must be implemented by subclasses.
+
+        Returns:
+            str, optional: The persisted index, or None if it was never saved.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def _write(self, content: str):
+        """
+        Abstract method to persist the index. Must be implemented by subclasses.
+
+        Args:
+            content (str): The index serialised as JSON.
+        """
+        raise NotImplementedError
+
+    def load(self):
+        """
+        Reads the persisted index. An index never saved is empty.
+        """
+        content = self._read()
+        self.entries = {
+            product_name: (dt.date.fromisoformat(date), value)
+            for product_name, (date, value) in (
+                json.loads(content).items() if content else []
+            )
+        }
+
+    def save(self):
+        """
+        Persists the index.
+        """
+        self._write(
+            json.dumps(
+                {
+                    product_name: [date.isoformat(), value]
+                    for product_name, (date, value) in self.entries.items()
+                },
+                separators=(",", ":"),
+            )
+        )
+
+    def filter_changed(
+        self, asset_valuations: List[model.AssetValuation]
+    ) -> List[model.AssetValuation]:
+        """
+        Filters Asset Valuations down to the new or changed ones. Asset Valuations of a batch
+        are judged in date order, against the index as it would be after loading the earlier
+        ones, so repeated unchanged values within the batch are filtered too.
+
+        Args:
+            asset_valuations (List[model.AssetValuation]): Parsed Asset Valuations.
+        Returns:
+            List[model.AssetValuation]: Asset Valuations not known to the index, in
+                                        their original order.
+        """
+        entries = dict(self.entries)
+        keep = [False] * len(asset_valuations)
+        by_date = sorted(
+            range(len(asset_valuations)), key=lambda i: asset_valuations[i].date
+        )
+        for i in by_date:
+            asset_valuation = asset_valuations[i]
+            last_known = entries.get(asset_valuation.product_name)
+            if last_known is None or asset_valuation.date < last_known[0]:
+                keep[i] = True
+            elif asset_valuation.value != last_known[1]:
+                keep[i] = True
+            if keep[i] and (
+                last_known is None or asset_valuation.date >= last_known[0]
+            ):
+                entries[asset_valuation.product_name] = (
+                    asset_valuation.date,
+                    asset_valuation.value,
+                )
+
+        return [
+            asset_valuation
+            for asset_valuation, kept in zip(asset_valuations, keep)
+            if kept
+        ]
+
+    def update(self, asset_valuations: List[model.AssetValuation]):
+        """
+        Updates the index with Asset Valuations loaded into the destination. Only
+        Asset Valuations as recent as the last known one of their product replace it.
+
+        Args:
+            asset_valuations (List[model.AssetValuation]): Asset Valuations loaded.
+        """
+        for asset_valuation in asset_valuations:
+            last_known = self.entries.get(asset_valuation.product_name)
+            if last_known is None or asset_valuation.date >= last_known[0]:
+                self.entries[asset_valuation.product_name] = (
+                    asset_valuation.date,
+                    asset_valuation.value,
+                )
+
+    def rebuild(
+        self, destination_repo: destination_repository.AbstractDestinationRepository
+    ):
+        """
+        Rebuilds the index from the latest Asset Valuations of a destination.
+
+        Args:
+            destination_repo (destination_repository.AbstractDestinationRepository):
+                The destination repository the index tracks.
+        """
+        self.entries = {}
+        self.update(destination_repo.get_latest_asset_valuations())
+
+
+class LocalDeltaIndex(AbstractDeltaIndex):
+    """
+    A concrete implementation of AbstractDeltaIndex persisted into a local file.
+
+    Args:
+        index_path (str): The path to the index file.
+    Attributes:
+        index_path (str): The path to the index file.
+        entries (Dict[str, Tuple[dt.date, float]]): Last known (date, value) by product name.
+    """
+
+    def __init__(self, index_path: str):
+        super().__init__()
+        self.index_path = index_path
+
+    def _read(self) -> Optional[str]:
+        """
+        Reads the index file.
+
+        Returns:
+            str, optional: The content of the index file, or None if it does not exist.
+        """
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, content: str):
+        """
+        Writes the index file.
+
+        Args:
+            content (str): The index serialised as JSON.
+        """
+        with open(self.index_path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+
+class GcpBucketDeltaIndex(AbstractDeltaIndex):
+    """
+    A concrete implementation of AbstractDeltaIndex persisted into a GCP Bucket Blob.
+
+    Args:
+        index_path (str): The path to the index blob in the GCP bucket.
+        bucket_name (str): The name of the GCP bucket.
+        storage_client (storage.Client): A client for interacting with Google Cloud Storage.
+    Attributes:
+        index_path (str): The path to the index blob in the GCP bucket.
+        blob (storage.Blob): The index blob.
+        rate_limiter (RateLimiter): Rate limiter and retry policy of GCS calls, shared by
+                                    the process.
+        entries (Dict[str, Tuple[dt.date, float]]): Last known (date, value) by product name.
+    """
+
+    def __init__(
+        self, index_path: str, bucket_name: str, storage_client: storage.Client
+    ):
+        super().__init__()
+        self.index_path = index_path
+        self.blob = storage_client.bucket(bucket_name).blob(index_path)
+        self.rate_limiter = get_rate_limiter("gcs")
+
+    def _read(self) -> Optional[str]:
+        """
+        Downloads the index blob.
+
+        Returns:
+            str, optional: The content of the index blob, or None if it does not exist.
+        """
+        if not self.rate_limiter.call(self.blob.exists):
+            return None
+
+        return self.rate_limiter.call(self.blob.download_as_text, encoding="utf-8")
+
+    def _write(self, content: str):
+        """
+        Uploads the index blob.
+
+        Args:
+            content (str): The index serialised as JSON.
+        """
+        self.rate_limiter.call(
+            self.blob.upload_from_string, content, content_type="application/json"
+        )
+
+
+def create_delta_index(
+    index_path: str, storage_client: Optional[storage.Client] = None
+) -> AbstractDeltaIndex:
+    """
+    Creates a delta index from its location: a 'gs://bucket/path' URI or a local path.
+    The index is loaded before being returned.
+
+    Args:
+        index_path (str): The location of the index.
+        storage_client (storage.Client, optional): A client for interacting with Google
+                                                   Cloud Storage, needed for 'gs://' URIs.
+    Returns:
+        AbstractDeltaIndex: The loaded delta index.
+    Raises:
+        ValueError: Raised if the index is in a GCP bucket and no storage client is given.
+    """
+    delta_index: AbstractDeltaIndex
+    if index_path.startswith("gs://"):
+        bucket_name, _, blob_path = index_path[len("gs://") :].partition("/")
+        if storage_client is None:
+            raise ValueError(f"A storage client is needed for index '{index_path}'.")
+        delta_index = GcpBucketDeltaIndex(blob_path, bucket_name, storage_client)
+    else:
+        delta_index = LocalDeltaIndex(index_path)
+    delta_index.load()
+
+    return delta_index
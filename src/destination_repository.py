@@ -1,8 +1,90 @@
 from abc import ABC, abstractmethod
-from typing import Optional, List, Any, Dict
+from dataclasses import dataclass, field
+import datetime as dt
+import io
+import itertools
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional, List, Any, Callable, Dict, Iterable, Iterator, Tuple
+import uuid
+from google.api_core import exceptions
 from google.cloud import bigquery
 
-from src import model
+from src import model, serialisation, spool, validation
+from src.utils.logs import default_module_logger
+from src.utils.memory_budget import get_memory_budget
+from src.utils.rate_limiting import RateLimiter, get_rate_limiter
+
+logger = default_module_logger(__file__)
+
+# source URIs of a single job, as for load jobs
+MAX_URIS_PER_JOB = 10000
+# products of a single MERGE into the latest snapshot, bounding its query parameters
+MAX_PRODUCTS_PER_MERGE = 5000
+# staging tables of loads in several chunks expire on their own if never dropped
+STAGING_TABLE_EXPIRATION_HOURS = 24
+DEFAULT_BIGQUERY_DESTINATION = "raw.asset_valuations_v2"
+# jobs and calls of a BigQuery load other than its load jobs, as counted by a dry run
+PLANNED_JOB_KINDS = (
+    "staging table creations",
+    "staging copy jobs",
+    "staging table deletions",
+    "snapshot creations",
+    "snapshot merges",
+)
+
+
+@dataclass
+class LoadMetrics:
+    """
+    Records the chunks sent by a destination repository, to tune load throughput.
+
+    Attributes:
+        chunk_rows (List[int]): Number of rows of each chunk loaded.
+        chunk_bytes (List[int]): Serialised size in bytes of each chunk loaded.
+        job_seconds (List[float]): Time taken by the load job of each chunk.
+    Methods:
+        record(rows: int, n_bytes: int, seconds: float):
+            Records a loaded chunk.
+        summary() -> str:
+            Describes the chunks loaded so far.
+    """
+
+    chunk_rows: List[int] = field(default_factory=list)
+    chunk_bytes: List[int] = field(default_factory=list)
+    job_seconds: List[float] = field(default_factory=list)
+
+    def record(self, rows: int, n_bytes: int, seconds: float):
+        """
+        Records a loaded chunk.
+
+        Args:
+            rows (int): Number of rows of the chunk.
+            n_bytes (int): Serialised size in bytes of the chunk.
+            seconds (float): Time taken by the load job of the chunk.
+        """
+        self.chunk_rows.append(rows)
+        self.chunk_bytes.append(n_bytes)
+        self.job_seconds.append(seconds)
+
+    def summary(self) -> str:
+        """
+        Describes the chunks loaded so far.
+
+        Returns:
+            str: number of chunks and range of their rows, bytes and job latency.
+        """
+        if not self.chunk_rows:
+            return "0 chunks loaded"
+
+        return (
+            f"{len(self.chunk_rows)} chunks loaded, "
+            f"rows [{min(self.chunk_rows)}, {max(self.chunk_rows)}], "
+            f"bytes [{min(self.chunk_bytes)}, {max(self.chunk_bytes)}], "
+            f"job seconds [{min(self.job_seconds):.2f}, {max(self.job_seconds):.2f}]"
+        )
 
 
 class AbstractDestinationRepository(ABC):
@@ -13,6 +95,8 @@ class AbstractDestinationRepository(ABC):
     Methods:
         load_asset_valuations (List[model.AssetValuation]):
             List of AssetValuation instances to be loaded into the repository.
+        get_latest_asset_valuations() -> List[model.AssetValuation]:
+            Retrieves the latest Asset Valuation of each product in the repository.
     """
 
     @abstractmethod
@@ -28,53 +112,1088 @@ class AbstractDestinationRepository(ABC):
         """
         raise NotImplementedError
 
+    @abstractmethod
+    def get_latest_asset_valuations(self) -> list[model.AssetValuation]:
+        """
+        Abstract method to retrieve the latest Asset Valuation of each product in the
+        repository, by date and then by creation date.
+
+        Returns:
+            List[model.AssetValuation]: A list of AssetValuation instances, one per product.
+        """
+        raise NotImplementedError
+
+
+def latest_snapshot_of(asset_valuations_destination: str) -> str:
+    """
+    Names the latest snapshot table of a BigQuery destination table.
+
+    Args:
+        asset_valuations_destination (str): The destination table.
+    Returns:
+        str: raw.asset_valuations_latest for raw.asset_valuations_v2, the destination
+             table suffixed '_latest' for any other.
+    """
+    if asset_valuations_destination == DEFAULT_BIGQUERY_DESTINATION:
+        return "raw.asset_valuations_latest"
+
+    return f"{asset_valuations_destination}_latest"
+
+
+class NdjsonChunker:
+    """
+    Serialises Asset Valuations as NDJSON into a reusable buffer, one chunk of a load job
+    at a time. A chunk is closed when it reaches chunk_rows rows or max_chunk_bytes
+    serialised bytes. After each load job chunk_rows adapts to the observed job latency:
+    it is halved when the job took longer than target_job_seconds and doubled when it
+    took less than half of it, always within [min_chunk_rows, max_chunk_rows].
+
+    Args:
+        min_chunk_rows (int, optional): Lower bound for the rows of a chunk. Defaults to 1000.
+        max_chunk_rows (int, optional): Upper bound for the rows of a chunk. Defaults to 100000.
+        max_chunk_bytes (int, optional): Upper bound for the serialised size of a chunk.
+                                         Defaults to 8 MiB.
+        target_job_seconds (float, optional): Load job latency aimed at. Defaults to 15.
+    Attributes:
+        min_chunk_rows (int): Lower bound for the rows of a chunk.
+        max_chunk_rows (int): Upper bound for the rows of a chunk.
+        max_chunk_bytes (int): Upper bound for the serialised size of a chunk.
+        target_job_seconds (float): Load job latency aimed at.
+        chunk_rows (int): Current maximum number of rows of a chunk.
+        serialiser (serialisation.NdjsonSerialiser): Serialiser of the rows.
+        buffer (io.BytesIO): The buffer holding the current chunk.
+    Methods:
+        fill_chunks(asset_valuations: Iterable[model.AssetValuation]) -> Iterator[Tuple[int, int]]:
+            Serialises Asset Valuations into the buffer, one chunk at a time.
+        adapt_chunk_rows(job_seconds: float):
+            Adapts chunk_rows to the latency of the last load job.
+    """
+
+    def __init__(
+        self,
+        min_chunk_rows: int = 1000,
+        max_chunk_rows: int = 100000,
+        max_chunk_bytes: int = 8 * 1024 * 1024,
+        target_job_seconds: float = 15.0,
+    ):
+        self.min_chunk_rows = min_chunk_rows
+        self.max_chunk_rows = max_chunk_rows
+        self.max_chunk_bytes = max_chunk_bytes
+        self.target_job_seconds = target_job_seconds
+        self.chunk_rows = max_chunk_rows
+        self.serialiser = serialisation.NdjsonSerialiser()
+        self.buffer = io.BytesIO()
+
+    def fill_chunks(
+        self, asset_valuations: Iterable[model.AssetValuation]
+    ) -> Iterator[Tuple[int, int]]:
+        """
+        Serialises Asset Valuations into the reusable buffer, yielding each time the buffer
+        holds a chunk of chunk_rows rows or max_chunk_bytes bytes. The buffer must be
+        consumed before resuming the iteration, as it is then cleared for the next chunk.
+        A row bigger than max_chunk_bytes on its own makes a chunk by itself.
+
+        Args:
+            asset_valuations (Iterable[model.AssetValuation]): Asset Valuations to be loaded.
+        Returns:
+            Iterator[Tuple[int, int]]: rows and serialised size of the chunk in the buffer.
+        """
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        chunk_rows = 0
+        for asset_valuation in asset_valuations:
+            line = self.serialiser.serialise(asset_valuation)
+            if chunk_rows and (
+                chunk_rows >= self.chunk_rows
+                or self.buffer.tell() + len(line) > self.max_chunk_bytes
+            ):
+                yield chunk_rows, self.buffer.tell()
+                self.buffer.seek(0)
+                self.buffer.truncate()
+                chunk_rows = 0
+            self.buffer.write(line)
+            chunk_rows += 1
+
+        if chunk_rows:
+            yield chunk_rows, self.buffer.tell()
+
+    def adapt_chunk_rows(self, job_seconds: float):
+        """
+        Adapts chunk_rows to the latency of the last load job: halved if the job was slower
+        than target_job_seconds, doubled if it took less than half of it.
+
+        Args:
+            job_seconds (float): Time taken by the last load job.
+        """
+        if job_seconds > self.target_job_seconds:
+            self.chunk_rows = max(self.min_chunk_rows, self.chunk_rows // 2)
+        elif job_seconds < self.target_job_seconds / 2:
+            self.chunk_rows = min(self.max_chunk_rows, self.chunk_rows * 2)
+
 
 class BiqQueryDestinationRepository(AbstractDestinationRepository):
     """
     Concrete implementation of the AbstractDestinationRepository for interacting with Google BigQuery.
     This repository class is designed to load asset valuations data into Google BigQuery.
 
+    Asset valuations are serialised as NDJSON into the reusable buffer of an
+    NdjsonChunker, which is uploaded with load_table_from_file, and are loaded in chunks
+    whose rows adapt to the observed job latency.
+    Each call is loaded atomically: a call fitting a single chunk is loaded straight
+    into the destination table, while the chunks of a bigger call are loaded into a
+    staging table of their own, then appended to the destination table by a single copy
+    job, so a failed chunk leaves nothing committed and the call can be retried whole.
+    Jobs are run through the BigQuery rate limiter shared by the process, see
+    rate_limiting.RateLimiter, and retried on throttling or transient errors. Each job is
+    created under a job id of its own, so a retry never runs a job twice.
+    After each load the latest snapshot table, holding the latest Asset Valuation of each
+    product, is updated by a MERGE touching only the products loaded, so consumers, and
+    get_latest_asset_valuations(), read current values from a table of one row per
+    product instead of the whole history. The snapshot is built from the history when
+    first created. A MERGE that fails, e.g. on concurrent MERGEs into the snapshot, is
+    logged and not raised, as the load it follows is committed already: the snapshot
+    table is dropped instead, so that whichever process reads it next builds it again
+    from the history. Only if dropping it fails too does this repository read the
+    history instead, until rebuild_latest_snapshot() is run.
+
     Args:
         bigquery_client (google.cloud.bigquery.Client): BigQuery client instance.
+        min_chunk_rows (int, optional): Lower bound for the rows of a chunk. Defaults to 1000.
+        max_chunk_rows (int, optional): Upper bound for the rows of a chunk. Defaults to 100000.
+        max_chunk_bytes (int, optional): Upper bound for the serialised size of a chunk.
+                                         Defaults to 8 MiB.
+        target_job_seconds (float, optional): Load job latency aimed at. Defaults to 15.
+        maintain_latest_snapshot (bool, optional): Whether the latest snapshot table is
+                                                   updated after each load. Defaults to True.
+        asset_valuations_destination (str, optional): The destination table. Defaults to
+                                                      raw.asset_valuations_v2, whose latest
+                                                      snapshot is raw.asset_valuations_latest;
+                                                      that of another table is suffixed
+                                                      '_latest'.
     Attributes:
         bigquery_client (google.cloud.bigquery.Client): BigQuery client instance.
         asset_valuations_destination (str): The destination table for asset valuations in BigQuery.
+        latest_snapshot_destination (str): The table of the latest Asset Valuation of each
+                                           product.
+        maintain_latest_snapshot (bool): Whether the latest snapshot table is updated
+                                         after each load.
+        chunker (NdjsonChunker): Serialiser of the rows sent to BigQuery, into chunks.
+        load_metrics (LoadMetrics): Sizes and latencies of the chunks loaded so far.
+        rate_limiter (RateLimiter): Rate limiter and retry policy of BigQuery calls.
     Methods:
         load_asset_valuations(asset_valuations: list[model.AssetValuation]):
             Load asset valuations into BigQuery table indicated by attribute asset_valuations_destination.
+        get_latest_asset_valuations() -> List[model.AssetValuation]:
+            Retrieves the latest Asset Valuation of each product in the BigQuery table.
+        load_generic_csv_uris(uris: List[str], header: validation.GenericHeader) -> int:
+            Loads generic CSV files straight from GCS, server side.
+        rebuild_latest_snapshot():
+            Rebuilds the latest snapshot table from the whole history.
+        _load_chunk(chunk_rows: int, chunk_bytes: int, destination: str):
+            Runs the load job of the chunk in the buffer.
+        _load_staged(first_chunk: Tuple[int, int], chunks: Iterator[Tuple[int, int]]):
+            Loads chunks through a staging table, committed by a single copy job.
+        _update_latest_snapshot(asset_valuations: List[model.AssetValuation]):
+            Merges the latest Asset Valuation of each product loaded into the snapshot.
+        _keep_latest_snapshot(merge: Callable[[], None]):
+            Runs a merge into the snapshot, dropping the snapshot if the merge fails.
+        _run_job(create_job: Callable[[str], Any]) -> Any:
+            Runs a BigQuery job, rate limited and retried.
     """
 
-    def __init__(self, bigquery_client: bigquery.Client):
+    def __init__(
+        self,
+        bigquery_client: bigquery.Client,
+        min_chunk_rows: int = 1000,
+        max_chunk_rows: int = 100000,
+        max_chunk_bytes: int = 8 * 1024 * 1024,
+        target_job_seconds: float = 15.0,
+        maintain_latest_snapshot: bool = True,
+        asset_valuations_destination: str = DEFAULT_BIGQUERY_DESTINATION,
+    ):
         self.bigquery_client = bigquery_client
-        self.asset_valuations_destination = "raw.asset_valuations_v2"
+        self.asset_valuations_destination = asset_valuations_destination
+        self.latest_snapshot_destination = latest_snapshot_of(
+            asset_valuations_destination
+        )
+        self.maintain_latest_snapshot = maintain_latest_snapshot
+        self.chunker = NdjsonChunker(
+            min_chunk_rows, max_chunk_rows, max_chunk_bytes, target_job_seconds
+        )
+        self.load_metrics = LoadMetrics()
+        self.rate_limiter: RateLimiter = get_rate_limiter("bigquery")
+        self._latest_snapshot_created = False
+        self._latest_snapshot_stale = False
 
     def load_asset_valuations(self, asset_valuations: list[model.AssetValuation]):
         """
-        Load Asset Valuations into BigQuery table indicated by attribute asset_valuations_destination.
+        Load Asset Valuations into BigQuery table indicated by attribute asset_valuations_destination,
+        all or none of them, then updates the latest snapshot table with the products
+        loaded. Asset Valuations not fitting a single chunk are staged first, see
+        _load_staged().
 
         Args:
             asset_valuations (List[model.AssetValuation]):
                 List of AssetValuation instances to be loaded into BigQuery.
         """
+        chunks = self.chunker.fill_chunks(asset_valuations)
+        first_chunk = next(chunks, None)
+        if first_chunk is None:
+            return
+        if first_chunk[0] == len(asset_valuations):
+            self._load_chunk(*first_chunk, self.asset_valuations_destination)
+        else:
+            self._load_staged(first_chunk, chunks)
 
-        dictify: List[Dict[str, Any]] = [
-            {
-                "date": asset_valuation.date.strftime("%Y-%m-%d"),
-                "value": asset_valuation.value,
-                "product_name": asset_valuation.product_name,
-                "__source_file__": asset_valuation.source_file,
-                "__creation_date__": asset_valuation.creation_date.strftime(
-                    "%Y-%m-%d %H:%M:%S"
-                ),
-            }
-            for asset_valuation in asset_valuations
-        ]
+        if self.maintain_latest_snapshot:
+            self._keep_latest_snapshot(
+                lambda: self._update_latest_snapshot(asset_valuations)
+            )
+
+    def _load_staged(
+        self, first_chunk: Tuple[int, int], chunks: Iterator[Tuple[int, int]]
+    ):
+        """
+        Loads chunks into a staging table of their own, then appends the staging table
+        to the destination table by a single copy job, which commits all rows or none.
+        The staging table is dropped once done, or expires after
+        STAGING_TABLE_EXPIRATION_HOURS if dropping it fails.
+
+        Args:
+            first_chunk (Tuple[int, int]): Rows and size of the chunk in the buffer.
+            chunks (Iterator[Tuple[int, int]]): The next chunks, see
+                                                NdjsonChunker.fill_chunks().
+        """
+        staging_table = (
+            f"{self.asset_valuations_destination}_staging_{uuid.uuid4().hex}"
+        )
+        query = (
+            f"CREATE TABLE {staging_table} ("
+            "date DATE, value FLOAT64, product_name STRING, "
+            "__source_file__ STRING, __creation_date__ TIMESTAMP) "
+            "OPTIONS (expiration_timestamp = TIMESTAMP_ADD("
+            f"CURRENT_TIMESTAMP(), INTERVAL {STAGING_TABLE_EXPIRATION_HOURS} HOUR))"
+        )
+        self._run_job(lambda job_id: self.bigquery_client.query(query, job_id=job_id))
+        try:
+            for chunk_rows, chunk_bytes in itertools.chain([first_chunk], chunks):
+                self._load_chunk(chunk_rows, chunk_bytes, staging_table)
+            job_config = bigquery.CopyJobConfig(
+                create_disposition=bigquery.CreateDisposition.CREATE_IF_NEEDED,
+                write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+            )
+            self._run_job(
+                lambda job_id: self.bigquery_client.copy_table(
+                    staging_table,
+                    self.asset_valuations_destination,
+                    job_id=job_id,
+                    job_config=job_config,
+                )
+            )
+        finally:
+            try:
+                self.rate_limiter.call(
+                    lambda: self.bigquery_client.delete_table(
+                        staging_table, not_found_ok=True
+                    )
+                )
+            except exceptions.GoogleAPICallError:
+                pass  # the staging table expires on its own
+
+    def _load_chunk(self, chunk_rows: int, chunk_bytes: int, destination: str):
+        """
+        Runs the load job of the chunk in the buffer, then adapts chunk_rows to its latency.
+
+        Args:
+            chunk_rows (int): Rows of the chunk.
+            chunk_bytes (int): Serialised size of the chunk.
+            destination (str): Table the chunk is loaded into.
+        """
         job_config = bigquery.LoadJobConfig(
             create_disposition=bigquery.CreateDisposition.CREATE_IF_NEEDED,
             write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
             source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
+            autodetect=True,
+        )
+        start = time.perf_counter()
+        # the chunk is held while uploaded, accounted without waiting as it drains a batch
+        budget = get_memory_budget()
+        budget.track(chunk_bytes, "serialise")
+        try:
+            self._run_job(
+                lambda job_id: self.bigquery_client.load_table_from_file(
+                    self.chunker.buffer,
+                    destination,
+                    rewind=True,
+                    size=chunk_bytes,
+                    job_id=job_id,
+                    job_config=job_config,
+                )
+            )
+        finally:
+            budget.release(chunk_bytes, "serialise")
+        job_seconds = time.perf_counter() - start
+
+        self.load_metrics.record(chunk_rows, chunk_bytes, job_seconds)
+        self.chunker.adapt_chunk_rows(job_seconds)
+
+    def get_latest_asset_valuations(self) -> list[model.AssetValuation]:
+        """
+        Retrieves the latest Asset Valuation of each product in the BigQuery table indicated
+        by attribute asset_valuations_destination, by date and then by creation date.
+        They are read from the latest snapshot table, created from the history if needed,
+        also if dropped by another process since, unless the snapshot is not maintained
+        or went stale, in which case the whole history is scanned.
+
+        Returns:
+            List[model.AssetValuation]: A list of AssetValuation instances, one per product.
+        """
+        if self.maintain_latest_snapshot and not self._latest_snapshot_stale:
+            query = (
+                "SELECT date, value, product_name, __source_file__, __creation_date__ "
+                f"FROM {self.latest_snapshot_destination}"
+            )
+            self._create_latest_snapshot()
+            try:
+                query_job = self._run_job(
+                    lambda job_id: self.bigquery_client.query(query, job_id=job_id)
+                )
+            except exceptions.NotFound:
+                # dropped after a failed MERGE since checked, see _keep_latest_snapshot()
+                self._latest_snapshot_created = False
+                self._create_latest_snapshot()
+                query_job = self._run_job(
+                    lambda job_id: self.bigquery_client.query(query, job_id=job_id)
+                )
+        else:
+            query = self._latest_of_history_query()
+            query_job = self._run_job(
+                lambda job_id: self.bigquery_client.query(query, job_id=job_id)
+            )
+
+        return [
+            model.AssetValuation(
+                date=row.date,
+                value=row.value,
+                product_name=row.product_name,
+                source_file=row.__source_file__,
+                creation_date=row.__creation_date__,
+            )
+            for row in query_job.result()
+        ]
+
+    def load_generic_csv_uris(
+        self, uris: List[str], header: validation.GenericHeader
+    ) -> int:
+        """
+        Loads generic CSV files straight from GCS into the BigQuery table indicated by
+        attribute asset_valuations_destination, so rows never go through this process.
+        Files are read as a temporary external table, with a column per column of the
+        header, and inserted by a query job that adds __source_file__, from the
+        _FILE_NAME pseudo column, and __creation_date__. Rows are checked as by
+        validation.validate_generic_rows(), server side: any invalid row, or a product
+        valued differently twice on a date within a file, fails the job, and with it the
+        insert of all rows of the job. Rows repeated exactly are inserted once.
+        Files are sent by jobs of up to MAX_URIS_PER_JOB URIs.
+
+        Args:
+            uris (List[str]): gs:// URIs of generic CSV files, without header check.
+            header (validation.GenericHeader): Column layout shared by all files, as
+                                               checked on their header.
+        Returns:
+            int: Number of rows inserted.
+        """
+        rows_inserted = 0
+        for i in range(0, len(uris), MAX_URIS_PER_JOB):
+            job_uris = uris[i : i + MAX_URIS_PER_JOB]
+            external_config = bigquery.ExternalConfig("CSV")
+            external_config.source_uris = job_uris
+            external_config.schema = [
+                bigquery.SchemaField(f"column_{j}", "STRING")
+                for j in range(header.width)
+            ]
+            external_config.csv_options.skip_leading_rows = 1
+            job_config = bigquery.QueryJobConfig(
+                table_definitions={"generic_files": external_config}
+            )
+
+            query = self._generic_csv_insert_query(header)
+            start = time.perf_counter()
+            query_job = self._run_job(
+                lambda job_id: self.bigquery_client.query(
+                    query, job_config=job_config, job_id=job_id
+                )
+            )
+            job_seconds = time.perf_counter() - start
+
+            rows = query_job.num_dml_affected_rows or 0
+            self.load_metrics.record(
+                rows, query_job.total_bytes_processed or 0, job_seconds
+            )
+            rows_inserted += rows
+            if self.maintain_latest_snapshot and rows:
+                self._keep_latest_snapshot(
+                    lambda: self._merge_latest_snapshot_of_files(job_uris)
+                )
+
+        return rows_inserted
+
+    def _latest_of_history_query(self) -> str:
+        """
+        Builds the query of the latest Asset Valuation of each product over the whole
+        history of the destination table, by date and then by creation date.
+        """
+        return (
+            "SELECT date, value, product_name, __source_file__, __creation_date__ "
+            f"FROM {self.asset_valuations_destination} WHERE TRUE "
+            "QUALIFY ROW_NUMBER() OVER ("
+            "PARTITION BY product_name ORDER BY date DESC, __creation_date__ DESC) = 1"
+        )
+
+    def _create_latest_snapshot(self):
+        """
+        Creates the latest snapshot table, clustered by product name, if needed, built
+        from the history so it is complete from the start. Only checked once per
+        repository, until the snapshot is dropped, see _keep_latest_snapshot().
+        """
+        if self._latest_snapshot_created:
+            return
+
+        query = (
+            f"CREATE TABLE IF NOT EXISTS {self.latest_snapshot_destination} "
+            f"CLUSTER BY product_name AS {self._latest_of_history_query()}"
+        )
+        self._run_job(lambda job_id: self.bigquery_client.query(query, job_id=job_id))
+        self._latest_snapshot_created = True
+
+    def _latest_snapshot_merge_query(self, source: str) -> str:
+        """
+        Builds the MERGE of the latest Asset Valuation of some products into the latest
+        snapshot table. A product is only updated by a valuation at least as recent, by
+        date and then by creation date, so merging twice or out of order is harmless.
+
+        Args:
+            source (str): Query or table of the latest valuation of each product merged,
+                          with columns date, value, product_name, source_file and
+                          creation_date.
+        Returns:
+            str: The MERGE statement.
+        """
+        return (
+            f"MERGE {self.latest_snapshot_destination} AS snapshot "
+            f"USING ({source}) AS latest "
+            "ON snapshot.product_name = latest.product_name "
+            "WHEN MATCHED AND (latest.date > snapshot.date OR ("
+            "latest.date = snapshot.date "
+            "AND latest.creation_date >= snapshot.__creation_date__)) THEN "
+            "UPDATE SET date = latest.date, value = latest.value, "
+            "__source_file__ = latest.source_file, "
+            "__creation_date__ = latest.creation_date "
+            "WHEN NOT MATCHED THEN "
+            "INSERT (date, value, product_name, __source_file__, __creation_date__) "
+            "VALUES (latest.date, latest.value, latest.product_name, "
+            "latest.source_file, latest.creation_date)"
+        )
+
+    def _update_latest_snapshot(self, asset_valuations: List[model.AssetValuation]):
+        """
+        Merges the latest Asset Valuation of each product of asset_valuations into the
+        latest snapshot table, sent as a query parameter, by MERGEs of up to
+        MAX_PRODUCTS_PER_MERGE products. Other products are not touched.
+
+        Args:
+            asset_valuations (List[model.AssetValuation]): Asset Valuations just loaded.
+        """
+        self._create_latest_snapshot()
+        latest = model.latest_asset_valuations(asset_valuations)
+        query = self._latest_snapshot_merge_query("SELECT * FROM UNNEST(@latest)")
+        for i in range(0, len(latest), MAX_PRODUCTS_PER_MERGE):
+            rows = [
+                bigquery.StructQueryParameter(
+                    None,
+                    bigquery.ScalarQueryParameter("date", "DATE", row.date),
+                    bigquery.ScalarQueryParameter("value", "FLOAT64", row.value),
+                    bigquery.ScalarQueryParameter(
+                        "product_name", "STRING", row.product_name
+                    ),
+                    bigquery.ScalarQueryParameter(
+                        "source_file", "STRING", row.source_file
+                    ),
+                    bigquery.ScalarQueryParameter(
+                        "creation_date", "TIMESTAMP", row.creation_date
+                    ),
+                )
+                for row in latest[i : i + MAX_PRODUCTS_PER_MERGE]
+            ]
+            job_config = bigquery.QueryJobConfig(
+                query_parameters=[
+                    bigquery.ArrayQueryParameter("latest", "STRUCT", rows)
+                ]
+            )
+            self._run_job(
+                lambda job_id: self.bigquery_client.query(
+                    query, job_config=job_config, job_id=job_id
+                )
+            )
+
+    def _merge_latest_snapshot_of_files(self, uris: List[str]):
+        """
+        Merges the latest Asset Valuation of each product of files loaded server side
+        into the latest snapshot table, reading them back from the destination table by
+        source file, see load_generic_csv_uris().
+
+        Args:
+            uris (List[str]): gs:// URIs of the files loaded.
+        """
+        self._create_latest_snapshot()
+        source_files = [re.sub(r"^gs://[^/]+/", "", uri) for uri in uris]
+        source = (
+            "SELECT date, value, product_name, __source_file__ AS source_file, "
+            "__creation_date__ AS creation_date "
+            f"FROM {self.asset_valuations_destination} "
+            "WHERE __source_file__ IN UNNEST(@source_files) "
+            "QUALIFY ROW_NUMBER() OVER ("
+            "PARTITION BY product_name ORDER BY date DESC, __creation_date__ DESC) = 1"
+        )
+        query = self._latest_snapshot_merge_query(source)
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ArrayQueryParameter("source_files", "STRING", source_files)
+            ]
+        )
+        self._run_job(
+            lambda job_id: self.bigquery_client.query(
+                query, job_config=job_config, job_id=job_id
+            )
+        )
+
+    def rebuild_latest_snapshot(self):
+        """
+        Rebuilds the latest snapshot table from the whole history of the destination
+        table, e.g. once for history loaded before the snapshot was maintained.
+        """
+        query = (
+            f"CREATE OR REPLACE TABLE {self.latest_snapshot_destination} "
+            f"CLUSTER BY product_name AS {self._latest_of_history_query()}"
+        )
+        self._run_job(lambda job_id: self.bigquery_client.query(query, job_id=job_id))
+        self._latest_snapshot_created = True
+        self._latest_snapshot_stale = False
+
+    def _keep_latest_snapshot(self, merge: Callable[[], None]):
+        """
+        Runs a merge into the latest snapshot table after a load. The load is committed
+        already, so an error is logged instead of raised, where it would have the load
+        retried and duplicated. The snapshot, missing the products loaded, is dropped,
+        so that every process, not only this one, builds it again from the history when
+        next read. If dropping it fails too, this repository marks it stale.
+
+        Args:
+            merge (Callable[[], None]): Merges the Asset Valuations just loaded.
+        """
+        try:
+            merge()
+        except Exception as e:
+            self._latest_snapshot_created = False
+            try:
+                self.rate_limiter.call(
+                    lambda: self.bigquery_client.delete_table(
+                        self.latest_snapshot_destination, not_found_ok=True
+                    )
+                )
+            except Exception as drop_error:
+                self._latest_snapshot_stale = True
+                logger.error(
+                    f"Failed to update '{self.latest_snapshot_destination}' ({e}) and "
+                    f"to drop it ({drop_error}), stale until rebuilt by "
+                    "rebuild_latest_snapshot()"
+                )
+            else:
+                logger.error(
+                    f"Failed to update '{self.latest_snapshot_destination}', dropped to "
+                    f"be built again from the history when next read: {e}"
+                )
+
+    def _run_job(self, create_job: Callable[[str], Any]) -> Any:
+        """
+        Runs a BigQuery job through rate_limiter, waiting for it to finish. The job is
+        created under a fresh job id, kept while it may still be running: if waiting for
+        the job fails, the retry attaches to the same job, which BigQuery refuses to
+        create twice, instead of running it again. Only a job that failed gets a new id.
+
+        Args:
+            create_job (Callable[[str], Any]): Creates the job under the given job id.
+        Returns:
+            Any: The finished job.
+        """
+        job_id = f"asset_valuations_{uuid.uuid4().hex}"
+
+        def attempt() -> Any:
+            nonlocal job_id
+            try:
+                job = create_job(job_id)
+            except exceptions.Conflict:
+                # created by an earlier attempt, whose wait for the job failed
+                job = self.bigquery_client.get_job(job_id)
+            try:
+                job.result()
+            except Exception:
+                if job.error_result is not None:
+                    job_id = f"asset_valuations_{uuid.uuid4().hex}"
+                raise
+
+            return job
+
+        return self.rate_limiter.call(attempt)
+
+    def _generic_csv_insert_query(self, header: validation.GenericHeader) -> str:
+        """
+        Builds the query inserting the rows of the generic_files external table, see
+        load_generic_csv_uris().
+
+        Args:
+            header (validation.GenericHeader): Column layout of the files.
+        Returns:
+            str: The INSERT statement.
+        """
+        product_name, date, value = (f"column_{i}" for i in header.indexes)
+        min_date = validation.MIN_VALUATION_DATE.isoformat()
+
+        return (
+            "INSERT INTO "
+            f"{self.asset_valuations_destination} "
+            "(date, value, product_name, __source_file__, __creation_date__) "
+            "WITH parsed AS ("
+            f"SELECT {product_name} AS product_name, "
+            f"PARSE_DATE('%Y-%m-%d', {date}) AS date, "
+            f"CAST({value} AS FLOAT64) AS value, "
+            "REGEXP_REPLACE(_FILE_NAME, r'^gs://[^/]+/', '') AS source_file "
+            "FROM generic_files), "
+            "keyed AS ("
+            "SELECT *, COUNT(DISTINCT value) OVER ("
+            "PARTITION BY source_file, product_name, date) AS values_per_key "
+            "FROM parsed) "
+            "SELECT DISTINCT date, value, product_name, source_file, "
+            "CURRENT_TIMESTAMP() "
+            "FROM keyed "
+            "WHERE IF("
+            "TRIM(product_name) != '' "
+            f"AND date BETWEEN DATE '{min_date}' AND CURRENT_DATE() "
+            "AND NOT IS_INF(value) AND NOT IS_NAN(value) AND values_per_key = 1, "
+            "TRUE, ERROR(CONCAT('Invalid row in file ', source_file, ': ', "
+            "TO_JSON_STRING(keyed))))"
+        )
+
+
+class DryRunDestinationRepository(AbstractDestinationRepository):
+    """
+    Stand-in for BiqQueryDestinationRepository that plans the jobs it would run instead
+    of running them, to size backfills from real data. Asset Valuations are serialised
+    and split into chunks by an NdjsonChunker exactly as they would be for BigQuery, and
+    each chunk is recorded on load_metrics as a projected load job, taking no time. As
+    no job runs, chunk_rows does not adapt: chunks are planned at max_chunk_rows rows.
+    The other jobs and calls of each load are counted on planned_jobs: the creation,
+    copy and deletion of the staging table of a load in several chunks, and the creation
+    of the latest snapshot table and the MERGEs into it.
+
+    Args:
+        min_chunk_rows (int, optional): Lower bound for the rows of a chunk. Defaults to 1000.
+        max_chunk_rows (int, optional): Upper bound for the rows of a chunk. Defaults to 100000.
+        max_chunk_bytes (int, optional): Upper bound for the serialised size of a chunk.
+                                         Defaults to 8 MiB.
+        maintain_latest_snapshot (bool, optional): Whether the latest snapshot table would
+                                                   be updated after each load. Defaults to
+                                                   True.
+        asset_valuations_destination (str, optional): The destination table the jobs are
+                                                      planned for. Defaults to
+                                                      raw.asset_valuations_v2.
+    Attributes:
+        asset_valuations_destination (str): The destination table the jobs are planned for.
+        latest_snapshot_destination (str): The latest snapshot table the MERGEs are
+                                           planned for.
+        maintain_latest_snapshot (bool): Whether snapshot jobs are planned.
+        chunker (NdjsonChunker): Serialiser of the rows, into chunks.
+        load_metrics (LoadMetrics): Sizes of the load jobs planned so far.
+        planned_jobs (Dict[str, int]): Jobs and calls other than load jobs planned so far,
+                                       by kind, in PLANNED_JOB_KINDS.
+        last_load (Tuple[int, int, int]): Rows, serialised bytes and load jobs planned by the
+                                          last call to load_asset_valuations.
+    Methods:
+        load_asset_valuations(asset_valuations: list[model.AssetValuation]):
+            Plans the jobs of a load of Asset Valuations, without running them.
+        get_latest_asset_valuations() -> List[model.AssetValuation]:
+            Returns no Asset Valuation, as nothing is loaded.
+        load_generic_csv_uris(uris: List[str], header: validation.GenericHeader) -> int:
+            Plans the query jobs loading generic CSV files from GCS, without running them.
+        plan_summary() -> str:
+            Describes the jobs planned so far.
+        _plan_latest_snapshot(merges: int):
+            Plans the creation of the latest snapshot table, once, and MERGEs into it.
+    """
+
+    def __init__(
+        self,
+        min_chunk_rows: int = 1000,
+        max_chunk_rows: int = 100000,
+        max_chunk_bytes: int = 8 * 1024 * 1024,
+        maintain_latest_snapshot: bool = True,
+        asset_valuations_destination: str = DEFAULT_BIGQUERY_DESTINATION,
+    ):
+        self.asset_valuations_destination = asset_valuations_destination
+        self.latest_snapshot_destination = latest_snapshot_of(
+            asset_valuations_destination
         )
-        load_job = self.bigquery_client.load_table_from_json(
-            dictify, self.asset_valuations_destination, job_config=job_config
+        self.maintain_latest_snapshot = maintain_latest_snapshot
+        self.chunker = NdjsonChunker(min_chunk_rows, max_chunk_rows, max_chunk_bytes)
+        self.load_metrics = LoadMetrics()
+        self.planned_jobs: Dict[str, int] = dict.fromkeys(PLANNED_JOB_KINDS, 0)
+        self.last_load: Tuple[int, int, int] = (0, 0, 0)
+        self._latest_snapshot_created = False
+
+    def load_asset_valuations(self, asset_valuations: list[model.AssetValuation]):
+        """
+        Plans the jobs of a load of Asset Valuations, as run by
+        BiqQueryDestinationRepository.load_asset_valuations(), without running them.
+
+        Args:
+            asset_valuations (List[model.AssetValuation]):
+                List of AssetValuation instances that would be loaded into BigQuery.
+        """
+        rows, n_bytes, jobs = 0, 0, 0
+        for chunk_rows, chunk_bytes in self.chunker.fill_chunks(asset_valuations):
+            self.load_metrics.record(chunk_rows, chunk_bytes, 0.0)
+            rows, n_bytes, jobs = rows + chunk_rows, n_bytes + chunk_bytes, jobs + 1
+        self.last_load = (rows, n_bytes, jobs)
+        if not jobs:
+            return
+
+        if jobs > 1:
+            for kind in PLANNED_JOB_KINDS[:3]:
+                self.planned_jobs[kind] += 1
+        products = len(model.latest_asset_valuations(asset_valuations))
+        self._plan_latest_snapshot(-(-products // MAX_PRODUCTS_PER_MERGE))
+
+    def _plan_latest_snapshot(self, merges: int):
+        """
+        Plans the creation of the latest snapshot table, once per repository as it is
+        only checked for once, and MERGEs into it, if the snapshot is maintained.
+
+        Args:
+            merges (int): MERGEs into the snapshot.
+        """
+        if not self.maintain_latest_snapshot:
+            return
+        if not self._latest_snapshot_created:
+            self.planned_jobs["snapshot creations"] += 1
+            self._latest_snapshot_created = True
+        self.planned_jobs["snapshot merges"] += merges
+
+    def get_latest_asset_valuations(self) -> list[model.AssetValuation]:
+        """
+        Returns no Asset Valuation, as nothing is loaded.
+
+        Returns:
+            List[model.AssetValuation]: An empty list.
+        """
+        return []
+
+    def load_generic_csv_uris(
+        self, uris: List[str], header: validation.GenericHeader
+    ) -> int:
+        """
+        Plans the query jobs loading generic CSV files from GCS, without running them,
+        and a MERGE into the latest snapshot table after each, as if it inserted rows.
+        Rows are only read server side, so last_load holds jobs alone.
+
+        Args:
+            uris (List[str]): gs:// URIs of generic CSV files.
+            header (validation.GenericHeader): Column layout shared by all files.
+        Returns:
+            int: 0, as no row is inserted.
+        """
+        jobs = -(-len(uris) // MAX_URIS_PER_JOB)
+        self.last_load = (0, 0, jobs)
+        self._plan_latest_snapshot(jobs)
+
+        return 0
+
+    def plan_summary(self) -> str:
+        """
+        Describes the jobs planned so far.
+
+        Returns:
+            str: number of load jobs, rows and bytes planned, range of chunk sizes, and
+                 number of the other jobs planned by kind.
+        """
+        metrics = self.load_metrics
+        if not metrics.chunk_rows:
+            summary = f"0 load jobs projected into {self.asset_valuations_destination}"
+        else:
+            summary = (
+                f"{len(metrics.chunk_rows)} load jobs projected into "
+                f"{self.asset_valuations_destination}: {sum(metrics.chunk_rows)} rows, "
+                f"{sum(metrics.chunk_bytes)} bytes, "
+                f"rows per job [{min(metrics.chunk_rows)}, {max(metrics.chunk_rows)}], "
+                f"bytes per job [{min(metrics.chunk_bytes)}, {max(metrics.chunk_bytes)}]"
+            )
+        others = ", ".join(
+            f"{count} {kind}" for kind, count in self.planned_jobs.items() if count
         )
-        load_job.result()
+
+        return f"{summary}; also {others}" if others else summary
+
+
+class SqliteDestinationRepository(AbstractDestinationRepository):
+    """
+    Concrete implementation of the AbstractDestinationRepository for a local SQLite database.
+    It offers an offline destination, with the same columns as the BigQuery table, for local
+    runs, benchmarks and ad-hoc analysis. Asset valuations of a call are inserted in bulk
+    within a single transaction. The table is created if needed, indexed on
+    (date, product_name).
+    A latest snapshot table, keyed by product name, holds the latest Asset Valuation of
+    each product. It is upserted within the transaction of each load, for the products
+    loaded only, and built from the history when first created, so it is always
+    complete and get_latest_asset_valuations() reads it instead of the history.
+
+    Args:
+        database_path (str): Path of the SQLite database file. ':memory:' for an in-memory one.
+    Attributes:
+        database_path (str): Path of the SQLite database file.
+        asset_valuations_destination (str): The destination table for asset valuations.
+        latest_snapshot_destination (str): The table of the latest Asset Valuation of each
+                                           product.
+        connection (sqlite3.Connection): Connection to the database.
+    Methods:
+        load_asset_valuations(asset_valuations: list[model.AssetValuation]):
+            Load asset valuations into table indicated by attribute asset_valuations_destination.
+        get_latest_asset_valuations() -> List[model.AssetValuation]:
+            Retrieves the latest Asset Valuation of each product in the database.
+        rebuild_latest_snapshot():
+            Rebuilds the latest snapshot table from the whole history.
+        close():
+            Closes the connection to the database.
+    """
+
+    def __init__(self, database_path: str):
+        self.database_path = database_path
+        self.asset_valuations_destination = "asset_valuations"
+        self.latest_snapshot_destination = "asset_valuations_latest"
+        self.connection = sqlite3.connect(database_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._create_table()
+
+    def _create_table(self):
+        """
+        Creates the destination table and its (date, product_name) index, and the latest
+        snapshot table, if needed. A new snapshot table is built from the history.
+        """
+        table = self.asset_valuations_destination
+        with self.connection:
+            self.connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "date TEXT NOT NULL, value REAL NOT NULL, product_name TEXT NOT NULL, "
+                "__source_file__ TEXT, __creation_date__ TEXT)"
+            )
+            self.connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_date_product_name "
+                f"ON {table} (date, product_name)"
+            )
+            created = self.connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (self.latest_snapshot_destination,),
+            ).fetchone()
+            self.connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.latest_snapshot_destination} ("
+                "product_name TEXT PRIMARY KEY, date TEXT NOT NULL, "
+                "value REAL NOT NULL, __source_file__ TEXT, __creation_date__ TEXT)"
+            )
+        if not created:
+            self.rebuild_latest_snapshot()
+
+    def load_asset_valuations(self, asset_valuations: list[model.AssetValuation]):
+        """
+        Load Asset Valuations into table indicated by attribute asset_valuations_destination,
+        as one bulk insert within a single transaction.
+
+        Args:
+            asset_valuations (List[model.AssetValuation]):
+                List of AssetValuation instances to be loaded into the database.
+        """
+        dates: Dict[Any, str] = {}
+        creation_dates: Dict[Any, str] = {}
+        for asset_valuation in asset_valuations:
+            if asset_valuation.date not in dates:
+                dates[asset_valuation.date] = asset_valuation.date.strftime("%Y-%m-%d")
+            if asset_valuation.creation_date not in creation_dates:
+                creation_dates[asset_valuation.creation_date] = (
+                    asset_valuation.creation_date.strftime("%Y-%m-%d %H:%M:%S")
+                )
+
+        latest = model.latest_asset_valuations(asset_valuations)
+        with self._lock, self.connection:
+            self.connection.executemany(
+                f"INSERT INTO {self.asset_valuations_destination} "
+                "(date, value, product_name, __source_file__, __creation_date__) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    (
+                        dates[asset_valuation.date],
+                        asset_valuation.value,
+                        asset_valuation.product_name,
+                        asset_valuation.source_file,
+                        creation_dates[asset_valuation.creation_date],
+                    )
+                    for asset_valuation in asset_valuations
+                ),
+            )
+            snapshot = self.latest_snapshot_destination
+            self.connection.executemany(
+                f"INSERT INTO {snapshot} "
+                "(date, value, product_name, __source_file__, __creation_date__) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (product_name) DO UPDATE SET date = excluded.date, "
+                "value = excluded.value, __source_file__ = excluded.__source_file__, "
+                "__creation_date__ = excluded.__creation_date__ "
+                f"WHERE excluded.date > {snapshot}.date OR ("
+                f"excluded.date = {snapshot}.date "
+                f"AND excluded.__creation_date__ >= {snapshot}.__creation_date__)",
+                (
+                    (
+                        dates[asset_valuation.date],
+                        asset_valuation.value,
+                        asset_valuation.product_name,
+                        asset_valuation.source_file,
+                        creation_dates[asset_valuation.creation_date],
+                    )
+                    for asset_valuation in latest
+                ),
+            )
+
+    def get_latest_asset_valuations(self) -> list[model.AssetValuation]:
+        """
+        Retrieves the latest Asset Valuation of each product in the table indicated by
+        attribute asset_valuations_destination, by date and then by creation date, from
+        the latest snapshot table.
+
+        Returns:
+            List[model.AssetValuation]: A list of AssetValuation instances, one per product.
+        """
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT date, value, product_name, __source_file__, __creation_date__ "
+                f"FROM {self.latest_snapshot_destination}"
+            ).fetchall()
+
+        return [
+            model.AssetValuation(
+                date=dt.date.fromisoformat(row[0]),
+                value=row[1],
+                product_name=row[2],
+                source_file=row[3],
+                creation_date=dt.datetime.fromisoformat(row[4]),
+            )
+            for row in rows
+        ]
+
+    def rebuild_latest_snapshot(self):
+        """
+        Rebuilds the latest snapshot table from the whole history of the table indicated
+        by attribute asset_valuations_destination.
+        """
+        with self._lock, self.connection:
+            self.connection.execute(f"DELETE FROM {self.latest_snapshot_destination}")
+            self.connection.execute(
+                f"INSERT INTO {self.latest_snapshot_destination} "
+                "(date, value, product_name, __source_file__, __creation_date__) "
+                "SELECT date, value, product_name, __source_file__, __creation_date__ "
+                "FROM (SELECT *, ROW_NUMBER() OVER ("
+                "PARTITION BY product_name "
+                "ORDER BY date DESC, __creation_date__ DESC, rowid DESC"
+                f") AS position FROM {self.asset_valuations_destination}) "
+                "WHERE position = 1"
+            )
+
+    def close(self):
+        """
+        Closes the connection to the database.
+        """
+        self.connection.close()
+
+
+class SpoolDestinationRepository(AbstractDestinationRepository):
+    """
+    Concrete implementation of the AbstractDestinationRepository writing into a durable
+    local spool.Spool instead of the final destination, so that parsing neither waits on
+    a slow or unavailable destination nor loses parsed work on a crash. Each call
+    appends its Asset Valuations as one NDJSON batch, on disk once the call returns.
+    Batches are then loaded into the final destination by services.flush_spool(),
+    possibly from another process. The repository is the single writer of its spool from
+    its first load until closed, see spool.Spool: segments left open by a crash are
+    recovered then, and a second repository writing into the same spool fails.
+
+    Args:
+        spool_dir (str): Directory of the spool segment files.
+        segment_max_bytes (int, optional): Size at which a segment is sealed for
+                                           flushing. Defaults to 64 MiB.
+        segment_max_seconds (float, optional): Age at which a segment is sealed for
+                                               flushing. Defaults to 60.
+    Attributes:
+        spool (spool.Spool): The spool written into.
+        serialiser (serialisation.NdjsonSerialiser): Serialiser of the batches.
+    Methods:
+        load_asset_valuations(asset_valuations: list[model.AssetValuation]):
+            Appends Asset Valuations to the spool as one batch.
+        get_latest_asset_valuations() -> List[model.AssetValuation]:
+            Retrieves the latest Asset Valuation of each product waiting in the spool.
+        close():
+            Seals the open segment, so that it can be flushed.
+    """
+
+    def __init__(
+        self,
+        spool_dir: str,
+        segment_max_bytes: int = 64 * 1024 * 1024,
+        segment_max_seconds: float = 60.0,
+    ):
+        self.spool = spool.Spool(spool_dir, segment_max_bytes, segment_max_seconds)
+        self.serialiser = serialisation.NdjsonSerialiser()
+        self._buffer = io.BytesIO()
+
+    def load_asset_valuations(self, asset_valuations: list[model.AssetValuation]):
+        """
+        Appends Asset Valuations to the spool as one batch.
+
+        Args:
+            asset_valuations (List[model.AssetValuation]):
+                List of AssetValuation instances to be loaded, once flushed.
+        Raises:
+            SpoolLockedError: Raised if another process writes into the spool.
+        """
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self.serialiser.write(asset_valuations, self._buffer)
+        self.spool.append_batch(self._buffer.getvalue(), len(asset_valuations))
+
+    def get_latest_asset_valuations(self) -> list[model.AssetValuation]:
+        """
+        Retrieves the latest Asset Valuation of each product waiting in the sealed
+        segments of the spool, by date and then by creation date. Asset Valuations
+        already flushed are not in the spool anymore.
+
+        Returns:
+            List[model.AssetValuation]: A list of AssetValuation instances, one per product.
+        """
+        deserialiser = serialisation.NdjsonDeserialiser()
+
+        return model.latest_asset_valuations(
+            asset_valuation
+            for segment_path in self.spool.sealed_segments()
+            for _, payload in self.spool.read_segment(segment_path)
+            for asset_valuation in deserialiser.deserialise(payload)
+        )
+
+    def close(self):
+        """
+        Seals the open segment, so that it can be flushed.
+        """
+        self.spool.close()
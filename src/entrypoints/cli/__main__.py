@@ -1,10 +1,20 @@
 import click
+from typing import Optional
 from src.entrypoints.cli.load_file import (
     load_gcp_file,
     load_local_file,
     load_all_files_from_bucket,
+    load_generic_uris,
+    flush_spool,
+    watch,
+    reprocess_table,
+    portfolio_report,
+    summarise_run_reports,
+    rebuild_delta_index,
+    rebuild_latest_snapshot,
 )
 from src.utils.env_var_loader import env_var_loader
+from src.utils.profiling import CommandProfiler
 import warnings
 
 
@@ -12,13 +22,43 @@ warnings.filterwarnings("ignore", category=UserWarning)
 
 
 @click.group()
-def cli():
-    pass
+@click.option(
+    "--profile",
+    "profile_path",
+    default=None,
+    help="Path where a cProfile file of the command is written, plus a '.txt' summary",
+)
+@click.option(
+    "--profile_top",
+    default=20,
+    show_default=True,
+    help="Number of hottest functions in the profile summary",
+)
+@click.option("--trace_memory", is_flag=True, help="Report peak memory of the command")
+@click.pass_context
+def cli(
+    ctx: click.Context,
+    profile_path: Optional[str],
+    profile_top: int,
+    trace_memory: bool,
+):
+    if profile_path or trace_memory:
+        profiler = CommandProfiler(profile_path, profile_top, trace_memory)
+        profiler.start()
+        ctx.call_on_close(lambda: click.echo(profiler.stop(), err=True))
 
 
 cli.add_command(load_local_file)
 cli.add_command(load_gcp_file)
 cli.add_command(load_all_files_from_bucket)
+cli.add_command(load_generic_uris)
+cli.add_command(flush_spool)
+cli.add_command(watch)
+cli.add_command(reprocess_table)
+cli.add_command(portfolio_report)
+cli.add_command(summarise_run_reports)
+cli.add_command(rebuild_delta_index)
+cli.add_command(rebuild_latest_snapshot)
 
 if __name__ == "__main__":
     env_var_loader(".env")
@@ -1,18 +1,297 @@
 import click
+import csv
+import datetime as dt
 import os
-from src import source_repository, destination_repository, services
-from src.utils.logs import default_module_logger
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from google.cloud import storage
+from src import source_repository, destination_repository, services, model
+from src.analytics import PERIODS, ValuationHistory, period_returns
+from src.generic_uri_load import plan_generic_uri_loads
+from src.spool import Spool
+from src.delta_index import AbstractDeltaIndex, create_delta_index
+from src.validation import GENERIC_COLUMNS
+from src.utils.logs import RATE_LIMITED, default_module_logger, log_stage
+from src.utils.run_report import RunReport, merge_run_reports
+from src.utils.sharding import in_shard
+from src.utils.bucket_listing import ParallelBucketLister
+from src.utils.scheduling import (
+    SCHEDULE_ORDERS,
+    ScheduledFile,
+    order_files,
+    pack_batches,
+)
+from src.utils.dir_watch import FileSettler, MicroBatcher, create_watcher
 from src.utils.gcp_clients import create_storage_client, create_bigquery_client
+from src.utils.memory_budget import get_memory_budget
+from src.utils.rate_limiting import rate_limiters_summary
 
 logger = default_module_logger(__file__)
 
+QUARANTINE_DIR_HELP = (
+    "Directory where invalid rows are written. If given, valid rows are loaded and "
+    "invalid ones quarantined, instead of failing the whole file"
+)
+HEADER_ALIAS_HELP = (
+    "Alias of a column of generic files, as alias=column, e.g. valuation=value. "
+    "Can be given several times"
+)
+# backoff of the files of a micro-batch whose load failed, e.g. on a transient error
+WATCH_RETRY_INITIAL_SECONDS = 5.0
+WATCH_RETRY_MAX_SECONDS = 300.0
+
+
+def destination_options(command: Callable) -> Callable:
+    """
+    Adds the options selecting the destination repository to a command.
+
+    Args:
+        command (Callable): The click command.
+    Returns:
+        Callable: The command with options --destination, --database_path, --spool_dir,
+                  --delta_index and --dry_run.
+    """
+    command = click.option(
+        "--dry_run",
+        is_flag=True,
+        help="List, download and parse files, and plan the BigQuery load jobs, but load "
+        "nothing and leave the delta index unchanged. Only with destination bigquery",
+    )(command)
+    command = click.option(
+        "--delta_index",
+        "-di",
+        default=None,
+        help="Local path or gs:// URI of the index of last known valuations. If given, "
+        "only valuations that changed since the last snapshot are loaded",
+    )(command)
+    command = click.option(
+        "--spool_dir",
+        "-sd",
+        default="spool",
+        show_default=True,
+        help="Directory of the spool, if destination is spool. Spooled valuations are "
+        "loaded by the flush-spool command",
+    )(command)
+    command = click.option(
+        "--database_path",
+        "-db",
+        default="asset_valuations.db",
+        show_default=True,
+        help="Path of the SQLite database, if destination is sqlite",
+    )(command)
+    command = click.option(
+        "--destination",
+        "-d",
+        type=click.Choice(["bigquery", "sqlite", "spool"]),
+        default="bigquery",
+        show_default=True,
+        help="Destination repository Asset Valuations are loaded into",
+    )(command)
+
+    return command
+
+
+def parse_header_aliases(
+    ctx: click.Context, param: click.Parameter, values: Tuple[str, ...]
+) -> Dict[str, str]:
+    """
+    Parses the --header_alias options into a column by alias dictionary.
+
+    Args:
+        ctx (click.Context): The click context.
+        param (click.Parameter): The --header_alias parameter.
+        values (Tuple[str, ...]): The options given, as alias=column.
+    Returns:
+        Dict[str, str]: Column of generic files by alias.
+    Raises:
+        click.BadParameter: Raised if an option is not alias=column or the column is
+                            not one of the generic columns.
+    """
+    header_aliases: Dict[str, str] = {}
+    for value in values:
+        alias, _, column = value.partition("=")
+        if not alias or column not in GENERIC_COLUMNS:
+            raise click.BadParameter(
+                f"'{value}' is not alias=column, with column one of {GENERIC_COLUMNS}",
+                ctx=ctx,
+                param=param,
+            )
+        header_aliases[alias] = column
+
+    return header_aliases
+
+
+def create_destination_repository(
+    destination: str,
+    database_path: str,
+    dry_run: bool = False,
+    spool_dir: Optional[str] = None,
+    destination_table: str = destination_repository.DEFAULT_BIGQUERY_DESTINATION,
+) -> destination_repository.AbstractDestinationRepository:
+    """
+    Creates the destination repository selected through the destination options.
+
+    Args:
+        destination (str): 'bigquery', 'sqlite' or 'spool'.
+        database_path (str): Path of the SQLite database, if destination is sqlite.
+        dry_run (bool, optional): If True, a repository planning BigQuery load jobs
+                                  without running them is returned instead. Only
+                                  supported if destination is bigquery.
+        spool_dir (str, optional): Directory of the spool, if destination is spool.
+        destination_table (str, optional): Table loaded into, if destination is bigquery.
+                                           Defaults to raw.asset_valuations_v2.
+    Returns:
+        destination_repository.AbstractDestinationRepository: The destination repository.
+    Raises:
+        click.BadParameter: Raised if dry_run is given with a destination other than
+                            bigquery, as only BigQuery load jobs are planned.
+    """
+    if dry_run and destination != "bigquery":
+        raise click.BadParameter(
+            f"plans BigQuery load jobs and cannot be used with destination "
+            f"'{destination}'",
+            param_hint="'--dry_run'",
+        )
+    if dry_run:
+        logger.info("Dry run: nothing will be loaded")
+        return destination_repository.DryRunDestinationRepository(
+            asset_valuations_destination=destination_table
+        )
+    if destination == "sqlite":
+        logger.info(f"Loading into SQLite database '{database_path}'")
+        return destination_repository.SqliteDestinationRepository(database_path)
+    if destination == "spool":
+        logger.info(f"Spooling into '{spool_dir}'")
+        return destination_repository.SpoolDestinationRepository(spool_dir or "spool")
+
+    return destination_repository.BiqQueryDestinationRepository(
+        bigquery_client=create_bigquery_client(os.environ.get("PROJECT")),
+        asset_valuations_destination=destination_table,
+    )
+
+
+def close_destination_repository(
+    destination_repo: destination_repository.AbstractDestinationRepository,
+):
+    """
+    Closes the destination repository once a command is done with it, sealing the open
+    segment of a spool so that it can be flushed. Does nothing for other repositories.
+
+    Args:
+        destination_repo (destination_repository.AbstractDestinationRepository):
+            The destination repository of the command.
+    """
+    if isinstance(destination_repo, destination_repository.SpoolDestinationRepository):
+        destination_repo.close()
+        logger.info(f"Spool: {destination_repo.spool.metrics().summary()}")
+
+
+def load_delta_index(
+    delta_index_path: Optional[str],
+    storage_client: Optional[storage.Client] = None,
+) -> Optional[AbstractDeltaIndex]:
+    """
+    Loads the delta index selected through the destination options, if any.
+
+    Args:
+        delta_index_path (str, optional): Local path or gs:// URI of the delta index.
+        storage_client (storage.Client, optional): A client for interacting with Google
+                                                   Cloud Storage. Created if needed.
+    Returns:
+        AbstractDeltaIndex, optional: The loaded delta index.
+    """
+    if delta_index_path is None:
+        return None
+
+    if delta_index_path.startswith("gs://") and storage_client is None:
+        storage_client = create_storage_client(os.environ.get("PROJECT"))
+    delta_idx = create_delta_index(delta_index_path, storage_client)
+    logger.info(
+        f"Loading only changed valuations, {len(delta_idx.entries)} products indexed"
+    )
+
+    return delta_idx
+
+
+def report_quarantined_rows(
+    file: source_repository.FileSourceAbstract, quarantine_dir: Optional[str]
+):
+    """
+    Logs the rows of a file that failed validation and writes them into the quarantine
+    directory, if any.
+
+    Args:
+        file (source_repository.FileSourceAbstract): The file already run through the pipeline.
+        quarantine_dir (str, optional): Directory where invalid rows are written.
+    """
+    report = file.validation_report
+    if report is None or report.is_valid():
+        return
+
+    logger.warning(f"Quarantined {report.summary()}")
+    if quarantine_dir:
+        os.makedirs(quarantine_dir, exist_ok=True)
+        quarantine_path = os.path.join(
+            quarantine_dir, os.path.basename(file.file_path) + ".rejected.csv"
+        )
+        report.write_quarantine_csv(quarantine_path)
+        logger.warning(f"Invalid rows written to '{quarantine_path}'")
+
+
+def report_dry_run(
+    file: source_repository.FileSourceAbstract,
+    destination_repo: destination_repository.AbstractDestinationRepository,
+):
+    """
+    Logs the rows, serialised bytes, load jobs and parse throughput of a file run through
+    the pipeline into a dry run repository. Does nothing for other repositories.
+
+    Args:
+        file (source_repository.FileSourceAbstract): The file already run through the pipeline.
+        destination_repo (destination_repository.AbstractDestinationRepository):
+            The destination repository of the run.
+    """
+    if not isinstance(
+        destination_repo, destination_repository.DryRunDestinationRepository
+    ):
+        return
+
+    rows, n_bytes, jobs = destination_repo.last_load
+    parse_seconds = file.parse_seconds or 0.0
+    throughput = f"{rows / parse_seconds:.0f} rows/s" if parse_seconds else "n/a"
+    logger.info(
+        f"Dry run of file '{file.file_path}': {rows} rows, {n_bytes} bytes serialised, "
+        f"{jobs} load jobs, parsed in {parse_seconds:.3f}s ({throughput})",
+        extra={"file_name": file.file_path, "stage": "dry_run"},
+    )
+
 
 @click.command()
 @click.option("--bucket_name", "-bn", required=True, help="Name of the GCP bucket")
 @click.option(
     "--file_path", "-fp", required=True, help="Path of the file in the bucket"
 )
-def load_gcp_file(bucket_name: str, file_path: str):
+@click.option("--quarantine_dir", "-qd", default=None, help=QUARANTINE_DIR_HELP)
+@click.option(
+    "--header_alias",
+    "-ha",
+    "header_aliases",
+    multiple=True,
+    callback=parse_header_aliases,
+    help=HEADER_ALIAS_HELP,
+)
+@destination_options
+def load_gcp_file(
+    bucket_name: str,
+    file_path: str,
+    quarantine_dir: Optional[str],
+    header_aliases: Dict[str, str],
+    destination: str,
+    database_path: str,
+    spool_dir: str,
+    delta_index: Optional[str],
+    dry_run: bool,
+):
     """
     Loads a file from a specified Google Cloud Storage bucket and processes it
     through the asset valuation pipeline.
@@ -20,78 +299,1187 @@ def load_gcp_file(bucket_name: str, file_path: str):
     Args:
         bucket_name (str): The name of the Google Cloud Storage bucket.
         file_path (str): The path to the file within the bucket.
+        quarantine_dir (str, optional): Directory where invalid rows are written.
+        header_aliases (Dict[str, str]): Column of generic files by alias.
+        destination (str): Destination repository, 'bigquery', 'sqlite' or 'spool'.
+        database_path (str): Path of the SQLite database, if destination is sqlite.
+        spool_dir (str): Directory of the spool, if destination is spool.
+        delta_index (str, optional): Local path or gs:// URI of the delta index.
+        dry_run (bool): If True, files are parsed and load jobs planned, not run.
     """
     logger.info(f"Loading file '{file_path}' from bucket '{bucket_name}'")
+    storage_client = create_storage_client(os.environ.get("PROJECT"))
     file = source_repository.GcpBucketFileSource(
         file_path,
         bucket_name,
-        storage_client=create_storage_client(os.environ.get("PROJECT")),
+        storage_client=storage_client,
+        quarantine_invalid_rows=quarantine_dir is not None,
+        header_aliases=header_aliases,
     )
-    bigquery = destination_repository.BiqQueryDestinationRepository(
-        bigquery_client=create_bigquery_client(os.environ.get("PROJECT"))
+    destination_repo = create_destination_repository(
+        destination, database_path, dry_run, spool_dir
     )
+    delta_idx = load_delta_index(delta_index, storage_client)
 
-    services.asset_valuation_pipeline(file, bigquery)
+    with log_stage(logger, "pipeline", file_path):
+        services.asset_valuation_pipeline(
+            file, destination_repo, delta_idx, dry_run=dry_run
+        )
+    report_quarantined_rows(file, quarantine_dir)
+    report_dry_run(file, destination_repo)
+    close_destination_repository(destination_repo)
 
 
 @click.command()
 @click.option(
     "--file_path", "-fp", required=True, help="Path of the file in the local machine"
 )
-def load_local_file(file_path: str):
+@click.option("--quarantine_dir", "-qd", default=None, help=QUARANTINE_DIR_HELP)
+@click.option(
+    "--header_alias",
+    "-ha",
+    "header_aliases",
+    multiple=True,
+    callback=parse_header_aliases,
+    help=HEADER_ALIAS_HELP,
+)
+@destination_options
+def load_local_file(
+    file_path: str,
+    quarantine_dir: Optional[str],
+    header_aliases: Dict[str, str],
+    destination: str,
+    database_path: str,
+    spool_dir: str,
+    delta_index: Optional[str],
+    dry_run: bool,
+):
     """
     Loads a local file and processes it through the asset valuation pipeline.
-    This function initializes a local file source and a BigQuery destination
-    repository, then processes the file using the asset valuation pipeline.
+    This function initializes a local file source and a destination repository,
+    BigQuery by default, then processes the file using the asset valuation pipeline.
 
     Args:
         file_path (str): The path to the local file to be loaded.
+        quarantine_dir (str, optional): Directory where invalid rows are written.
+        header_aliases (Dict[str, str]): Column of generic files by alias.
+        destination (str): Destination repository, 'bigquery', 'sqlite' or 'spool'.
+        database_path (str): Path of the SQLite database, if destination is sqlite.
+        spool_dir (str): Directory of the spool, if destination is spool.
+        delta_index (str, optional): Local path or gs:// URI of the delta index.
+        dry_run (bool): If True, files are parsed and load jobs planned, not run.
     """
     logger.info(f"Loading file '{file_path}' from local machine")
-    file = source_repository.LocalFileSource(file_path)
-    bigquery = destination_repository.BiqQueryDestinationRepository(
-        bigquery_client=create_bigquery_client(os.environ.get("PROJECT"))
+    file = source_repository.LocalFileSource(
+        file_path,
+        quarantine_invalid_rows=quarantine_dir is not None,
+        header_aliases=header_aliases,
     )
+    destination_repo = create_destination_repository(
+        destination, database_path, dry_run, spool_dir
+    )
+    delta_idx = load_delta_index(delta_index)
 
-    services.asset_valuation_pipeline(file, bigquery)
+    with log_stage(logger, "pipeline", file_path):
+        services.asset_valuation_pipeline(
+            file, destination_repo, delta_idx, dry_run=dry_run
+        )
+    report_quarantined_rows(file, quarantine_dir)
+    report_dry_run(file, destination_repo)
+    close_destination_repository(destination_repo)
 
 
 @click.command()
 @click.option("--bucket_name", "-bn", required=True, help="Name of the GCP bucket")
-def load_all_files_from_bucket(bucket_name: str):
+@click.option("--quarantine_dir", "-qd", default=None, help=QUARANTINE_DIR_HELP)
+@click.option(
+    "--header_alias",
+    "-ha",
+    "header_aliases",
+    multiple=True,
+    callback=parse_header_aliases,
+    help=HEADER_ALIAS_HELP,
+)
+@click.option(
+    "--prefix", "-p", default=None, help="Only load blobs whose name starts with prefix"
+)
+@click.option(
+    "--shard_index",
+    "-si",
+    default=0,
+    show_default=True,
+    type=click.IntRange(min=0),
+    help="Shard of the bucket loaded by this worker",
+)
+@click.option(
+    "--shard_count",
+    "-sc",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of workers the bucket is split across, by a stable hash of blob names",
+)
+@click.option(
+    "--report_path", "-rp", default=None, help="Path where the run report is written"
+)
+@click.option(
+    "--list_workers",
+    "-lw",
+    default=8,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of ranges of the bucket listed concurrently",
+)
+@click.option(
+    "--order",
+    "-o",
+    type=click.Choice(list(SCHEDULE_ORDERS)),
+    default="listing",
+    show_default=True,
+    help="Order files are loaded in: as listed, largest first to shorten the run, or "
+    "newest first to load the latest statements first. Orders other than listing wait "
+    "for the whole listing",
+)
+@click.option(
+    "--batch_max_files",
+    "-bf",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Files loaded together, in a single load",
+)
+@click.option(
+    "--batch_max_bytes",
+    "-bb",
+    default=None,
+    type=click.IntRange(min=1),
+    help="Bytes of files loaded together at most, so loads are of even size",
+)
+@click.option(
+    "--parse_workers",
+    "-pw",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Files of a batch downloaded and parsed concurrently. Batches are loaded one "
+    "after another, so it needs --batch_max_files above 1",
+)
+@destination_options
+def load_all_files_from_bucket(
+    bucket_name: str,
+    quarantine_dir: Optional[str],
+    header_aliases: Dict[str, str],
+    prefix: Optional[str],
+    shard_index: int,
+    shard_count: int,
+    report_path: Optional[str],
+    list_workers: int,
+    order: str,
+    batch_max_files: int,
+    batch_max_bytes: Optional[int],
+    parse_workers: int,
+    destination: str,
+    database_path: str,
+    spool_dir: str,
+    delta_index: Optional[str],
+    dry_run: bool,
+):
     """
     Loads all files from a specified Google Cloud Storage bucket and processes them
     using the asset valuation pipeline.
-    This function retrieves all blob names from the specified bucket, iterates through
-    each file, and processes it using the asset valuation pipeline. If an error occurs
+    This function lists the blobs of the specified bucket, several ranges of the bucket
+    at once, and processes each hl and generic file using the asset valuation pipeline as
+    soon as its name is listed, in any folder. Other blobs are skipped, and counted in the
+    logs. If an error occurs
     while processing a file, it logs the error and continues with the next file.
+    Valuations already loaded from an earlier file of the run are not loaded again.
+    The bucket can be split across several independent workers: each worker is given
+    the same shard_count and its own shard_index, and only loads the blobs whose name
+    hashes into its shard. Blobs can also be partitioned by prefix.
+    Files can be scheduled by their size and update time, see scheduling.order_files():
+    largest first, so the parse workers of a batch are not held up by a large file
+    parsed last, or newest first, so the latest statements do not wait behind years of
+    history. They can also be loaded in batches, whose files are downloaded and parsed
+    by a pool of threads, see services.asset_valuation_batch_pipeline(). Batches are
+    loaded one after another, so parse_workers only applies within a batch.
 
     Args:
         bucket_name (str): The name of the Google Cloud Storage bucket to load files from.
+        quarantine_dir (str, optional): Directory where invalid rows are written.
+        header_aliases (Dict[str, str]): Column of generic files by alias.
+        prefix (str, optional): Only blobs whose name starts with prefix are loaded.
+        shard_index (int): Shard of the bucket loaded by this worker.
+        shard_count (int): Number of shards the bucket is split into.
+        report_path (str, optional): Path where the run report is written as JSON.
+        list_workers (int): Number of ranges of the bucket listed concurrently.
+        order (str): Order files are loaded in, 'listing', 'largest' or 'newest'.
+        batch_max_files (int): Files loaded together at most.
+        batch_max_bytes (int, optional): Bytes of files loaded together at most.
+        parse_workers (int): Files of a batch downloaded and parsed concurrently.
+        destination (str): Destination repository, 'bigquery', 'sqlite' or 'spool'.
+        database_path (str): Path of the SQLite database, if destination is sqlite.
+        spool_dir (str): Directory of the spool, if destination is spool.
+        delta_index (str, optional): Local path or gs:// URI of the delta index. Workers
+                                     of different shards must use different indexes.
+        dry_run (bool): If True, files are parsed and load jobs planned, not run.
     Raises:
+        click.BadParameter: Raised if shard_index is not lower than shard_count, or if
+                            parse_workers is above 1 while batch_max_files is 1.
         Exception: Logs any exceptions that occur during file processing.
     """
+    if shard_index >= shard_count:
+        raise click.BadParameter(
+            f"must be lower than shard_count ({shard_count})",
+            param_hint="'--shard_index'",
+        )
+    if parse_workers > 1 and batch_max_files == 1:
+        raise click.BadParameter(
+            "has no effect when files are loaded one at a time, set --batch_max_files "
+            "above 1",
+            param_hint="'--parse_workers'",
+        )
 
-    logger.info(f"Listing all files from bucket '{bucket_name}'")
-    bigquery_client = create_bigquery_client(os.environ.get("PROJECT"))
+    logger.info(
+        f"Listing files from bucket '{bucket_name}' for shard {shard_index} of {shard_count}"
+    )
     storage_client = create_storage_client(os.environ.get("PROJECT"))
-    bucket = storage_client.bucket(bucket_name)
-    blobs = bucket.list_blobs()
-    blob_names = [blob.name for blob in blobs]
+    lister = ParallelBucketLister(
+        storage_client.bucket(bucket_name), prefix or "", workers=list_workers
+    )
+    destination_repo = create_destination_repository(
+        destination, database_path, dry_run, spool_dir
+    )
+    delta_idx = load_delta_index(delta_index, storage_client)
+    run_report = RunReport(bucket_name, prefix, [shard_index], shard_count)
+    seen_keys = model.SeenKeys()
 
-    logger.info(f"Loading all files from bucket '{bucket_name}'")
-    for blob_name in blob_names:
+    def open_file(scheduled: ScheduledFile) -> source_repository.GcpBucketFileSource:
+        return source_repository.GcpBucketFileSource(
+            scheduled.name,
+            bucket_name,
+            storage_client=storage_client,
+            quarantine_invalid_rows=quarantine_dir is not None,
+            header_aliases=header_aliases,
+            size_bytes=scheduled.size or None,
+        )
+
+    def load_file(scheduled: ScheduledFile):
+        blob_name = scheduled.name
         try:
             logger.info(f"Loading file '{blob_name}' from bucket '{bucket_name}'")
-            file = source_repository.GcpBucketFileSource(
-                blob_name,
-                bucket_name,
-                storage_client=storage_client,
+            file = open_file(scheduled)
+
+            with log_stage(logger, "pipeline", blob_name):
+                rows = services.asset_valuation_pipeline(
+                    file, destination_repo, delta_idx, seen_keys, dry_run
+                )
+            run_report.record_loaded(blob_name, rows)
+            report_quarantined_rows(file, quarantine_dir)
+            report_dry_run(file, destination_repo)
+        except Exception as e:
+            logger.error(f"Failed to load file '{blob_name}': {e}")
+            run_report.record_failed(blob_name, str(e))
+
+    def load_batch(batch: List[ScheduledFile]):
+        logger.info(f"Loading {len(batch)} files from bucket '{bucket_name}'")
+        files = [open_file(scheduled) for scheduled in batch]
+        try:
+            with log_stage(logger, "pipeline", f"{len(files)} files"):
+                loaded, failed = services.asset_valuation_batch_pipeline(
+                    files,
+                    destination_repo,
+                    delta_idx,
+                    seen_keys,
+                    dry_run,
+                    parse_workers,
+                )
+        except Exception as e:
+            logger.error(f"Failed to load {len(files)} files: {e}")
+            for file in files:
+                run_report.record_failed(file.file_path, str(e))
+            return
+        for file_path, error in failed.items():
+            logger.error(f"Failed to load file '{file_path}': {error}")
+            run_report.record_failed(file_path, str(error))
+        for file in files:
+            if file.file_path in loaded:
+                run_report.record_loaded(file.file_path, loaded[file.file_path])
+                report_quarantined_rows(file, quarantine_dir)
+
+    # size and update time are only listed if the files are scheduled by them
+    if order == "listing" and batch_max_bytes is None:
+        listed: Iterable[ScheduledFile] = map(ScheduledFile, lister.iter_blob_names())
+    else:
+        listed = lister.iter_files()
+    files: Iterable[ScheduledFile] = (
+        file for file in listed if in_shard(file.name, shard_index, shard_count)
+    )
+    if order != "listing":
+        with log_stage(logger, "list_files", bucket_name):
+            files = order_files(files, order)
+        logger.info(
+            f"{len(files)} files to load, {sum(file.size for file in files)} bytes, "
+            f"{order} first"
+        )
+
+    for batch in pack_batches(files, batch_max_files, batch_max_bytes):
+        if len(batch) == 1:
+            load_file(batch[0])
+        else:
+            load_batch(batch)
+    if lister.skipped_blobs:
+        logger.warning(
+            f"{lister.skipped_blobs} blobs of bucket '{bucket_name}' skipped, not being "
+            f"hl or generic files"
+        )
+
+    if isinstance(destination_repo, destination_repository.DryRunDestinationRepository):
+        logger.info(f"Dry run: {destination_repo.plan_summary()}")
+    elif isinstance(
+        destination_repo, destination_repository.BiqQueryDestinationRepository
+    ):
+        logger.info(f"Load metrics: {destination_repo.load_metrics.summary()}")
+    close_destination_repository(destination_repo)
+    logger.info(run_report.summary())
+    logger.info(f"API calls: {rate_limiters_summary()}")
+    logger.info(f"Memory: {get_memory_budget().summary()}")
+    if report_path:
+        run_report.save(report_path)
+
+
+@click.command()
+@click.option(
+    "--uri",
+    "-u",
+    "uris",
+    multiple=True,
+    required=True,
+    help="gs:// URI of generic CSV files, wildcards allowed, e.g. "
+    "gs://{bucket}/generic_2018_*.csv. Can be given several times",
+)
+@click.option(
+    "--header_alias",
+    "-ha",
+    "header_aliases",
+    multiple=True,
+    callback=parse_header_aliases,
+    help=HEADER_ALIAS_HELP,
+)
+@click.option(
+    "--header_workers",
+    "-hw",
+    default=8,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Number of file headers checked concurrently",
+)
+@click.option(
+    "--dry_run",
+    is_flag=True,
+    help="Check the headers of the files and plan the BigQuery jobs, but load nothing",
+)
+def load_generic_uris(
+    uris: Tuple[str, ...],
+    header_aliases: Dict[str, str],
+    header_workers: int,
+    dry_run: bool,
+):
+    """
+    Loads generic CSV files straight from Google Cloud Storage into BigQuery, server side,
+    so that their rows never go through this process. The header of each file is checked
+    with a small ranged read, and files are then loaded by one BigQuery job per column
+    layout, see BiqQueryDestinationRepository.load_generic_csv_uris(). Rows are validated
+    by BigQuery, any invalid row failing the job. The delta index is not used.
+
+    Args:
+        uris (Tuple[str, ...]): gs:// URIs of the files, possibly holding wildcards.
+        header_aliases (Dict[str, str]): Column of generic files by alias.
+        header_workers (int): Number of file headers checked concurrently.
+        dry_run (bool): If True, headers are checked and jobs planned, not run.
+    """
+    storage_client = create_storage_client(os.environ.get("PROJECT"))
+    with log_stage(logger, "check_headers", ", ".join(uris)):
+        groups = plan_generic_uri_loads(
+            storage_client, uris, header_aliases, header_workers
+        )
+    logger.info(
+        f"{sum(len(group.uris) for group in groups)} generic files to load, "
+        f"in {len(groups)} column layouts"
+    )
+    destination_repo = (
+        destination_repository.DryRunDestinationRepository()
+        if dry_run
+        else destination_repository.BiqQueryDestinationRepository(
+            bigquery_client=create_bigquery_client(os.environ.get("PROJECT"))
+        )
+    )
+
+    rows, jobs = 0, 0
+    for group in groups:
+        with log_stage(logger, "load_uris", group.uris[0]):
+            rows += destination_repo.load_generic_csv_uris(group.uris, group.header)
+        if isinstance(
+            destination_repo, destination_repository.DryRunDestinationRepository
+        ):
+            jobs += destination_repo.last_load[2]
+
+    if dry_run:
+        logger.info(f"Dry run: {jobs} query jobs projected, nothing loaded")
+    else:
+        logger.info(
+            f"{rows} rows loaded. Load metrics: {destination_repo.load_metrics.summary()}"
+        )
+    logger.info(f"API calls: {rate_limiters_summary()}")
+
+
+@click.command()
+@click.argument("report_paths", nargs=-1, required=True)
+@click.option(
+    "--report_path", "-rp", default=None, help="Path where the merged report is written"
+)
+def summarise_run_reports(report_paths: Tuple[str, ...], report_path: Optional[str]):
+    """
+    Merges the run reports written by the shards of a load_all_files_from_bucket run
+    and logs the overall result, including shards with no report.
+
+    Args:
+        report_paths (Tuple[str, ...]): Paths of the run reports to merge.
+        report_path (str, optional): Path where the merged report is written as JSON.
+    """
+    merged = merge_run_reports([RunReport.load(path) for path in report_paths])
+
+    logger.info(merged.summary())
+    for file_name, error in sorted(merged.files_failed.items()):
+        logger.info(f"Failed file '{file_name}': {error}")
+    if report_path:
+        merged.save(report_path)
+
+
+@click.command()
+@click.option(
+    "--destination",
+    "-d",
+    type=click.Choice(["bigquery", "sqlite"]),
+    default="bigquery",
+    show_default=True,
+    help="Destination repository the delta index is rebuilt from. A spool is not one, "
+    "as it only holds the valuations not flushed yet",
+)
+@click.option(
+    "--database_path",
+    "-db",
+    default="asset_valuations.db",
+    show_default=True,
+    help="Path of the SQLite database, if destination is sqlite",
+)
+@click.option(
+    "--delta_index",
+    "-di",
+    required=True,
+    help="Local path or gs:// URI of the index of last known valuations",
+)
+@click.option("--dry_run", is_flag=True, help="Rebuild the index but do not save it")
+def rebuild_delta_index(
+    destination: str,
+    database_path: str,
+    delta_index: str,
+    dry_run: bool,
+):
+    """
+    Rebuilds the delta index from the latest valuation of each product found in the
+    destination repository, and saves it unless on a dry run.
+
+    Args:
+        destination (str): Destination repository, 'bigquery' or 'sqlite'.
+        database_path (str): Path of the SQLite database, if destination is sqlite.
+        delta_index (str): Local path or gs:// URI of the delta index.
+        dry_run (bool): If True, the index is rebuilt but not saved.
+    """
+    destination_repo = create_destination_repository(destination, database_path)
+    delta_idx = load_delta_index(delta_index)
+    assert delta_idx is not None
+    delta_idx.rebuild(destination_repo)
+    close_destination_repository(destination_repo)
+    if dry_run:
+        logger.info(
+            f"Dry run: delta index of {len(delta_idx.entries)} products not saved"
+        )
+        return
+    delta_idx.save()
+    logger.info(f"Delta index rebuilt with {len(delta_idx.entries)} products")
+
+
+@click.command()
+@click.option(
+    "--destination",
+    "-d",
+    type=click.Choice(["bigquery", "sqlite"]),
+    default="bigquery",
+    show_default=True,
+    help="Destination repository whose latest snapshot table is rebuilt",
+)
+@click.option(
+    "--database_path",
+    "-db",
+    default="asset_valuations.db",
+    show_default=True,
+    help="Path of the SQLite database, if destination is sqlite",
+)
+def rebuild_latest_snapshot(destination: str, database_path: str):
+    """
+    Rebuilds the table of the latest Asset Valuation of each product from the whole
+    history of the destination repository. Loads keep it up to date afterwards, so it is
+    only needed once for history loaded before the table was maintained, or after a
+    merge into the table failed, as logged by the load.
+
+    Args:
+        destination (str): Destination repository, 'bigquery' or 'sqlite'.
+        database_path (str): Path of the SQLite database, if destination is sqlite.
+    """
+    destination_repo = create_destination_repository(destination, database_path)
+    assert isinstance(
+        destination_repo,
+        (
+            destination_repository.BiqQueryDestinationRepository,
+            destination_repository.SqliteDestinationRepository,
+        ),
+    )
+    with log_stage(
+        logger, "rebuild_latest_snapshot", destination_repo.latest_snapshot_destination
+    ):
+        destination_repo.rebuild_latest_snapshot()
+    close_destination_repository(destination_repo)
+
+
+@click.command()
+@click.option(
+    "--spool_dir",
+    "-sd",
+    default="spool",
+    show_default=True,
+    help="Directory of the spool",
+)
+@click.option(
+    "--destination",
+    "-d",
+    type=click.Choice(["bigquery", "sqlite"]),
+    default="bigquery",
+    show_default=True,
+    help="Destination repository spooled Asset Valuations are loaded into",
+)
+@click.option(
+    "--database_path",
+    "-db",
+    default="asset_valuations.db",
+    show_default=True,
+    help="Path of the SQLite database, if destination is sqlite",
+)
+@click.option(
+    "--max_batch_mib",
+    "-mb",
+    default=256,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Upper bound in MiB of the spooled segments loaded at once",
+)
+@click.option(
+    "--follow",
+    "-f",
+    is_flag=True,
+    help="Keep flushing segments as they are sealed, until interrupted",
+)
+@click.option(
+    "--interval",
+    "-i",
+    default=10.0,
+    show_default=True,
+    type=click.FloatRange(min=0),
+    help="Seconds between flushes, if following the spool",
+)
+@click.option(
+    "--recover",
+    is_flag=True,
+    help="First seal the segments left open by a crashed writer. Fails while a process "
+    "writes into the spool",
+)
+def flush_spool(
+    spool_dir: str,
+    destination: str,
+    database_path: str,
+    max_batch_mib: int,
+    follow: bool,
+    interval: float,
+    recover: bool,
+):
+    """
+    Loads the Asset Valuations spooled by load commands run with destination spool into
+    the destination repository, with large batched loads, see services.flush_spool().
+    Segments are removed once loaded, so an interrupted flush resumes where it stopped.
+    Depth and age of the spool are logged before each flush.
+
+    Args:
+        spool_dir (str): Directory of the spool.
+        destination (str): Destination repository, 'bigquery' or 'sqlite'.
+        database_path (str): Path of the SQLite database, if destination is sqlite.
+        max_batch_mib (int): Upper bound in MiB of the spooled segments loaded at once.
+        follow (bool): If True, keep flushing every interval seconds until interrupted.
+        interval (float): Seconds between flushes, if following the spool.
+        recover (bool): If True, first seal the segments left open by a crashed writer.
+    """
+    source_spool = Spool(spool_dir)
+    if recover:
+        logger.info(f"{source_spool.recover()} open segments recovered")
+    destination_repo = create_destination_repository(destination, database_path)
+
+    while True:
+        metrics = source_spool.metrics()
+        logger.info(
+            f"Spool: {metrics.summary()}",
+            extra={"stage": "flush_spool", "file_name": spool_dir},
+        )
+        if metrics.segments:
+            with log_stage(logger, "flush_spool", spool_dir):
+                rows = services.flush_spool(
+                    source_spool, destination_repo, max_batch_mib * 1024 * 1024
+                )
+            logger.info(f"{rows} spooled Asset Valuations loaded")
+        if not follow:
+            break
+        time.sleep(interval)
+
+
+@click.command()
+@click.option(
+    "--source",
+    "-s",
+    type=click.Choice(["bigquery", "sqlite"]),
+    default="bigquery",
+    show_default=True,
+    help="Repository of the table read back",
+)
+@click.option(
+    "--source_table",
+    "-st",
+    default=None,
+    help="Table read back. Defaults to the destination table of the source repository",
+)
+@click.option(
+    "--source_database_path",
+    "-sdb",
+    default="asset_valuations.db",
+    show_default=True,
+    help="Path of the SQLite database read back, if source is sqlite",
+)
+@click.option(
+    "--start_date",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    default=None,
+    help="First date read, inclusive",
+)
+@click.option(
+    "--end_date",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    default=None,
+    help="Last date read, inclusive",
+)
+@click.option(
+    "--product",
+    "-p",
+    "products",
+    multiple=True,
+    help="Product read. Can be given several times. All products if not given",
+)
+@click.option(
+    "--without_provenance",
+    is_flag=True,
+    help="Read only date, value and product name, not source file and creation date",
+)
+@click.option(
+    "--streams",
+    "-rs",
+    default=4,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Read streams run at once",
+)
+@click.option(
+    "--batch_rows",
+    "-br",
+    default=10000,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Rows of each batch read and loaded",
+)
+@click.option(
+    "--destination_table",
+    "-dt",
+    default=destination_repository.DEFAULT_BIGQUERY_DESTINATION,
+    show_default=True,
+    help="Table loaded into, if destination is bigquery, e.g. a new table to migrate "
+    "history into. Its latest snapshot is the table name suffixed '_latest'",
+)
+@destination_options
+def reprocess_table(
+    source: str,
+    source_table: Optional[str],
+    source_database_path: str,
+    start_date: Optional[dt.datetime],
+    end_date: Optional[dt.datetime],
+    products: Tuple[str, ...],
+    without_provenance: bool,
+    streams: int,
+    batch_rows: int,
+    destination_table: str,
+    destination: str,
+    database_path: str,
+    spool_dir: str,
+    delta_index: Optional[str],
+    dry_run: bool,
+):
+    """
+    Reads Asset Valuations back from a table, e.g. to migrate history into a new table
+    or database, and loads them into the destination repository one batch at a time,
+    see services.reprocess_table(). The table is read by parallel read streams, reading
+    only the rows between start_date and end_date of the products given.
+    Reading a table back into itself is refused. Valuations the destination table holds
+    already are not loaded again, looked up by natural key one batch at a time, so a
+    run interrupted or repeated does not duplicate them.
+
+    Args:
+        source (str): Repository of the table read back, 'bigquery' or 'sqlite'.
+        source_table (str, optional): Table read back.
+        source_database_path (str): Path of the SQLite database, if source is sqlite.
+        start_date (dt.datetime, optional): First date read, inclusive.
+        end_date (dt.datetime, optional): Last date read, inclusive.
+        products (Tuple[str, ...]): Products read, all if empty.
+        without_provenance (bool): If True, source file and creation date are not read.
+        streams (int): Read streams run at once.
+        batch_rows (int): Rows of each batch read and loaded.
+        destination_table (str): Table loaded into, if destination is bigquery.
+        destination (str): Destination repository, 'bigquery', 'sqlite' or 'spool'.
+        database_path (str): Path of the SQLite database, if destination is sqlite.
+        spool_dir (str): Directory of the spool, if destination is spool.
+        delta_index (str, optional): Local path or gs:// URI of the delta index.
+        dry_run (bool): If True, the table is read and load jobs planned, not run.
+    Raises:
+        click.BadParameter: Raised if the source table is the destination table, or if
+                            destination_table is given with another destination than
+                            bigquery.
+    """
+    if (
+        destination != "bigquery"
+        and destination_table != destination_repository.DEFAULT_BIGQUERY_DESTINATION
+    ):
+        raise click.BadParameter(
+            f"cannot be used with destination '{destination}'",
+            param_hint="'--destination_table'",
+        )
+    row_filter = source_repository.ValuationFilter(
+        start_date.date() if start_date else None,
+        end_date.date() if end_date else None,
+        products,
+    )
+    bigquery_clients: List[Any] = []
+
+    def table_source(
+        repository: str, path: str, table: Optional[str], with_provenance: bool
+    ) -> source_repository.TableSourceAbstract:
+        table_options: Dict[str, Any] = {"table": table} if table else {}
+        if repository == "sqlite":
+            return source_repository.SqliteTableSource(
+                path,
+                row_filter=row_filter,
+                with_provenance=with_provenance,
+                streams=streams,
+                batch_rows=batch_rows,
+                **table_options,
+            )
+        if not bigquery_clients:
+            bigquery_clients.append(create_bigquery_client(os.environ.get("PROJECT")))
+        return source_repository.BigQueryTableSource(
+            bigquery_clients[0],
+            row_filter=row_filter,
+            with_provenance=with_provenance,
+            streams=streams,
+            batch_rows=batch_rows,
+            **table_options,
+        )
+
+    source_repo = table_source(
+        source, source_database_path, source_table, not without_provenance
+    )
+    destination_repo = create_destination_repository(
+        destination, database_path, dry_run, spool_dir, destination_table
+    )
+    # the table the destination repository loads into, looked up for its natural keys
+    held_table: Optional[source_repository.TableSourceAbstract] = None
+    if destination in ("bigquery", "sqlite"):
+        held_table = table_source(
+            destination,
+            database_path,
+            destination_repo.asset_valuations_destination,  # type: ignore[attr-defined]
+            False,
+        )
+    if (
+        held_table is not None
+        and destination == source
+        and held_table.table == source_repo.table
+        and (
+            source == "bigquery"
+            or os.path.abspath(database_path) == os.path.abspath(source_database_path)
+        )
+    ):
+        raise click.BadParameter(
+            f"table '{source_repo.table}' is both read back and loaded into, which "
+            "would append a copy of it to itself. Choose another destination",
+            param_hint="'--destination' / '--destination_table'",
+        )
+    delta_idx = load_delta_index(delta_index)
+    # a dry run loads nothing, so the keys of earlier batches are only known in memory
+    seen_keys: Optional[Set[model.NaturalKey]] = model.SeenKeys() if dry_run else None
+
+    logger.info(f"Reading back table '{source_repo.table}' from {source}")
+    with log_stage(logger, "reprocess_table", source_repo.table):
+        rows = services.reprocess_table(
+            source_repo,
+            destination_repo,
+            delta_idx,
+            seen_keys,
+            dry_run,
+            held_table,
+        )
+    logger.info(f"{rows} Asset Valuations loaded from table '{source_repo.table}'")
+    if isinstance(destination_repo, destination_repository.DryRunDestinationRepository):
+        logger.info(f"Dry run: {destination_repo.plan_summary()}")
+    close_destination_repository(destination_repo)
+    logger.info(f"API calls: {rate_limiters_summary()}")
+    logger.info(f"Memory: {get_memory_budget().summary()}")
+
+
+@click.command()
+@click.option(
+    "--source",
+    "-s",
+    type=click.Choice(["bigquery", "sqlite"]),
+    default="bigquery",
+    show_default=True,
+    help="Repository of the valuations reported on",
+)
+@click.option(
+    "--source_database_path",
+    "-sdb",
+    default="asset_valuations.db",
+    show_default=True,
+    help="Path of the SQLite database, if source is sqlite",
+)
+@click.option(
+    "--period",
+    "-p",
+    type=click.Choice(list(PERIODS)),
+    default="month",
+    show_default=True,
+    help="Period of the returns reported",
+)
+@click.option(
+    "--start_date",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    default=None,
+    help="First day reported. Defaults to the first date valued",
+)
+@click.option(
+    "--end_date",
+    type=click.DateTime(formats=["%Y-%m-%d"]),
+    default=None,
+    help="Last day reported. Defaults to the last date valued",
+)
+@click.option(
+    "--max_staleness_days",
+    "-msd",
+    default=None,
+    type=click.IntRange(min=0),
+    help="Days a valuation is carried forward at most. Forever if not given",
+)
+@click.option(
+    "--report_path",
+    "-rp",
+    default=None,
+    help="Path of the CSV report. Written to standard output if not given",
+)
+def portfolio_report(
+    source: str,
+    source_database_path: str,
+    period: str,
+    start_date: Optional[dt.datetime],
+    end_date: Optional[dt.datetime],
+    max_staleness_days: Optional[int],
+    report_path: Optional[str],
+):
+    """
+    Reports the value of the portfolio at the end of each period and its return over
+    the period, as CSV. The history is read once from the source table, see
+    source_repository.TableSourceAbstract, and the daily series computed in memory,
+    see analytics.ValuationHistory.
+
+    Args:
+        source (str): Repository of the valuations, 'bigquery' or 'sqlite'.
+        source_database_path (str): Path of the SQLite database, if source is sqlite.
+        period (str): Period of the returns, 'month', 'quarter' or 'year'.
+        start_date (dt.datetime, optional): First day reported.
+        end_date (dt.datetime, optional): Last day reported.
+        max_staleness_days (int, optional): Days a valuation is carried forward at most.
+        report_path (str, optional): Path of the CSV report, standard output if not given.
+    """
+    # valuations before start_date are read too, as they carry into the first days, and
+    # creation dates, so the valuation created last wins when a date is valued twice
+    row_filter = source_repository.ValuationFilter(
+        end_date=end_date.date() if end_date else None
+    )
+    source_repo: source_repository.TableSourceAbstract
+    if source == "sqlite":
+        source_repo = source_repository.SqliteTableSource(
+            source_database_path, row_filter=row_filter
+        )
+    else:
+        source_repo = source_repository.BigQueryTableSource(
+            create_bigquery_client(os.environ.get("PROJECT")),
+            row_filter=row_filter,
+        )
+
+    history = ValuationHistory()
+    with log_stage(logger, "read_history", source_repo.table):
+        history.add_batches(source_repo.iter_asset_valuation_batches())
+    with log_stage(logger, "daily_series", source_repo.table):
+        try:
+            series = history.daily_series(
+                start_date.date() if start_date else None,
+                end_date.date() if end_date else None,
+                max_staleness_days,
             )
-            bigquery = destination_repository.BiqQueryDestinationRepository(
-                bigquery_client=bigquery_client
+        except ValueError as error:
+            raise click.ClickException(str(error))
+        returns = period_returns(series, series.totals(), period)
+    logger.info(
+        f"{history.rows} valuations of {len(series.products)} products over "
+        f"{len(series)} days"
+    )
+
+    with click.open_file(report_path or "-", "w") as report:
+        writer = csv.writer(report)
+        writer.writerow(["start", "end", "start_value", "end_value", "return"])
+        for period_return in returns:
+            writer.writerow(
+                [
+                    period_return.start.isoformat(),
+                    period_return.end.isoformat(),
+                    f"{period_return.start_value:.2f}",
+                    f"{period_return.end_value:.2f}",
+                    (
+                        ""
+                        if period_return.simple_return is None
+                        else f"{period_return.simple_return:.6f}"
+                    ),
+                ]
             )
 
-            services.asset_valuation_pipeline(file, bigquery)
+
+def is_supported_file(file_name: str) -> bool:
+    """
+    Whether a file name is that of a file type the asset valuation pipeline parses,
+    e.g. 'hl_2024_01_01.csv' or 'generic_2024_01_01.csv.gz'.
+
+    Args:
+        file_name (str): Name of the file, without folders.
+    Returns:
+        bool: True if the file type is 'hl' or 'generic'.
+    """
+    return file_name.split("_")[0].lower() in ("hl", "generic")
+
+
+@click.command()
+@click.option(
+    "--directory", "-dir", required=True, help="Directory watched for new files"
+)
+@click.option(
+    "--settle_seconds",
+    "-ss",
+    default=2.0,
+    show_default=True,
+    type=click.FloatRange(min=0),
+    help="Seconds a file must stay unchanged before it is taken as fully written",
+)
+@click.option(
+    "--batch_max_files",
+    "-bf",
+    default=50,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Files at which a micro-batch is loaded",
+)
+@click.option(
+    "--batch_max_seconds",
+    "-bs",
+    default=5.0,
+    show_default=True,
+    type=click.FloatRange(min=0),
+    help="Seconds the first file of a micro-batch waits at most before it is loaded",
+)
+@click.option(
+    "--poll_interval",
+    "-pi",
+    default=None,
+    type=click.FloatRange(min=0.01),
+    help="Poll the directory at this interval in seconds, instead of using file "
+    "notifications",
+)
+@click.option(
+    "--move_to",
+    "-mt",
+    default=None,
+    help="Directory where files are moved once loaded",
+)
+@click.option("--quarantine_dir", "-qd", default=None, help=QUARANTINE_DIR_HELP)
+@click.option(
+    "--header_alias",
+    "-ha",
+    "header_aliases",
+    multiple=True,
+    callback=parse_header_aliases,
+    help=HEADER_ALIAS_HELP,
+)
+@destination_options
+def watch(
+    directory: str,
+    settle_seconds: float,
+    batch_max_files: int,
+    batch_max_seconds: float,
+    poll_interval: Optional[float],
+    move_to: Optional[str],
+    quarantine_dir: Optional[str],
+    header_aliases: Dict[str, str],
+    destination: str,
+    database_path: str,
+    spool_dir: str,
+    delta_index: Optional[str],
+    dry_run: bool,
+):
+    """
+    Watches a local directory and loads its files as they arrive, until interrupted.
+    Files are known from file notifications (inotify), or by polling the directory
+    where notifications are not available or poll_interval is given, so the directory
+    is not listed again and again. Files present at start are loaded too. A file is
+    parsed once it settled, i.e. stayed unchanged for settle_seconds, and hidden or
+    partial files, e.g. '*.part', are ignored until renamed. Settled files are loaded
+    in micro-batches of up to batch_max_files files, waiting at most batch_max_seconds,
+    see services.asset_valuation_batch_pipeline(). A file failing to parse is logged and
+    skipped; it is tried again if it changes. If the load of a whole micro-batch fails,
+    e.g. on a transient destination error, its files settle again after an exponential
+    backoff, from WATCH_RETRY_INITIAL_SECONDS up to WATCH_RETRY_MAX_SECONDS.
+
+    Args:
+        directory (str): Directory watched for new files.
+        settle_seconds (float): Seconds a file must stay unchanged before it is parsed.
+        batch_max_files (int): Files at which a micro-batch is loaded.
+        batch_max_seconds (float): Seconds the first file of a micro-batch waits at most.
+        poll_interval (float, optional): If given, the directory is polled at this interval.
+        move_to (str, optional): Directory where files are moved once loaded.
+        quarantine_dir (str, optional): Directory where invalid rows are written.
+        header_aliases (Dict[str, str]): Column of generic files by alias.
+        destination (str): Destination repository, 'bigquery', 'sqlite' or 'spool'.
+        database_path (str): Path of the SQLite database, if destination is sqlite.
+        spool_dir (str): Directory of the spool, if destination is spool.
+        delta_index (str, optional): Local path or gs:// URI of the delta index.
+        dry_run (bool): If True, files are parsed and load jobs planned, not run.
+    """
+    destination_repo = create_destination_repository(
+        destination, database_path, dry_run, spool_dir
+    )
+    delta_idx = load_delta_index(delta_index)
+    seen_keys = model.SeenKeys()
+    watcher = create_watcher(directory, poll_interval)
+    settler = FileSettler(directory, settle_seconds)
+    batcher = MicroBatcher(batch_max_files, batch_max_seconds)
+    # failed loads in a row of each file, to back off their retries
+    failed_loads: Dict[str, int] = {}
+    if move_to:
+        os.makedirs(move_to, exist_ok=True)
+    logger.info(f"Watching directory '{directory}' with {type(watcher).__name__}")
+
+    def load_batch(paths: List[str]):
+        files = [
+            source_repository.LocalFileSource(
+                path,
+                quarantine_invalid_rows=quarantine_dir is not None,
+                header_aliases=header_aliases,
+            )
+            for path in paths
+        ]
+        try:
+            with log_stage(logger, "pipeline", f"{len(files)} files"):
+                loaded, failed = services.asset_valuation_batch_pipeline(
+                    files, destination_repo, delta_idx, seen_keys, dry_run
+                )
         except Exception as e:
-            logger.error(f"Failed to load file '{blob_name}': {e}")
+            attempts = max(failed_loads.get(path, 0) for path in paths)
+            retry_seconds = min(
+                WATCH_RETRY_MAX_SECONDS, WATCH_RETRY_INITIAL_SECONDS * 2**attempts
+            )
+            logger.error(
+                f"Failed to load {len(files)} files, retrying in {retry_seconds:.0f}s: {e}"
+            )
+            for path in paths:
+                failed_loads[path] = attempts + 1
+            settler.retry({os.path.basename(path) for path in paths}, retry_seconds)
+            return
+        for path in paths:
+            failed_loads.pop(path, None)
+        for file_path, error in failed.items():
+            logger.error(f"Failed to load file '{file_path}': {error}")
+        for file in files:
+            if file.file_path not in loaded:
+                continue
+            report_quarantined_rows(file, quarantine_dir)
+            if move_to and not dry_run:
+                os.replace(
+                    file.file_path,
+                    os.path.join(move_to, os.path.basename(file.file_path)),
+                )
+        logger.info(
+            f"{sum(loaded.values())} Asset Valuations loaded from {len(loaded)} files"
+        )
+
+    settler.touch(set(os.listdir(directory)))
+    try:
+        while True:
+            deadlines = [
+                deadline
+                for deadline in (settler.next_deadline(), batcher.next_deadline())
+                if deadline is not None
+            ]
+            changed = watcher.changes(min(deadlines, default=1.0))
+            if getattr(watcher, "overflowed", False):
+                logger.warning(
+                    "File notifications were lost, listing the directory",
+                    extra=RATE_LIMITED,
+                )
+                watcher.overflowed = False  # type: ignore
+                changed = set(os.listdir(directory))
+            settler.touch(changed)
+            batcher.add(
+                [
+                    path
+                    for path in settler.settled()
+                    if is_supported_file(os.path.basename(path))
+                ]
+            )
+            paths = batcher.take()
+            if paths:
+                load_batch(paths)
+    except KeyboardInterrupt:
+        logger.info("Stopped watching, loading the files already settled")
+        paths = batcher.take(force=True)
+        if paths:
+            load_batch(paths)
+    finally:
+        watcher.close()
+        close_destination_repository(destination_repo)
+        logger.info(f"Memory: {get_memory_budget().summary()}")
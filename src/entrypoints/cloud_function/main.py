@@ -1,9 +1,32 @@
+import threading
 from src import source_repository, destination_repository, services
-from src.utils.logs import default_module_logger
+from src.utils.logs import default_module_logger, flush_logs, log_stage
 from src.utils.gcp_clients import create_bigquery_client, create_storage_client
+from src.utils.memory_budget import get_memory_budget
 
 logger = default_module_logger(__file__)
 
+# state reused across the events handled by an instance, per thread as a repository
+# holds a buffer of its own
+_instance = threading.local()
+
+
+def get_bigquery_repository() -> destination_repository.BiqQueryDestinationRepository:
+    """
+    Returns the BigQuery repository of the instance, created on its first event, so that
+    the client is reused and the latest snapshot table only checked for once per
+    instance instead of once per file.
+
+    Returns:
+        destination_repository.BiqQueryDestinationRepository: The repository.
+    """
+    if not hasattr(_instance, "bigquery"):
+        _instance.bigquery = destination_repository.BiqQueryDestinationRepository(
+            bigquery_client=create_bigquery_client()
+        )
+
+    return _instance.bigquery
+
 
 def func_entry_point(event, context):
     """
@@ -27,11 +50,21 @@ def func_entry_point(event, context):
     bucket_name = event["bucket"]
     file_path = event["name"]
     logger.info(f"Working on file: '{file_path}' found on Bucket: '{bucket_name}'")
-    file = source_repository.GcpBucketFileSource(
-        file_path, bucket_name, create_storage_client()
-    )
-    bigquery = destination_repository.BiqQueryDestinationRepository(
-        bigquery_client=create_bigquery_client()
-    )
-
-    services.asset_valuation_pipeline(file, bigquery)
+    try:
+        # the size of the blob is part of the event, so parsing it is budgeted without a
+        # request
+        file = source_repository.GcpBucketFileSource(
+            file_path,
+            bucket_name,
+            create_storage_client(),
+            size_bytes=int(event.get("size") or 0) or None,
+        )
+        bigquery = get_bigquery_repository()
+
+        with log_stage(logger, "pipeline", file_path):
+            services.asset_valuation_pipeline(file, bigquery)
+        logger.info(f"Memory: {get_memory_budget().summary()}")
+    finally:
+        # the instance may be throttled once the function returns, so queued records are
+        # written now rather than at exit
+        flush_logs()
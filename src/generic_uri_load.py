@@ -0,0 +1,170 @@
+from concurrent.futures import ThreadPoolExecutor
+import csv
+from dataclasses import dataclass, field
+import re
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+from google.cloud import storage
+
+from src import custom_errors, validation
+from src.utils.rate_limiting import get_rate_limiter
+
+# large enough for any sensible header, small enough to be a single short request
+HEADER_PROBE_BYTES = 4096
+# characters that make a blob name a pattern, see match_glob of Bucket.list_blobs
+_WILDCARD = re.compile(r"[*?\[{]")
+
+
+@dataclass
+class GenericUriGroup:
+    """
+    Generic CSV files sharing a column layout, so that they can be loaded by a single
+    server side job.
+
+    Attributes:
+        header (validation.GenericHeader): Column layout shared by the files.
+        uris (List[str]): gs:// URIs of the files.
+    """
+
+    header: validation.GenericHeader
+    uris: List[str] = field(default_factory=list)
+
+
+def parse_gcs_uri(uri: str) -> Tuple[str, str]:
+    """
+    Splits a gs:// URI into its bucket name and blob name.
+
+    Args:
+        uri (str): URI as gs://<bucket>/<blob name>.
+    Returns:
+        Tuple[str, str]: bucket name and blob name, which may be a pattern.
+    Raises:
+        ValueError: Raised if uri is not a gs:// URI of a blob.
+    """
+    bucket_name, _, blob_name = uri.removeprefix("gs://").partition("/")
+    if not uri.startswith("gs://") or not bucket_name or not blob_name:
+        raise ValueError(f"'{uri}' is not a gs://<bucket>/<blob name> URI")
+
+    return bucket_name, blob_name
+
+
+def expand_gcs_uri(storage_client: storage.Client, uri: str) -> List[str]:
+    """
+    Expands a gs:// URI into the names of the blobs it refers to. A blob name holding
+    wildcards, e.g. 'generic_2018_*.csv', is a glob listed server side, only fetching blob
+    names; any other name is taken as is, without checking that the blob exists.
+
+    Args:
+        storage_client (storage.Client): A client for interacting with Google Cloud Storage.
+        uri (str): URI of a blob, or of several through wildcards.
+    Returns:
+        List[str]: Names of the blobs, sorted.
+    """
+    bucket_name, blob_name = parse_gcs_uri(uri)
+    wildcard = _WILDCARD.search(blob_name)
+    if wildcard is None:
+        return [blob_name]
+
+    blobs = storage_client.bucket(bucket_name).list_blobs(
+        prefix=blob_name[: wildcard.start()],
+        match_glob=blob_name,
+        fields="items(name),nextPageToken",
+    )
+
+    return sorted(blob.name for blob in blobs)
+
+
+def read_generic_header(
+    blob: storage.Blob, header_aliases: Optional[Dict[str, str]] = None
+) -> Optional[validation.GenericHeader]:
+    """
+    Resolves the column layout of a generic CSV blob from its header row, reading only
+    its first HEADER_PROBE_BYTES bytes, through the GCS rate limiter.
+
+    Args:
+        blob (storage.Blob): The generic CSV blob.
+        header_aliases (Dict[str, str], optional): Column of generic files by alias.
+    Returns:
+        validation.GenericHeader, optional: The column layout, None if the blob is empty.
+    Raises:
+        custom_errors.HeaderNotMatchError: Raised if the header does not include
+                                           ["date", "product_name", "value"] once, or
+                                           does not end within the bytes read.
+    """
+    probe = get_rate_limiter("gcs").call(
+        blob.download_as_bytes, start=0, end=HEADER_PROBE_BYTES - 1
+    )
+    if not probe:
+        return None
+
+    header_line, newline, _ = probe.decode("utf-8-sig", errors="replace").partition(
+        "\n"
+    )
+    if not newline and len(probe) >= HEADER_PROBE_BYTES:
+        raise custom_errors.HeaderNotMatchError(
+            blob.name,
+            f"header longer than {HEADER_PROBE_BYTES} bytes",
+            ", ".join(validation.GENERIC_COLUMNS),
+        )
+
+    header_row = next(csv.reader([header_line.rstrip("\r")]), [])
+
+    return validation.GenericHeader.resolve(header_row, blob.name, header_aliases)
+
+
+def plan_generic_uri_loads(
+    storage_client: storage.Client,
+    uris: Sequence[str],
+    header_aliases: Optional[Dict[str, str]] = None,
+    workers: int = 8,
+) -> List[GenericUriGroup]:
+    """
+    Expands gs:// URIs of generic CSV files, wildcards included, checks the header of
+    each file with a ranged read, several files at once, and groups the files by column
+    layout. Empty files are left out, as they hold no row.
+
+    Args:
+        storage_client (storage.Client): A client for interacting with Google Cloud Storage.
+        uris (Sequence[str]): URIs of the files, possibly holding wildcards.
+        header_aliases (Dict[str, str], optional): Column of generic files by alias.
+        workers (int): Number of headers read concurrently.
+    Returns:
+        List[GenericUriGroup]: The files by column layout, in order of first file.
+    Raises:
+        custom_errors.FileTypeNotImplementedError: Raised if a file is not a generic file.
+        custom_errors.FileFormatError: Raised if a file is not an uncompressed CSV file.
+        custom_errors.HeaderNotMatchError: Raised if the header of a file does not match.
+    """
+    blobs: List[storage.Blob] = []
+    blob_uris: List[str] = []
+    seen_uris: Set[str] = set()
+    for uri in uris:
+        bucket_name, _ = parse_gcs_uri(uri)
+        bucket = storage_client.bucket(bucket_name)
+        for blob_name in expand_gcs_uri(storage_client, uri):
+            blob_uri = f"gs://{bucket_name}/{blob_name}"
+            if blob_uri in seen_uris:
+                continue
+            seen_uris.add(blob_uri)
+            file_name = blob_name.split("/")[-1]
+            if file_name.split("_")[0].lower() != "generic":
+                raise custom_errors.FileTypeNotImplementedError(blob_name)
+            file_format = file_name.split(".", 1)[-1]
+            if file_format.lower() != "csv":
+                raise custom_errors.FileFormatError(blob_name, file_format, "csv")
+            blobs.append(bucket.blob(blob_name))
+            blob_uris.append(blob_uri)
+
+    with ThreadPoolExecutor(
+        max_workers=workers, thread_name_prefix="header-probe"
+    ) as executor:
+        headers = list(
+            executor.map(lambda blob: read_generic_header(blob, header_aliases), blobs)
+        )
+
+    groups: Dict[validation.GenericHeader, GenericUriGroup] = {}
+    for blob_uri, header in zip(blob_uris, headers):
+        if header is None:
+            continue
+        groups.setdefault(header, GenericUriGroup(header)).uris.append(blob_uri)
+
+    return list(groups.values())
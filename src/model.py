@@ -1,6 +1,15 @@
+from collections import deque
 from dataclasses import dataclass
 import datetime as dt
-from typing import Any
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from src.utils.memory_budget import NATURAL_KEY_BYTES, get_memory_budget
+
+NaturalKey = Tuple[dt.date, float, str]
+# natural keys kept by a run to drop duplicates across files, about 180 MB
+SEEN_KEYS_MAX = 1_000_000
+# share of the memory budget limit, if any, the keys kept by a run may take
+SEEN_KEYS_BUDGET_SHARE = 0.25
 
 
 @dataclass(frozen=True)
@@ -15,9 +24,9 @@ class AssetValuation:
         source_file (str): The name of the source file from which the valuation was extracted.
         creation_date (dt.datetime, optional): The creation date of the valuation instance.
                                                Defaults to the current date and time.
-    Methods:
-        to_dict() -> dict:
-            Converts the instance data to a dictionary.
+        natural_key (NaturalKey): (date, value, product_name), identity of the valuation.
+                                  Equality and hash are both defined on it, so equal
+                                  valuations from different files collapse in sets and dicts.
     """
 
     date: dt.date
@@ -26,11 +35,117 @@ class AssetValuation:
     source_file: str
     creation_date: dt.datetime = dt.datetime.now()
 
+    @property
+    def natural_key(self) -> NaturalKey:
+        return (self.date, self.value, self.product_name)
+
     def __eq__(self, other: Any) -> bool:
         if not isinstance(other, AssetValuation):
             return False
-        return (
-            self.date == other.date
-            and self.value == other.value
-            and self.product_name == other.product_name
-        )
+        return self.natural_key == other.natural_key
+
+    def __hash__(self) -> int:
+        return hash(self.natural_key)
+
+
+class SeenKeys(Set[NaturalKey]):
+    """
+    Set of the natural keys loaded so far by a run, to drop duplicates across files,
+    bounded to the max_keys most recently added: once full, the oldest keys are evicted,
+    so a duplicate of a valuation loaded that long before in the run is no longer
+    dropped. By default, the keys take at most SEEN_KEYS_BUDGET_SHARE of the memory
+    budget limit, if any. They are held for the whole run, so they are not tracked in
+    the budget, whose producers wait for memory in flight to be released.
+
+    Args:
+        max_keys (int, optional): Keys held at most. Defaults to SEEN_KEYS_MAX, or less
+                                  to fit in the memory budget.
+    Attributes:
+        max_keys (int): Keys held at most.
+        evicted (int): Keys evicted so far.
+    Methods:
+        add(key: NaturalKey):
+            Adds a key, evicting the oldest one if full.
+        update(*keys: Iterable[NaturalKey]):
+            Adds keys, evicting the oldest ones if full.
+    """
+
+    def __init__(self, max_keys: Optional[int] = None):
+        super().__init__()
+        if max_keys is None:
+            max_keys = SEEN_KEYS_MAX
+            limit_bytes = get_memory_budget().limit_bytes
+            if limit_bytes is not None:
+                budget_keys = (
+                    int(limit_bytes * SEEN_KEYS_BUDGET_SHARE) // NATURAL_KEY_BYTES
+                )
+                max_keys = max(1, min(max_keys, budget_keys))
+        self.max_keys = max_keys
+        self.evicted = 0
+        self._order: Deque[NaturalKey] = deque()
+
+    def add(self, key: NaturalKey):
+        self.update([key])
+
+    def update(self, *keys: Iterable[NaturalKey]):
+        for key in (key for iterable in keys for key in iterable):
+            if key in self:
+                continue
+            super().add(key)
+            self._order.append(key)
+            if len(self._order) > self.max_keys:
+                self.discard(self._order.popleft())
+                self.evicted += 1
+
+
+def deduplicate_asset_valuations(
+    asset_valuations: Iterable[AssetValuation],
+    seen_keys: Optional[Set[NaturalKey]] = None,
+) -> List[AssetValuation]:
+    """
+    Drops duplicated Asset Valuations, by natural key, in a single pass. The first
+    occurrence is kept and order is preserved.
+
+    Args:
+        asset_valuations (Iterable[AssetValuation]): Asset Valuations to deduplicate.
+        seen_keys (Set[NaturalKey], optional): Natural keys already seen, e.g. loaded from
+                                               other files. Asset Valuations with those keys
+                                               are dropped too. It is not modified.
+    Returns:
+        List[AssetValuation]: Asset Valuations without duplicates.
+    """
+    kept_keys: Set[NaturalKey] = set()
+    previous_keys = seen_keys if seen_keys is not None else set()
+    deduplicated: List[AssetValuation] = []
+    for asset_valuation in asset_valuations:
+        key = asset_valuation.natural_key
+        if key not in kept_keys and key not in previous_keys:
+            kept_keys.add(key)
+            deduplicated.append(asset_valuation)
+
+    return deduplicated
+
+
+def latest_asset_valuations(
+    asset_valuations: Iterable[AssetValuation],
+) -> List[AssetValuation]:
+    """
+    Picks the latest Asset Valuation of each product, by date and then by creation date,
+    in a single pass. On a tie the last occurrence wins, as it was loaded last.
+
+    Args:
+        asset_valuations (Iterable[AssetValuation]): Asset Valuations of any products.
+    Returns:
+        List[AssetValuation]: One Asset Valuation per product, in order of first occurrence
+                              of the product.
+    """
+    latest: Dict[str, AssetValuation] = {}
+    for asset_valuation in asset_valuations:
+        current = latest.get(asset_valuation.product_name)
+        if current is None or (asset_valuation.date, asset_valuation.creation_date) >= (
+            current.date,
+            current.creation_date,
+        ):
+            latest[asset_valuation.product_name] = asset_valuation
+
+    return list(latest.values())
@@ -0,0 +1,140 @@
+import datetime as dt
+import json
+from typing import IO, Dict, Iterable, List
+
+from src import model
+
+
+class NdjsonSerialiser:
+    """
+    Serialises Asset Valuations into newline delimited JSON bytes, as expected by the
+    destination table: date, value, product_name, __source_file__ and __creation_date__.
+    Rows are written straight as bytes, without building an intermediate dict per row.
+    Formatted dates, creation dates, product names and source files are cached, so each
+    distinct value is formatted and JSON escaped only once.
+
+    Methods:
+        serialise(asset_valuation: model.AssetValuation) -> bytes:
+            Serialises an Asset Valuation into a NDJSON line.
+        write(asset_valuations: Iterable[model.AssetValuation], buffer: IO[bytes]) -> int:
+            Writes Asset Valuations as NDJSON lines into a buffer.
+    """
+
+    def __init__(self):
+        self._dates: Dict[dt.date, bytes] = {}
+        self._creation_dates: Dict[dt.datetime, bytes] = {}
+        self._strings: Dict[str, bytes] = {}
+
+    def _date(self, date: dt.date) -> bytes:
+        formatted = self._dates.get(date)
+        if formatted is None:
+            formatted = self._dates[date] = (
+                b'{"date": "' + date.strftime("%Y-%m-%d").encode() + b'", "value": '
+            )
+
+        return formatted
+
+    def _creation_date(self, creation_date: dt.datetime) -> bytes:
+        formatted = self._creation_dates.get(creation_date)
+        if formatted is None:
+            formatted = self._creation_dates[creation_date] = (
+                b', "__creation_date__": "'
+                + creation_date.strftime("%Y-%m-%d %H:%M:%S").encode()
+                + b'"}\n'
+            )
+
+        return formatted
+
+    def _string(self, string: str) -> bytes:
+        escaped = self._strings.get(string)
+        if escaped is None:
+            escaped = self._strings[string] = json.dumps(string).encode()
+
+        return escaped
+
+    def serialise(self, asset_valuation: model.AssetValuation) -> bytes:
+        """
+        Serialises an Asset Valuation into a NDJSON line.
+
+        Args:
+            asset_valuation (model.AssetValuation): The Asset Valuation to serialise.
+        Returns:
+            bytes: JSON object followed by a newline.
+        """
+        return b"".join(
+            (
+                self._date(asset_valuation.date),
+                repr(float(asset_valuation.value)).encode(),
+                b', "product_name": ',
+                self._string(asset_valuation.product_name),
+                b', "__source_file__": ',
+                self._string(asset_valuation.source_file),
+                self._creation_date(asset_valuation.creation_date),
+            )
+        )
+
+    def write(
+        self, asset_valuations: Iterable[model.AssetValuation], buffer: IO[bytes]
+    ) -> int:
+        """
+        Writes Asset Valuations as NDJSON lines into a buffer.
+
+        Args:
+            asset_valuations (Iterable[model.AssetValuation]): Asset Valuations to serialise.
+            buffer (IO[bytes]): Binary buffer to write into.
+        Returns:
+            int: number of bytes written.
+        """
+        n_bytes = 0
+        for asset_valuation in asset_valuations:
+            n_bytes += buffer.write(self.serialise(asset_valuation))
+
+        return n_bytes
+
+
+class NdjsonDeserialiser:
+    """
+    Reads Asset Valuations back from the newline delimited JSON bytes written by
+    NdjsonSerialiser. Dates and creation dates are cached, as few distinct ones are
+    shared by many rows.
+
+    Methods:
+        deserialise(lines: bytes) -> List[model.AssetValuation]:
+            Reads the Asset Valuations of NDJSON lines.
+    """
+
+    def __init__(self):
+        self._dates: Dict[str, dt.date] = {}
+        self._creation_dates: Dict[str, dt.datetime] = {}
+
+    def deserialise(self, lines: bytes) -> List[model.AssetValuation]:
+        """
+        Reads the Asset Valuations of NDJSON lines.
+
+        Args:
+            lines (bytes): NDJSON lines, as written by NdjsonSerialiser.
+        Returns:
+            List[model.AssetValuation]: The Asset Valuations, in order.
+        """
+        asset_valuations: List[model.AssetValuation] = []
+        for line in lines.splitlines():
+            row = json.loads(line)
+            date = self._dates.get(row["date"])
+            if date is None:
+                date = self._dates[row["date"]] = dt.date.fromisoformat(row["date"])
+            creation_date = self._creation_dates.get(row["__creation_date__"])
+            if creation_date is None:
+                creation_date = self._creation_dates[row["__creation_date__"]] = (
+                    dt.datetime.fromisoformat(row["__creation_date__"])
+                )
+            asset_valuations.append(
+                model.AssetValuation(
+                    date=date,
+                    value=row["value"],
+                    product_name=row["product_name"],
+                    source_file=row["__source_file__"],
+                    creation_date=creation_date,
+                )
+            )
+
+        return asset_valuations
@@ -1,18 +1,368 @@
-from src import source_repository, destination_repository
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+import os
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from src import (
+    source_repository,
+    destination_repository,
+    delta_index,
+    model,
+    serialisation,
+    spool,
+)
+from src.utils.memory_budget import (
+    estimate_parse_bytes,
+    estimate_rows_bytes,
+    get_memory_budget,
+)
 
 
 def asset_valuation_pipeline(
     source_repo: source_repository.AbstractSourceRepository,
     destination_repo: destination_repository.AbstractDestinationRepository,
-):
+    delta_idx: Optional[delta_index.AbstractDeltaIndex] = None,
+    seen_keys: Optional[Set[model.NaturalKey]] = None,
+    dry_run: bool = False,
+) -> int:
     """
     Fetches Asset Valuations from the source repository and loads it into the destination repository.
+    Duplicated Asset Valuations are dropped before loading. If a set of natural keys seen is
+    given, Asset Valuations already loaded from other files are dropped too, and the keys of
+    those loaded are added to it once the load succeeds. If a delta index is given, only
+    Asset Valuations that changed since the last snapshot are loaded, and the index is
+    updated and saved once the load succeeds. On a dry run the index is updated but not
+    saved, so later files of the run are filtered as they would be on a real run.
+    Files take their estimated parse size from the memory budget of the process while
+    they are parsed and loaded, waiting for it if it is spent by other threads, see
+    memory_budget.MemoryBudget.
 
     Args:
         destination_repo
             (destination_repository.AbstractDestinationRepository): The data repository to
                                                                     load Asset Valuations into.
         source_repo (source_repository.AbstractSourceRepository): The data repository to load Asset Valuations from.
+        delta_idx (delta_index.AbstractDeltaIndex, optional): Index of the last known valuation
+                                                              of each product.
+        seen_keys (Set[model.NaturalKey], optional): Natural keys of the Asset Valuations
+                                                     loaded by earlier runs of the pipeline.
+        dry_run (bool, optional): Whether destination_repo only plans the load, e.g. a
+                                  destination_repository.DryRunDestinationRepository.
+                                  Defaults to False.
+    Returns:
+        int: Number of Asset Valuations loaded.
+    """
+    budget = get_memory_budget()
+    with budget.reserve(_parse_estimate(source_repo), "parse"):
+        asset_valuations = _load_asset_valuations(
+            source_repo.get_asset_valuations(),
+            destination_repo,
+            delta_idx,
+            seen_keys,
+            dry_run,
+        )
+
+    return len(asset_valuations)
+
+
+def _load_asset_valuations(
+    parsed: List[model.AssetValuation],
+    destination_repo: destination_repository.AbstractDestinationRepository,
+    delta_idx: Optional[delta_index.AbstractDeltaIndex],
+    seen_keys: Optional[Set[model.NaturalKey]],
+    dry_run: bool,
+) -> List[model.AssetValuation]:
+    """
+    Deduplicates and filters parsed Asset Valuations, loads them, then updates the delta
+    index and the seen keys, see asset_valuation_pipeline().
+
+    Returns:
+        List[model.AssetValuation]: The Asset Valuations loaded.
     """
-    asset_valuations = source_repo.get_asset_valuations()
+    asset_valuations = model.deduplicate_asset_valuations(parsed, seen_keys)
+    if delta_idx is not None:
+        asset_valuations = delta_idx.filter_changed(asset_valuations)
+
     destination_repo.load_asset_valuations(asset_valuations)
+
+    if delta_idx is not None:
+        delta_idx.update(asset_valuations)
+        if not dry_run:
+            delta_idx.save()
+    if seen_keys is not None:
+        seen_keys.update(
+            asset_valuation.natural_key for asset_valuation in asset_valuations
+        )
+
+    return asset_valuations
+
+
+def _parse_estimate(source_repo: source_repository.AbstractSourceRepository) -> int:
+    """
+    Estimates the memory taken by parsing a source, 0 if it is not a file.
+    """
+    if not isinstance(source_repo, source_repository.FileSourceAbstract):
+        return 0
+
+    return estimate_parse_bytes(
+        source_repo.stored_size(), source_repo.compression is not None
+    )
+
+
+def _parse_file(
+    source_repo: source_repository.FileSourceAbstract,
+) -> Tuple[List[model.AssetValuation], Optional[Exception]]:
+    """
+    Parses a file, returning its error instead of raising it.
+    """
+    try:
+        return source_repo.get_asset_valuations(), None
+    except Exception as e:
+        return [], e
+
+
+def asset_valuation_batch_pipeline(
+    source_repos: List[source_repository.FileSourceAbstract],
+    destination_repo: destination_repository.AbstractDestinationRepository,
+    delta_idx: Optional[delta_index.AbstractDeltaIndex] = None,
+    seen_keys: Optional[Set[model.NaturalKey]] = None,
+    dry_run: bool = False,
+    parse_workers: int = 1,
+) -> Tuple[Dict[str, int], Dict[str, Exception]]:
+    """
+    Runs several files through the Asset Valuation pipeline as one micro-batch: each file
+    is parsed on its own, so a file failing does not fail the others, and the Asset
+    Valuations of all files parsed are then loaded into the destination repository at
+    once. Deduplication, seen keys and the delta index apply as in
+    asset_valuation_pipeline(), across the files of the batch too.
+    Files can be read and parsed by a pool of threads, which overlaps their downloads.
+    Workers take the files in the order given, e.g. largest first, see
+    scheduling.order_files(), and results are kept in that order.
+    Each file takes its estimated parse size from the memory budget of the process, see
+    memory_budget.MemoryBudget, and holds the estimated size of its Asset Valuations
+    until they are loaded. Once the budget is spent, no more files are parsed until
+    memory is released, and if it is spent by the files of the batch itself, those
+    parsed so far are loaded first, splitting the batch into several loads.
+
+    Args:
+        source_repos (List[source_repository.FileSourceAbstract]): The files of the batch.
+        destination_repo
+            (destination_repository.AbstractDestinationRepository): The data repository to
+                                                                    load Asset Valuations into.
+        delta_idx (delta_index.AbstractDeltaIndex, optional): Index of the last known valuation
+                                                              of each product.
+        seen_keys (Set[model.NaturalKey], optional): Natural keys of the Asset Valuations
+                                                     loaded by earlier runs of the pipeline.
+        dry_run (bool, optional): Whether destination_repo only plans the load.
+                                  Defaults to False.
+        parse_workers (int, optional): Files read and parsed concurrently. Defaults to 1.
+    Returns:
+        Tuple[Dict[str, int], Dict[str, Exception]]: Asset Valuations loaded by file path,
+                                                     and error by path of the files that
+                                                     failed to parse.
+    Raises:
+        Exception: Any error loading the batch, in which case no file is loaded, but for
+                   the files of earlier loads if the memory budget split the batch.
+    """
+    budget = get_memory_budget()
+    # keys of earlier loads of the batch, if the budget splits it, are dropped too
+    loaded_keys = seen_keys if seen_keys is not None else set()
+    loaded: Dict[str, int] = {}
+    failed: Dict[str, Exception] = {}
+    queued: Deque[source_repository.FileSourceAbstract] = deque(source_repos)
+    # file, future and budgeted bytes of each file being parsed, in order
+    parsing: Deque[Tuple[source_repository.FileSourceAbstract, Future, int]] = deque()
+    parsed: List[model.AssetValuation] = []
+    parsed_files: List[str] = []
+    parsed_bytes = 0
+
+    def load_parsed():
+        nonlocal parsed, parsed_files, parsed_bytes
+        try:
+            asset_valuations = _load_asset_valuations(
+                parsed, destination_repo, delta_idx, loaded_keys, dry_run
+            )
+        finally:
+            budget.release(parsed_bytes, "parsed")
+            parsed_bytes = 0
+        loaded.update((file_path, 0) for file_path in parsed_files)
+        for asset_valuation in asset_valuations:
+            loaded[asset_valuation.source_file] += 1
+        parsed, parsed_files = [], []
+
+    with ThreadPoolExecutor(
+        max_workers=parse_workers, thread_name_prefix="parser"
+    ) as executor:
+        try:
+            while queued or parsing:
+                while queued and len(parsing) < parse_workers:
+                    n_bytes = _parse_estimate(queued[0])
+                    # waiting on the budget is only safe if the batch holds none of it
+                    if not parsing and not parsed_files:
+                        budget.acquire(n_bytes, "parse")
+                    elif not budget.try_acquire(n_bytes, "parse"):
+                        break
+                    source_repo = queued.popleft()
+                    parsing.append(
+                        (
+                            source_repo,
+                            executor.submit(_parse_file, source_repo),
+                            n_bytes,
+                        )
+                    )
+                if not parsing:
+                    # the budget is spent by the files parsed: load them to release it
+                    load_parsed()
+                    continue
+
+                source_repo, future, n_bytes = parsing[0]
+                file_valuations, error = future.result()
+                parsing.popleft()
+                if error is not None:
+                    failed[source_repo.file_path] = error
+                else:
+                    held_bytes = estimate_rows_bytes(len(file_valuations))
+                    budget.track(held_bytes, "parsed")
+                    parsed_bytes += held_bytes
+                    parsed.extend(file_valuations)
+                    parsed_files.append(source_repo.file_path)
+                budget.release(n_bytes, "parse")
+
+            load_parsed()
+        finally:
+            for _, future, n_bytes in parsing:
+                future.cancel()
+                budget.release(n_bytes, "parse")
+            budget.release(parsed_bytes, "parsed")
+
+    return loaded, failed
+
+
+def flush_spool(
+    source_spool: spool.Spool,
+    destination_repo: destination_repository.AbstractDestinationRepository,
+    max_batch_bytes: int = 256 * 1024 * 1024,
+) -> int:
+    """
+    Drains the sealed segments of a spool into the destination repository, oldest first,
+    with as few loads as possible: segments are grouped into loads of up to
+    max_batch_bytes, a segment bigger than that making a load by itself. Segments are
+    removed once their load succeeds, so a flush interrupted by a crash or a failed load
+    resumes from the first segment not loaded. Segments loaded but not yet removed when
+    the process crashed are loaded again: delivery is at least once. The flusher lock of
+    the spool is held throughout, so that a second flusher fails instead of loading the
+    same segments, and each batch reserves the memory of its Asset Valuations from the
+    memory budget, estimated from the rows of its frame headers, before it is read.
+
+    Args:
+        source_spool (spool.Spool): The spool to drain.
+        destination_repo
+            (destination_repository.AbstractDestinationRepository): The data repository to
+                                                                    load Asset Valuations into.
+        max_batch_bytes (int, optional): Upper bound of the spooled bytes of a load, unless
+                                         a single segment is bigger. Defaults to 256 MiB.
+    Returns:
+        int: Number of Asset Valuations loaded.
+    Raises:
+        SpoolFlushLockedError: Raised if another process flushes the spool.
+    """
+    deserialiser = serialisation.NdjsonDeserialiser()
+    budget = get_memory_budget()
+    loaded = 0
+    with source_spool.lock_flusher():
+        batches: List[List[str]] = []
+        batch_bytes = 0
+        for segment_path in source_spool.sealed_segments():
+            segment_bytes = os.path.getsize(segment_path)
+            if not batches or batch_bytes + segment_bytes > max_batch_bytes:
+                batches.append([])
+                batch_bytes = 0
+            batches[-1].append(segment_path)
+            batch_bytes += segment_bytes
+
+        for batch in batches:
+            rows = sum(source_spool.segment_rows(path) for path in batch)
+            with budget.reserve(estimate_rows_bytes(rows), "flush"):
+                asset_valuations = [
+                    asset_valuation
+                    for segment_path in batch
+                    for _, payload in source_spool.read_segment(segment_path)
+                    for asset_valuation in deserialiser.deserialise(payload)
+                ]
+                destination_repo.load_asset_valuations(asset_valuations)
+            for segment_path in batch:
+                source_spool.remove_segment(segment_path)
+            loaded += len(asset_valuations)
+
+    return loaded
+
+
+def reprocess_table(
+    source_table: source_repository.TableSourceAbstract,
+    destination_repo: destination_repository.AbstractDestinationRepository,
+    delta_idx: Optional[delta_index.AbstractDeltaIndex] = None,
+    seen_keys: Optional[Set[model.NaturalKey]] = None,
+    dry_run: bool = False,
+    destination_table: Optional[source_repository.TableSourceAbstract] = None,
+) -> int:
+    """
+    Copies the Asset Valuations of a table, e.g. the destination table of an earlier
+    run, into the destination repository, one batch of the table at a time. Duplicates
+    are dropped by natural key within each batch, see
+    model.deduplicate_asset_valuations(), and across batches: given the table the
+    destination repository loads into, the keys of each batch are looked up in it, see
+    source_repository.TableSourceAbstract.find_natural_keys(), so memory is bounded by
+    the batch size and not by the table, and a copy interrupted or run twice does not
+    duplicate rows; otherwise the keys loaded are kept in seen_keys. Given a delta
+    index, unchanged valuations are dropped and the index saved once done.
+
+    Args:
+        source_table (source_repository.TableSourceAbstract): The table read.
+        destination_repo
+            (destination_repository.AbstractDestinationRepository): The data repository to
+                                                                    load Asset Valuations into.
+        delta_idx (delta_index.AbstractDeltaIndex, optional): Index of the last known valuation
+                                                              of each product.
+        seen_keys (Set[model.NaturalKey], optional): Natural keys of the Asset Valuations
+                                                     already in the destination. Updated
+                                                     with the keys loaded. A bounded
+                                                     model.SeenKeys of its own if not given
+                                                     and destination_table is not either.
+        dry_run (bool, optional): Whether destination_repo only plans the load, in which
+                                  case the delta index is not saved. Defaults to False.
+        destination_table
+            (source_repository.TableSourceAbstract, optional): The table destination_repo
+                                                               loads into, looked up for
+                                                               the valuations it holds.
+    Returns:
+        int: Number of Asset Valuations loaded.
+    """
+    if seen_keys is None and destination_table is None:
+        seen_keys = model.SeenKeys()
+    loaded = 0
+    for batch in source_table.iter_asset_valuation_batches():
+        asset_valuations = model.deduplicate_asset_valuations(batch, seen_keys)
+        if destination_table is not None and asset_valuations:
+            held_keys = destination_table.find_natural_keys(asset_valuations)
+            asset_valuations = [
+                asset_valuation
+                for asset_valuation in asset_valuations
+                if asset_valuation.natural_key not in held_keys
+            ]
+        if delta_idx is not None:
+            asset_valuations = delta_idx.filter_changed(asset_valuations)
+        if not asset_valuations:
+            continue
+        destination_repo.load_asset_valuations(asset_valuations)
+        if delta_idx is not None:
+            delta_idx.update(asset_valuations)
+        if seen_keys is not None:
+            seen_keys.update(
+                asset_valuation.natural_key for asset_valuation in asset_valuations
+            )
+        loaded += len(asset_valuations)
+
+    if delta_idx is not None and not dry_run:
+        delta_idx.save()
+
+    return loaded
@@ -1,12 +1,103 @@
 from abc import ABC, abstractmethod
-from google.cloud import storage
+from google.api_core import exceptions
+from google.cloud import bigquery, storage
 from google.cloud.storage import Bucket
+from google.cloud.storage.fileio import BlobReader
+import bz2
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing, contextmanager
 import csv
+from dataclasses import dataclass
 import datetime as dt
-from typing import IO, Any, List, Optional
+from enum import Enum
+import gzip
+import io
+import os
+import sqlite3
+import time
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+import zstandard
 
-from src import model, custom_errors
+from src import model, custom_errors, validation, xlsx_reader
 from src.utils.gcp_clients import create_bigquery_client, create_storage_client
+from src.utils.memory_budget import estimate_rows_bytes, get_memory_budget
+from src.utils.rate_limiting import RateLimiter, get_rate_limiter
+
+HL_CREATED_AT_LABEL = "spreadsheet created at"
+HL_TOTAL_CASH_LABEL = "total cash:"
+HL_HOLDINGS_HEADER = "Code"
+HL_CREATED_AT_FORMATS = ("%d-%m-%Y", "%Y-%m-%d")
+ROW_FORMATS = ("csv", "xlsx")
+# natural keys looked up by a single SQLite query, within its limit of 999 parameters
+MAX_KEYS_PER_SQLITE_LOOKUP = 300
+
+
+DECOMPRESSORS: Dict[str, Callable[[IO[bytes]], IO[bytes]]] = {
+    "gz": lambda raw: gzip.GzipFile(fileobj=raw, mode="rb"),
+    "bz2": lambda raw: bz2.BZ2File(raw, mode="rb"),
+    "zst": lambda raw: zstandard.ZstdDecompressor().stream_reader(raw),
+}
+
+
+class _DecompressedTextStream(io.TextIOWrapper):
+    """
+    Text stream over a decompressed binary stream, that also closes the raw stream
+    the compressed bytes are read from.
+    """
+
+    def __init__(self, decompressed: IO[bytes], raw: IO[bytes]):
+        super().__init__(decompressed, encoding="utf-8")  # type: ignore
+        self._raw = raw
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self._raw.close()
+
+
+class _HlSection(Enum):
+    """
+    Sections of a HL source file, used as states by the HL parser.
+    """
+
+    PREAMBLE = "preamble"
+    HOLDINGS = "holdings"
+
+
+def _parse_hl_created_date(text: str, file_path: str) -> dt.date:
+    """
+    Parses the creation date of a HL file: 'DD-MM-YYYY' as exported to CSV, or
+    'YYYY-MM-DD' as read from a date cell of a workbook.
+
+    Args:
+        text (str): The date, without time.
+        file_path (str): The path of the HL file.
+    Returns:
+        dt.date: The creation date.
+    Raises:
+        ValueError: Raised if the date follows none of HL_CREATED_AT_FORMATS.
+    """
+    for date_format in HL_CREATED_AT_FORMATS:
+        try:
+            return dt.datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+
+    raise ValueError(f"Creation date '{text}' not valid in file: {file_path}.")
 
 
 class AbstractSourceRepository(ABC):
@@ -33,16 +124,40 @@ class AbstractSourceRepository(ABC):
 class FileSourceAbstract(AbstractSourceRepository, ABC):
     """
     An abstract base class representing a generic file from which to retrieve asset valuations.
+    Files can be CSV files or xlsx workbooks, whose first worksheet is streamed row by row,
+    see xlsx_reader.XlsxRowReader. Files compressed with gzip, bzip2 or zstandard are recognised by a compound extension
+    (e.g. 'generic_2024_01_01.csv.gz') and decompressed on the fly while being read.
 
     Arguments:
         file_path (str): The path to the file.
+        quarantine_invalid_rows (bool, optional): If True, invalid rows are set aside and
+                                                  valid ones returned, instead of raising.
+                                                  Defaults to False.
+        header_aliases (Dict[str, str], optional): Column of generic files by alias, for
+                                                   columns named differently, e.g.
+                                                   {"valuation": "value"}.
     Attributes:
         file_path (str): The path to the file.
         file_format (str): The format of the file, extracted from the file extension.
+        compression (str, optional): The compression of the file, extracted from the last
+                                     file extension if it is a key of DECOMPRESSORS.
         file_type (str): The type of the file, derived from the file name.
+        quarantine_invalid_rows (bool): Whether invalid rows are set aside instead of raising.
+        header_aliases (Dict[str, str]): Column of generic files by alias.
+        validation_report (validation.ValidationReport, optional): Report of the last
+                                                                   validation run.
+        parse_seconds (float, optional): Time taken by the last get_asset_valuations call,
+                                         reading the file included.
     Methods:
         _open() -> IO[Any]:
             Abstract method to open the file. Must be implemented by subclasses.
+        _open_binary() -> IO[bytes]:
+            Abstract method to open the file as a seekable binary stream. Must be
+            implemented by subclasses.
+        _read_rows() -> Iterator[Iterable[List[str]]]:
+            Context manager opening the file as an iterable of rows.
+        _decompress(raw: IO[bytes]) -> IO[Any]:
+            Wraps a binary stream of the compressed file into a decompressed text stream.
         _get_asset_valuations_from_generic_source() -> List[model.AssetValuation]:
             Internal method to parse asset valuations from a generic source file.
         _get_asset_valuations_from_hl_source(self) -> list[model.AssetValuation]:
@@ -50,12 +165,37 @@ class FileSourceAbstract(AbstractSourceRepository, ABC):
         get_asset_valuations() -> List[model.AssetValuation]:
             Retrieves asset valuations from the file. Implemented by calling internal methods
             based on the file type.
+        stored_size() -> Optional[int]:
+            Size of the file as stored, if known.
     """
 
-    def __init__(self, file_path: str):
+    def __init__(
+        self,
+        file_path: str,
+        quarantine_invalid_rows: bool = False,
+        header_aliases: Optional[Dict[str, str]] = None,
+    ):
         self.file_path = file_path
-        self.file_format = file_path.split(".")[-1]
+        extensions = file_path.split(".")
+        self.compression: Optional[str] = None
+        if len(extensions) > 2 and extensions[-1].lower() in DECOMPRESSORS:
+            self.compression = extensions.pop().lower()
+        self.file_format = extensions[-1]
         self.file_type = file_path.split("/")[-1].split("_")[0].lower()
+        self.quarantine_invalid_rows = quarantine_invalid_rows
+        self.header_aliases = header_aliases if header_aliases else {}
+        self.validation_report: Optional[validation.ValidationReport] = None
+        self.parse_seconds: Optional[float] = None
+
+    def stored_size(self) -> Optional[int]:
+        """
+        Size of the file as stored, compressed if it is, used to estimate the memory
+        taken by parsing it. Not known by default.
+
+        Returns:
+            int, optional: The size in bytes, None if not known.
+        """
+        return None
 
     @abstractmethod
     def _open(self) -> IO[Any]:
@@ -64,138 +204,198 @@ class FileSourceAbstract(AbstractSourceRepository, ABC):
         """
         raise NotImplementedError
 
+    @abstractmethod
+    def _open_binary(self) -> IO[bytes]:
+        """
+        Abstract method to open the file as a seekable binary stream, as stored. Must be
+        implemented by subclasses.
+        """
+        raise NotImplementedError
+
+    @contextmanager
+    def _read_rows(self) -> Iterator[Iterable[List[str]]]:
+        """
+        Opens the file as an iterable of rows: a csv.reader for CSV files and a
+        xlsx_reader.XlsxRowReader for xlsx workbooks.
+
+        Returns:
+            Iterator[Iterable[List[str]]]: Context manager yielding the rows of the file.
+        Raises:
+            custom_errors.FileFormatError: Raised if the format of the file is not one of
+                                           ROW_FORMATS, or is a compressed workbook.
+        """
+        if self.file_format not in ROW_FORMATS:
+            raise custom_errors.FileFormatError(
+                self.file_path, self.file_format, " or ".join(ROW_FORMATS)
+            )
+
+        if self.file_format == "xlsx":
+            if self.compression:
+                # workbooks are zip archives already and must be seekable to be read
+                raise custom_errors.FileFormatError(
+                    self.file_path, f"xlsx.{self.compression}", "xlsx"
+                )
+            with self._open_binary() as f, xlsx_reader.XlsxRowReader(f) as rows:
+                yield rows
+        else:
+            with self._open() as f:
+                yield csv.reader(f)
+
+    def _decompress(self, raw: IO[bytes]) -> IO[Any]:
+        """
+        Wraps a binary stream of the compressed file into a text stream that decompresses
+        the file while it is read, so no temporary file is needed.
+
+        Args:
+            raw (IO[bytes]): binary stream of the compressed file.
+        Returns:
+            IO: An open text stream of the decompressed file.
+        """
+        decompressor = DECOMPRESSORS[str(self.compression)]
+
+        return _DecompressedTextStream(decompressor(raw), raw)
+
     def _get_asset_valuations_from_generic_source(self) -> List[model.AssetValuation]:
         """
         Internal method to parse asset valuations from a generic source file.
         It checks for file format and headers.
-        Generic source file must be a CSV and must contain at least columns:
+        Generic source file must be a CSV or xlsx file and must contain at least columns:
             date: must follow next pattern 'YYYY-MM-DD'
             value: numerical valuation of asset
             product_name: name of asset
+        Columns can be in any order, or named by one of header_aliases, and any other
+        column is ignored. The header is resolved once into column indexes, see
+        validation.GenericHeader.
         An example can be found at tests/data/generic_2023_11_24.csv.
+        All rows are validated as one batch once read, see validation.validate_generic_rows().
+        If quarantine_invalid_rows is set, invalid rows are left out of the result and
+        recorded on validation_report.
 
         Returns:
             List[model.AssetValuation]: A list of AssetValuation instances.
         Raises:
-            custom_errors.FileFormatError: Raised if the format of the file is not a csv
-            custom_errors.HeaderNotMatchError: Raised if file headers are not
-                                               ["date", "product_name", "value"]
+            custom_errors.FileFormatError: Raised if the format of the file is not csv or xlsx
+            custom_errors.HeaderNotMatchError: Raised if file headers do not include
+                                               ["date", "product_name", "value"] once
+            custom_errors.RowValidationError: Raised if any row is not valid and
+                                              quarantine_invalid_rows is not set.
         """
-        if self.file_format != "csv":
-            raise custom_errors.FileFormatError(self.file_path, self.file_format, "csv")
+        header: Optional[validation.GenericHeader] = None
+        rows: List[List[str]] = []
+        with self._read_rows() as file_rows:
+            s_reader = iter(file_rows)
+            header_row = next(s_reader, None)
+            if header_row is not None:
+                header = validation.GenericHeader.resolve(
+                    header_row, self.file_path, self.header_aliases
+                )
+                rows = list(s_reader)
 
-        asset_valuations: List[model.AssetValuation] = []
-        with self._open() as f:
-            s_reader = csv.reader(f)
-
-            for row_number, row in enumerate(s_reader):
-                if row_number == 0:
-                    if [str(elem).lower() for elem in row] != [
-                        "product_name",
-                        "date",
-                        "value",
-                    ]:
-                        raise custom_errors.HeaderNotMatchError(
-                            self.file_path,
-                            str([str(elem).lower() for elem in row]).replace("'", ""),
-                            "[date, product_name, value]",
-                        )
+        if header is not None and self.file_format == "xlsx":
+            # workbooks leave out empty trailing cells, which CSV files keep as ""
+            rows = [
+                (
+                    row + [""] * (header.width - len(row))
+                    if len(row) < header.width
+                    else row
+                )
+                for row in rows
+            ]
 
-                else:
-                    dictify_row = dict(zip(["product_name", "date", "value"], row))
-                    asset_valuations.append(
-                        model.AssetValuation(
-                            date=dt.datetime.strptime(
-                                dictify_row["date"], "%Y-%m-%d"
-                            ).date(),
-                            value=float(dictify_row["value"]),
-                            product_name=dictify_row["product_name"],
-                            source_file=self.file_path,
-                        )
-                    )
+        asset_valuations, self.validation_report = validation.validate_generic_rows(
+            rows, self.file_path, header=header
+        )
+        if not self.validation_report.is_valid() and not self.quarantine_invalid_rows:
+            raise custom_errors.RowValidationError(
+                self.file_path, self.validation_report.summary()
+            )
 
         return asset_valuations
 
     def _get_asset_valuations_from_hl_source(self) -> list[model.AssetValuation]:
         """
         Internal method to parse asset valuations from HL source file. It checks for file format.
-        HL file format sample can be found at tests/data/hl_2023_11_24.csv.
+        HL file format sample can be found at tests/data/hl_2023_11_24.csv, the same
+        layout being read from xlsx workbooks.
+        The file is read as a stream with two sections: the preamble, holding the creation
+        date and total cash, and the holdings table that starts at the 'Code' header.
+        Reading stops at the row closing the holdings table, so trailing content is never
+        consumed.
 
         Returns:
             List[model.AssetValuation]: A list of AssetValuation instances.
         Raises:
-            custom_errors.FileFormatError: Raised if the format of the file is not a csv
+            custom_errors.FileFormatError: Raised if the format of the file is not csv or xlsx
         """
-        if self.file_format != "csv":
-            raise custom_errors.FileFormatError(self.file_path, self.file_format, "csv")
-
         asset_valuations: List[model.AssetValuation] = []
-        with self._open() as f:
-            s_reader = csv.reader(f)
-
-            created_date, variable_name, all_extracted, to_accounts = (
-                None,
-                "spreadsheet created at",
-                False,
-                False,
-            )
+        created_date: Optional[dt.date] = None
+        section = _HlSection.PREAMBLE
+        with self._read_rows() as s_reader:
             for row in s_reader:
+                if len(row) == 0:
+                    continue
 
-                if all_extracted or len(row) == 0:
-                    pass
+                first_cell = row[0]
+                if first_cell == "":
+                    # the holdings table is closed by the totals row: whatever follows are
+                    # disclaimers, so the rest of the stream is left unread
+                    break
 
-                elif row[0].strip().lower() == variable_name:
-                    created_date = dt.datetime.strptime(row[1][:10], "%d-%m-%Y").date()
-
-                elif row[0].strip().lower() == "total cash:":
+                if section is _HlSection.HOLDINGS:
                     asset_valuations.append(
                         model.AssetValuation(
                             date=created_date if created_date else dt.date(1990, 1, 1),
-                            value=float(row[1].replace(",", "")),
-                            product_name="HL - Cash",
+                            value=float(row[4].replace(",", "")),
+                            product_name=row[1],
                             source_file=self.file_path,
                         )
                     )
+                    continue
 
-                elif row[0] == "Code":
-                    to_accounts = True
+                label = first_cell.strip().lower()
+                if label == HL_CREATED_AT_LABEL:
+                    created_date = _parse_hl_created_date(row[1][:10], self.file_path)
 
-                elif to_accounts and row[0] != "":
+                elif label == HL_TOTAL_CASH_LABEL:
                     asset_valuations.append(
                         model.AssetValuation(
                             date=created_date if created_date else dt.date(1990, 1, 1),
-                            value=float(row[4].replace(",", "")),
-                            product_name=row[1],
+                            value=float(row[1].replace(",", "")),
+                            product_name="HL - Cash",
                             source_file=self.file_path,
                         )
                     )
 
-                elif row[0] == "":
-                    all_extracted = True
+                elif first_cell == HL_HOLDINGS_HEADER:
+                    section = _HlSection.HOLDINGS
 
-            if created_date is None:
-                raise ValueError(
-                    f"Expected value '{variable_name}' not found in file: {self.file_path}."
-                )
+        if created_date is None:
+            raise ValueError(
+                f"Expected value '{HL_CREATED_AT_LABEL}' not found in file: {self.file_path}."
+            )
 
         return asset_valuations
 
     def get_asset_valuations(self) -> list[model.AssetValuation]:
         """
         Factory method to retrieves asset valuations from the file. Implemented by calling internal methods
-        based on the file type.
+        based on the file type. The time taken, reading the file included, is kept on parse_seconds.
 
         Returns:
             List[model.AssetValuation]: A list of AssetValuation instances.
         Raises:
             custom_errors.FileTypeNotImplementedError: Raised if the file type is not recognized.
         """
+        start = time.perf_counter()
         if self.file_type == "generic":
-            return self._get_asset_valuations_from_generic_source()
+            asset_valuations = self._get_asset_valuations_from_generic_source()
         elif self.file_type == "hl":
-            return self._get_asset_valuations_from_hl_source()
+            asset_valuations = self._get_asset_valuations_from_hl_source()
         else:
             raise custom_errors.FileTypeNotImplementedError(self.file_path)
+        self.parse_seconds = time.perf_counter() - start
+
+        return asset_valuations
 
 
 class LocalFileSource(FileSourceAbstract):
@@ -212,6 +412,8 @@ class LocalFileSource(FileSourceAbstract):
     Methods:
         _open():
             Opens the local file and returns a file object.
+        _open_binary():
+            Opens the local file as a binary stream.
         _get_asset_valuations_from_generic_source() -> List[model.AssetValuation]:
             Internal method to parse asset valuations from a generic source file.
         _get_asset_valuations_from_hl_source(self) -> list[model.AssetValuation]:
@@ -223,13 +425,38 @@ class LocalFileSource(FileSourceAbstract):
 
     def _open(self) -> IO[Any]:
         """
-        Opens the local file and returns a file object.
+        Opens the local file and returns a file object. Compressed files are decompressed
+        while read.
 
         Returns:
             IO: An open file object.
         """
+        if self.compression:
+            return self._decompress(open(self.file_path, "rb"))
+
         return open(self.file_path, encoding="utf-8")
 
+    def _open_binary(self) -> IO[bytes]:
+        """
+        Opens the local file as a binary stream.
+
+        Returns:
+            IO[bytes]: An open binary file object.
+        """
+        return open(self.file_path, "rb")
+
+    def stored_size(self) -> Optional[int]:
+        """
+        Size of the local file.
+
+        Returns:
+            int, optional: The size in bytes, None if the file cannot be found.
+        """
+        try:
+            return os.path.getsize(self.file_path)
+        except OSError:
+            return None
+
 
 class GcpBucketFileSource(FileSourceAbstract):
     """
@@ -240,30 +467,51 @@ class GcpBucketFileSource(FileSourceAbstract):
         file_path (str): The path to the file in the GCP bucket.
         bucket_name (str): The name of the GCP bucket.
         storage_client (storage.Client): A client for interacting with Google Cloud Storage.
+        quarantine_invalid_rows (bool, optional): If True, invalid rows are set aside and
+                                                  valid ones returned, instead of raising.
+                                                  Defaults to False.
+        header_aliases (Dict[str, str], optional): Column of generic files by alias.
+        size_bytes (int, optional): Size of the blob, if known, e.g. from the listing.
     Attributes:
         file_path (str): The path to the local file.
         file_format (str): The format of the file, extracted from the file extension.
         file_type (str): The type of the file, derived from the file name.
         storage_client (storage.Client): A client for interacting with Google Cloud Storage.
         bucket (Bucket): The GCP Bucket client.
+        hl_read_chunk_size (int): Size in bytes of each ranged download issued while an
+                                  uncompressed HL CSV blob is read, as its parser stops
+                                  after the holdings table and does not fetch the rest.
+                                  Other blobs are read whole, in ranges of the library
+                                  default size.
+        rate_limiter (RateLimiter): Rate limiter and retry policy of GCS calls, shared by
+                                    the process, applied to each ranged download.
     Methods:
         _open():
             Opens the local file and returns a file object.
         _get_asset_valuations_from_generic_source() -> List[model.AssetValuation]:
             Internal method to parse asset valuations from a generic source file.
-        get_asset_valuations() -> List[model.AssetValuation]:
-            Retrieves asset valuations from the file. Implemented by calling internal methods
-            based on the file type.
+        _open_binary():
+            Opens the blob as a seekable binary stream.
         _get_bucket() -> storage.bucket.Bucket:
             Retrieves the GCP bucket.
     """
 
+    hl_read_chunk_size: int = 256 * 1024
+
     def __init__(
-        self, file_path: str, bucket_name: str, storage_client: storage.Client
+        self,
+        file_path: str,
+        bucket_name: str,
+        storage_client: storage.Client,
+        quarantine_invalid_rows: bool = False,
+        header_aliases: Optional[Dict[str, str]] = None,
+        size_bytes: Optional[int] = None,
     ):
-        super().__init__(file_path)
+        super().__init__(file_path, quarantine_invalid_rows, header_aliases)
+        self.size_bytes = size_bytes
         self.storage_client = storage_client
         self.bucket: Bucket = self._get_bucket(bucket_name)
+        self.rate_limiter: RateLimiter = get_rate_limiter("gcs")
 
     def _get_bucket(self, bucket_name: str) -> Bucket:
         """
@@ -278,13 +526,571 @@ class GcpBucketFileSource(FileSourceAbstract):
 
         return bucket
 
+    def stored_size(self) -> Optional[int]:
+        """
+        Size of the blob, as given when created, so that it is not fetched.
+
+        Returns:
+            int, optional: The size in bytes, None if not given.
+        """
+        return self.size_bytes
+
     def _open(self) -> IO[Any]:
         """
-        Opens the file in the GCP bucket and returns a file-like object.
+        Opens the file in the GCP bucket and returns a file-like object. Compressed blobs
+        are downloaded as stored, without decompressive transcoding, and decompressed
+        while read.
 
         Returns:
             IO: An open file-like object.
         """
         blob = self.bucket.blob(self.file_path)
+        if self.compression:
+            return self._decompress(self._open_reader(blob, raw_download=True))
+        chunk_size = self.hl_read_chunk_size if self.file_type == "hl" else None
+
+        return io.TextIOWrapper(
+            self._open_reader(blob, chunk_size=chunk_size), encoding="utf-8"
+        )
+
+    def _open_binary(self) -> IO[bytes]:
+        """
+        Opens the file in the GCP bucket as a seekable binary stream, downloaded in ranges
+        of the library default size as it is read.
+
+        Returns:
+            IO[bytes]: An open binary file-like object.
+        """
+        return self._open_reader(self.bucket.blob(self.file_path))
+
+    def _open_reader(
+        self, blob: storage.Blob, chunk_size: Optional[int] = None, **download_kwargs
+    ) -> BlobReader:
+        """
+        Opens a binary stream of the blob, as blob.open does, whose ranged downloads each
+        go through rate_limiter: every request is counted and rate limited, and only the
+        failed range is downloaded again on a throttling or transient error, instead of
+        the whole blob.
+
+        Args:
+            blob (storage.Blob): The blob to read.
+            chunk_size (int, optional): Size in bytes of each ranged download. Defaults
+                                        to the library default size.
+            **download_kwargs: Arguments of each download, e.g. raw_download.
+        Returns:
+            BlobReader: An open binary file-like object.
+        """
+        rate_limited_blob = _RateLimitedBlob(blob, self.rate_limiter)
+
+        # retries are left to rate_limiter rather than to the library
+        return BlobReader(
+            rate_limited_blob, chunk_size=chunk_size, retry=None, **download_kwargs
+        )
+
+
+class _RateLimitedBlob:
+    """
+    Blob whose downloads go through a rate limiter, all other attributes being those of
+    the blob, so that a BlobReader rate limits and retries each ranged download it issues.
+
+    Args:
+        blob (storage.Blob): The blob.
+        rate_limiter (RateLimiter): Rate limiter and retry policy of the downloads.
+    """
+
+    def __init__(self, blob: storage.Blob, rate_limiter: RateLimiter):
+        self._blob = blob
+        self._rate_limiter = rate_limiter
+
+    def download_as_bytes(self, **kwargs) -> bytes:
+        return self._rate_limiter.call(self._blob.download_as_bytes, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._blob, name)
+
+
+@dataclass(frozen=True)
+class ValuationFilter:
+    """
+    Row filter of a table source, pushed down into the query reading the table.
+
+    Attributes:
+        start_date (dt.date, optional): First date read, inclusive.
+        end_date (dt.date, optional): Last date read, inclusive.
+        product_names (Tuple[str, ...], optional): Products read. All if empty.
+    """
+
+    start_date: Optional[dt.date] = None
+    end_date: Optional[dt.date] = None
+    product_names: Tuple[str, ...] = ()
+
+
+def _read_ranges_in_parallel(
+    read_range: Callable[[int, int], List[model.AssetValuation]],
+    ranges: Iterable[Tuple[int, int]],
+    streams: int,
+) -> Iterator[List[model.AssetValuation]]:
+    """
+    Reads ranges of rows with up to streams ranges read at once, yielding the batch of
+    each range in range order. At most 2 * streams batches are held in memory, so a slow
+    consumer holds back the readers. Each batch read ahead takes its estimated size from
+    the memory budget of the process until the consumer is done with it, and no range is
+    read ahead while the budget is spent, see memory_budget.MemoryBudget.
+
+    Args:
+        read_range (Callable[[int, int], List[model.AssetValuation]]): Reads the rows of a
+                                                                      (start, size) range.
+        ranges (Iterable[Tuple[int, int]]): (start, size) of each range, in order.
+        streams (int): Ranges read at once.
+    Returns:
+        Iterator[List[model.AssetValuation]]: The batch of each range.
+    """
+    budget = get_memory_budget()
+    ranges = iter(ranges)
+    next_range = next(ranges, None)
+    # future and budgeted bytes of each range read ahead
+    pending: Deque[Tuple[Future, int]] = deque()
+    with ThreadPoolExecutor(max_workers=streams) as executor:
+        try:
+            while next_range is not None or pending:
+                while next_range is not None and len(pending) < 2 * streams:
+                    start, size = next_range
+                    n_bytes = estimate_rows_bytes(size)
+                    if not pending:
+                        budget.acquire(n_bytes, "read")
+                    elif not budget.try_acquire(n_bytes, "read"):
+                        break
+                    pending.append((executor.submit(read_range, start, size), n_bytes))
+                    next_range = next(ranges, None)
+                batch = pending[0][0].result()
+                _, n_bytes = pending.popleft()
+                try:
+                    yield batch
+                finally:
+                    budget.release(n_bytes, "read")
+        finally:
+            for future, n_bytes in pending:
+                future.cancel()
+                budget.release(n_bytes, "read")
+
+
+class TableSourceAbstract(AbstractSourceRepository, ABC):
+    """
+    An abstract base class representing a table of Asset Valuations to read back, e.g. to
+    reprocess or migrate history that was already loaded. The table is read in batches by
+    parallel read streams, reading only the columns needed and the rows matching
+    row_filter.
+
+    Args:
+        row_filter (ValuationFilter, optional): Rows read. All rows if not given.
+        with_provenance (bool, optional): Whether source file and creation date are read.
+                                          If False, only date, value and product name are
+                                          read, and source_file is set to the table name.
+                                          Defaults to True.
+        streams (int, optional): Read streams run at once. Defaults to 4.
+        batch_rows (int, optional): Rows of each batch. Defaults to 10000.
+    Attributes:
+        table (str): The table read.
+        row_filter (ValuationFilter): Rows read.
+        with_provenance (bool): Whether source file and creation date are read.
+        streams (int): Read streams run at once.
+        batch_rows (int): Rows of each batch.
+    Methods:
+        iter_asset_valuation_batches() -> Iterator[List[model.AssetValuation]]:
+            Reads the Asset Valuations of the table, one batch at a time.
+        get_asset_valuations() -> List[model.AssetValuation]:
+            Reads all Asset Valuations of the table matching row_filter.
+        find_natural_keys(asset_valuations: List[model.AssetValuation]) -> Set[model.NaturalKey]:
+            Looks up which Asset Valuations the table holds already.
+    """
+
+    table: str
+
+    def __init__(
+        self,
+        row_filter: Optional[ValuationFilter] = None,
+        with_provenance: bool = True,
+        streams: int = 4,
+        batch_rows: int = 10000,
+    ):
+        self.row_filter = row_filter if row_filter else ValuationFilter()
+        self.with_provenance = with_provenance
+        self.streams = streams
+        self.batch_rows = batch_rows
+
+    @property
+    def columns(self) -> List[str]:
+        """
+        Columns read from the table.
+        """
+        columns = ["date", "value", "product_name"]
+        if self.with_provenance:
+            columns += ["__source_file__", "__creation_date__"]
+
+        return columns
+
+    @abstractmethod
+    def iter_asset_valuation_batches(self) -> Iterator[List[model.AssetValuation]]:
+        """
+        Abstract method to read the Asset Valuations of the table, one batch at a time.
+
+        Returns:
+            Iterator[List[model.AssetValuation]]: Batches of up to batch_rows Asset Valuations.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def find_natural_keys(
+        self, asset_valuations: List[model.AssetValuation]
+    ) -> Set[model.NaturalKey]:
+        """
+        Abstract method to look up which Asset Valuations the table holds already, by
+        natural key, whatever row_filter, e.g. to load a batch into the table only once.
+
+        Args:
+            asset_valuations (List[model.AssetValuation]): Asset Valuations looked up.
+        Returns:
+            Set[model.NaturalKey]: Natural keys of those held by the table.
+        """
+        raise NotImplementedError
+
+    def get_asset_valuations(self) -> list[model.AssetValuation]:
+        """
+        Reads all Asset Valuations of the table matching row_filter.
+
+        Returns:
+            List[model.AssetValuation]: A list of AssetValuation instances.
+        """
+        return [
+            asset_valuation
+            for batch in self.iter_asset_valuation_batches()
+            for asset_valuation in batch
+        ]
+
+    def _to_asset_valuation(
+        self,
+        date: dt.date,
+        value: float,
+        product_name: str,
+        source_file: Optional[str] = None,
+        creation_date: Optional[dt.datetime] = None,
+    ) -> model.AssetValuation:
+        """
+        Builds the Asset Valuation of a row, from the columns read.
+        """
+        if not self.with_provenance:
+            return model.AssetValuation(date, value, product_name, self.table)
+
+        return model.AssetValuation(
+            date, value, product_name, str(source_file), creation_date  # type: ignore
+        )
+
+
+class BigQueryTableSource(TableSourceAbstract):
+    """
+    A concrete implementation of TableSourceAbstract reading a BigQuery table, by default
+    the destination table of BiqQueryDestinationRepository. One query projects the
+    columns needed and filters rows, so only these are scanned and billed; its result is
+    then read back by streams parallel readers, each reading ranges of batch_rows rows
+    of the result table. Calls are made through the BigQuery rate limiter shared by the
+    process.
+
+    Args:
+        bigquery_client (google.cloud.bigquery.Client): BigQuery client instance.
+        table (str, optional): The table read. Defaults to raw.asset_valuations_v2.
+        row_filter (ValuationFilter, optional): Rows read. All rows if not given.
+        with_provenance (bool, optional): Whether source file and creation date are read.
+                                          Defaults to True.
+        streams (int, optional): Read streams run at once. Defaults to 4.
+        batch_rows (int, optional): Rows of each batch. Defaults to 10000.
+    Attributes:
+        bigquery_client (google.cloud.bigquery.Client): BigQuery client instance.
+        rate_limiter (RateLimiter): Rate limiter and retry policy of BigQuery calls.
+    Methods:
+        iter_asset_valuation_batches() -> Iterator[List[model.AssetValuation]]:
+            Reads the Asset Valuations of the table, one batch at a time.
+        find_natural_keys(asset_valuations: List[model.AssetValuation]) -> Set[model.NaturalKey]:
+            Looks up which Asset Valuations the table holds already, server side.
+    """
+
+    def __init__(
+        self,
+        bigquery_client: bigquery.Client,
+        table: str = "raw.asset_valuations_v2",
+        row_filter: Optional[ValuationFilter] = None,
+        with_provenance: bool = True,
+        streams: int = 4,
+        batch_rows: int = 10000,
+    ):
+        super().__init__(row_filter, with_provenance, streams, batch_rows)
+        self.bigquery_client = bigquery_client
+        self.table = table
+        self.rate_limiter: RateLimiter = get_rate_limiter("bigquery")
+
+    def _query(self) -> Tuple[str, List[Any]]:
+        """
+        Builds the query projecting and filtering the table, and its parameters.
+        """
+        conditions = ["TRUE"]
+        parameters: List[Any] = []
+        if self.row_filter.start_date:
+            conditions.append("date >= @start_date")
+            parameters.append(
+                bigquery.ScalarQueryParameter(
+                    "start_date", "DATE", self.row_filter.start_date
+                )
+            )
+        if self.row_filter.end_date:
+            conditions.append("date <= @end_date")
+            parameters.append(
+                bigquery.ScalarQueryParameter(
+                    "end_date", "DATE", self.row_filter.end_date
+                )
+            )
+        if self.row_filter.product_names:
+            conditions.append("product_name IN UNNEST(@product_names)")
+            parameters.append(
+                bigquery.ArrayQueryParameter(
+                    "product_names", "STRING", list(self.row_filter.product_names)
+                )
+            )
+        query = (
+            f"SELECT {', '.join(self.columns)} FROM {self.table} "
+            f"WHERE {' AND '.join(conditions)}"
+        )
+
+        return query, parameters
+
+    def iter_asset_valuation_batches(self) -> Iterator[List[model.AssetValuation]]:
+        """
+        Queries the table, then reads the result back with parallel read streams, one
+        batch at a time, in the order of the result.
+
+        Returns:
+            Iterator[List[model.AssetValuation]]: Batches of up to batch_rows Asset Valuations.
+        """
+        query, parameters = self._query()
+        job_config = bigquery.QueryJobConfig(query_parameters=parameters)
+        query_job = self.rate_limiter.call(
+            self.bigquery_client.query, query, job_config=job_config
+        )
+        result = self.rate_limiter.call(query_job.result)
+        total_rows = result.total_rows or 0
+        schema = result.schema
+
+        def read_range(start: int, size: int) -> List[model.AssetValuation]:
+            rows = self.rate_limiter.call(
+                lambda: list(
+                    self.bigquery_client.list_rows(
+                        query_job.destination,
+                        selected_fields=schema,
+                        start_index=start,
+                        max_results=size,
+                        page_size=size,
+                    )
+                )
+            )
+            return [self._to_asset_valuation(*row.values()) for row in rows]
+
+        yield from _read_ranges_in_parallel(
+            read_range,
+            (
+                (start, min(self.batch_rows, total_rows - start))
+                for start in range(0, total_rows, self.batch_rows)
+            ),
+            self.streams,
+        )
+
+    def find_natural_keys(
+        self, asset_valuations: List[model.AssetValuation]
+    ) -> Set[model.NaturalKey]:
+        """
+        Looks up which Asset Valuations the table holds already, by natural key, joining
+        the table with the keys sent as a query parameter, so only the keys found are
+        read back. A table not created yet holds none.
+
+        Args:
+            asset_valuations (List[model.AssetValuation]): Asset Valuations looked up.
+        Returns:
+            Set[model.NaturalKey]: Natural keys of those held by the table.
+        """
+        if not asset_valuations:
+            return set()
+        keys = [
+            bigquery.StructQueryParameter(
+                None,
+                bigquery.ScalarQueryParameter("date", "DATE", asset_valuation.date),
+                bigquery.ScalarQueryParameter(
+                    "value", "FLOAT64", asset_valuation.value
+                ),
+                bigquery.ScalarQueryParameter(
+                    "product_name", "STRING", asset_valuation.product_name
+                ),
+            )
+            for asset_valuation in set(asset_valuations)
+        ]
+        query = (
+            "SELECT DISTINCT held.date, held.value, held.product_name "
+            f"FROM {self.table} AS held JOIN UNNEST(@keys) AS key "
+            "ON held.date = key.date AND held.product_name = key.product_name "
+            "AND held.value = key.value"
+        )
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ArrayQueryParameter("keys", "STRUCT", keys)]
+        )
+        try:
+            query_job = self.rate_limiter.call(
+                self.bigquery_client.query, query, job_config=job_config
+            )
+            rows = self.rate_limiter.call(query_job.result)
+        except exceptions.NotFound:
+            return set()
+
+        return {tuple(row.values()) for row in rows}  # type: ignore[misc]
+
+
+class SqliteTableSource(TableSourceAbstract):
+    """
+    A concrete implementation of TableSourceAbstract reading the table of a local SQLite
+    database, as written by SqliteDestinationRepository. It is the local stand-in of
+    BigQueryTableSource: the same projection and filters are pushed down into the
+    query, and streams readers, each with a connection of its own, read ranges of
+    batch_rows row ids at once.
+
+    Args:
+        database_path (str): Path of the SQLite database file.
+        table (str, optional): The table read. Defaults to asset_valuations.
+        row_filter (ValuationFilter, optional): Rows read. All rows if not given.
+        with_provenance (bool, optional): Whether source file and creation date are read.
+                                          Defaults to True.
+        streams (int, optional): Read streams run at once. Defaults to 4.
+        batch_rows (int, optional): Row ids of each batch. Defaults to 10000.
+    Attributes:
+        database_path (str): Path of the SQLite database file.
+    Methods:
+        iter_asset_valuation_batches() -> Iterator[List[model.AssetValuation]]:
+            Reads the Asset Valuations of the table, one batch at a time.
+        find_natural_keys(asset_valuations: List[model.AssetValuation]) -> Set[model.NaturalKey]:
+            Looks up which Asset Valuations the table holds already.
+    """
+
+    def __init__(
+        self,
+        database_path: str,
+        table: str = "asset_valuations",
+        row_filter: Optional[ValuationFilter] = None,
+        with_provenance: bool = True,
+        streams: int = 4,
+        batch_rows: int = 10000,
+    ):
+        super().__init__(row_filter, with_provenance, streams, batch_rows)
+        self.database_path = database_path
+        self.table = table
+
+    def _query(self) -> Tuple[str, List[Any]]:
+        """
+        Builds the query projecting and filtering a range of row ids of the table, and
+        its parameters but the range.
+        """
+        conditions = ["rowid >= ? AND rowid < ?"]
+        parameters: List[Any] = []
+        if self.row_filter.start_date:
+            conditions.append("date >= ?")
+            parameters.append(self.row_filter.start_date.isoformat())
+        if self.row_filter.end_date:
+            conditions.append("date <= ?")
+            parameters.append(self.row_filter.end_date.isoformat())
+        if self.row_filter.product_names:
+            placeholders = ", ".join("?" * len(self.row_filter.product_names))
+            conditions.append(f"product_name IN ({placeholders})")
+            parameters.extend(self.row_filter.product_names)
+        query = (
+            f"SELECT {', '.join(self.columns)} FROM {self.table} "
+            f"WHERE {' AND '.join(conditions)} ORDER BY rowid"
+        )
+
+        return query, parameters
+
+    def iter_asset_valuation_batches(self) -> Iterator[List[model.AssetValuation]]:
+        """
+        Reads the table with parallel read streams, one range of row ids at a time, in
+        row id order. Batches may hold fewer rows than batch_rows, or none, where rows
+        were deleted or filtered out; empty batches are not yielded.
+
+        Returns:
+            Iterator[List[model.AssetValuation]]: Batches of up to batch_rows Asset Valuations.
+        """
+        with closing(sqlite3.connect(self.database_path)) as connection:
+            first_rowid, last_rowid = connection.execute(
+                f"SELECT MIN(rowid), MAX(rowid) FROM {self.table}"
+            ).fetchone()
+        if first_rowid is None:
+            return
+        query, parameters = self._query()
+
+        def read_range(start: int, size: int) -> List[model.AssetValuation]:
+            with closing(sqlite3.connect(self.database_path)) as connection:
+                rows = connection.execute(
+                    query, [start, start + size, *parameters]
+                ).fetchall()
+            asset_valuations = []
+            for row in rows:
+                values = [dt.date.fromisoformat(row[0]), row[1], row[2]]
+                if self.with_provenance:
+                    values += [row[3], dt.datetime.fromisoformat(row[4])]
+                asset_valuations.append(self._to_asset_valuation(*values))
+            return asset_valuations
+
+        for batch in _read_ranges_in_parallel(
+            read_range,
+            (
+                (start, self.batch_rows)
+                for start in range(first_rowid, last_rowid + 1, self.batch_rows)
+            ),
+            self.streams,
+        ):
+            if batch:
+                yield batch
+
+    def find_natural_keys(
+        self, asset_valuations: List[model.AssetValuation]
+    ) -> Set[model.NaturalKey]:
+        """
+        Looks up which Asset Valuations the table holds already, by natural key, joining
+        the table with up to MAX_KEYS_PER_SQLITE_LOOKUP keys at a time, through its
+        (date, product_name) index.
+
+        Args:
+            asset_valuations (List[model.AssetValuation]): Asset Valuations looked up.
+        Returns:
+            Set[model.NaturalKey]: Natural keys of those held by the table.
+        """
+        keys = list(
+            {
+                (
+                    asset_valuation.date.isoformat(),
+                    asset_valuation.value,
+                    asset_valuation.product_name,
+                )
+                for asset_valuation in asset_valuations
+            }
+        )
+        found: Set[model.NaturalKey] = set()
+        with closing(sqlite3.connect(self.database_path)) as connection:
+            for i in range(0, len(keys), MAX_KEYS_PER_SQLITE_LOOKUP):
+                lookup_keys = keys[i : i + MAX_KEYS_PER_SQLITE_LOOKUP]
+                values = ", ".join(["(?, ?, ?)"] * len(lookup_keys))
+                rows = connection.execute(
+                    f"WITH key (date, value, product_name) AS (VALUES {values}) "
+                    "SELECT DISTINCT held.date, held.value, held.product_name "
+                    f"FROM {self.table} AS held JOIN key "
+                    "ON held.date = key.date AND held.product_name = key.product_name "
+                    "AND held.value = key.value",
+                    [parameter for key in lookup_keys for parameter in key],
+                ).fetchall()
+                found.update(
+                    (dt.date.fromisoformat(date), value, product_name)
+                    for date, value, product_name in rows
+                )
 
-        return blob.open(encoding="utf-8")  # type: ignore
+        return found
@@ -0,0 +1,397 @@
+from contextlib import contextmanager
+from dataclasses import dataclass
+import fcntl
+import os
+import struct
+import threading
+import time
+from typing import IO, Iterator, List, Optional, Tuple
+import zlib
+
+from src.custom_errors import SpoolFlushLockedError, SpoolLockedError
+
+# each batch is framed by its payload size, rows and CRC32, so torn writes are detected
+FRAME_HEADER = struct.Struct(">III")
+OPEN_SUFFIX = ".open"
+SEALED_SUFFIX = ".seg"
+# held with an exclusive lock by the writer of a spool, for as long as it writes
+WRITER_LOCK_NAME = ".writer.lock"
+# held with an exclusive lock by the flusher of a spool, for as long as it flushes
+FLUSHER_LOCK_NAME = ".flusher.lock"
+
+
+@dataclass(frozen=True)
+class SpoolMetrics:
+    """
+    Depth and age of the batches waiting in a spool.
+
+    Attributes:
+        segments (int): Sealed segments waiting to be flushed.
+        rows (int): Rows of the sealed segments.
+        bytes (int): Size in bytes of the sealed segments.
+        oldest_age_seconds (float): Age of the oldest sealed segment, 0 if none.
+    """
+
+    segments: int
+    rows: int
+    bytes: int
+    oldest_age_seconds: float
+
+    def summary(self) -> str:
+        """
+        Describes the depth and age of the spool.
+
+        Returns:
+            str: segments, rows and bytes waiting, and the age of the oldest segment.
+        """
+        return (
+            f"{self.segments} segments waiting, {self.rows} rows, {self.bytes} bytes, "
+            f"oldest {self.oldest_age_seconds:.1f}s old"
+        )
+
+
+def _segment_created(segment_path: str) -> float:
+    """
+    Reads the creation time of a segment from its name, '<created ns>-<sequence>.<suffix>'.
+    """
+    return int(os.path.basename(segment_path).split("-", 1)[0]) / 1e9
+
+
+def read_frames(segment: IO[bytes]) -> Iterator[Tuple[int, bytes, int]]:
+    """
+    Reads the batches of a segment, stopping at the first incomplete or corrupt frame,
+    which only the last batch of a segment not sealed can be.
+
+    Args:
+        segment (IO[bytes]): Binary stream of the segment, at its start.
+    Returns:
+        Iterator[Tuple[int, bytes, int]]: rows and payload of each batch, and the offset
+                                          right after it.
+    """
+    offset = 0
+    while True:
+        header = segment.read(FRAME_HEADER.size)
+        if len(header) < FRAME_HEADER.size:
+            return
+        size, rows, crc = FRAME_HEADER.unpack(header)
+        payload = segment.read(size)
+        if len(payload) < size or zlib.crc32(payload) != crc:
+            return
+        offset += FRAME_HEADER.size + size
+        yield rows, payload, offset
+
+
+class Spool:
+    """
+    Durable on-disk queue of serialised batches, in a directory of append-only segment
+    files. Batches are appended to the open segment, each framed by its size, rows and
+    CRC32 and flushed to disk before append_batch returns, so an appended batch survives
+    a crash. The open segment is sealed, i.e. renamed from '.open' to '.seg', once it
+    exceeds segment_max_bytes or segment_max_seconds, or when the spool is closed. Only
+    sealed segments are read by flushers, oldest first, and removed once loaded.
+    A spool directory has a single writer: the first append takes an exclusive lock of
+    the directory, held until the spool is closed, and a second writer fails with
+    SpoolLockedError instead of sealing segments still being written. Segments left open
+    by a writer that crashed, and so released the lock, are recovered by the next writer
+    once it holds the lock: any torn batch at their end is cut off and they are sealed.
+    Likewise, a spool has a single flusher, holding the flusher lock while it loads and
+    removes segments, so that two flushers never load the same segment.
+
+    Args:
+        spool_dir (str): Directory of the segment files, created if needed.
+        segment_max_bytes (int, optional): Size at which the open segment is sealed.
+                                           Defaults to 64 MiB.
+        segment_max_seconds (float, optional): Age at which the open segment is sealed,
+                                               on the next append. Defaults to 60.
+        fsync (bool, optional): Whether appended batches are flushed to disk, not only to
+                                the OS. Defaults to True.
+    Attributes:
+        spool_dir (str): Directory of the segment files.
+        segment_max_bytes (int): Size at which the open segment is sealed.
+        segment_max_seconds (float): Age at which the open segment is sealed.
+    Methods:
+        recover() -> int:
+            Seals the segments left open by a writer that crashed.
+        append_batch(payload: bytes, rows: int):
+            Appends a batch to the open segment, durably.
+        seal():
+            Seals the open segment, if any.
+        sealed_segments() -> List[str]:
+            Paths of the sealed segments, oldest first.
+        read_segment(segment_path: str) -> Iterator[Tuple[int, bytes]]:
+            Reads the rows and payload of each batch of a segment.
+        segment_rows(segment_path: str) -> int:
+            Rows of a segment, read from its frame headers.
+        lock_flusher():
+            Context manager holding the flusher lock.
+        remove_segment(segment_path: str):
+            Removes a segment once loaded.
+        metrics() -> SpoolMetrics:
+            Depth and age of the sealed segments.
+        close():
+            Seals the open segment and releases the writer lock.
+    """
+
+    def __init__(
+        self,
+        spool_dir: str,
+        segment_max_bytes: int = 64 * 1024 * 1024,
+        segment_max_seconds: float = 60.0,
+        fsync: bool = True,
+    ):
+        self.spool_dir = spool_dir
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_seconds = segment_max_seconds
+        self.fsync = fsync
+        self._segment: Optional[IO[bytes]] = None
+        self._segment_path: Optional[str] = None
+        self._segment_bytes = 0
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._writer_lock: Optional[IO[bytes]] = None
+        os.makedirs(spool_dir, exist_ok=True)
+
+    def __enter__(self) -> "Spool":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _lock_writer(self) -> bool:
+        """
+        Takes the exclusive writer lock of the spool directory, if not held yet.
+
+        Returns:
+            bool: True if the lock was taken by this call.
+        Raises:
+            SpoolLockedError: Raised if another process holds the lock.
+        """
+        if self._writer_lock is not None:
+            return False
+        writer_lock = open(os.path.join(self.spool_dir, WRITER_LOCK_NAME), "ab")
+        try:
+            fcntl.flock(writer_lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            writer_lock.close()
+            raise SpoolLockedError(self.spool_dir)
+        self._writer_lock = writer_lock
+
+        return True
+
+    def _unlock_writer(self):
+        """
+        Releases the writer lock of the spool directory, if held.
+        """
+        if self._writer_lock is not None:
+            self._writer_lock.close()
+            self._writer_lock = None
+
+    def recover(self) -> int:
+        """
+        Seals the segments left open by a writer that crashed, cutting off any torn batch
+        at their end. The writer lock is taken for the time of the recovery, unless held
+        already, so segments of a writer still running are never touched.
+
+        Returns:
+            int: Number of segments recovered.
+        Raises:
+            SpoolLockedError: Raised if another process writes into the spool.
+        """
+        with self._lock:
+            locked = self._lock_writer()
+            try:
+                return self._recover()
+            finally:
+                if locked:
+                    self._unlock_writer()
+
+    def _recover(self) -> int:
+        """
+        Seals the segments left open, other than the open segment. Must be called
+        holding the writer lock.
+        """
+        recovered = 0
+        for name in sorted(os.listdir(self.spool_dir)):
+            path = os.path.join(self.spool_dir, name)
+            if not name.endswith(OPEN_SUFFIX) or path == self._segment_path:
+                continue
+            with open(path, "r+b") as segment:
+                valid_bytes = 0
+                for _, _, valid_bytes in read_frames(segment):
+                    pass
+                segment.truncate(valid_bytes)
+            if valid_bytes:
+                os.replace(path, path[: -len(OPEN_SUFFIX)] + SEALED_SUFFIX)
+            else:
+                os.remove(path)
+            recovered += 1
+
+        return recovered
+
+    def append_batch(self, payload: bytes, rows: int):
+        """
+        Appends a batch to the open segment, opening one if needed, and flushes it to
+        disk. The open segment is sealed first if it is full or too old.
+
+        Args:
+            payload (bytes): The serialised batch.
+            rows (int): Number of rows of the batch.
+        """
+        if not payload:
+            return
+
+        with self._lock:
+            if self._writer_lock is None:
+                self._lock_writer()
+                self._recover()
+            if self._segment is not None and (
+                self._segment_bytes >= self.segment_max_bytes
+                or time.time() - _segment_created(str(self._segment_path))
+                >= self.segment_max_seconds
+            ):
+                self._seal()
+            if self._segment is None:
+                self._open_segment()
+            assert self._segment is not None
+
+            self._segment.write(
+                FRAME_HEADER.pack(len(payload), rows, zlib.crc32(payload)) + payload
+            )
+            self._segment.flush()
+            if self.fsync:
+                os.fsync(self._segment.fileno())
+            self._segment_bytes += FRAME_HEADER.size + len(payload)
+            if self._segment_bytes >= self.segment_max_bytes:
+                self._seal()
+
+    def _open_segment(self):
+        """
+        Opens a new segment, named after its creation time so names sort by age.
+        """
+        self._sequence += 1
+        name = f"{time.time_ns():020d}-{os.getpid()}-{self._sequence:06d}"
+        self._segment_path = os.path.join(self.spool_dir, name + OPEN_SUFFIX)
+        self._segment = open(self._segment_path, "xb")
+        self._segment_bytes = 0
+
+    def _seal(self):
+        """
+        Closes the open segment and renames it as sealed, so that flushers read it.
+        """
+        if self._segment is None or self._segment_path is None:
+            return
+
+        self._segment.close()
+        os.replace(
+            self._segment_path,
+            self._segment_path[: -len(OPEN_SUFFIX)] + SEALED_SUFFIX,
+        )
+        self._segment = None
+        self._segment_path = None
+
+    def seal(self):
+        """
+        Seals the open segment, if any, so that flushers read it.
+        """
+        with self._lock:
+            self._seal()
+
+    def close(self):
+        """
+        Seals the open segment and releases the writer lock, so that another process can
+        write into the spool.
+        """
+        with self._lock:
+            self._seal()
+            self._unlock_writer()
+
+    def sealed_segments(self) -> List[str]:
+        """
+        Paths of the sealed segments, oldest first.
+
+        Returns:
+            List[str]: Paths of the segments.
+        """
+        return [
+            os.path.join(self.spool_dir, name)
+            for name in sorted(os.listdir(self.spool_dir))
+            if name.endswith(SEALED_SUFFIX)
+        ]
+
+    def read_segment(self, segment_path: str) -> Iterator[Tuple[int, bytes]]:
+        """
+        Reads the rows and payload of each batch of a segment.
+
+        Args:
+            segment_path (str): Path of the segment.
+        Returns:
+            Iterator[Tuple[int, bytes]]: rows and payload of each batch.
+        """
+        with open(segment_path, "rb") as segment:
+            for rows, payload, _ in read_frames(segment):
+                yield rows, payload
+
+    def segment_rows(self, segment_path: str) -> int:
+        """
+        Rows of a segment, read from its frame headers, so batch payloads are not read.
+
+        Args:
+            segment_path (str): Path of the segment.
+        Returns:
+            int: Rows of all batches of the segment.
+        """
+        rows = 0
+        with open(segment_path, "rb") as segment:
+            while True:
+                header = segment.read(FRAME_HEADER.size)
+                if len(header) < FRAME_HEADER.size:
+                    return rows
+                size, batch_rows, _ = FRAME_HEADER.unpack(header)
+                rows += batch_rows
+                segment.seek(size, os.SEEK_CUR)
+
+    @contextmanager
+    def lock_flusher(self) -> Iterator[None]:
+        """
+        Holds the exclusive flusher lock of the spool directory while the block runs.
+
+        Raises:
+            SpoolFlushLockedError: Raised if another process flushes the spool.
+        """
+        flusher_lock = open(os.path.join(self.spool_dir, FLUSHER_LOCK_NAME), "ab")
+        try:
+            try:
+                fcntl.flock(flusher_lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise SpoolFlushLockedError(self.spool_dir)
+            yield
+        finally:
+            flusher_lock.close()
+
+    def remove_segment(self, segment_path: str):
+        """
+        Removes a segment once loaded.
+
+        Args:
+            segment_path (str): Path of the segment.
+        """
+        os.remove(segment_path)
+
+    def metrics(self) -> SpoolMetrics:
+        """
+        Depth and age of the sealed segments. Rows are read from the frame headers, so
+        batch payloads are not read.
+
+        Returns:
+            SpoolMetrics: Segments, rows and bytes waiting, and age of the oldest segment.
+        """
+        segments = self.sealed_segments()
+        rows, n_bytes = 0, 0
+        for segment_path in segments:
+            rows += self.segment_rows(segment_path)
+            n_bytes += os.path.getsize(segment_path)
+        oldest_age_seconds = (
+            time.time() - _segment_created(segments[0]) if segments else 0.0
+        )
+
+        return SpoolMetrics(len(segments), rows, n_bytes, max(0.0, oldest_age_seconds))
@@ -0,0 +1,283 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import datetime as dt
+import queue
+import threading
+from typing import Any, Iterator, List, Optional, Sequence, Union
+from google.cloud.storage import Bucket
+
+from src.utils.scheduling import ScheduledFile
+
+SUPPORTED_FILE_TYPES = ("hl", "generic")
+FIRST_VALUATION_YEAR = 2000
+# only blob names are needed, so the rest of the metadata is not fetched
+LISTING_FIELDS = "items(name),nextPageToken"
+# but for scheduling, which needs their size and update time too
+SCHEDULING_LISTING_FIELDS = "items(name,size,updated),nextPageToken"
+
+
+@dataclass(frozen=True)
+class ListingShard:
+    """
+    A contiguous range of the keyspace of a bucket, listed by a single request stream.
+    Names in the range start with prefix and lie within [start_offset, end_offset).
+
+    Attributes:
+        prefix (str): Prefix shared by all names of the range.
+        start_offset (str, optional): Inclusive lower bound of the range, if any.
+        end_offset (str, optional): Exclusive upper bound of the range, if any.
+    """
+
+    prefix: str
+    start_offset: Optional[str] = None
+    end_offset: Optional[str] = None
+
+
+def _file_type_prefix(prefix: str, file_type: str) -> Optional[str]:
+    """
+    Narrows a listing prefix down to the blobs of a file type, that is to the blobs whose
+    name, without folders, starts with '<file_type>_'.
+
+    Args:
+        prefix (str): The listing prefix, possibly including folders.
+        file_type (str): The file type, e.g. 'hl'.
+    Returns:
+        str, optional: Prefix of the blobs of the file type, or None if the listing
+                       prefix cannot match any of them.
+    """
+    folder, _, name_prefix = prefix.rpartition("/")
+    folder = folder + "/" if folder else ""
+    type_prefix = f"{file_type}_"
+    if name_prefix.lower().startswith(type_prefix):
+        return prefix
+    if type_prefix.startswith(name_prefix.lower()):
+        return folder + type_prefix
+
+    return None
+
+
+def _other_ranges(prefix: str, type_prefixes: List[str]) -> List[ListingShard]:
+    """
+    Splits the names under a prefix that do not start with any of the type prefixes into
+    contiguous ranges, i.e. the gaps between the ranges of the file types.
+
+    Args:
+        prefix (str): The listing prefix.
+        type_prefixes (List[str]): Prefixes of the file types, each starting with prefix.
+    Returns:
+        List[ListingShard]: The ranges, in lexicographic order.
+    """
+    if prefix in type_prefixes:
+        return []
+    bounds: List[Optional[str]] = [None]
+    for type_prefix in sorted(type_prefixes):
+        # names starting with type_prefix are those in [type_prefix, its successor)
+        bounds.extend([type_prefix, type_prefix[:-1] + chr(ord(type_prefix[-1]) + 1)])
+    bounds.append(None)
+
+    return [
+        ListingShard(prefix, start, end)
+        for start, end in zip(bounds[::2], bounds[1::2])
+        if start is None or end is None or start < end
+    ]
+
+
+def listing_shards(
+    prefix: str = "",
+    file_types: Sequence[str] = SUPPORTED_FILE_TYPES,
+    first_year: int = FIRST_VALUATION_YEAR,
+    last_year: Optional[int] = None,
+) -> List[ListingShard]:
+    """
+    Splits the keyspace of the supported files under a prefix into ranges that can be
+    listed concurrently. Files are named '<file_type>_YYYY_MM_DD', so the keyspace of each
+    file type is split by year: one range per year between first_year and last_year, plus
+    one for any name sorting before first_year and one for any sorting after last_year.
+    Any other name under the prefix, e.g. of a file in a folder or named in upper case, is
+    part of one of the catch-all ranges between those of the file types, so that every
+    blob under the prefix falls in exactly one range.
+
+    Args:
+        prefix (str): Only blobs whose name starts with prefix are listed.
+        file_types (Sequence[str]): File types to list.
+        first_year (int): First year given its own range.
+        last_year (int, optional): Last year given its own range. Defaults to this year.
+    Returns:
+        List[ListingShard]: The ranges of each file type, then the catch-all ranges.
+    """
+    last_year = last_year if last_year else dt.date.today().year
+    shards: List[ListingShard] = []
+    type_prefixes: List[str] = []
+    for file_type in file_types:
+        type_prefix = _file_type_prefix(prefix, file_type)
+        if type_prefix is None:
+            continue
+        type_prefixes.append(type_prefix)
+
+        folder = type_prefix[: type_prefix.rfind("/") + 1]
+        boundaries = [
+            boundary
+            for boundary in (
+                f"{folder}{file_type}_{year}"
+                for year in range(first_year, last_year + 1)
+            )
+            if boundary.startswith(type_prefix) and boundary != type_prefix
+        ]
+        bounds: List[Optional[str]] = [None, *boundaries, None]
+        shards.extend(
+            ListingShard(type_prefix, start, end)
+            for start, end in zip(bounds[:-1], bounds[1:])
+        )
+
+    return shards + _other_ranges(prefix, type_prefixes)
+
+
+class ParallelBucketLister:
+    """
+    Lists the names of the supported files of a GCP bucket by listing several ranges of
+    its keyspace concurrently, see listing_shards(). Names are streamed to the caller as
+    pages of results arrive, so that processing can start before the listing ends.
+    The file type of a blob is that of its name without folders, in any case, as for
+    FileSourceAbstract. Blobs of other files, only listed by the catch-all ranges, are
+    skipped and counted. Only blob names are requested.
+
+    Args:
+        bucket (Bucket): The GCP bucket to list.
+        prefix (str): Only blobs whose name starts with prefix are listed.
+        file_types (Sequence[str]): File types to list.
+        workers (int): Number of ranges listed concurrently.
+        max_queued_pages (int): Pages of names held before listing waits for the caller.
+    Attributes:
+        bucket (Bucket): The GCP bucket to list.
+        file_types (Sequence[str]): File types listed.
+        shards (List[ListingShard]): Ranges of the keyspace listed.
+        workers (int): Number of ranges listed concurrently.
+        skipped_blobs (int): Blobs listed that are not of a supported file type.
+    Methods:
+        iter_blob_names() -> Iterator[str]:
+            Yields the names of the supported files as they are listed.
+        iter_files() -> Iterator[ScheduledFile]:
+            Yields the supported files, with their size and update time, as they are listed.
+    """
+
+    def __init__(
+        self,
+        bucket: Bucket,
+        prefix: str = "",
+        file_types: Sequence[str] = SUPPORTED_FILE_TYPES,
+        workers: int = 8,
+        max_queued_pages: int = 64,
+    ):
+        self.bucket = bucket
+        self.file_types = file_types
+        self.shards = listing_shards(prefix, file_types)
+        self.skipped_blobs = 0
+        self.workers = workers
+        self.max_queued_pages = max_queued_pages
+
+    def _list_shard(
+        self,
+        shard: ListingShard,
+        pages: "queue.Queue[Union[List[Any], BaseException, None]]",
+        stop: threading.Event,
+        fields: str,
+    ):
+        """
+        Lists a range of the keyspace, page by page, into the queue of pages. A None
+        is queued once the range is fully listed, or the error if listing fails.
+
+        Args:
+            shard (ListingShard): The range to list.
+            pages (queue.Queue): Queue the blobs are sent through.
+            stop (threading.Event): Set when the caller stops consuming blobs.
+            fields (str): Fields of the blobs fetched.
+        """
+        try:
+            blobs = self.bucket.list_blobs(
+                prefix=shard.prefix,
+                start_offset=shard.start_offset,
+                end_offset=shard.end_offset,
+                fields=fields,
+            )
+            for page in blobs.pages:
+                if stop.is_set():
+                    return
+                pages.put(list(page))
+            pages.put(None)
+        except BaseException as e:
+            pages.put(e)
+
+    def iter_blob_names(self) -> Iterator[str]:
+        """
+        Yields the names of the supported files as they are listed. Names of different
+        ranges are interleaved, so they are not yielded in lexicographic order.
+
+        Returns:
+            Iterator[str]: Names of the blobs.
+        Raises:
+            Exception: The first error raised while listing a range.
+        """
+        for blob in self._iter_blobs(LISTING_FIELDS):
+            yield blob.name
+
+    def iter_files(self) -> Iterator[ScheduledFile]:
+        """
+        Yields the supported files as they are listed, with the size and update time
+        they are scheduled by, see scheduling.order_files(). As for iter_blob_names(),
+        files of different ranges are interleaved.
+
+        Returns:
+            Iterator[ScheduledFile]: The files.
+        Raises:
+            Exception: The first error raised while listing a range.
+        """
+        for blob in self._iter_blobs(SCHEDULING_LISTING_FIELDS):
+            yield ScheduledFile(blob.name, int(blob.size or 0), blob.updated)
+
+    def _is_supported(self, blob_name: str) -> bool:
+        file_type = blob_name.split("/")[-1].split("_")[0].lower()
+
+        return file_type in self.file_types
+
+    def _iter_blobs(self, fields: str) -> Iterator[Any]:
+        """
+        Yields the blobs of the supported files as they are listed, with the given
+        fields only, counting the others in skipped_blobs.
+
+        Args:
+            fields (str): Fields of the blobs fetched.
+        Returns:
+            Iterator[Blob]: The blobs.
+        Raises:
+            Exception: The first error raised while listing a range.
+        """
+        pages: "queue.Queue[Union[List[Any], BaseException, None]]" = queue.Queue(
+            maxsize=self.max_queued_pages
+        )
+        stop = threading.Event()
+        executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="bucket-lister"
+        )
+        for shard in self.shards:
+            executor.submit(self._list_shard, shard, pages, stop, fields)
+
+        try:
+            pending = len(self.shards)
+            while pending:
+                page = pages.get()
+                if page is None:
+                    pending -= 1
+                elif isinstance(page, BaseException):
+                    raise page
+                else:
+                    for blob in page:
+                        if self._is_supported(blob.name):
+                            yield blob
+                        else:
+                            self.skipped_blobs += 1
+        finally:
+            stop.set()
+            # unblock listing threads waiting on a full queue
+            while not pages.empty():
+                pages.get_nowait()
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,367 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import stat
+import struct
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+# inotify flags, see inotify(7)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")
+# names of files still being written or downloaded by common tools
+PARTIAL_FILE_SUFFIXES = (".tmp", ".part", ".partial", ".crdownload", ".swp")
+
+
+def is_partial_file(file_name: str) -> bool:
+    """
+    Whether a file name is that of a hidden file or of one still being written by a
+    tool that renames it once complete, e.g. 'hl_2024_01_01.csv.part'.
+
+    Args:
+        file_name (str): Name of the file, without folders.
+    Returns:
+        bool: True if the file must be ignored.
+    """
+    return file_name.startswith(".") or file_name.lower().endswith(
+        PARTIAL_FILE_SUFFIXES
+    )
+
+
+class PollingWatcher:
+    """
+    Watches a directory by listing it every interval seconds, comparing the size and
+    modification time of its files with the previous listing. Used where file
+    notifications are not available.
+
+    Args:
+        directory (str): The directory to watch.
+        interval (float, optional): Seconds between listings. Defaults to 1.
+    Methods:
+        changes(timeout: float) -> Set[str]:
+            Names of the files created or modified since the last call.
+        close():
+            Releases the watcher.
+    """
+
+    def __init__(self, directory: str, interval: float = 1.0):
+        self.directory = directory
+        self.interval = interval
+        self._snapshot: Dict[str, Tuple[int, int]] = {}
+        self._next_listing = 0.0
+
+    def _list(self) -> Dict[str, Tuple[int, int]]:
+        with os.scandir(self.directory) as entries:
+            return {
+                entry.name: (entry.stat().st_size, entry.stat().st_mtime_ns)
+                for entry in entries
+                if entry.is_file()
+            }
+
+    def changes(self, timeout: float) -> Set[str]:
+        """
+        Names of the files created or modified since the last call, waiting up to timeout
+        seconds for the next listing.
+
+        Args:
+            timeout (float): Maximum seconds to wait.
+        Returns:
+            Set[str]: Names of the files, without folders.
+        """
+        wait_seconds = self._next_listing - time.monotonic()
+        if wait_seconds > timeout:
+            time.sleep(timeout)
+            return set()
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+
+        self._next_listing = time.monotonic() + self.interval
+        snapshot = self._list()
+        changed = {
+            name for name, stat in snapshot.items() if self._snapshot.get(name) != stat
+        }
+        self._snapshot = snapshot
+
+        return changed
+
+    def close(self):
+        """
+        Releases the watcher.
+        """
+
+
+class InotifyWatcher:
+    """
+    Watches a directory through Linux inotify file notifications, so that new and
+    modified files are known as soon as they are written, without listing the directory.
+    Only files directly within the directory are watched.
+
+    Args:
+        directory (str): The directory to watch.
+    Raises:
+        OSError: Raised if inotify is not available, e.g. not on Linux.
+    Methods:
+        changes(timeout: float) -> Set[str]:
+            Names of the files created or modified since the last call.
+        close():
+            Releases the inotify file descriptor.
+    """
+
+    def __init__(self, directory: str):
+        library = ctypes.util.find_library("c")
+        libc = ctypes.CDLL(library, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+
+        self.directory = directory
+        self.overflowed = False
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_CREATE | IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO
+        if libc.inotify_add_watch(self._fd, os.fsencode(directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f"cannot watch '{directory}'")
+
+    def changes(self, timeout: float) -> Set[str]:
+        """
+        Names of the files created or modified since the last call, waiting up to timeout
+        seconds for the first notification. If the kernel queue overflowed, overflowed
+        is set, as notifications were lost.
+
+        Args:
+            timeout (float): Maximum seconds to wait.
+        Returns:
+            Set[str]: Names of the files, without folders.
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        changed: Set[str] = set()
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size
+                name = data[offset : offset + length].rstrip(b"\0")
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    self.overflowed = True
+                elif name:
+                    changed.add(os.fsdecode(name))
+
+        return changed
+
+    def close(self):
+        """
+        Releases the inotify file descriptor.
+        """
+        os.close(self._fd)
+
+
+def create_watcher(directory: str, poll_interval: Optional[float] = None):
+    """
+    Creates the watcher of a directory: file notifications where available, else, or if
+    a poll interval is given, polling.
+
+    Args:
+        directory (str): The directory to watch.
+        poll_interval (float, optional): If given, the directory is polled at this interval.
+    Returns:
+        InotifyWatcher | PollingWatcher: The watcher.
+    """
+    if poll_interval is None:
+        try:
+            return InotifyWatcher(directory)
+        except OSError:
+            pass
+
+    return PollingWatcher(directory, poll_interval or 1.0)
+
+
+class FileSettler:
+    """
+    Debounces the files of a watched directory: a file is settled, i.e. taken as fully
+    written, once it has not changed for settle_seconds and its size is the same as when
+    last seen. Each file is settled once, until it changes again. Hidden and partial
+    files, see is_partial_file(), are ignored.
+
+    Args:
+        directory (str): The watched directory.
+        settle_seconds (float, optional): Seconds a file must stay unchanged. Defaults to 2.
+    Methods:
+        touch(names: Set[str]):
+            Records that files were created or modified.
+        settled() -> List[str]:
+            Paths of the files settled since the last call.
+        retry(names: Set[str], delay_seconds: float):
+            Settles files again after a delay, e.g. once their load failed.
+        next_deadline() -> Optional[float]:
+            Seconds until a pending file may settle, if any.
+    """
+
+    def __init__(self, directory: str, settle_seconds: float = 2.0):
+        self.directory = directory
+        self.settle_seconds = settle_seconds
+        # (last change, size when last seen) of each file not settled yet
+        self._pending: Dict[str, Tuple[float, int]] = {}
+
+    def _size(self, name: str) -> Optional[int]:
+        try:
+            file_stat = os.stat(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            return None
+
+        return file_stat.st_size if stat.S_ISREG(file_stat.st_mode) else None
+
+    def touch(self, names: Set[str]):
+        """
+        Records that files were created or modified, restarting their debounce.
+
+        Args:
+            names (Set[str]): Names of the files, without folders.
+        """
+        now = time.monotonic()
+        for name in names:
+            if is_partial_file(name):
+                continue
+            size = self._size(name)
+            if size is not None:
+                self._pending[name] = (now, size)
+
+    def settled(self) -> List[str]:
+        """
+        Paths of the files settled since the last call, in order of last change. Files
+        that changed size without a notification, or were removed, are debounced again
+        or dropped.
+
+        Returns:
+            List[str]: Paths of the settled files.
+        """
+        now = time.monotonic()
+        settled: List[Tuple[float, str]] = []
+        for name, (changed_at, size) in list(self._pending.items()):
+            if now - changed_at < self.settle_seconds:
+                continue
+            current_size = self._size(name)
+            if current_size is None:
+                del self._pending[name]
+            elif current_size != size:
+                self._pending[name] = (now, current_size)
+            else:
+                del self._pending[name]
+                settled.append((changed_at, os.path.join(self.directory, name)))
+
+        return [path for _, path in sorted(settled)]
+
+    def retry(self, names: Set[str], delay_seconds: float):
+        """
+        Settles files again after delay_seconds, e.g. once their load failed, unless they
+        change or are removed meanwhile. Files changed since are left to settle as usual.
+
+        Args:
+            names (Set[str]): Names of the files, without folders.
+            delay_seconds (float): Seconds before the files settle again.
+        """
+        changed_at = time.monotonic() + delay_seconds - self.settle_seconds
+        for name in names:
+            size = self._size(name)
+            if size is not None and name not in self._pending:
+                self._pending[name] = (changed_at, size)
+
+    def next_deadline(self) -> Optional[float]:
+        """
+        Seconds until a pending file may settle, if any.
+
+        Returns:
+            float, optional: Seconds to wait, 0 if a file may settle now.
+        """
+        if not self._pending:
+            return None
+
+        oldest_change = min(changed_at for changed_at, _ in self._pending.values())
+
+        return max(0.0, oldest_change + self.settle_seconds - time.monotonic())
+
+
+class MicroBatcher:
+    """
+    Groups settled files into micro-batches: a batch is due once it holds max_files
+    files, or once its first file has waited max_seconds, which bounds the latency
+    added by batching while loading bursts of files together.
+
+    Args:
+        max_files (int, optional): Files at which a batch is due. Defaults to 50.
+        max_seconds (float, optional): Wait of the first file at which a batch is due.
+                                       Defaults to 5.
+    Methods:
+        add(paths: List[str]):
+            Adds files to the current batch.
+        take(force: bool = False) -> List[str]:
+            Takes the current batch if due, or if forced.
+        next_deadline() -> Optional[float]:
+            Seconds until the current batch is due, if any.
+    """
+
+    def __init__(self, max_files: int = 50, max_seconds: float = 5.0):
+        self.max_files = max_files
+        self.max_seconds = max_seconds
+        self._paths: List[str] = []
+        self._started: Optional[float] = None
+
+    def add(self, paths: List[str]):
+        """
+        Adds files to the current batch, once each.
+
+        Args:
+            paths (List[str]): Paths of the files.
+        """
+        for path in paths:
+            if path not in self._paths:
+                self._paths.append(path)
+        if self._paths and self._started is None:
+            self._started = time.monotonic()
+
+    def take(self, force: bool = False) -> List[str]:
+        """
+        Takes the current batch if it is due, or if forced and not empty.
+
+        Args:
+            force (bool, optional): Whether to take the batch even if not due.
+                                    Defaults to False.
+        Returns:
+            List[str]: Paths of the files of the batch, empty if none is taken.
+        """
+        if not self._paths or not (force or self.next_deadline() == 0):
+            return []
+
+        paths, self._paths, self._started = self._paths, [], None
+
+        return paths
+
+    def next_deadline(self) -> Optional[float]:
+        """
+        Seconds until the current batch is due, if any.
+
+        Returns:
+            float, optional: Seconds to wait, 0 if the batch is due now.
+        """
+        if self._started is None:
+            return None
+        if len(self._paths) >= self.max_files:
+            return 0.0
+
+        return max(0.0, self._started + self.max_seconds - time.monotonic())
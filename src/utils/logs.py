@@ -1,19 +1,232 @@
-from logging import INFO, Logger, StreamHandler, getLogger
-
-
-def default_module_logger(src_file_name: str) -> Logger:
-    """
-    Gets or creates a module logger.
-
-    Args:
-        src_file_name (str): The name of the source file/module using the logger.
-    Returns:
-        Logger: default module logger.
-    """
-    logger = getLogger(src_file_name)
-    if len(logger.handlers) == 0:
-        handler = StreamHandler()
-        logger.addHandler(handler)
-    logger.setLevel(INFO)
-
-    return logger
+import atexit
+from contextlib import contextmanager
+import datetime as dt
+import json
+import os
+import queue
+import threading
+import time
+from logging import (
+    INFO,
+    WARNING,
+    ERROR,
+    Filter,
+    Formatter,
+    Logger,
+    LogRecord,
+    StreamHandler,
+    getLogger,
+)
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Iterator, Optional, Tuple
+
+WARNING_RATE_LIMIT = 10
+WARNING_RATE_INTERVAL_SECONDS = 60.0
+STRUCTURED_FIELDS = ("file_name", "stage", "duration")
+# `extra` of the logging calls whose warnings are rate limited per call site, e.g. one
+# warning per row of a file: other warnings are never dropped
+RATE_LIMITED = {"rate_limited": True}
+FLUSH_TIMEOUT_SECONDS = 5.0
+
+_listener_lock = threading.Lock()
+_listener: Optional[QueueListener] = None
+_listener_pid: Optional[int] = None
+
+
+class JsonFormatter(Formatter):
+    """
+    Formats log records as one JSON object per line, with the keys Cloud Logging reads
+    from stdout/stderr: severity, message and time. The structured fields file_name, stage
+    and duration are included when given through `extra`, as well as the number of similar
+    records suppressed by a RateLimitFilter.
+    """
+
+    def format(self, record: LogRecord) -> str:
+        entry = {
+            "severity": record.levelname,
+            "time": dt.datetime.fromtimestamp(
+                record.created, dt.timezone.utc
+            ).isoformat(),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS + ("suppressed",):
+            if hasattr(record, field):
+                entry[field] = getattr(record, field)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(Filter):
+    """
+    Lets through at most `limit` records per interval from each logging call site, for
+    records below ERROR level logged with `extra=RATE_LIMITED`, so that a warning raised
+    for every row of a file cannot flood the logs. Other records always pass. The first
+    record let through after some were dropped carries the number of records suppressed.
+
+    Args:
+        limit (int): Maximum number of records per call site and interval.
+        interval_seconds (float): Length of the interval.
+    """
+
+    def __init__(
+        self,
+        limit: int = WARNING_RATE_LIMIT,
+        interval_seconds: float = WARNING_RATE_INTERVAL_SECONDS,
+    ):
+        super().__init__()
+        self.limit = limit
+        self.interval_seconds = interval_seconds
+        self._lock = threading.Lock()
+        # call site -> (interval start, records let through, records suppressed)
+        self._windows: Dict[Tuple[str, int], Tuple[float, int, int]] = {}
+
+    def filter(self, record: LogRecord) -> bool:
+        if (
+            not getattr(record, "rate_limited", False)
+            or record.levelno < WARNING
+            or record.levelno >= ERROR
+        ):
+            return True
+
+        call_site = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            start, passed, suppressed = self._windows.get(call_site, (now, 0, 0))
+            if now - start >= self.interval_seconds:
+                start, passed = now, 0
+            if passed >= self.limit:
+                self._windows[call_site] = (start, passed, suppressed + 1)
+                return False
+            self._windows[call_site] = (start, passed + 1, 0)
+        if suppressed:
+            record.suppressed = suppressed
+
+        return True
+
+
+class _ProcessQueueHandler(QueueHandler):
+    """
+    QueueHandler that puts records on the queue of the listener of the current process.
+    A process forked by a process pool inherits the handler but not the listener thread,
+    so a new queue and listener are started on its first record.
+    """
+
+    def __init__(self):
+        super().__init__(queue.SimpleQueue())
+
+    def prepare(self, record: LogRecord) -> LogRecord:
+        # the listener runs in the same process, so records need neither copying nor
+        # pickling: only arguments, which the caller may still mutate, are merged now
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+
+        return record
+
+    def enqueue(self, record: LogRecord):
+        _start_listener().queue.put_nowait(record)
+
+
+class _FlushableQueueListener(QueueListener):
+    """
+    QueueListener that sets the threading.Event found on its queue once every record
+    queued before it is written, see flush_logs().
+    """
+
+    def handle(self, record: LogRecord):
+        if isinstance(record, threading.Event):
+            record.set()
+            return
+        super().handle(record)
+
+
+def _start_listener() -> QueueListener:
+    """
+    Starts, once per process, the thread writing queued records as JSON into stderr.
+
+    Returns:
+        QueueListener: The listener of the current process.
+    """
+    global _listener, _listener_pid
+    if _listener is not None and _listener_pid == os.getpid():
+        return _listener
+
+    with _listener_lock:
+        if _listener is None or _listener_pid != os.getpid():
+            handler = StreamHandler()
+            handler.setFormatter(JsonFormatter())
+            _listener = _FlushableQueueListener(queue.SimpleQueue(), handler)
+            _listener.start()
+            _listener_pid = os.getpid()
+            atexit.register(_listener.stop)
+
+    return _listener
+
+
+def flush_logs(timeout_seconds: float = FLUSH_TIMEOUT_SECONDS):
+    """
+    Waits for the listener of the current process to write the records queued so far,
+    e.g. before a Cloud Function returns, after which its instance may be throttled or
+    stopped without running exit handlers.
+
+    Args:
+        timeout_seconds (float, optional): Longest wait. Defaults to 5.
+    """
+    listener = _listener
+    if listener is None or _listener_pid != os.getpid():
+        return
+
+    flushed = threading.Event()
+    listener.queue.put_nowait(flushed)  # type: ignore
+    flushed.wait(timeout_seconds)
+
+
+def default_module_logger(src_file_name: str) -> Logger:
+    """
+    Gets or creates a module logger. Records are not written by the thread logging them:
+    they are put on a queue and written as JSON lines into stderr by a listener thread,
+    one per process, see flush_logs(). Warnings logged with `extra=RATE_LIMITED` are
+    rate limited per call site.
+
+    Args:
+        src_file_name (str): The name of the source file/module using the logger.
+    Returns:
+        Logger: default module logger.
+    """
+    logger = getLogger(src_file_name)
+    if len(logger.handlers) == 0:
+        handler = _ProcessQueueHandler()
+        handler.addFilter(RateLimitFilter())
+        logger.addHandler(handler)
+    logger.setLevel(INFO)
+
+    return logger
+
+
+@contextmanager
+def log_stage(logger: Logger, stage: str, file_name: str) -> Iterator[None]:
+    """
+    Logs how long a stage of the processing of a file took, with the structured fields
+    file_name, stage and duration, whether the stage succeeds or fails.
+
+    Args:
+        logger (Logger): The logger to log into.
+        stage (str): Name of the stage, e.g. 'load'.
+        file_name (str): The file being processed.
+    """
+    start = time.perf_counter()
+    outcome = "failed"
+    try:
+        yield
+        outcome = "finished"
+    finally:
+        duration = round(time.perf_counter() - start, 6)
+        logger.info(
+            f"Stage '{stage}' {outcome} for file '{file_name}' in {duration:.3f}s",
+            extra={"file_name": file_name, "stage": stage, "duration": duration},
+        )
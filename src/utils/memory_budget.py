@@ -0,0 +1,262 @@
+from contextlib import contextmanager
+import os
+import threading
+import time
+from typing import Dict, Iterator, Optional
+
+MEMORY_BUDGET_ENV = "MEMORY_BUDGET_BYTES"
+# approximate memory held by a parsed AssetValuation: the object, its date, datetime
+# and float, strings being mostly shared between the valuations of a file
+ASSET_VALUATION_BYTES = 220
+# approximate memory held by a natural key kept to drop duplicates across files: the
+# tuple, its date and float, and its slots in a set and a deque
+NATURAL_KEY_BYTES = 180
+# approximate peak memory while a file is parsed, per byte of the file as stored:
+# rows being validated and the Asset Valuations parsed so far
+PARSE_BYTES_PER_FILE_BYTE = 18
+# assumed ratio of compressed files, whose uncompressed size is not known up front
+COMPRESSION_RATIO = 6
+# assumed size of files whose size is not known, e.g. not listed
+UNKNOWN_FILE_BYTES = 4 * 1024 * 1024
+
+
+def estimate_parse_bytes(file_bytes: Optional[int], compressed: bool = False) -> int:
+    """
+    Estimates the peak memory taken by parsing a file, from its size as stored.
+
+    Args:
+        file_bytes (int, optional): Size of the file, as stored. Not known if None or 0.
+        compressed (bool, optional): Whether the file is compressed. Defaults to False.
+    Returns:
+        int: The estimate, in bytes.
+    """
+    file_bytes = file_bytes if file_bytes else UNKNOWN_FILE_BYTES
+    if compressed:
+        file_bytes *= COMPRESSION_RATIO
+
+    return file_bytes * PARSE_BYTES_PER_FILE_BYTE
+
+
+def estimate_rows_bytes(rows: int) -> int:
+    """
+    Estimates the memory held by rows parsed as Asset Valuations.
+
+    Args:
+        rows (int): Number of Asset Valuations.
+    Returns:
+        int: The estimate, in bytes.
+    """
+    return rows * ASSET_VALUATION_BYTES
+
+
+class MemoryBudget:
+    """
+    Bounds the approximate memory held by the batches in flight between the stages of the
+    pipeline, e.g. files being downloaded and parsed, Asset Valuations parsed and waiting
+    to be loaded, and chunks being serialised. Each stage accounts the bytes it holds,
+    by estimate, and producers wait for memory to be released before taking more once
+    the limit is reached, which holds them back to the pace of the stages consuming
+    their batches. A batch is admitted when nothing else is in flight, however large,
+    so a batch larger than the limit runs alone instead of waiting forever.
+    Stages draining memory, e.g. loading batches already parsed, use track() instead,
+    which never waits, so a producer waiting on its own consumer cannot deadlock.
+
+    Args:
+        limit_bytes (int, optional): Bytes held in flight at most. Not limited if not
+                                     given, in which case usage is still accounted.
+    Attributes:
+        limit_bytes (int, optional): Bytes held in flight at most.
+        in_flight_bytes (int): Bytes held now.
+        peak_bytes (int): Most bytes held at once so far.
+        stage_peak_bytes (Dict[str, int]): Most bytes held at once by each stage so far.
+        waits (int): Acquisitions that had to wait.
+        wait_seconds (float): Time producers spent waiting.
+    Methods:
+        acquire(n_bytes: int, stage: str) -> float:
+            Takes bytes of the budget, waiting for them if needed.
+        try_acquire(n_bytes: int, stage: str) -> bool:
+            Takes bytes of the budget if available now.
+        track(n_bytes: int, stage: str):
+            Accounts bytes without waiting.
+        release(n_bytes: int, stage: str):
+            Gives bytes back to the budget.
+        reserve(n_bytes: int, stage: str):
+            Context manager holding bytes of the budget.
+        summary() -> str:
+            Describes the limit and the peak usage.
+    """
+
+    def __init__(self, limit_bytes: Optional[int] = None):
+        self.limit_bytes = limit_bytes
+        self.in_flight_bytes = 0
+        self.peak_bytes = 0
+        self.stage_peak_bytes: Dict[str, int] = {}
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self._stage_bytes: Dict[str, int] = {}
+        self._available = threading.Condition()
+
+    def _fits(self, n_bytes: int) -> bool:
+        return (
+            self.limit_bytes is None
+            or not self.in_flight_bytes
+            or self.in_flight_bytes + n_bytes <= self.limit_bytes
+        )
+
+    def _take(self, n_bytes: int, stage: str):
+        """
+        Accounts bytes taken by a stage. Must be called holding the condition.
+        """
+        self.in_flight_bytes += n_bytes
+        self.peak_bytes = max(self.peak_bytes, self.in_flight_bytes)
+        stage_bytes = self._stage_bytes.get(stage, 0) + n_bytes
+        self._stage_bytes[stage] = stage_bytes
+        self.stage_peak_bytes[stage] = max(
+            self.stage_peak_bytes.get(stage, 0), stage_bytes
+        )
+
+    def acquire(self, n_bytes: int, stage: str) -> float:
+        """
+        Takes bytes of the budget, waiting for other batches to release them if the
+        limit would be exceeded. The caller must not hold bytes itself, else it could
+        wait on itself: use try_acquire() or track() then.
+
+        Args:
+            n_bytes (int): Bytes taken, by estimate.
+            stage (str): Stage taking them, e.g. 'parse'.
+        Returns:
+            float: Seconds waited.
+        """
+        with self._available:
+            if self._fits(n_bytes):
+                self._take(n_bytes, stage)
+                return 0.0
+            start = time.monotonic()
+            self._available.wait_for(lambda: self._fits(n_bytes))
+            waited = time.monotonic() - start
+            self.waits += 1
+            self.wait_seconds += waited
+            self._take(n_bytes, stage)
+
+        return waited
+
+    def try_acquire(self, n_bytes: int, stage: str) -> bool:
+        """
+        Takes bytes of the budget if the limit allows it now, without waiting.
+
+        Args:
+            n_bytes (int): Bytes taken, by estimate.
+            stage (str): Stage taking them.
+        Returns:
+            bool: True if the bytes were taken.
+        """
+        with self._available:
+            if not self._fits(n_bytes):
+                return False
+            self._take(n_bytes, stage)
+
+        return True
+
+    def track(self, n_bytes: int, stage: str):
+        """
+        Accounts bytes held by a stage without waiting, even over the limit, e.g. by a
+        consumer serialising a batch already admitted.
+
+        Args:
+            n_bytes (int): Bytes held, by estimate.
+            stage (str): Stage holding them.
+        """
+        with self._available:
+            self._take(n_bytes, stage)
+
+    def release(self, n_bytes: int, stage: str):
+        """
+        Gives bytes back to the budget, waking producers waiting for them.
+
+        Args:
+            n_bytes (int): Bytes taken by acquire(), try_acquire() or track().
+            stage (str): Stage that took them.
+        """
+        with self._available:
+            self.in_flight_bytes -= n_bytes
+            self._stage_bytes[stage] = self._stage_bytes.get(stage, 0) - n_bytes
+            self._available.notify_all()
+
+    @contextmanager
+    def reserve(self, n_bytes: int, stage: str) -> Iterator[None]:
+        """
+        Holds bytes of the budget while the block runs, waiting for them first if needed.
+
+        Args:
+            n_bytes (int): Bytes held, by estimate.
+            stage (str): Stage holding them.
+        """
+        self.acquire(n_bytes, stage)
+        try:
+            yield
+        finally:
+            self.release(n_bytes, stage)
+
+    def summary(self) -> str:
+        """
+        Describes the limit and the peak usage of the budget.
+
+        Returns:
+            str: limit, peak bytes in flight overall and by stage, and time waited.
+        """
+        limit = f"{self.limit_bytes} bytes" if self.limit_bytes else "no limit"
+        stages = ", ".join(
+            f"{stage} {peak_bytes}"
+            for stage, peak_bytes in sorted(self.stage_peak_bytes.items())
+        )
+        return (
+            f"{limit}, peak {self.peak_bytes} bytes in flight"
+            f"{f' ({stages})' if stages else ''}, {self.waits} waits, "
+            f"waited {self.wait_seconds:.2f}s"
+        )
+
+
+_budget: Optional[MemoryBudget] = None
+_budget_lock = threading.Lock()
+
+
+def limit_from_env() -> Optional[int]:
+    """
+    Reads the memory budget of the process from the MEMORY_BUDGET_BYTES environment
+    variable, e.g. a fraction of the memory of a Cloud Function instance.
+
+    Returns:
+        int, optional: Bytes held in flight at most, None if not set.
+    """
+    limit_bytes = os.environ.get(MEMORY_BUDGET_ENV)
+
+    return int(limit_bytes) if limit_bytes else None
+
+
+def get_memory_budget() -> MemoryBudget:
+    """
+    Returns the memory budget shared by the whole process, created on first use with the
+    limit of the environment, see limit_from_env().
+
+    Returns:
+        MemoryBudget: The memory budget.
+    """
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            _budget = MemoryBudget(limit_from_env())
+
+    return _budget
+
+
+def configure_memory_budget(limit_bytes: Optional[int] = None):
+    """
+    Replaces the memory budget shared by the whole process, resetting its usage. Without
+    a limit, it is read again from the environment.
+
+    Args:
+        limit_bytes (int, optional): Bytes held in flight at most.
+    """
+    global _budget
+    with _budget_lock:
+        _budget = MemoryBudget(limit_bytes if limit_bytes else limit_from_env())
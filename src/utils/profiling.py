@@ -0,0 +1,75 @@
+import cProfile
+import io
+import pstats
+import tracemalloc
+from typing import Optional
+
+
+class CommandProfiler:
+    """
+    Profiles the execution of a command with cProfile and, optionally, tracks its peak
+    memory with tracemalloc.
+
+    Args:
+        output_path (str, optional): Path where the cProfile stats are written. A top-N
+                                     summary is also written to '<output_path>.txt'. If not
+                                     given, time is not profiled.
+        top_n (int, optional): Number of hottest functions in the summary. Defaults to 20.
+        trace_memory (bool, optional): Whether to report peak memory. Defaults to False.
+    Attributes:
+        output_path (str, optional): Path where the cProfile stats are written.
+        top_n (int): Number of hottest functions in the summary.
+        trace_memory (bool): Whether peak memory is reported.
+    Methods:
+        start():
+            Starts profiling.
+        stop() -> str:
+            Stops profiling, writes the profile files and returns a summary.
+    """
+
+    def __init__(
+        self, output_path: Optional[str], top_n: int = 20, trace_memory: bool = False
+    ):
+        self.output_path = output_path
+        self.top_n = top_n
+        self.trace_memory = trace_memory
+        self._profile: Optional[cProfile.Profile] = None
+
+    def start(self):
+        """
+        Starts profiling.
+        """
+        if self.trace_memory:
+            tracemalloc.start()
+        if self.output_path:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def stop(self) -> str:
+        """
+        Stops profiling, writes the profile files and returns a summary with the hottest
+        functions by cumulative time and the peak memory, as requested.
+
+        Returns:
+            str: summary of the profiled execution.
+        """
+        summary = ""
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(self.output_path)
+
+            stream = io.StringIO()
+            stats = pstats.Stats(self._profile, stream=stream)
+            stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top_n)
+            summary += stream.getvalue()
+            with open(f"{self.output_path}.txt", "w", encoding="utf-8") as f:
+                f.write(summary)
+            summary += f"Profile written to '{self.output_path}'\n"
+            self._profile = None
+
+        if self.trace_memory and tracemalloc.is_tracing():
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            summary += f"Peak traced memory: {peak / 1024 / 1024:.2f} MiB\n"
+
+        return summary
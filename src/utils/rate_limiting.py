@@ -0,0 +1,328 @@
+from dataclasses import dataclass, field, replace
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional, TypeVar
+from google.api_core import exceptions
+from google.auth import exceptions as auth_exceptions
+import requests
+
+T = TypeVar("T")
+
+# errors of BigQuery jobs and GCS requests worth trying again, by reason
+RETRYABLE_REASONS = frozenset(
+    {"backendError", "internalError", "rateLimitExceeded", "jobRateLimitExceeded"}
+)
+RETRYABLE_ERRORS = (
+    exceptions.TooManyRequests,
+    exceptions.InternalServerError,
+    exceptions.BadGateway,
+    exceptions.ServiceUnavailable,
+    exceptions.GatewayTimeout,
+    # the Google clients send requests with requests, whose network errors are not
+    # builtin ConnectionError, and refresh credentials with google.auth
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    auth_exceptions.TransportError,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    Rate limit and retry policy of an API.
+
+    Attributes:
+        requests_per_second (float): Sustained rate of calls allowed.
+        burst (int): Calls allowed at once after a quiet period.
+        max_attempts (int): Attempts of a call before its error is raised.
+        initial_backoff_seconds (float): Upper bound of the wait before the first retry.
+        max_backoff_seconds (float): Upper bound of the wait before any retry.
+    """
+
+    requests_per_second: float
+    burst: int
+    max_attempts: int = 6
+    initial_backoff_seconds: float = 0.5
+    max_backoff_seconds: float = 32.0
+
+    def backoff_seconds(self, retry: int) -> float:
+        """
+        Draws the wait before a retry: exponential backoff with full jitter, so that
+        callers failing together do not retry together.
+
+        Args:
+            retry (int): Number of the retry, 0 for the first one.
+        Returns:
+            float: Seconds to wait, uniformly within [0, initial * 2 ** retry] capped to
+                   max_backoff_seconds.
+        """
+        ceiling = min(self.max_backoff_seconds, self.initial_backoff_seconds * 2**retry)
+
+        return random.uniform(0, ceiling)
+
+
+# defaults well within the per project quotas of each API, see the README
+DEFAULT_POLICIES: Dict[str, RetryPolicy] = {
+    "gcs": RetryPolicy(requests_per_second=200.0, burst=200),
+    "bigquery": RetryPolicy(requests_per_second=20.0, burst=20),
+}
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Whether a failed call is worth trying again: throttling, server errors and network
+    errors are, while errors of the request itself, e.g. an invalid row, are not.
+
+    Args:
+        error (BaseException): The error raised by the call.
+    Returns:
+        bool: True if the call may succeed when tried again.
+    """
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    if isinstance(error, exceptions.GoogleAPICallError):
+        # BigQuery reports throttled and failed jobs as 403 or 400 errors with a reason
+        return any(
+            isinstance(e, dict) and e.get("reason") in RETRYABLE_REASONS
+            for e in error.errors
+        )
+
+    return False
+
+
+@dataclass
+class ApiCounters:
+    """
+    Counts the calls made to an API through a rate limiter.
+
+    Attributes:
+        calls (int): Calls made, retries excluded.
+        retries (int): Calls tried again after a retryable error.
+        failures (int): Calls whose error was raised, retryable or not.
+        throttled_seconds (float): Time spent waiting for the rate limit.
+        backoff_seconds (float): Time spent waiting before retries.
+    """
+
+    calls: int = 0
+    retries: int = 0
+    failures: int = 0
+    throttled_seconds: float = 0.0
+    backoff_seconds: float = 0.0
+    _lock: threading.Lock = field(
+        default_factory=threading.Lock, repr=False, compare=False
+    )
+
+    def add(self, **increments: float):
+        """
+        Adds increments to the counters, safe to call from several threads.
+
+        Args:
+            increments (float): Increment by counter name.
+        """
+        with self._lock:
+            for name, increment in increments.items():
+                setattr(self, name, getattr(self, name) + increment)
+
+
+class TokenBucket:
+    """
+    Token bucket shared by the threads calling an API: tokens are added at rate per
+    second up to capacity, and each call takes one, waiting for it if none is left.
+    Tokens are reserved in call order, so waiting callers are served first come first
+    served without busy looping.
+
+    Args:
+        rate (float): Tokens added per second.
+        capacity (int): Maximum number of tokens held.
+    Methods:
+        acquire() -> float:
+            Takes a token, waiting for it if needed.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Takes a token, waiting for it if none is left.
+
+        Returns:
+            float: Seconds waited.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            # the token is taken now, tokens going negative for callers waiting on it
+            self._tokens -= 1
+            wait_seconds = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+        if wait_seconds:
+            time.sleep(wait_seconds)
+
+        return wait_seconds
+
+
+class RateLimiter:
+    """
+    Rate limits and retries the calls made to an API, following its RetryPolicy. Each
+    attempt of a call takes a token of a TokenBucket shared by all threads, and a call
+    failing with a retryable error, see is_retryable(), is tried again after a jittered
+    exponential backoff, up to max_attempts attempts.
+
+    Args:
+        api (str): Name of the API, e.g. 'gcs'.
+        policy (RetryPolicy): Rate limit and retry policy of the API.
+    Attributes:
+        api (str): Name of the API.
+        policy (RetryPolicy): Rate limit and retry policy of the API.
+        counters (ApiCounters): Calls, retries and time waited so far.
+    Methods:
+        call(function: Callable[..., T], *args, **kwargs) -> T:
+            Calls a function making a request to the API, rate limited and retried.
+        summary() -> str:
+            Describes the calls made so far.
+    """
+
+    def __init__(self, api: str, policy: RetryPolicy):
+        self.api = api
+        self.policy = policy
+        self.counters = ApiCounters()
+        self._bucket = TokenBucket(policy.requests_per_second, policy.burst)
+
+    def call(self, function: Callable[..., T], *args, **kwargs) -> T:
+        """
+        Calls a function making a request to the API, rate limited and retried. The
+        function must be safe to call again after a failure.
+
+        Args:
+            function (Callable[..., T]): The function to call.
+            args: Positional arguments of the function.
+            kwargs: Keyword arguments of the function.
+        Returns:
+            T: The result of the function.
+        Raises:
+            Exception: The error of the last attempt, or of the first non retryable one.
+        """
+        self.counters.add(calls=1)
+        for attempt in range(self.policy.max_attempts):
+            self.counters.add(throttled_seconds=self._bucket.acquire())
+            try:
+                return function(*args, **kwargs)
+            except Exception as e:
+                if attempt + 1 >= self.policy.max_attempts or not is_retryable(e):
+                    self.counters.add(failures=1)
+                    raise
+            backoff_seconds = self.policy.backoff_seconds(attempt)
+            self.counters.add(retries=1, backoff_seconds=backoff_seconds)
+            time.sleep(backoff_seconds)
+
+        raise AssertionError("unreachable: max_attempts must be at least 1")
+
+    def summary(self) -> str:
+        """
+        Describes the calls made so far.
+
+        Returns:
+            str: calls, retries, failures and time waited.
+        """
+        counters = self.counters
+
+        return (
+            f"{self.api}: {counters.calls} calls, {counters.retries} retries, "
+            f"{counters.failures} failures, throttled {counters.throttled_seconds:.2f}s, "
+            f"backed off {counters.backoff_seconds:.2f}s"
+        )
+
+
+_limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def policy_from_env(api: str, default: RetryPolicy) -> RetryPolicy:
+    """
+    Overrides the default policy of an API with environment variables, if set:
+    <API>_REQUESTS_PER_SECOND, <API>_BURST and <API>_MAX_ATTEMPTS, e.g.
+    GCS_REQUESTS_PER_SECOND.
+
+    Args:
+        api (str): Name of the API.
+        default (RetryPolicy): Policy used for any variable not set.
+    Returns:
+        RetryPolicy: The policy of the API.
+    """
+    prefix = api.upper()
+    requests_per_second = os.environ.get(f"{prefix}_REQUESTS_PER_SECOND")
+    burst = os.environ.get(f"{prefix}_BURST")
+    max_attempts = os.environ.get(f"{prefix}_MAX_ATTEMPTS")
+
+    return replace(
+        default,
+        requests_per_second=(
+            float(requests_per_second)
+            if requests_per_second
+            else default.requests_per_second
+        ),
+        burst=int(burst) if burst else default.burst,
+        max_attempts=int(max_attempts) if max_attempts else default.max_attempts,
+    )
+
+
+def get_rate_limiter(api: str) -> RateLimiter:
+    """
+    Returns the rate limiter of an API shared by the whole process, created on first use
+    with the policy of DEFAULT_POLICIES overridden by the environment, see
+    policy_from_env().
+
+    Args:
+        api (str): Name of the API, a key of DEFAULT_POLICIES.
+    Returns:
+        RateLimiter: The rate limiter of the API.
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(api)
+        if limiter is None:
+            limiter = _limiters[api] = RateLimiter(
+                api, policy_from_env(api, DEFAULT_POLICIES[api])
+            )
+
+    return limiter
+
+
+def configure_rate_limiter(api: str, policy: Optional[RetryPolicy] = None):
+    """
+    Replaces the rate limiter of an API shared by the whole process, resetting its
+    counters. Without a policy, it is read again from DEFAULT_POLICIES and the environment.
+
+    Args:
+        api (str): Name of the API.
+        policy (RetryPolicy, optional): The new policy of the API.
+    """
+    policy = policy if policy else policy_from_env(api, DEFAULT_POLICIES[api])
+    with _limiters_lock:
+        _limiters[api] = RateLimiter(api, policy)
+
+
+def rate_limiters_summary() -> str:
+    """
+    Describes the calls made so far through each rate limiter used by the process.
+
+    Returns:
+        str: The summary of each rate limiter, or a note if none was used.
+    """
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    if not limiters:
+        return "no API calls made"
+
+    return "; ".join(limiter.summary() for limiter in limiters)
@@ -0,0 +1,164 @@
+from dataclasses import asdict, dataclass, field
+import json
+from typing import Dict, List, Optional
+
+
+@dataclass
+class RunReport:
+    """
+    Report of a run loading files from a bucket, or the merge of several of them.
+
+    Attributes:
+        bucket_name (str): The name of the bucket files were loaded from.
+        prefix (str, optional): The prefix blobs were listed with, if any.
+        shard_indexes (List[int]): The shards covered by the report.
+        shard_count (int): The number of shards the bucket was split into.
+        files_loaded (Dict[str, int]): Rows loaded by file name.
+        files_failed (Dict[str, str]): Error by name of the files that failed.
+    Methods:
+        record_loaded(file_name: str, rows: int):
+            Records a file loaded.
+        record_failed(file_name: str, error: str):
+            Records a file that failed.
+        rows_loaded() -> int:
+            Total rows loaded.
+        missing_shards() -> List[int]:
+            Shards of the split not covered by the report.
+        summary() -> str:
+            Compact description of the report.
+        save(path: str):
+            Writes the report as JSON.
+        load(path: str) -> RunReport:
+            Reads a report written by save().
+    """
+
+    bucket_name: str
+    prefix: Optional[str] = None
+    shard_indexes: List[int] = field(default_factory=lambda: [0])
+    shard_count: int = 1
+    files_loaded: Dict[str, int] = field(default_factory=dict)
+    files_failed: Dict[str, str] = field(default_factory=dict)
+
+    def record_loaded(self, file_name: str, rows: int):
+        """
+        Records a file loaded.
+
+        Args:
+            file_name (str): The name of the file.
+            rows (int): Number of rows loaded from the file.
+        """
+        self.files_loaded[file_name] = rows
+
+    def record_failed(self, file_name: str, error: str):
+        """
+        Records a file that failed.
+
+        Args:
+            file_name (str): The name of the file.
+            error (str): Description of the error.
+        """
+        self.files_failed[file_name] = error
+
+    def rows_loaded(self) -> int:
+        """
+        Total rows loaded.
+
+        Returns:
+            int: sum of rows loaded over all files.
+        """
+        return sum(self.files_loaded.values())
+
+    def missing_shards(self) -> List[int]:
+        """
+        Shards of the split not covered by the report.
+
+        Returns:
+            List[int]: indexes of the shards not covered.
+        """
+        return sorted(set(range(self.shard_count)) - set(self.shard_indexes))
+
+    def summary(self) -> str:
+        """
+        Compact description of the report.
+
+        Returns:
+            str: files loaded and failed, rows loaded and shards missing, if any.
+        """
+        summary = (
+            f"Bucket '{self.bucket_name}'"
+            + (f" prefix '{self.prefix}'" if self.prefix else "")
+            + f", shards {self.shard_indexes} of {self.shard_count}: "
+            f"{len(self.files_loaded)} files loaded ({self.rows_loaded()} rows), "
+            f"{len(self.files_failed)} files failed"
+        )
+        if self.files_failed:
+            summary += " [" + ", ".join(sorted(self.files_failed)) + "]"
+        if self.missing_shards():
+            summary += f". Missing shards: {self.missing_shards()}"
+
+        return summary
+
+    def save(self, path: str):
+        """
+        Writes the report as JSON.
+
+        Args:
+            path (str): The path of the file to write.
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(asdict(self), f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> "RunReport":
+        """
+        Reads a report written by save().
+
+        Args:
+            path (str): The path of the file to read.
+        Returns:
+            RunReport: The report.
+        """
+        with open(path, encoding="utf-8") as f:
+            return cls(**json.load(f))
+
+
+def merge_run_reports(reports: List[RunReport]) -> RunReport:
+    """
+    Merges the reports of the shards of a run into a single report.
+
+    Args:
+        reports (List[RunReport]): Reports to merge. They must share bucket, prefix and
+                                   shard count.
+    Returns:
+        RunReport: Report covering all shards of the given reports.
+    Raises:
+        ValueError: Raised if reports do not belong to the same run or repeat a shard.
+    """
+    if not reports:
+        raise ValueError("No run reports to merge.")
+
+    first = reports[0]
+    merged = RunReport(
+        bucket_name=first.bucket_name,
+        prefix=first.prefix,
+        shard_indexes=[],
+        shard_count=first.shard_count,
+    )
+    for report in reports:
+        if (report.bucket_name, report.prefix, report.shard_count) != (
+            merged.bucket_name,
+            merged.prefix,
+            merged.shard_count,
+        ):
+            raise ValueError(
+                f"Run reports of different runs cannot be merged: '{report.summary()}'."
+            )
+        repeated = set(report.shard_indexes) & set(merged.shard_indexes)
+        if repeated:
+            raise ValueError(f"Shards {sorted(repeated)} found in several run reports.")
+
+        merged.shard_indexes = sorted(merged.shard_indexes + report.shard_indexes)
+        merged.files_loaded.update(report.files_loaded)
+        merged.files_failed.update(report.files_failed)
+
+    return merged
@@ -0,0 +1,97 @@
+from dataclasses import dataclass
+import datetime as dt
+from typing import Iterable, Iterator, List, Optional
+
+SCHEDULE_ORDERS = ("listing", "largest", "newest")
+
+
+@dataclass(frozen=True)
+class ScheduledFile:
+    """
+    A file to load, with the metadata it is scheduled by, as returned by the listing.
+
+    Attributes:
+        name (str): Name of the file, e.g. the blob name.
+        size (int): Size of the file in bytes, 0 if not known.
+        updated (dt.datetime, optional): Time the file was last written, if known.
+    """
+
+    name: str
+    size: int = 0
+    updated: Optional[dt.datetime] = None
+
+
+def order_files(files: Iterable[ScheduledFile], order: str) -> List[ScheduledFile]:
+    """
+    Orders files to load:
+    - 'listing' keeps the listing order.
+    - 'largest' loads the largest files first. Greedily handing the files of a batch
+      out in this order to its parse workers is the longest processing time rule, so
+      one large file parsed last cannot keep the batch going after the other workers
+      are done. Batches are loaded one after another, so this bound holds within each
+      batch, not across the run.
+    - 'newest' loads the files updated last first, so the latest statements are loaded
+      before years of history. Files of unknown update time come last.
+    Ties are broken by name, newest name first, so the order is stable across runs.
+
+    Args:
+        files (Iterable[ScheduledFile]): The files.
+        order (str): 'listing', 'largest' or 'newest'.
+    Returns:
+        List[ScheduledFile]: The files, in the order to load them.
+    Raises:
+        ValueError: Raised if order is not supported.
+    """
+    if order not in SCHEDULE_ORDERS:
+        raise ValueError(f"order must be one of {SCHEDULE_ORDERS}, not '{order}'")
+
+    files = list(files)
+    if order == "listing":
+        return files
+    # sorted by name then by the order key, sorts being stable
+    files.sort(key=lambda file: file.name, reverse=True)
+    if order == "largest":
+        files.sort(key=lambda file: file.size, reverse=True)
+    else:
+        files.sort(
+            key=lambda file: (
+                file.updated is not None,
+                file.updated or dt.datetime.min,
+            ),
+            reverse=True,
+        )
+
+    return files
+
+
+def pack_batches(
+    files: Iterable[ScheduledFile],
+    max_files: int = 1,
+    max_bytes: Optional[int] = None,
+) -> Iterator[List[ScheduledFile]]:
+    """
+    Packs files into batches loaded together, in order: a batch is closed once it holds
+    max_files files, or before adding a file would take it over max_bytes, so load jobs
+    are of even size. A file larger than max_bytes is a batch on its own. Files are
+    consumed lazily, so batches of a streamed listing are yielded as it goes.
+
+    Args:
+        files (Iterable[ScheduledFile]): The files, in the order to load them.
+        max_files (int, optional): Files per batch at most. Defaults to 1.
+        max_bytes (int, optional): Bytes per batch at most. Not limited if not given.
+    Returns:
+        Iterator[List[ScheduledFile]]: The batches, in order.
+    """
+    batch: List[ScheduledFile] = []
+    batch_bytes = 0
+    for file in files:
+        if batch and max_bytes is not None and batch_bytes + file.size > max_bytes:
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(file)
+        batch_bytes += file.size
+        if len(batch) >= max_files:
+            yield batch
+            batch, batch_bytes = [], 0
+    if batch:
+        yield batch
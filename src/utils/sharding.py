@@ -0,0 +1,31 @@
+import hashlib
+
+
+def shard_of(blob_name: str, shard_count: int) -> int:
+    """
+    Assigns a blob to a shard from a stable hash of its name, so independent workers
+    agree on the split without coordination, whatever machine or process they run on.
+
+    Args:
+        blob_name (str): The name of the blob.
+        shard_count (int): The number of shards.
+    Returns:
+        int: The index of the shard the blob belongs to, in [0, shard_count).
+    """
+    digest = hashlib.md5(blob_name.encode("utf-8")).digest()
+
+    return int.from_bytes(digest[:8], "big") % shard_count
+
+
+def in_shard(blob_name: str, shard_index: int, shard_count: int) -> bool:
+    """
+    Whether a blob belongs to a given shard.
+
+    Args:
+        blob_name (str): The name of the blob.
+        shard_index (int): The index of the shard.
+        shard_count (int): The number of shards.
+    Returns:
+        bool: True if the blob belongs to the shard.
+    """
+    return shard_count <= 1 or shard_of(blob_name, shard_count) == shard_index
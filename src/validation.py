@@ -0,0 +1,329 @@
+from dataclasses import dataclass, field
+import csv
+import datetime as dt
+import math
+from typing import Dict, List, Optional, Tuple
+
+from src import model, custom_errors
+
+GENERIC_COLUMNS = ["product_name", "date", "value"]
+MIN_VALUATION_DATE = dt.date(1900, 1, 1)
+
+
+@dataclass(frozen=True)
+class RowError:
+    """
+    Represents a validation error found on a row of a source file.
+
+    Attributes:
+        row_number (int): The number of the row in the file, header being row 0.
+        column (str): The name of the column holding the invalid value.
+        value (str): The raw value that failed validation.
+        reason (str): Description of why the value is not valid.
+    """
+
+    row_number: int
+    column: str
+    value: str
+    reason: str
+
+    def __str__(self) -> str:
+        return f"row {self.row_number} {self.column} '{self.value}': {self.reason}"
+
+
+@dataclass
+class ValidationReport:
+    """
+    Collects all row errors found while validating a batch of rows from a source file.
+
+    Attributes:
+        file_path (str): The path of the validated file.
+        rows_checked (int): Number of rows validated.
+        errors (List[RowError]): All errors found, in row order.
+        quarantined_rows (Dict[int, List[str]]): Raw content of the invalid rows by row number.
+        duplicates_dropped (int): Rows dropped for repeating an earlier row exactly.
+    Methods:
+        is_valid() -> bool:
+            Whether no errors were found.
+        summary(max_errors: int) -> str:
+            Compact, human readable description of the errors.
+        write_quarantine_csv(path: str):
+            Writes the invalid rows and their errors into a CSV file.
+    """
+
+    file_path: str
+    rows_checked: int = 0
+    errors: List[RowError] = field(default_factory=list)
+    quarantined_rows: Dict[int, List[str]] = field(default_factory=dict)
+    duplicates_dropped: int = 0
+
+    def is_valid(self) -> bool:
+        """
+        Whether no errors were found.
+
+        Returns:
+            bool: True if the batch has no invalid rows.
+        """
+        return len(self.errors) == 0
+
+    def summary(self, max_errors: int = 10) -> str:
+        """
+        Compact, human readable description of the errors.
+
+        Args:
+            max_errors (int): Maximum number of errors to detail.
+        Returns:
+            str: description of the errors found.
+        """
+        summary = (
+            f"{len(self.quarantined_rows)} invalid rows out of {self.rows_checked} "
+            f"in file '{self.file_path}'"
+        )
+        if self.errors:
+            details = "; ".join(str(error) for error in self.errors[:max_errors])
+            omitted = len(self.errors) - max_errors
+            summary += f": {details}" + (f"; and {omitted} more" if omitted > 0 else "")
+
+        return summary
+
+    def write_quarantine_csv(self, path: str):
+        """
+        Writes the invalid rows, followed by their errors, into a CSV file.
+
+        Args:
+            path (str): The path of the CSV file to write.
+        """
+        reasons: Dict[int, List[str]] = {}
+        for error in self.errors:
+            reasons.setdefault(error.row_number, []).append(
+                f"{error.column}: {error.reason}"
+            )
+
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["row_number"] + GENERIC_COLUMNS + ["errors"])
+            for row_number, row in sorted(self.quarantined_rows.items()):
+                writer.writerow(
+                    [row_number] + row + ["; ".join(reasons.get(row_number, []))]
+                )
+
+
+@dataclass(frozen=True)
+class GenericHeader:
+    """
+    Column layout of a generic file, resolved once from its header row, so that the
+    product_name, date and value of each row are then read by index. Columns may come in
+    any order, extra columns are ignored and columns may be named by an alias.
+
+    Attributes:
+        width (int): Number of columns of the file.
+        indexes (Tuple[int, ...]): Indexes of product_name, date and value, in that order.
+    Methods:
+        resolve(header: List[str], file_path: str, aliases: Dict[str, str]) -> GenericHeader:
+            Resolves the column layout from the header row of a file.
+    """
+
+    width: int = len(GENERIC_COLUMNS)
+    indexes: Tuple[int, ...] = tuple(range(len(GENERIC_COLUMNS)))
+
+    @classmethod
+    def resolve(
+        cls,
+        header: List[str],
+        file_path: str,
+        aliases: Optional[Dict[str, str]] = None,
+    ) -> "GenericHeader":
+        """
+        Resolves the column layout from the header row of a file. Column names are
+        compared case insensitively, after replacing aliases by the column they stand for.
+
+        Args:
+            header (List[str]): The header row.
+            file_path (str): The path of the file the header comes from.
+            aliases (Dict[str, str], optional): Column of GENERIC_COLUMNS by alias.
+        Returns:
+            GenericHeader: The column layout of the file.
+        Raises:
+            custom_errors.HeaderNotMatchError: Raised if any of product_name, date and value
+                                               is missing or found more than once.
+        """
+        aliases = {
+            alias.strip().lower(): column for alias, column in (aliases or {}).items()
+        }
+        names = [str(elem).strip().lower() for elem in header]
+        columns = [aliases.get(name, name) for name in names]
+        if any(columns.count(column) != 1 for column in GENERIC_COLUMNS):
+            raise custom_errors.HeaderNotMatchError(
+                file_path,
+                str(names).replace("'", ""),
+                "[date, product_name, value]",
+            )
+
+        return cls(
+            width=len(columns),
+            indexes=tuple(columns.index(column) for column in GENERIC_COLUMNS),
+        )
+
+
+def _parse_dates(
+    dates: List[str], min_date: dt.date, max_date: dt.date
+) -> Dict[str, Tuple[Optional[dt.date], str]]:
+    """
+    Parses every distinct date string of a column once.
+
+    Args:
+        dates (List[str]): The date column.
+        min_date (dt.date): Earliest valid date.
+        max_date (dt.date): Latest valid date.
+    Returns:
+        Dict[str, Tuple[Optional[dt.date], str]]: parsed date, or None and the error
+                                                  reason, by distinct date string.
+    """
+    parsed: Dict[str, Tuple[Optional[dt.date], str]] = {}
+    for date_string in set(dates):
+        try:
+            date = dt.datetime.strptime(date_string, "%Y-%m-%d").date()
+        except ValueError:
+            parsed[date_string] = (None, "does not follow pattern 'YYYY-MM-DD'")
+            continue
+        if not min_date <= date <= max_date:
+            parsed[date_string] = (None, f"out of range [{min_date}, {max_date}]")
+        else:
+            parsed[date_string] = (date, "")
+
+    return parsed
+
+
+def _parse_values(values: List[str]) -> Dict[str, Tuple[Optional[float], str]]:
+    """
+    Parses every distinct value string of a column once.
+
+    Args:
+        values (List[str]): The value column.
+    Returns:
+        Dict[str, Tuple[Optional[float], str]]: parsed value, or None and the error
+                                                reason, by distinct value string.
+    """
+    parsed: Dict[str, Tuple[Optional[float], str]] = {}
+    for value_string in set(values):
+        try:
+            value = float(value_string)
+        except ValueError:
+            parsed[value_string] = (None, "is not a number")
+            continue
+        if not math.isfinite(value):
+            parsed[value_string] = (None, "is not a finite number")
+        else:
+            parsed[value_string] = (value, "")
+
+    return parsed
+
+
+def validate_generic_rows(
+    rows: List[List[str]],
+    file_path: str,
+    min_date: dt.date = MIN_VALUATION_DATE,
+    max_date: Optional[dt.date] = None,
+    header: Optional[GenericHeader] = None,
+) -> Tuple[List[model.AssetValuation], ValidationReport]:
+    """
+    Validates a whole batch of generic source rows at once, column by column, and builds
+    Asset Valuations out of the valid ones. Checks run are:
+        - rows have as many columns as the header
+        - product_name is not empty
+        - date follows pattern 'YYYY-MM-DD' and lies within [min_date, max_date]
+        - value is a finite number
+        - (product_name, date) is not repeated within the batch with a different value
+    Rows repeating an earlier row exactly, i.e. with the same natural key, are dropped
+    without error. Distinct dates and values are parsed once, however many rows share them.
+    Invalid rows are quarantined as product_name, date and value, or whole if malformed.
+
+    Args:
+        rows (List[List[str]]): Rows of the file, header excluded.
+        file_path (str): The path of the file the rows come from.
+        min_date (dt.date): Earliest valid date. Defaults to 1900-01-01.
+        max_date (dt.date, optional): Latest valid date. Defaults to today.
+        header (GenericHeader, optional): Column layout of the rows. Defaults to columns
+                                          product_name, date and value, in that order.
+    Returns:
+        Tuple[List[model.AssetValuation], ValidationReport]: Asset Valuations built from
+                                                            valid rows and the report of
+                                                            the invalid ones.
+    """
+    max_date = max_date if max_date else dt.date.today()
+    header = header if header else GenericHeader()
+    report = ValidationReport(file_path=file_path, rows_checked=len(rows))
+
+    # first data row is row 1, header being row 0
+    row_numbers = range(1, len(rows) + 1)
+    well_formed = [len(row) == header.width for row in rows]
+    product_names, dates, values = (
+        [row[i] if ok else "" for row, ok in zip(rows, well_formed)]
+        for i in header.indexes
+    )
+    parsed_dates = _parse_dates(dates, min_date, max_date)
+    parsed_values = _parse_values(values)
+
+    asset_valuations: List[model.AssetValuation] = []
+    seen_keys: Dict[Tuple[str, str], Tuple[int, Optional[float]]] = {}
+    for row_number, row, ok, product_name, date_string, value_string in zip(
+        row_numbers, rows, well_formed, product_names, dates, values
+    ):
+        row_errors: List[RowError] = []
+        if not ok:
+            row_errors.append(
+                RowError(
+                    row_number,
+                    "row",
+                    ",".join(row),
+                    f"expected {header.width} columns, found {len(row)}",
+                )
+            )
+        else:
+            date, date_reason = parsed_dates[date_string]
+            value, value_reason = parsed_values[value_string]
+            if product_name.strip() == "":
+                row_errors.append(
+                    RowError(row_number, "product_name", product_name, "is empty")
+                )
+            if date is None:
+                row_errors.append(
+                    RowError(row_number, "date", date_string, date_reason)
+                )
+            if value is None:
+                row_errors.append(
+                    RowError(row_number, "value", value_string, value_reason)
+                )
+            key = (product_name, date_string)
+            if key not in seen_keys:
+                seen_keys[key] = (row_number, value)
+            elif not row_errors and seen_keys[key][1] == value:
+                report.duplicates_dropped += 1
+                continue
+            else:
+                row_errors.append(
+                    RowError(
+                        row_number,
+                        "product_name",
+                        product_name,
+                        f"duplicated for date '{date_string}' (first seen on row "
+                        f"{seen_keys[key][0]})",
+                    )
+                )
+
+        if row_errors:
+            report.errors.extend(row_errors)
+            report.quarantined_rows[row_number] = (
+                [product_name, date_string, value_string] if ok else row
+            )
+        else:
+            asset_valuations.append(
+                model.AssetValuation(
+                    date=date,  # type: ignore
+                    value=value,  # type: ignore
+                    product_name=product_name,
+                    source_file=file_path,
+                )
+            )
+
+    return asset_valuations, report
@@ -0,0 +1,307 @@
+import datetime as dt
+import posixpath
+import re
+from typing import IO, Callable, Dict, Iterator, List, Optional, Set
+from xml.etree.ElementTree import Element, XMLParser, iterparse
+import zipfile
+
+# built-in number formats of dates and times, see ECMA-376 Part 1, 18.8.30
+BUILTIN_DATE_FORMATS = set(range(14, 23)) | set(range(45, 48))
+RELATIONSHIPS_NAMESPACE = (
+    "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+)
+_QUOTED_OR_BRACKETED = re.compile(r'"[^"]*"|\[[^\]]*\]|\\.')
+_DATE_TOKENS = re.compile(r"[dmyhs]", re.IGNORECASE)
+_CELL_COLUMN = re.compile(r"[A-Z]+")
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def _local_name(tag: str) -> str:
+    """
+    Strips the namespace of an XML tag, so that transitional and strict workbooks,
+    which use different namespaces, are read alike.
+    """
+    return tag.rsplit("}", 1)[-1]
+
+
+def _column_index(cell_reference: str) -> int:
+    """
+    Converts the column letters of a cell reference, e.g. 'AB12', to a 0 based index.
+    """
+    match = _CELL_COLUMN.match(cell_reference)
+    index = 0
+    for letter in match.group() if match else "":
+        index = index * 26 + ord(letter) - ord("A") + 1
+
+    return index - 1
+
+
+def _is_date_format(format_code: str) -> bool:
+    """
+    Whether a custom number format code formats dates or times, once literal text,
+    colours and conditions are removed.
+    """
+    return bool(_DATE_TOKENS.search(_QUOTED_OR_BRACKETED.sub("", format_code)))
+
+
+class XlsxRowReader:
+    """
+    Streams the rows of the first worksheet of an xlsx workbook as lists of strings, as
+    a csv.reader would, so that the same parsing logic applies to both formats. The sheet
+    XML is fed to the parser in chunks, without building an element tree, and each row is
+    discarded once yielded, so memory does not grow with the number of rows. Shared
+    strings are read once up front, as cells refer to them by index.
+    Cells are converted to text as follows:
+        - shared, inline and formula strings: as is
+        - numbers: as stored, e.g. '1200.5'
+        - numbers formatted as dates: 'YYYY-MM-DD', or 'YYYY-MM-DD HH:MM:SS' with a time
+        - booleans: 'TRUE' or 'FALSE'
+    Missing cells within a row are empty strings, empty trailing cells are left out and
+    rows without any value are skipped.
+
+    Args:
+        stream (IO[bytes]): Seekable binary stream of the workbook.
+    Methods:
+        __iter__() -> Iterator[List[str]]:
+            Yields the rows of the first worksheet.
+        close():
+            Closes the workbook, not the underlying stream.
+    """
+
+    def __init__(self, stream: IO[bytes]):
+        self._workbook = zipfile.ZipFile(stream)
+        self._names = set(self._workbook.namelist())
+        self._epoch = dt.datetime(1899, 12, 30)
+        self._sheet_path = self._first_sheet_path()
+        self._shared_strings = self._read_shared_strings()
+        self._date_styles = self._read_date_styles()
+        self._date_texts: Dict[str, str] = {}
+
+    def __enter__(self) -> "XlsxRowReader":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Closes the workbook, not the underlying stream.
+        """
+        self._workbook.close()
+
+    def _iter_elements(self, path: str) -> Iterator[Element]:
+        """
+        Parses an XML part of the workbook incrementally, yielding each element once
+        complete. Callers clear the elements they are done with.
+        """
+        with self._workbook.open(path) as part:
+            for _, element in iterparse(part, events=("end",)):
+                yield element
+
+    def _first_sheet_path(self) -> str:
+        """
+        Finds the part of the first worksheet through the workbook and its relationships,
+        also reading whether dates count from 1904.
+        """
+        sheet_relationship: Optional[str] = None
+        for element in self._iter_elements("xl/workbook.xml"):
+            name = _local_name(element.tag)
+            if name == "workbookPr" and element.get("date1904") in ("1", "true"):
+                self._epoch = dt.datetime(1904, 1, 1)
+            elif name == "sheet" and sheet_relationship is None:
+                sheet_relationship = element.get(f"{{{RELATIONSHIPS_NAMESPACE}}}id")
+
+        relationships = "xl/_rels/workbook.xml.rels"
+        if sheet_relationship is not None and relationships in self._names:
+            for element in self._iter_elements(relationships):
+                if element.get("Id") == sheet_relationship:
+                    target = element.get("Target", "")
+                    if target.startswith("/"):
+                        return target.lstrip("/")
+                    return posixpath.normpath(posixpath.join("xl", target))
+
+        return "xl/worksheets/sheet1.xml"
+
+    def _read_shared_strings(self) -> List[str]:
+        """
+        Reads the shared strings table. Rich text runs are concatenated and phonetic
+        hints left out.
+        """
+        shared_strings: List[str] = []
+        if "xl/sharedStrings.xml" not in self._names:
+            return shared_strings
+
+        parts: List[str] = []
+        for element in self._iter_elements("xl/sharedStrings.xml"):
+            name = _local_name(element.tag)
+            if name == "t":
+                parts.append(element.text or "")
+            elif name == "rPh":
+                # phonetic runs are parsed before their parent string is complete
+                for t in element.iter():
+                    if _local_name(t.tag) == "t" and parts:
+                        parts.pop()
+            elif name == "si":
+                shared_strings.append("".join(parts))
+                parts = []
+                element.clear()
+
+        return shared_strings
+
+    def _read_date_styles(self) -> Set[int]:
+        """
+        Reads the indexes of the cell styles formatting numbers as dates or times.
+        """
+        date_styles: Set[int] = set()
+        if "xl/styles.xml" not in self._names:
+            return date_styles
+
+        custom_date_formats: Set[int] = set()
+        cell_styles: List[int] = []
+        in_cell_styles = False
+        with self._workbook.open("xl/styles.xml") as part:
+            for event, element in iterparse(part, events=("start", "end")):
+                name = _local_name(element.tag)
+                if name == "cellXfs":
+                    in_cell_styles = event == "start"
+                elif event == "end" and name == "numFmt":
+                    if _is_date_format(element.get("formatCode", "")):
+                        custom_date_formats.add(int(element.get("numFmtId", "0")))
+                elif event == "end" and name == "xf" and in_cell_styles:
+                    cell_styles.append(int(element.get("numFmtId", "0")))
+
+        date_formats = BUILTIN_DATE_FORMATS | custom_date_formats
+        for style, number_format in enumerate(cell_styles):
+            if number_format in date_formats:
+                date_styles.add(style)
+
+        return date_styles
+
+    def _date_text(self, serial: str) -> str:
+        """
+        Converts a date serial number into 'YYYY-MM-DD', plus the time if any.
+        """
+        date = self._epoch + dt.timedelta(days=float(serial))
+        if date.time() == dt.time():
+            return date.strftime("%Y-%m-%d")
+
+        return date.replace(microsecond=0).strftime("%Y-%m-%d %H:%M:%S")
+
+    def _cell_text(self, cell_type: str, style: Optional[str], value: str) -> str:
+        """
+        Converts the value of a cell into text, see the class description.
+        """
+        if cell_type == "s":
+            return self._shared_strings[int(value)]
+        if cell_type == "b":
+            return "TRUE" if value == "1" else "FALSE"
+        if cell_type == "n" and style is not None and int(style) in self._date_styles:
+            date_text = self._date_texts.get(value)
+            if date_text is None:
+                date_text = self._date_texts[value] = self._date_text(value)
+            return date_text
+
+        return value
+
+    def __iter__(self) -> Iterator[List[str]]:
+        """
+        Yields the rows of the first worksheet. The sheet XML is fed to the parser in
+        chunks, without building any element tree, and rows are yielded as completed.
+
+        Returns:
+            Iterator[List[str]]: Cells of each row as text.
+        """
+        target = _SheetRowTarget(self._cell_text)
+        parser = XMLParser(target=target)
+        with self._workbook.open(self._sheet_path) as part:
+            while True:
+                chunk = part.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                parser.feed(chunk)
+                yield from target.rows
+                target.rows.clear()
+        parser.close()
+        yield from target.rows
+
+
+class _SheetRowTarget:
+    """
+    Parser target collecting the rows of a worksheet as they are parsed, see
+    XlsxRowReader. Only the cells of the row being parsed are kept, plus the completed
+    rows not yet consumed.
+
+    Args:
+        cell_text (Callable[[str, Optional[str], str], str]): Converts the type, style
+                                                              and value of a cell to text.
+    Attributes:
+        rows (List[List[str]]): Completed rows not yet consumed.
+    """
+
+    def __init__(self, cell_text: Callable[[str, Optional[str], str], str]):
+        self.rows: List[List[str]] = []
+        self._cell_text = cell_text
+        self._local_names: Dict[str, str] = {}
+        self._columns: Dict[str, int] = {}
+        self._cells: Dict[int, str] = {}
+        self._next_column = 0
+        self._cell_column = 0
+        self._cell_type = "n"
+        self._cell_style: Optional[str] = None
+        self._text: List[str] = []
+        self._collecting = False
+
+    def _local_name(self, tag: str) -> str:
+        name = self._local_names.get(tag)
+        if name is None:
+            name = self._local_names[tag] = _local_name(tag)
+
+        return name
+
+    def start(self, tag: str, attrib: Dict[str, str]):
+        name = self._local_name(tag)
+        if name == "c":
+            reference = attrib.get("r")
+            if reference:
+                letters = reference.rstrip("0123456789")
+                column = self._columns.get(letters)
+                if column is None:
+                    column = self._columns[letters] = _column_index(letters)
+                self._cell_column = column
+            else:
+                self._cell_column = self._next_column
+            self._cell_type = attrib.get("t", "n")
+            self._cell_style = attrib.get("s")
+            self._text = []
+        elif name == "v" or (name == "t" and self._cell_type == "inlineStr"):
+            self._collecting = True
+        elif name == "rPh":
+            # phonetic hints of inline strings are not part of their text
+            self._cell_type = "inlineStrPhonetic"
+        elif name == "row":
+            self._cells = {}
+            self._next_column = 0
+
+    def data(self, data: str):
+        if self._collecting:
+            self._text.append(data)
+
+    def end(self, tag: str):
+        name = self._local_name(tag)
+        if name == "v" or name == "t":
+            self._collecting = False
+        elif name == "rPh":
+            self._cell_type = "inlineStr"
+        elif name == "c":
+            value = "".join(self._text)
+            if self._cell_type != "inlineStr" and value != "":
+                value = self._cell_text(self._cell_type, self._cell_style, value)
+            if value != "":
+                self._cells[self._cell_column] = value
+            self._next_column = self._cell_column + 1
+        elif name == "row" and self._cells:
+            cells = self._cells
+            self.rows.append([cells.get(i, "") for i in range(max(cells) + 1)])
+
+    def close(self):
+        pass
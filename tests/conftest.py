@@ -2,12 +2,14 @@ from google.cloud import storage
 from google.cloud.storage.bucket import Bucket
 import pytest
 import os
-from typing import Tuple, List, Generator, Optional
+from typing import Tuple, List, Generator, Iterator, Optional
 import warnings
 
 from src import destination_repository, model
 from tests.data.asset_valuations import ASSET_VALUATIONS_2018
+from src.utils import memory_budget
 from src.utils.gcp_clients import create_bigquery_client, create_storage_client
+from src.utils.memory_budget import configure_memory_budget
 
 
 warnings.filterwarnings("ignore", category=UserWarning)
@@ -60,6 +62,26 @@ def repository_with_asset_valuations(
     )
 
 
+@pytest.fixture(scope="function")
+def sqlite_repository(
+    tmp_path,
+) -> Generator[destination_repository.SqliteDestinationRepository, None, None]:
+    """
+    Fixture that returns instance of SQLite Repository interface on an empty
+    database file, closed on tear down.
+
+    Returns:
+        instance of SqliteDestinationRepository()
+    """
+    sqlite_repository = destination_repository.SqliteDestinationRepository(
+        str(tmp_path / "asset_valuations.db")
+    )
+
+    yield sqlite_repository
+
+    sqlite_repository.close()
+
+
 @pytest.fixture(scope="function")
 def empty_bucket_and_project() -> Generator[
     Tuple[Bucket, Optional[str]],
@@ -90,3 +112,13 @@ def empty_bucket_and_project() -> Generator[
     yield bucket, storage_client.project
 
     delete_blobs(bucket)
+
+
+@pytest.fixture
+def process_budget(monkeypatch) -> Iterator[None]:
+    """
+    Fixture restoring the memory budget of the process, unlimited, once the test is done.
+    """
+    yield
+    monkeypatch.delenv(memory_budget.MEMORY_BUDGET_ENV, raising=False)
+    configure_memory_budget()
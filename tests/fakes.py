@@ -0,0 +1,272 @@
+import datetime as dt
+import json
+import re
+from typing import IO, Any, Dict, Iterator, List, Optional, Tuple
+
+from google.cloud import bigquery
+
+
+class FakeLoadJob:
+    """
+    In-process stand-in for google.cloud.bigquery.LoadJob.
+    """
+
+    error_result = None
+
+    def result(self) -> "FakeLoadJob":
+        return self
+
+
+class FakeQueryJob:
+    """
+    In-process stand-in for google.cloud.bigquery.QueryJob, of a DML statement or of a
+    query whose result rows are given. It is its own result.
+    """
+
+    error_result = None
+    num_dml_affected_rows = 0
+    total_bytes_processed = 0
+    destination = "project._anonymous.query_result"
+
+    def __init__(self, rows: Optional[List[Dict[str, Any]]] = None):
+        self.rows = rows if rows else []
+        self.total_rows = len(self.rows)
+        self.schema = [
+            bigquery.SchemaField(name, "STRING")
+            for name in (self.rows[0] if self.rows else {})
+        ]
+
+    def result(self) -> "FakeQueryJob":
+        return self
+
+    def __iter__(self) -> Iterator[bigquery.Row]:
+        return iter(_to_bigquery_rows(self.rows))
+
+
+def _to_bigquery_rows(
+    rows: List[Dict[str, Any]], fields: Optional[List[str]] = None
+) -> List[bigquery.Row]:
+    """
+    Builds BigQuery rows from dictionaries, with only the fields given if any.
+    """
+    if not rows:
+        return []
+    fields = fields if fields else list(rows[0])
+    field_to_index = {name: index for index, name in enumerate(fields)}
+
+    return [
+        bigquery.Row([row[name] for name in fields], field_to_index) for row in rows
+    ]
+
+
+class FakeBigQueryClient:
+    """
+    In-process stand-in for google.cloud.bigquery.Client that records load requests
+    instead of sending them to BigQuery.
+
+    Args:
+        query_rows (List[Dict[str, Any]], optional): Result rows of every query.
+    Attributes:
+        loads (List[Dict[str, Any]]): destination, rows and job config of each load request.
+        queries (List[Dict[str, Any]]): query and job config of each query request.
+        row_reads (List[Tuple[int, int]]): start index and rows of each list_rows request.
+        copies (List[Tuple[str, str]]): source and destination of each copy request.
+        deleted_tables (List[str]): tables of each delete request.
+    """
+
+    def __init__(self, query_rows: Optional[List[Dict[str, Any]]] = None):
+        self.query_rows = query_rows
+        self.loads: List[Dict[str, Any]] = []
+        self.queries: List[Dict[str, Any]] = []
+        self.row_reads: List[Tuple[int, int]] = []
+        self.copies: List[Tuple[str, str]] = []
+        self.deleted_tables: List[str] = []
+
+    def load_table_from_file(
+        self,
+        file_obj: IO[bytes],
+        destination: str,
+        rewind: bool = False,
+        size: Optional[int] = None,
+        job_id: Optional[str] = None,
+        job_config: Any = None,
+    ) -> FakeLoadJob:
+        if rewind:
+            file_obj.seek(0)
+        data = file_obj.read(size) if size is not None else file_obj.read()
+        self.loads.append(
+            {
+                "destination": destination,
+                "rows": [json.loads(line) for line in data.splitlines()],
+                "job_config": job_config,
+            }
+        )
+
+        return FakeLoadJob()
+
+    def query(
+        self, query: str, job_config: Any = None, job_id: Optional[str] = None
+    ) -> "FakeQueryJob":
+        self.queries.append({"query": query, "job_config": job_config})
+
+        return FakeQueryJob(self.query_rows)
+
+    def copy_table(
+        self,
+        sources: str,
+        destination: str,
+        job_id: Optional[str] = None,
+        job_config: Any = None,
+    ) -> FakeLoadJob:
+        self.copies.append((sources, destination))
+
+        return FakeLoadJob()
+
+    def delete_table(self, table: str, not_found_ok: bool = False):
+        self.deleted_tables.append(table)
+
+    def list_rows(
+        self,
+        table: str,
+        selected_fields: Optional[List[bigquery.SchemaField]] = None,
+        start_index: int = 0,
+        max_results: Optional[int] = None,
+        page_size: Optional[int] = None,
+    ) -> List[bigquery.Row]:
+        rows = self.query_rows if self.query_rows else []
+        end_index = len(rows) if max_results is None else start_index + max_results
+        self.row_reads.append((start_index, end_index - start_index))
+        fields = [field.name for field in selected_fields] if selected_fields else None
+
+        return _to_bigquery_rows(rows[start_index:end_index], fields)
+
+    def loaded_rows(self) -> List[Dict[str, Any]]:
+        """
+        Returns:
+            List[Dict[str, Any]]: all rows loaded so far, in load order.
+        """
+        return [row for load in self.loads for row in load["rows"]]
+
+
+class FakeBlob:
+    """
+    In-process stand-in for google.cloud.storage.Blob, holding its name and content.
+
+    Attributes:
+        size (int): size of the content in bytes.
+        updated (dt.datetime, optional): time the blob was last written.
+        chunk_size (int, optional): default size of ranged downloads of streams, None
+                                    for the library default.
+        ranges_read (List[Tuple[int, Optional[int]]]): start and end of each download
+                                                       request.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        content: bytes = b"",
+        updated: Optional[dt.datetime] = None,
+    ):
+        self.name = name
+        self.content = content
+        self.size = len(content)
+        self.updated = updated
+        self.chunk_size: Optional[int] = None
+        self.ranges_read: List[Tuple[int, Optional[int]]] = []
+
+    def download_as_bytes(
+        self, start: int = 0, end: Optional[int] = None, **kwargs
+    ) -> bytes:
+        self.ranges_read.append((start, end))
+
+        return self.content[start : None if end is None else end + 1]
+
+
+class FakeBlobIterator:
+    """
+    In-process stand-in for the page iterator returned by Bucket.list_blobs.
+    """
+
+    def __init__(self, blobs: List[FakeBlob], page_size: int):
+        self.pages = (blobs[i : i + page_size] for i in range(0, len(blobs), page_size))
+
+    def __iter__(self) -> Iterator[FakeBlob]:
+        for page in self.pages:
+            yield from page
+
+
+class FakeBucket:
+    """
+    In-process stand-in for google.cloud.storage.Bucket that lists a fixed set of blobs,
+    applying prefix, offsets and '*' or '**' globs as GCS does.
+
+    Attributes:
+        blob_names (List[str]): names of the blobs in the bucket.
+        page_size (int): number of blobs per page of results.
+        listed (List[str]): names returned by all listing requests so far.
+        blobs (Dict[str, FakeBlob]): blobs by name.
+    """
+
+    def __init__(
+        self,
+        blob_names: List[str],
+        page_size: int = 2,
+        contents: Optional[Dict[str, bytes]] = None,
+        name: str = "bucket",
+        updated: Optional[Dict[str, dt.datetime]] = None,
+    ):
+        self.name = name
+        self.blob_names = sorted(blob_names)
+        self.page_size = page_size
+        self.listed: List[str] = []
+        contents = contents if contents else {}
+        updated = updated if updated else {}
+        self.blobs = {
+            blob_name: FakeBlob(
+                blob_name, contents.get(blob_name, b""), updated.get(blob_name)
+            )
+            for blob_name in self.blob_names
+        }
+
+    def blob(self, blob_name: str) -> FakeBlob:
+        return self.blobs.setdefault(blob_name, FakeBlob(blob_name))
+
+    def list_blobs(
+        self,
+        prefix: Optional[str] = None,
+        start_offset: Optional[str] = None,
+        end_offset: Optional[str] = None,
+        fields: Optional[str] = None,
+        match_glob: Optional[str] = None,
+    ) -> FakeBlobIterator:
+        glob = None
+        if match_glob is not None:
+            glob = re.compile(
+                re.escape(match_glob)
+                .replace(r"\*\*", ".*")
+                .replace(r"\*", "[^/]*")
+                .replace(r"\?", "[^/]")
+            )
+        names = [
+            name
+            for name in self.blob_names
+            if name.startswith(prefix or "")
+            and (start_offset is None or name >= start_offset)
+            and (end_offset is None or name < end_offset)
+            and (glob is None or glob.fullmatch(name))
+        ]
+        self.listed.extend(names)
+
+        return FakeBlobIterator([self.blobs[name] for name in names], self.page_size)
+
+
+class FakeStorageClient:
+    """
+    In-process stand-in for google.cloud.storage.Client serving fake buckets.
+    """
+
+    def __init__(self, *buckets: FakeBucket):
+        self.buckets = {bucket.name: bucket for bucket in buckets}
+
+    def bucket(self, bucket_name: str) -> FakeBucket:
+        return self.buckets[bucket_name]
@@ -0,0 +1,584 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+import datetime as dt
+import json
+import logging
+import math
+import random
+import subprocess
+import sys
+import threading
+import time
+from types import SimpleNamespace
+from typing import IO, Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from unittest import mock
+
+import click
+
+from src.entrypoints.cloud_function import main as handler_module
+from src.utils.rate_limiting import rate_limiters_summary
+from tests.fakes import (
+    FakeBigQueryClient,
+    FakeBlob,
+    FakeBucket,
+    FakeLoadJob,
+    FakeQueryJob,
+    FakeStorageClient,
+)
+
+BUCKET_NAME = "raw-assets"
+FIRST_FILE_DATE = dt.date(2000, 1, 1)
+# run in a fresh interpreter, so the import of the handler module is timed as on a cold
+# instance, before the harness imports anything
+COLD_START_PROBE = """
+import time
+start = time.perf_counter()
+from src.entrypoints.cloud_function import main
+import_seconds = time.perf_counter() - start
+from tests.load_harness import cold_start_probe
+cold_start_probe(import_seconds, {rows})
+"""
+
+Event = Tuple[Dict[str, Any], SimpleNamespace]
+
+
+def synthetic_files(
+    count: int, rows: int, invalid_share: float = 0.0, seed: int = 0
+) -> Dict[str, bytes]:
+    """
+    Generates generic CSV files of a statement of rows products each, one per day from
+    FIRST_FILE_DATE, e.g. 'generic_2000_01_01.csv'. A share of the files has a wrong
+    header, so that handling them fails as an invalid upload would.
+
+    Args:
+        count (int): Number of files.
+        rows (int): Products valued by each file.
+        invalid_share (float, optional): Share of the files with a wrong header.
+                                         Defaults to 0.
+        seed (int, optional): Seed of the values and of the files made invalid.
+    Returns:
+        Dict[str, bytes]: Content of each file, by blob name.
+    """
+    rng = random.Random(seed)
+    files: Dict[str, bytes] = {}
+    for i in range(count):
+        date = FIRST_FILE_DATE + dt.timedelta(days=i)
+        header = "product,day,price" if rng.random() < invalid_share else None
+        lines = [header if header else "product_name,date,value"]
+        lines.extend(
+            f"Fund {product},{date.isoformat()},{rng.uniform(10, 99999):.2f}"
+            for product in range(rows)
+        )
+        files[f"generic_{date:%Y_%m_%d}.csv"] = ("\n".join(lines) + "\n").encode()
+
+    return files
+
+
+def finalize_event(blob: FakeBlob, bucket_name: str, generation: int) -> Event:
+    """
+    Builds the event and context delivered to the Cloud Function when a blob is
+    uploaded, as for a google.cloud.storage.object.v1.finalized trigger.
+
+    Args:
+        blob (FakeBlob): The blob uploaded.
+        bucket_name (str): Name of its bucket.
+        generation (int): Generation of the blob, also used as event id.
+    Returns:
+        Tuple[Dict[str, Any], SimpleNamespace]: The event and its context.
+    """
+    now = dt.datetime.now(dt.timezone.utc).isoformat()
+    event = {
+        "bucket": bucket_name,
+        "name": blob.name,
+        "size": str(blob.size),
+        "contentType": "text/csv",
+        "generation": str(generation),
+        "metageneration": "1",
+        "timeCreated": now,
+        "updated": now,
+    }
+    context = SimpleNamespace(
+        event_id=str(generation),
+        timestamp=now,
+        event_type="google.cloud.storage.object.v1.finalized",
+        resource={
+            "service": "storage.googleapis.com",
+            "name": f"projects/_/buckets/{bucket_name}/objects/{blob.name}",
+            "type": "storage#object",
+        },
+    )
+
+    return event, context
+
+
+class SlowBlob(FakeBlob):
+    """
+    Fake blob whose downloads take latency_seconds before returning, as a GCS request.
+    """
+
+    latency_seconds: float = 0.0
+
+    def download_as_bytes(
+        self, start: int = 0, end: Optional[int] = None, **kwargs
+    ) -> bytes:
+        time.sleep(self.latency_seconds)
+        return super().download_as_bytes(start, end)
+
+
+class ReplayBigQueryClient(FakeBigQueryClient):
+    """
+    Fake BigQuery client whose jobs take latency_seconds, counting the rows loaded
+    instead of keeping them, so that long replays do not grow in memory.
+
+    Args:
+        latency_seconds (float, optional): Time taken by each job. Defaults to 0.
+    Attributes:
+        jobs (int): Jobs run.
+        rows_loaded (int): Rows of all load jobs.
+    """
+
+    def __init__(self, latency_seconds: float = 0.0):
+        super().__init__()
+        self.latency_seconds = latency_seconds
+        self.jobs = 0
+        self.rows_loaded = 0
+        self._lock = threading.Lock()
+
+    def load_table_from_file(
+        self,
+        file_obj: IO[bytes],
+        destination: str,
+        rewind: bool = False,
+        size: Optional[int] = None,
+        job_id: Optional[str] = None,
+        job_config: Any = None,
+    ) -> FakeLoadJob:
+        if rewind:
+            file_obj.seek(0)
+        data = file_obj.read(size) if size is not None else file_obj.read()
+        time.sleep(self.latency_seconds)
+        with self._lock:
+            self.jobs += 1
+            self.rows_loaded += data.count(b"\n")
+
+        return FakeLoadJob()
+
+    def query(
+        self, query: str, job_config: Any = None, job_id: Optional[str] = None
+    ) -> FakeQueryJob:
+        time.sleep(self.latency_seconds)
+        with self._lock:
+            self.jobs += 1
+
+        return FakeQueryJob()
+
+
+def create_bucket(
+    files: Dict[str, bytes], latency_seconds: float = 0.0
+) -> Tuple[FakeBucket, List[Event]]:
+    """
+    Uploads files to a fake bucket whose reads take latency_seconds, and builds the
+    finalize event of each, in upload order.
+
+    Args:
+        files (Dict[str, bytes]): Content of each file, by blob name.
+        latency_seconds (float, optional): Time taken by each read. Defaults to 0.
+    Returns:
+        Tuple[FakeBucket, List[Event]]: The bucket and the event of each file.
+    """
+    bucket = FakeBucket(list(files), contents=files, name=BUCKET_NAME)
+    events: List[Event] = []
+    for generation, blob_name in enumerate(files, start=1):
+        blob = SlowBlob(blob_name, files[blob_name])
+        blob.latency_seconds = latency_seconds
+        bucket.blobs[blob_name] = blob
+        events.append(finalize_event(blob, bucket.name, generation))
+
+    return bucket, events
+
+
+@contextmanager
+def wired_handler(
+    storage_client: FakeStorageClient, bigquery_client: FakeBigQueryClient
+) -> Iterator[Callable[[Dict[str, Any], Any], None]]:
+    """
+    Wires the Cloud Function handler to in-process fakes instead of GCS and BigQuery.
+
+    Args:
+        storage_client (FakeStorageClient): Client of the buckets read by the handler.
+        bigquery_client (FakeBigQueryClient): Client of the loads run by the handler.
+    Returns:
+        Iterator[Callable]: func_entry_point, wired while the context is open.
+    """
+    with mock.patch.object(
+        handler_module, "create_storage_client", return_value=storage_client
+    ), mock.patch.object(
+        handler_module, "create_bigquery_client", return_value=bigquery_client
+    ), mock.patch.object(
+        handler_module, "_instance", threading.local()
+    ):
+        yield handler_module.func_entry_point
+
+
+@dataclass(frozen=True)
+class Invocation:
+    """
+    An invocation of the handler during a replay, times being perf_counter seconds.
+
+    Attributes:
+        blob_name (str): Blob of the event.
+        instance (int): Instance, i.e. worker, that handled the event.
+        cold (bool): Whether it was the first invocation of its instance.
+        arrival (float): Time the event was due.
+        start (float): Time the handler was called.
+        end (float): Time the handler returned.
+        error (str, optional): Error raised by the handler, if any.
+    """
+
+    blob_name: str
+    instance: int
+    cold: bool
+    arrival: float
+    start: float
+    end: float
+    error: Optional[str] = None
+
+    @property
+    def latency(self) -> float:
+        """
+        Seconds from the event being due until handled, time queued included.
+        """
+        return self.end - self.arrival
+
+    @property
+    def service_time(self) -> float:
+        """
+        Seconds the handler took.
+        """
+        return self.end - self.start
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """
+    Nearest-rank percentile of values, 0 if there are none.
+
+    Args:
+        values (Sequence[float]): The values.
+        q (float): The percentile, between 0 and 100.
+    Returns:
+        float: The smallest value at least q% of the values are lower than or equal to.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+@dataclass(frozen=True)
+class ReplayReport:
+    """
+    Outcome of a replay of events against the handler.
+
+    Attributes:
+        invocations (List[Invocation]): Each invocation, in arrival order.
+        duration (float): Seconds from the first event being due until the last handled.
+    """
+
+    invocations: List[Invocation]
+    duration: float
+
+    @property
+    def errors(self) -> int:
+        return sum(invocation.error is not None for invocation in self.invocations)
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / len(self.invocations) if self.invocations else 0.0
+
+    @property
+    def throughput(self) -> float:
+        """
+        Events handled per second.
+        """
+        return len(self.invocations) / self.duration if self.duration else 0.0
+
+    def latencies(self, cold: Optional[bool] = None) -> List[float]:
+        """
+        Latency of the invocations, of cold or warm ones only if cold is given.
+
+        Args:
+            cold (bool, optional): Whether only cold, or only warm, invocations count.
+        Returns:
+            List[float]: The latencies, in seconds.
+        """
+        return [
+            invocation.latency
+            for invocation in self.invocations
+            if cold is None or invocation.cold == cold
+        ]
+
+    def summary(self) -> str:
+        """
+        Describes the replay: latency percentiles, throughput, cold and warm invocations
+        and errors.
+
+        Returns:
+            str: The summary, one line per measure.
+        """
+        latencies = self.latencies()
+        service_times = [invocation.service_time for invocation in self.invocations]
+        lines = [
+            f"events: {len(self.invocations)} in {self.duration:.2f}s, "
+            f"throughput {self.throughput:.1f} events/s",
+            "latency: "
+            + ", ".join(
+                f"p{q} {percentile(latencies, q) * 1000:.1f}ms" for q in (50, 95, 99)
+            )
+            + f", max {max(latencies, default=0.0) * 1000:.1f}ms",
+            "handler time: "
+            + ", ".join(
+                f"p{q} {percentile(service_times, q) * 1000:.1f}ms"
+                for q in (50, 95, 99)
+            ),
+        ]
+        for label, cold in (("cold", True), ("warm", False)):
+            subset = self.latencies(cold)
+            lines.append(
+                f"{label}: {len(subset)} invocations, "
+                f"p50 {percentile(subset, 50) * 1000:.1f}ms, "
+                f"p99 {percentile(subset, 99) * 1000:.1f}ms"
+            )
+        lines.append(f"errors: {self.errors} ({self.error_rate:.1%})")
+        error_types = Counter(
+            invocation.error.split(":")[0]
+            for invocation in self.invocations
+            if invocation.error
+        )
+        lines.extend(f"  {name}: {count}" for name, count in error_types.most_common())
+
+        return "\n".join(lines)
+
+
+def replay(
+    handler: Callable[[Dict[str, Any], Any], None],
+    events: List[Event],
+    rate: Optional[float] = None,
+    concurrency: int = 1,
+) -> ReplayReport:
+    """
+    Replays events against a handler, open loop: event i is due at i / rate seconds,
+    whether earlier ones were handled or not, as a burst of uploads would be delivered.
+    Events are handled by concurrency instances, each handling one event at a time as a
+    Cloud Function instance does by default, so events queue once all are busy. The first
+    event handled by each instance is counted as cold.
+
+    Args:
+        handler (Callable): The handler, e.g. wired by wired_handler().
+        events (List[Event]): Event and context of each invocation.
+        rate (float, optional): Events due per second. All at once if not given.
+        concurrency (int, optional): Instances handling events. Defaults to 1.
+    Returns:
+        ReplayReport: Timing and outcome of each invocation.
+    """
+    instances = threading.local()
+    next_instance = iter(range(concurrency))
+    instance_lock = threading.Lock()
+
+    def invoke(event: Dict[str, Any], context: Any, arrival: float) -> Invocation:
+        cold = not hasattr(instances, "number")
+        if cold:
+            with instance_lock:
+                instances.number = next(next_instance)
+        start = time.perf_counter()
+        error = None
+        try:
+            handler(event, context)
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e)[:200]}"
+
+        return Invocation(
+            event["name"],
+            instances.number,
+            cold,
+            arrival,
+            start,
+            time.perf_counter(),
+            error,
+        )
+
+    first_arrival = time.perf_counter()
+    with ThreadPoolExecutor(
+        max_workers=concurrency, thread_name_prefix="instance"
+    ) as executor:
+        futures = []
+        for i, (event, context) in enumerate(events):
+            arrival = first_arrival + (i / rate if rate else 0.0)
+            wait_seconds = arrival - time.perf_counter()
+            if wait_seconds > 0:
+                time.sleep(wait_seconds)
+            futures.append(executor.submit(invoke, event, context, arrival))
+        invocations = [future.result() for future in futures]
+
+    duration = max(
+        (invocation.end for invocation in invocations), default=first_arrival
+    )
+
+    return ReplayReport(invocations, duration - first_arrival)
+
+
+def cold_start_probe(import_seconds: float, rows: int):
+    """
+    Handles two events in a fresh interpreter, started by measure_cold_starts(), and
+    prints the import time of the handler module and the time of each invocation as JSON.
+
+    Args:
+        import_seconds (float): Time the import of the handler module took.
+        rows (int): Products valued by each file.
+    """
+    bucket, events = create_bucket(synthetic_files(2, rows))
+    with wired_handler(FakeStorageClient(bucket), ReplayBigQueryClient()) as handler:
+        seconds = []
+        for event, context in events:
+            start = time.perf_counter()
+            handler(event, context)
+            seconds.append(time.perf_counter() - start)
+    print(
+        json.dumps(
+            {
+                "import_seconds": import_seconds,
+                "first_call_seconds": seconds[0],
+                "second_call_seconds": seconds[1],
+            }
+        )
+    )
+
+
+def measure_cold_starts(count: int, rows: int) -> List[Dict[str, float]]:
+    """
+    Measures cold starts: each one in a fresh interpreter, timing the import of the handler
+    module, then a first and a second invocation, see cold_start_probe().
+
+    Args:
+        count (int): Number of cold starts.
+        rows (int): Products valued by each file.
+    Returns:
+        List[Dict[str, float]]: import_seconds, first_call_seconds and
+                                second_call_seconds of each cold start.
+    """
+    probes = []
+    for _ in range(count):
+        result = subprocess.run(
+            [sys.executable, "-c", COLD_START_PROBE.format(rows=rows)],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        probes.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    return probes
+
+
+@click.command()
+@click.option(
+    "--events", "-e", default=200, show_default=True, type=click.IntRange(min=1)
+)
+@click.option(
+    "--rows",
+    "-r",
+    default=500,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Products valued by each file",
+)
+@click.option(
+    "--rate",
+    default=None,
+    type=click.FloatRange(min=0, min_open=True),
+    help="Events due per second. All at once if not given",
+)
+@click.option(
+    "--concurrency",
+    "-c",
+    default=4,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="Instances handling events, one at a time each",
+)
+@click.option(
+    "--invalid_share",
+    default=0.0,
+    show_default=True,
+    type=click.FloatRange(0, 1),
+    help="Share of the files with a wrong header",
+)
+@click.option(
+    "--gcs_latency_ms",
+    default=20.0,
+    show_default=True,
+    type=click.FloatRange(min=0),
+    help="Time taken by each GCS read",
+)
+@click.option(
+    "--bigquery_latency_ms",
+    default=200.0,
+    show_default=True,
+    type=click.FloatRange(min=0),
+    help="Time taken by each BigQuery job",
+)
+@click.option(
+    "--cold_starts",
+    default=0,
+    show_default=True,
+    type=click.IntRange(min=0),
+    help="Cold starts measured in fresh interpreters",
+)
+@click.option("--seed", default=0, show_default=True, type=int)
+@click.option("--handler_logs", is_flag=True, help="Keep the logs of the handler")
+def main(
+    events: int,
+    rows: int,
+    rate: Optional[float],
+    concurrency: int,
+    invalid_share: float,
+    gcs_latency_ms: float,
+    bigquery_latency_ms: float,
+    cold_starts: int,
+    seed: int,
+    handler_logs: bool,
+):
+    """
+    Replays a burst of finalize events against the Cloud Function handler, wired to
+    in-process GCS and BigQuery fakes with the given latencies, and reports latency
+    percentiles, throughput, cold and warm invocations and errors. BigQuery jobs are
+    rate limited as in production, see BIGQUERY_REQUESTS_PER_SECOND.
+    Run from the root of the repository: python -m tests.load_harness --help
+    """
+    if not handler_logs:
+        logging.disable(logging.INFO)
+    files = synthetic_files(events, rows, invalid_share, seed)
+    bucket, replayed = create_bucket(files, gcs_latency_ms / 1000)
+    bigquery_client = ReplayBigQueryClient(bigquery_latency_ms / 1000)
+
+    with wired_handler(FakeStorageClient(bucket), bigquery_client) as handler:
+        report = replay(handler, replayed, rate, concurrency)
+
+    click.echo(report.summary())
+    click.echo(
+        f"BigQuery: {bigquery_client.jobs} jobs, {bigquery_client.rows_loaded} rows loaded"
+    )
+    click.echo(f"API calls: {rate_limiters_summary()}")
+    if cold_starts:
+        probes = measure_cold_starts(cold_starts, rows)
+        for name in ("import_seconds", "first_call_seconds", "second_call_seconds"):
+            values = [probe[name] for probe in probes]
+            click.echo(
+                f"cold start {name}: p50 {percentile(values, 50) * 1000:.1f}ms, "
+                f"max {max(values) * 1000:.1f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import datetime as dt
+
+import pytest
+
+from src import model
+from src.analytics import ValuationHistory, period_returns
+
+CREATED = dt.datetime(2024, 1, 1)
+
+
+def valuation(
+    date: dt.date, value: float, product_name: str, creation_date=CREATED
+) -> model.AssetValuation:
+    return model.AssetValuation(date, value, product_name, "file.csv", creation_date)
+
+
+def test_daily_series_forward_fills_each_product():
+    """
+    GIVEN valuations of two products on irregular dates, one date valued twice
+    WHEN the daily series are built
+    THEN each product should be valued at its latest valuation on each day, 0 before its
+         first one, the valuation created last winning on a date
+    """
+    history = ValuationHistory()
+    history.add(
+        [
+            valuation(dt.date(2021, 1, 1), 100.0, "fund"),
+            valuation(dt.date(2021, 1, 4), 110.0, "fund"),
+            valuation(dt.date(2021, 1, 3), 50.0, "cash"),
+        ]
+    )
+    history.add(
+        [valuation(dt.date(2021, 1, 4), 120.0, "fund", dt.datetime(2024, 2, 1))]
+    )
+
+    series = history.daily_series()
+
+    assert (series.start, series.end, len(series)) == (
+        dt.date(2021, 1, 1),
+        dt.date(2021, 1, 4),
+        4,
+    )
+    assert list(series.products["fund"]) == [100.0, 100.0, 100.0, 120.0]
+    assert list(series.products["cash"]) == [0.0, 0.0, 50.0, 50.0]
+    assert list(series.totals()) == [100.0, 100.0, 150.0, 170.0]
+    assert history.rows == 4
+
+
+def test_daily_series_ties_broken_by_order_added():
+    """
+    GIVEN a date of a product valued twice with the same creation date, the lower value
+          added last
+    WHEN the daily series are built
+    THEN the valuation added last should win, not the larger one
+    """
+    history = ValuationHistory()
+    history.add([valuation(dt.date(2021, 1, 1), 120.0, "fund")])
+    history.add([valuation(dt.date(2021, 1, 1), 100.0, "fund")])
+
+    series = history.daily_series()
+
+    assert list(series.products["fund"]) == [100.0]
+
+
+def test_daily_series_over_a_range_with_staleness_limit():
+    """
+    GIVEN valuations of a product before, within and after a range of days
+    WHEN the daily series are built over the range, carrying valuations 2 days at most
+    THEN the valuation before the range should carry into it, and gaps longer than the
+         limit be valued at 0
+    """
+    history = ValuationHistory()
+    history.add(
+        [
+            valuation(dt.date(2021, 1, 1), 10.0, "fund"),
+            valuation(dt.date(2021, 1, 5), 20.0, "fund"),
+            valuation(dt.date(2021, 1, 20), 30.0, "fund"),
+        ]
+    )
+
+    series = history.daily_series(
+        dt.date(2021, 1, 2), dt.date(2021, 1, 10), max_staleness_days=2
+    )
+
+    assert (
+        list(series.products["fund"]) == [10.0, 10.0, 0.0, 20.0, 20.0, 20.0] + [0.0] * 3
+    )
+
+
+def test_daily_series_of_empty_history():
+    """
+    GIVEN an empty history
+    WHEN daily series are built with and without a range
+    THEN zeros should be returned over the range, and a ValueError raised without
+    """
+    history = ValuationHistory()
+
+    with pytest.raises(ValueError):
+        history.daily_series()
+    series = history.daily_series(dt.date(2021, 1, 1), dt.date(2021, 1, 3))
+    assert list(series.totals()) == [0.0, 0.0, 0.0]
+
+
+def test_period_returns_chain_over_months_and_years():
+    """
+    GIVEN a daily series from mid January to early March
+    WHEN monthly and yearly returns of its totals are computed
+    THEN each period should be measured from the end of the previous one, partial
+         periods included
+    """
+    history = ValuationHistory()
+    history.add(
+        [
+            valuation(dt.date(2021, 1, 15), 100.0, "fund"),
+            valuation(dt.date(2021, 1, 31), 110.0, "fund"),
+            valuation(dt.date(2021, 2, 28), 99.0, "fund"),
+            valuation(dt.date(2021, 3, 3), 0.0, "fund"),
+        ]
+    )
+    series = history.daily_series()
+
+    monthly = period_returns(series, series.totals(), "month")
+
+    assert [(r.start, r.end) for r in monthly] == [
+        (dt.date(2021, 1, 15), dt.date(2021, 1, 31)),
+        (dt.date(2021, 1, 31), dt.date(2021, 2, 28)),
+        (dt.date(2021, 2, 28), dt.date(2021, 3, 3)),
+    ]
+    assert [r.simple_return for r in monthly] == pytest.approx([0.1, -0.1, -1.0])
+    (yearly,) = period_returns(series, series.products["fund"], "year")
+    assert (yearly.start_value, yearly.end_value) == (100.0, 0.0)
+    with pytest.raises(ValueError):
+        period_returns(series, series.totals(), "week")
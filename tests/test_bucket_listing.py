@@ -0,0 +1,97 @@
+import datetime as dt
+
+from src.utils.bucket_listing import ListingShard, ParallelBucketLister, listing_shards
+from src.utils.scheduling import ScheduledFile
+from tests.fakes import FakeBucket
+
+
+def test_listing_shards_split_file_types_by_year():
+    """
+    GIVEN the supported file types and a range of years
+    WHEN the keyspace is split into listing shards
+    THEN each file type should get contiguous ranges bounded by year, and every other
+         name a catch-all range
+    """
+    shards = listing_shards(first_year=2022, last_year=2023)
+
+    assert shards == [
+        ListingShard("hl_", None, "hl_2022"),
+        ListingShard("hl_", "hl_2022", "hl_2023"),
+        ListingShard("hl_", "hl_2023", None),
+        ListingShard("generic_", None, "generic_2022"),
+        ListingShard("generic_", "generic_2022", "generic_2023"),
+        ListingShard("generic_", "generic_2023", None),
+        ListingShard("", None, "generic_"),
+        ListingShard("", "generic`", "hl_"),
+        ListingShard("", "hl`", None),
+    ]
+
+
+def test_listing_shards_narrowed_by_prefix():
+    """
+    GIVEN listing prefixes with folders or part of a file name
+    WHEN the keyspace is split into listing shards
+    THEN only file types the prefix can match should get their ranges, and other names
+         under the prefix catch-all ranges
+    """
+    assert {shard.prefix for shard in listing_shards("statements/")} == {
+        "statements/hl_",
+        "statements/generic_",
+        "statements/",
+    }
+    assert {shard.prefix for shard in listing_shards("g")} == {"generic_", "g"}
+    assert listing_shards("generic_2023", first_year=2022, last_year=2023) == [
+        ListingShard("generic_2023")
+    ]
+    assert listing_shards("dummy") == [ListingShard("dummy")]
+
+
+def test_parallel_bucket_lister_lists_each_supported_file_once():
+    """
+    GIVEN a bucket with supported files across years, in folders and in upper case, and
+          unsupported files
+    WHEN its blobs are listed in parallel
+    THEN every blob should be listed once, supported files yielded and the others
+         skipped and counted
+    """
+    supported = [
+        "2024/hl_2024_01_01.csv",
+        "HL_2024_01_02.csv",
+        "generic_1999_12_31.csv",
+        "generic_2018_12_29.csv",
+        "generic_2021_01_01.csv",
+        "generic_2021_06_30.csv.gz",
+        "hl_2023_11_24.csv",
+        "hl_2099_01_01.csv",
+    ]
+    unsupported = ["dummy.txt", "generics.csv", "readme.md", "zz/notes.txt"]
+    bucket = FakeBucket(supported + unsupported)
+
+    lister = ParallelBucketLister(bucket, workers=4)  # type: ignore
+    blob_names = list(lister.iter_blob_names())
+
+    assert sorted(blob_names) == supported
+    assert sorted(bucket.listed) == sorted(supported + unsupported)
+    assert lister.skipped_blobs == len(unsupported)
+
+
+def test_parallel_bucket_lister_lists_files_with_metadata():
+    """
+    GIVEN a bucket of supported files of different sizes and update times
+    WHEN its files are listed for scheduling
+    THEN each file should come with its size and update time
+    """
+    updated = dt.datetime(2024, 1, 1, tzinfo=dt.timezone.utc)
+    bucket = FakeBucket(
+        ["generic_2021_01_01.csv", "hl_2023_11_24.csv", "dummy.txt"],
+        contents={"hl_2023_11_24.csv": b"1234"},
+        updated={"hl_2023_11_24.csv": updated},
+    )
+
+    lister = ParallelBucketLister(bucket, workers=2)  # type: ignore
+    files = sorted(lister.iter_files(), key=lambda file: file.name)
+
+    assert files == [
+        ScheduledFile("generic_2021_01_01.csv", 0, None),
+        ScheduledFile("hl_2023_11_24.csv", 4, updated),
+    ]
@@ -0,0 +1,77 @@
+import datetime as dt
+
+from src import delta_index, destination_repository, model
+
+
+def valuation(day: int, value: float, product_name: str = "p") -> model.AssetValuation:
+    return model.AssetValuation(dt.date(2020, 1, day), value, product_name, "f.csv")
+
+
+def test_filter_changed():
+    """
+    GIVEN a delta index with the last known valuation of some products
+    WHEN a batch of Asset Valuations is filtered
+    THEN only new products, changed values and valuations older than the index are kept
+    """
+    index = delta_index.LocalDeltaIndex("unused.json")
+    index.update([valuation(10, 1.0, "a"), valuation(10, 2.0, "b")])
+    batch = [
+        valuation(11, 1.0, "a"),  # unchanged
+        valuation(10, 1.0, "a"),  # unchanged, same date
+        valuation(11, 2.5, "b"),  # changed
+        valuation(5, 2.0, "b"),  # older than index
+        valuation(11, 3.0, "c"),  # new
+        valuation(12, 3.0, "c"),  # unchanged within batch
+    ]
+
+    assert index.filter_changed(batch) == [batch[2], batch[3], batch[4]]
+
+
+def test_update_keeps_latest():
+    """
+    GIVEN a delta index
+    WHEN it is updated with valuations of different dates
+    THEN it should hold the most recent valuation of each product
+    """
+    index = delta_index.LocalDeltaIndex("unused.json")
+
+    index.update([valuation(10, 1.0), valuation(5, 2.0), valuation(12, 3.0)])
+
+    assert index.entries == {"p": (dt.date(2020, 1, 12), 3.0)}
+
+
+def test_save_and_load(tmp_path):
+    """
+    GIVEN a local delta index with entries
+    WHEN it is saved and loaded into a new index on the same path
+    THEN the new index should have the same entries
+    """
+    path = str(tmp_path / "index.json")
+    index = delta_index.create_delta_index(path)
+    assert index.entries == {}
+    index.update([valuation(10, 1.5, "a"), valuation(11, 2.0, "b")])
+
+    index.save()
+
+    assert delta_index.create_delta_index(path).entries == index.entries
+
+
+def test_rebuild_from_destination(
+    sqlite_repository: destination_repository.SqliteDestinationRepository,
+):
+    """
+    GIVEN a destination holding several valuations per product
+    WHEN a delta index is rebuilt from it
+    THEN the index should hold the latest valuation of each product
+    """
+    sqlite_repository.load_asset_valuations(
+        [valuation(10, 1.0, "a"), valuation(12, 2.0, "a"), valuation(11, 3.0, "b")]
+    )
+    index = delta_index.LocalDeltaIndex("unused.json")
+
+    index.rebuild(sqlite_repository)
+
+    assert index.entries == {
+        "a": (dt.date(2020, 1, 12), 2.0),
+        "b": (dt.date(2020, 1, 11), 3.0),
+    }
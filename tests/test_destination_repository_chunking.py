@@ -0,0 +1,393 @@
+import datetime as dt
+from google.api_core import exceptions
+import pytest
+
+from src import destination_repository, model
+from src.utils import rate_limiting
+from tests.fakes import FakeBigQueryClient
+
+
+def asset_valuations(
+    n: int, product_name: str = "product"
+) -> list[model.AssetValuation]:
+    return [
+        model.AssetValuation(
+            dt.date(2020, 1, 1), float(i), f"{product_name} {i}", "dummy_file.csv"
+        )
+        for i in range(n)
+    ]
+
+
+def test_load_asset_valuations_splits_by_rows():
+    """
+    GIVEN a BigQuery destination with a row bound per chunk
+    WHEN more Asset Valuations than the bound are loaded
+    THEN they should be sent in chunks no bigger than the bound to a staging table,
+         committed by a single copy into the destination table, and metrics recorded
+    """
+    client = FakeBigQueryClient()
+    bq_repository = destination_repository.BiqQueryDestinationRepository(
+        client, min_chunk_rows=2, max_chunk_rows=4  # type: ignore
+    )
+    bq_repository.chunker.target_job_seconds = float("inf")  # keep chunk_rows steady
+
+    bq_repository.load_asset_valuations(asset_valuations(10))
+
+    assert [len(load["rows"]) for load in client.loads] == [4, 4, 2]
+    assert bq_repository.load_metrics.chunk_rows == [4, 4, 2]
+    assert len(client.loaded_rows()) == 10
+    (staging_table,) = {load["destination"] for load in client.loads}
+    assert staging_table.startswith("raw.asset_valuations_v2_staging_")
+    assert client.queries[0]["query"].startswith(f"CREATE TABLE {staging_table} ")
+    assert client.copies == [(staging_table, "raw.asset_valuations_v2")]
+    assert client.deleted_tables == [staging_table]
+
+
+def test_dry_run_is_not_a_bigquery_repository():
+    """
+    GIVEN a dry run destination
+    WHEN it is checked for the methods of a BigQuery repository that run jobs
+    THEN it should have none of them, as it has no client to run them with
+    """
+    dry_run = destination_repository.DryRunDestinationRepository()
+
+    assert not isinstance(dry_run, destination_repository.BiqQueryDestinationRepository)
+    assert not hasattr(dry_run, "rebuild_latest_snapshot")
+    assert not hasattr(dry_run, "_run_job")
+
+
+def test_load_asset_valuations_splits_by_bytes():
+    """
+    GIVEN a BigQuery destination with a serialised size bound per chunk
+    WHEN Asset Valuations exceeding the bound are loaded
+    THEN every chunk should fit the bound and no row should be lost
+    """
+    client = FakeBigQueryClient()
+    bq_repository = destination_repository.BiqQueryDestinationRepository(
+        client, max_chunk_bytes=1000  # type: ignore
+    )
+
+    bq_repository.load_asset_valuations(asset_valuations(50, "p" * 40))
+
+    assert len(client.loads) > 1
+    assert max(bq_repository.load_metrics.chunk_bytes) <= 1000
+    assert sum(bq_repository.load_metrics.chunk_rows) == 50
+    assert [row["product_name"] for row in client.loaded_rows()] == [
+        f"{'p' * 40} {i}" for i in range(50)
+    ]
+
+
+@pytest.mark.parametrize(
+    "job_seconds, expected_chunk_rows",
+    [(100.0, 400), (10.0, 800), (1.0, 1600), (1000.0, 400), (0.0, 1600)],
+)
+def test_adapt_chunk_rows(job_seconds: float, expected_chunk_rows: int):
+    """
+    GIVEN a chunker with bounds on the rows per chunk
+    WHEN a load job latency is observed
+    THEN chunk rows should shrink for slow jobs, grow for fast ones, within bounds
+    """
+    chunker = destination_repository.NdjsonChunker(
+        min_chunk_rows=400, max_chunk_rows=1600, target_job_seconds=15.0
+    )
+    chunker.chunk_rows = 800
+    chunker.adapt_chunk_rows(job_seconds)
+
+    assert chunker.chunk_rows == expected_chunk_rows
+
+
+def test_dry_run_plans_load_jobs_without_loading():
+    """
+    GIVEN a dry run destination with a row bound per chunk
+    WHEN Asset Valuations are loaded twice, in several chunks then in one
+    THEN the load jobs of each call should be planned as they would be for BigQuery,
+         with the staging jobs of the first call and the snapshot jobs of both
+    """
+    dry_run = destination_repository.DryRunDestinationRepository(
+        min_chunk_rows=2, max_chunk_rows=4
+    )
+    expected_bytes = len(
+        b"".join(map(dry_run.chunker.serialiser.serialise, asset_valuations(10)))
+    )
+
+    dry_run.load_asset_valuations(asset_valuations(10))
+    first_load = dry_run.last_load
+    dry_run.load_asset_valuations(asset_valuations(3))
+
+    assert first_load == (10, expected_bytes, 3)
+    assert dry_run.last_load[0::2] == (3, 1)
+    assert dry_run.load_metrics.chunk_rows == [4, 4, 2, 3]
+    assert dry_run.planned_jobs == {
+        "staging table creations": 1,
+        "staging copy jobs": 1,
+        "staging table deletions": 1,
+        "snapshot creations": 1,
+        "snapshot merges": 2,
+    }
+    assert dry_run.plan_summary().startswith("4 load jobs projected")
+    assert dry_run.plan_summary().endswith(
+        "; also 1 staging table creations, 1 staging copy jobs, "
+        "1 staging table deletions, 1 snapshot creations, 2 snapshot merges"
+    )
+    assert dry_run.get_latest_asset_valuations() == []
+
+
+class FlakyJob:
+    """
+    Query job with no rows, whose first wait fails, either while polling or because the
+    job failed.
+    """
+
+    def __init__(self, client: "FlakyBigQueryClient"):
+        self.client = client
+        self.error_result = None
+
+    def result(self) -> list:
+        if self.client.failures_left:
+            self.client.failures_left -= 1
+            if self.client.run_fails:
+                self.error_result = {"reason": "backendError"}
+                raise exceptions.InternalServerError("job failed")
+            raise exceptions.ServiceUnavailable("polling failed")
+        return []
+
+
+class FlakyBigQueryClient:
+    """
+    BigQuery client refusing to create a job id twice, as BigQuery does.
+    """
+
+    def __init__(self, run_fails: bool):
+        self.run_fails = run_fails
+        self.failures_left = 1
+        self.jobs: dict = {}
+
+    def query(self, query: str, job_id: str) -> FlakyJob:
+        if job_id in self.jobs:
+            raise exceptions.Conflict(f"job {job_id} already exists")
+        self.jobs[job_id] = FlakyJob(self)
+        return self.jobs[job_id]
+
+    def get_job(self, job_id: str) -> FlakyJob:
+        return self.jobs[job_id]
+
+
+@pytest.mark.parametrize("run_fails, expected_jobs", [(False, 1), (True, 2)])
+def test_jobs_are_retried_without_running_twice(monkeypatch, run_fails, expected_jobs):
+    """
+    GIVEN a BigQuery client whose first wait for a job fails, either while polling a job
+          still running or because the job failed transiently
+    WHEN the latest Asset Valuations are queried
+    THEN the query should be retried, attaching to the running job in the first case and
+         running a new job only in the second
+    """
+    monkeypatch.setattr(rate_limiting.time, "sleep", lambda seconds: None)
+    client = FlakyBigQueryClient(run_fails)
+    bq_repository = destination_repository.BiqQueryDestinationRepository(
+        client, maintain_latest_snapshot=False  # type: ignore
+    )
+    bq_repository.rate_limiter = rate_limiting.RateLimiter(
+        "bigquery", rate_limiting.RetryPolicy(requests_per_second=1000, burst=10)
+    )
+
+    assert bq_repository.get_latest_asset_valuations() == []
+    assert len(client.jobs) == expected_jobs
+    assert bq_repository.rate_limiter.counters.retries == 1
+
+
+def test_load_asset_valuations_merges_latest_snapshot():
+    """
+    GIVEN a BigQuery destination
+    WHEN Asset Valuations of two products over several dates are loaded twice
+    THEN the snapshot table should be created once, and each load followed by a single
+         MERGE of the latest valuation of each product loaded
+    """
+    client = FakeBigQueryClient()
+    bq_repository = destination_repository.BiqQueryDestinationRepository(
+        client  # type: ignore
+    )
+    rows = [
+        model.AssetValuation(dt.date(2020, 1, day), float(day), name, "a.csv")
+        for day in (1, 3, 2)
+        for name in ("product 1", "product 2")
+    ]
+
+    bq_repository.load_asset_valuations(rows)
+    bq_repository.load_asset_valuations(rows[:2])
+
+    queries = [query["query"] for query in client.queries]
+    assert queries[0].startswith(
+        "CREATE TABLE IF NOT EXISTS raw.asset_valuations_latest "
+    )
+    assert [query.split(" ")[0] for query in queries] == ["CREATE", "MERGE", "MERGE"]
+    assert "USING (SELECT * FROM UNNEST(@latest))" in queries[1]
+    (parameter,) = client.queries[1]["job_config"].query_parameters
+    assert [
+        (row.struct_values["product_name"], row.struct_values["date"])
+        for row in parameter.values
+    ] == [("product 1", dt.date(2020, 1, 3)), ("product 2", dt.date(2020, 1, 3))]
+
+
+def test_failed_snapshot_merge_leaves_load_committed():
+    """
+    GIVEN a BigQuery destination whose MERGEs into the latest snapshot fail
+    WHEN Asset Valuations are loaded and the latest ones read, before and after
+    THEN the load should not fail, and the snapshot be dropped, so that it is built
+         again from the history when next read
+    """
+
+    class FailingMergeClient(FakeBigQueryClient):
+        def query(self, query, job_config=None, job_id=None):
+            if query.startswith("MERGE"):
+                raise exceptions.BadRequest("concurrent update")
+            return super().query(query, job_config, job_id)
+
+    client = FailingMergeClient()
+    bq_repository = destination_repository.BiqQueryDestinationRepository(
+        client  # type: ignore
+    )
+
+    bq_repository.get_latest_asset_valuations()
+    bq_repository.load_asset_valuations(asset_valuations(3))
+    bq_repository.get_latest_asset_valuations()
+
+    assert len(client.loads) == 1
+    assert client.deleted_tables == ["raw.asset_valuations_latest"]
+    queries = [query["query"] for query in client.queries]
+    create_query = (
+        "CREATE TABLE IF NOT EXISTS raw.asset_valuations_latest CLUSTER BY "
+        "product_name AS SELECT"
+    )
+    assert [query.split(" ")[0] for query in queries] == ["CREATE", "SELECT"] * 2
+    assert queries[0].startswith(create_query) and queries[2] == queries[0]
+    assert queries[3].endswith("FROM raw.asset_valuations_latest")
+
+
+def test_snapshot_left_stale_if_it_cannot_be_dropped():
+    """
+    GIVEN a BigQuery destination whose MERGEs into the latest snapshot fail, and whose
+          tables cannot be dropped
+    WHEN Asset Valuations are loaded and the latest ones read
+    THEN the load should not fail, and the latest valuations be read from the history
+    """
+
+    class FailingClient(FakeBigQueryClient):
+        def query(self, query, job_config=None, job_id=None):
+            if query.startswith("MERGE"):
+                raise exceptions.BadRequest("concurrent update")
+            return super().query(query, job_config, job_id)
+
+        def delete_table(self, table, not_found_ok=False):
+            raise exceptions.Forbidden("denied")
+
+    client = FailingClient()
+    bq_repository = destination_repository.BiqQueryDestinationRepository(
+        client  # type: ignore
+    )
+
+    bq_repository.load_asset_valuations(asset_valuations(3))
+    bq_repository.get_latest_asset_valuations()
+
+    assert len(client.loads) == 1
+    latest_query = client.queries[-1]["query"]
+    assert "FROM raw.asset_valuations_v2 WHERE TRUE QUALIFY" in latest_query
+
+
+def test_snapshot_dropped_by_another_process_is_built_again():
+    """
+    GIVEN a BigQuery destination whose latest snapshot was checked for, then dropped by
+          another process
+    WHEN the latest Asset Valuations are read
+    THEN the snapshot should be created again from the history, then read
+    """
+
+    class DroppedSnapshotClient(FakeBigQueryClient):
+        def __init__(self):
+            super().__init__()
+            self.dropped = False
+
+        def query(self, query, job_config=None, job_id=None):
+            if self.dropped and query.endswith("FROM raw.asset_valuations_latest"):
+                self.dropped = False
+                raise exceptions.NotFound("raw.asset_valuations_latest")
+            return super().query(query, job_config, job_id)
+
+    client = DroppedSnapshotClient()
+    bq_repository = destination_repository.BiqQueryDestinationRepository(
+        client  # type: ignore
+    )
+    bq_repository.get_latest_asset_valuations()
+    client.dropped = True
+
+    bq_repository.get_latest_asset_valuations()
+
+    assert [query["query"].split(" ")[0] for query in client.queries] == [
+        "CREATE",
+        "SELECT",
+        "CREATE",
+        "SELECT",
+    ]
+
+
+def test_failed_chunk_commits_nothing():
+    """
+    GIVEN a BigQuery destination whose second load job fails
+    WHEN Asset Valuations are loaded in chunks of 2 rows
+    THEN the error should be raised with nothing copied into the destination table nor
+         merged into the snapshot, and the staging table dropped
+    """
+
+    class FailingClient(FakeBigQueryClient):
+        def load_table_from_file(self, *args, **kwargs):
+            if self.loads:
+                raise exceptions.BadRequest("invalid row")
+            return super().load_table_from_file(*args, **kwargs)
+
+    client = FailingClient()
+    bq_repository = destination_repository.BiqQueryDestinationRepository(
+        client, min_chunk_rows=2, max_chunk_rows=2  # type: ignore
+    )
+
+    with pytest.raises(exceptions.BadRequest):
+        bq_repository.load_asset_valuations(asset_valuations(5))
+
+    assert client.copies == []
+    assert [query["query"].split(" ")[0] for query in client.queries] == ["CREATE"]
+    assert client.deleted_tables == [client.loads[0]["destination"]]
+
+
+def test_latest_snapshot_can_be_left_alone():
+    """
+    GIVEN a BigQuery destination not maintaining the latest snapshot
+    WHEN Asset Valuations are loaded
+    THEN no query should run
+    """
+    client = FakeBigQueryClient()
+    bq_repository = destination_repository.BiqQueryDestinationRepository(
+        client, maintain_latest_snapshot=False  # type: ignore
+    )
+
+    bq_repository.load_asset_valuations(asset_valuations(3))
+
+    assert len(client.loads) == 1
+    assert client.queries == []
+
+
+def test_load_into_another_table_with_its_own_snapshot():
+    """
+    GIVEN a BigQuery destination loading into a table other than the default one
+    WHEN Asset Valuations are loaded
+    THEN they should be loaded into that table, and merged into its own snapshot
+    """
+    client = FakeBigQueryClient()
+    bq_repository = destination_repository.BiqQueryDestinationRepository(
+        client, asset_valuations_destination="raw.history_v3"  # type: ignore
+    )
+
+    bq_repository.load_asset_valuations(asset_valuations(3))
+
+    assert [load["destination"] for load in client.loads] == ["raw.history_v3"]
+    queries = [query["query"] for query in client.queries]
+    assert queries[0].startswith("CREATE TABLE IF NOT EXISTS raw.history_v3_latest ")
+    assert "FROM raw.history_v3 WHERE TRUE" in queries[0]
+    assert queries[1].startswith("MERGE raw.history_v3_latest ")
@@ -0,0 +1,143 @@
+import datetime as dt
+from typing import List
+
+from src import model, destination_repository
+from tests.data.asset_valuations import ASSET_VALUATIONS_2018
+
+
+def read_asset_valuations(
+    sqlite_repository: destination_repository.SqliteDestinationRepository,
+) -> List[model.AssetValuation]:
+    rows = sqlite_repository.connection.execute(
+        "SELECT date, value, product_name, __source_file__, __creation_date__ "
+        f"FROM {sqlite_repository.asset_valuations_destination}"
+    ).fetchall()
+
+    return [
+        model.AssetValuation(
+            date=dt.date.fromisoformat(row[0]),
+            value=row[1],
+            product_name=row[2],
+            source_file=row[3],
+            creation_date=dt.datetime.fromisoformat(row[4]),
+        )
+        for row in rows
+    ]
+
+
+def test_load_asset_valuations_from_zero(
+    sqlite_repository: destination_repository.SqliteDestinationRepository,
+):
+    """
+    GIVEN an empty SQLite destination and a collection of Asset Valuations
+    WHEN they are passed as arguments to SqliteDestinationRepository.load_asset_valuations()
+    THEN Asset Valuations should be loaded into the destination table
+    """
+    sqlite_repository.load_asset_valuations(ASSET_VALUATIONS_2018)
+
+    results_asset_valuations = read_asset_valuations(sqlite_repository)
+
+    assert len(ASSET_VALUATIONS_2018) == len(results_asset_valuations)
+    for asset_valuation in ASSET_VALUATIONS_2018:
+        assert asset_valuation in results_asset_valuations
+    assert (
+        results_asset_valuations[0].source_file == ASSET_VALUATIONS_2018[0].source_file
+    )
+
+
+def test_load_asset_valuations_appending(
+    sqlite_repository: destination_repository.SqliteDestinationRepository,
+):
+    """
+    GIVEN a SQLite destination with a previous state and a new Asset Valuation to append
+    WHEN it is passed as argument to SqliteDestinationRepository.load_asset_valuations()
+    THEN Asset Valuations should be appended into the destination table
+    """
+    sqlite_repository.load_asset_valuations(ASSET_VALUATIONS_2018)
+    assets_to_append = [
+        model.AssetValuation(
+            dt.date(2020, 1, 1), 1200.0, "product 6", "dummy_file.csv"
+        ),
+    ]
+
+    sqlite_repository.load_asset_valuations(assets_to_append)
+
+    results_asset_valuations = read_asset_valuations(sqlite_repository)
+    expected_asset_valuations = ASSET_VALUATIONS_2018 + assets_to_append
+    assert len(expected_asset_valuations) == len(results_asset_valuations)
+    for asset_valuation in expected_asset_valuations:
+        assert asset_valuation in results_asset_valuations
+
+
+def test_table_is_indexed_on_date_and_product_name(
+    sqlite_repository: destination_repository.SqliteDestinationRepository,
+):
+    """
+    GIVEN a SQLite destination
+    WHEN its indexes are listed
+    THEN the destination table should be indexed on (date, product_name)
+    """
+    table = sqlite_repository.asset_valuations_destination
+    indexes = sqlite_repository.connection.execute(
+        f"PRAGMA index_list({table})"
+    ).fetchall()
+    columns = [
+        sqlite_repository.connection.execute(
+            f"PRAGMA index_info({index[1]})"
+        ).fetchall()
+        for index in indexes
+    ]
+
+    assert [[column[2] for column in index] for index in columns] == [
+        ["date", "product_name"]
+    ]
+
+
+def test_latest_snapshot_is_upserted_for_products_loaded(
+    sqlite_repository: destination_repository.SqliteDestinationRepository,
+):
+    """
+    GIVEN a SQLite destination holding valuations of several products
+    WHEN newer valuations of one product, then older ones of another, are loaded
+    THEN the latest snapshot should hold the newest valuation of each product only
+    """
+    sqlite_repository.load_asset_valuations(ASSET_VALUATIONS_2018)
+    newer = model.AssetValuation(
+        dt.date(2019, 1, 5), 1300.0, "product 1", "generic_2019_01_05.csv"
+    )
+    older = model.AssetValuation(
+        dt.date(2018, 1, 5), 1.0, "product 2", "generic_2018_01_05.csv"
+    )
+
+    sqlite_repository.load_asset_valuations([newer])
+    sqlite_repository.load_asset_valuations([older])
+
+    latest = sqlite_repository.get_latest_asset_valuations()
+    assert sorted(latest, key=lambda row: row.product_name) == [newer] + [
+        asset_valuation
+        for asset_valuation in ASSET_VALUATIONS_2018
+        if asset_valuation.product_name != "product 1"
+    ]
+    assert latest[0].source_file == "generic_2019_01_05.csv"
+
+
+def test_latest_snapshot_is_built_from_history_once_created(tmp_path):
+    """
+    GIVEN a SQLite database whose history was loaded without a latest snapshot table
+    WHEN it is opened by the SQLite destination
+    THEN the latest snapshot should be built from the history
+    """
+    database_path = str(tmp_path / "asset_valuations.db")
+    repository = destination_repository.SqliteDestinationRepository(database_path)
+    repository.load_asset_valuations(ASSET_VALUATIONS_2018)
+    repository.connection.execute(
+        f"DROP TABLE {repository.latest_snapshot_destination}"
+    )
+    repository.close()
+
+    repository = destination_repository.SqliteDestinationRepository(database_path)
+
+    assert sorted(
+        repository.get_latest_asset_valuations(), key=lambda row: row.product_name
+    ) == sorted(ASSET_VALUATIONS_2018, key=lambda row: row.product_name)
+    repository.close()
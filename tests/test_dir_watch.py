@@ -0,0 +1,137 @@
+import time
+
+import pytest
+
+from src.utils.dir_watch import (
+    FileSettler,
+    InotifyWatcher,
+    MicroBatcher,
+    PollingWatcher,
+    is_partial_file,
+)
+
+
+def wait_for_changes(watcher, names, timeout: float = 2.0) -> set:
+    """
+    Collects the changes of a watcher until all names are seen or timeout seconds passed.
+    """
+    changed: set = set()
+    deadline = time.monotonic() + timeout
+    while not names <= changed and time.monotonic() < deadline:
+        changed |= watcher.changes(0.05)
+
+    return changed
+
+
+def test_is_partial_file():
+    """
+    GIVEN names of complete, hidden and partially written files
+    WHEN checked for being partial
+    THEN only hidden files and files with a partial suffix should be
+    """
+    assert not is_partial_file("hl_2023_11_24.csv")
+    assert not is_partial_file("generic_2018_12_29.csv.gz")
+    assert is_partial_file(".hl_2023_11_24.csv")
+    assert is_partial_file("hl_2023_11_24.csv.PART")
+    assert is_partial_file("generic_2018_12_29.csv.tmp")
+
+
+@pytest.mark.parametrize("watcher_class", [PollingWatcher, InotifyWatcher])
+def test_watchers_report_created_and_modified_files(tmp_path, watcher_class):
+    """
+    GIVEN a watcher of an empty directory
+    WHEN a file is created, then another one modified
+    THEN each change should be reported by file name, once
+    """
+    if watcher_class is PollingWatcher:
+        watcher = PollingWatcher(str(tmp_path), interval=0.01)
+    else:
+        try:
+            watcher = InotifyWatcher(str(tmp_path))
+        except OSError:
+            pytest.skip("inotify is not available")
+    watcher.changes(0)
+
+    try:
+        (tmp_path / "hl_2023_11_24.csv").write_text("a")
+        assert wait_for_changes(watcher, {"hl_2023_11_24.csv"}) == {"hl_2023_11_24.csv"}
+
+        (tmp_path / "hl_2023_11_24.csv").write_text("ab")
+        assert wait_for_changes(watcher, {"hl_2023_11_24.csv"}) == {"hl_2023_11_24.csv"}
+        assert watcher.changes(0.05) == set()
+    finally:
+        watcher.close()
+
+
+def test_file_settler_debounces_files_being_written(tmp_path):
+    """
+    GIVEN a file being written, a partial file and a directory
+    WHEN the settler is checked before and after settle_seconds of quiet
+    THEN only the file should settle, once, and only after its size stopped changing
+    """
+    settler = FileSettler(str(tmp_path), settle_seconds=0.05)
+    (tmp_path / "hl_2023_11_24.csv").write_text("a")
+    (tmp_path / "hl_2023_11_25.csv.part").write_text("a")
+    (tmp_path / "done").mkdir()
+    settler.touch({"hl_2023_11_24.csv", "hl_2023_11_25.csv.part", "done"})
+
+    assert settler.settled() == []
+    time.sleep(0.06)
+    (tmp_path / "hl_2023_11_24.csv").write_text("ab")
+    assert settler.settled() == []
+    assert 0 < settler.next_deadline() <= 0.05
+
+    time.sleep(0.06)
+    assert settler.settled() == [str(tmp_path / "hl_2023_11_24.csv")]
+    assert settler.settled() == []
+    assert settler.next_deadline() is None
+
+
+def test_micro_batcher_takes_full_or_old_batches():
+    """
+    GIVEN a micro batcher of up to 2 files or 0.05 seconds
+    WHEN files are added
+    THEN a batch should be taken once full or once its first file waited long enough,
+         and a forced take should take any files left
+    """
+    batcher = MicroBatcher(max_files=2, max_seconds=0.05)
+    assert batcher.take() == [] and batcher.next_deadline() is None
+
+    batcher.add(["a.csv", "a.csv"])
+    assert batcher.take() == []
+    batcher.add(["b.csv", "c.csv"])
+    assert batcher.take() == ["a.csv", "b.csv", "c.csv"]
+
+    batcher.add(["d.csv"])
+    time.sleep(0.06)
+    assert batcher.take() == ["d.csv"]
+
+    batcher.add(["e.csv"])
+    assert batcher.take(force=True) == ["e.csv"]
+
+
+def test_file_settler_retries_files_after_delay(tmp_path):
+    """
+    GIVEN settled files whose load failed, one of them changed since
+    WHEN they are retried after a delay
+    THEN the unchanged file should settle again only once the delay passed, the changed
+         one as usual, and a removed one be dropped
+    """
+    settler = FileSettler(str(tmp_path), settle_seconds=0.01)
+    for name in ("hl_2023_11_24.csv", "hl_2023_11_25.csv", "hl_2023_11_26.csv"):
+        (tmp_path / name).write_text("a")
+    settler.touch({"hl_2023_11_24.csv", "hl_2023_11_25.csv", "hl_2023_11_26.csv"})
+    time.sleep(0.02)
+    assert len(settler.settled()) == 3
+
+    (tmp_path / "hl_2023_11_25.csv").write_text("ab")
+    settler.touch({"hl_2023_11_25.csv"})
+    (tmp_path / "hl_2023_11_26.csv").unlink()
+    settler.retry({"hl_2023_11_24.csv", "hl_2023_11_25.csv", "hl_2023_11_26.csv"}, 0.1)
+    time.sleep(0.02)
+    assert settler.settled() == [str(tmp_path / "hl_2023_11_25.csv")]
+    assert 0 < settler.next_deadline() <= 0.1
+
+    time.sleep(0.1)
+    assert settler.settled() == [str(tmp_path / "hl_2023_11_24.csv")]
+    assert settler.next_deadline() is None
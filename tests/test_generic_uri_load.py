@@ -0,0 +1,201 @@
+import pytest
+
+from src import custom_errors, destination_repository, validation
+from src.generic_uri_load import (
+    HEADER_PROBE_BYTES,
+    parse_gcs_uri,
+    plan_generic_uri_loads,
+)
+from tests.fakes import (
+    FakeBigQueryClient,
+    FakeBucket,
+    FakeQueryJob,
+    FakeStorageClient,
+)
+
+GENERIC_CSV = b"product_name,date,value\nfund_a,2018-12-29,1200.5\n"
+REORDERED_CSV = (
+    b"\xef\xbb\xbfValuation,Date,Product_Name\r\n1200.5,2018-12-29,fund_a\r\n"
+)
+
+
+def test_parse_gcs_uri():
+    """
+    GIVEN gs:// URIs, with and without folders, and invalid ones
+    WHEN they are parsed
+    THEN bucket and blob names should be returned, or a ValueError raised
+    """
+    assert parse_gcs_uri("gs://bucket/generic_*.csv") == ("bucket", "generic_*.csv")
+    assert parse_gcs_uri("gs://bucket/a/b.csv") == ("bucket", "a/b.csv")
+    for uri in ("bucket/b.csv", "gs://bucket", "gs:///b.csv"):
+        with pytest.raises(ValueError):
+            parse_gcs_uri(uri)
+
+
+def test_plan_generic_uri_loads_groups_files_by_layout():
+    """
+    GIVEN a bucket with generic files of two column layouts, an empty file and others
+    WHEN the loads of a wildcard URI and of an overlapping file URI are planned
+    THEN matching files should be grouped by layout once each, empty ones left out, and
+         only the first bytes of each file read
+    """
+    bucket = FakeBucket(
+        [
+            "generic_2018_12_28.csv",
+            "generic_2018_12_29.csv",
+            "generic_2018_12_30.csv",
+            "generic_2018_12_31.csv",
+            "generic_2019_01_01.csv",
+            "hl_2018_12_29.csv",
+        ],
+        contents={
+            "generic_2018_12_29.csv": GENERIC_CSV,
+            "generic_2018_12_30.csv": REORDERED_CSV,
+            "generic_2018_12_31.csv": GENERIC_CSV,
+        },
+    )
+
+    groups = plan_generic_uri_loads(
+        FakeStorageClient(bucket),  # type: ignore
+        ["gs://bucket/generic_2018_*.csv", "gs://bucket/generic_2018_12_29.csv"],
+        {"valuation": "value"},
+    )
+
+    assert [(group.header, group.uris) for group in groups] == [
+        (
+            validation.GenericHeader(),
+            [
+                "gs://bucket/generic_2018_12_29.csv",
+                "gs://bucket/generic_2018_12_31.csv",
+            ],
+        ),
+        (
+            validation.GenericHeader(width=3, indexes=(2, 1, 0)),
+            ["gs://bucket/generic_2018_12_30.csv"],
+        ),
+    ]
+    assert bucket.blobs["generic_2018_12_29.csv"].ranges_read == [
+        (0, HEADER_PROBE_BYTES - 1)
+    ]
+    assert "hl_2018_12_29.csv" not in bucket.listed
+
+
+def test_plan_generic_uri_loads_rejects_invalid_files():
+    """
+    GIVEN URIs of a file with a wrong header, a compressed file and a HL file
+    WHEN their loads are planned
+    THEN the matching custom error should be raised for each
+    """
+    bucket = FakeBucket(
+        ["generic_2018_12_29.csv", "generic_2018_12_30.csv.gz", "hl_2018_12_29.csv"],
+        contents={"generic_2018_12_29.csv": b"product,date,value\n"},
+    )
+    storage_client = FakeStorageClient(bucket)
+
+    for uri, error in (
+        ("gs://bucket/generic_2018_12_29.csv", custom_errors.HeaderNotMatchError),
+        ("gs://bucket/generic_2018_12_30.csv.gz", custom_errors.FileFormatError),
+        ("gs://bucket/hl_*", custom_errors.FileTypeNotImplementedError),
+    ):
+        with pytest.raises(error):
+            plan_generic_uri_loads(storage_client, [uri])  # type: ignore
+
+
+def test_plan_generic_uri_loads_rejects_header_beyond_probe():
+    """
+    GIVEN a generic file whose header does not end within the bytes probed
+    WHEN its load is planned
+    THEN a HeaderNotMatchError should be raised
+    """
+    bucket = FakeBucket(
+        ["generic_2018_12_29.csv"],
+        contents={"generic_2018_12_29.csv": b"x" * HEADER_PROBE_BYTES + GENERIC_CSV},
+    )
+
+    with pytest.raises(custom_errors.HeaderNotMatchError):
+        plan_generic_uri_loads(
+            FakeStorageClient(bucket), ["gs://bucket/generic_2018_12_29.csv"]  # type: ignore
+        )
+
+
+def test_load_generic_csv_uris_runs_one_server_side_query_per_batch_of_uris(
+    monkeypatch,
+):
+    """
+    GIVEN more URIs of a reordered column layout than fit into a single job
+    WHEN they are loaded through the BigQuery repository
+    THEN one INSERT query per batch of URIs should run over an external table of the
+         files, reading columns by the layout and adding source file and creation date
+    """
+    monkeypatch.setattr(destination_repository, "MAX_URIS_PER_JOB", 2)
+    client = FakeBigQueryClient()
+    repository = destination_repository.BiqQueryDestinationRepository(
+        bigquery_client=client  # type: ignore
+    )
+    uris = [f"gs://bucket/generic_2018_12_{day}.csv" for day in (29, 30, 31)]
+    header = validation.GenericHeader(width=4, indexes=(3, 0, 1))
+
+    repository.load_generic_csv_uris(uris, header)
+
+    assert client.loads == []
+    assert len(client.queries) == 2
+    external_configs = [
+        query["job_config"].table_definitions["generic_files"]
+        for query in client.queries
+    ]
+    assert [config.source_uris for config in external_configs] == [uris[:2], uris[2:]]
+    assert [field.name for field in external_configs[0].schema] == [
+        "column_0",
+        "column_1",
+        "column_2",
+        "column_3",
+    ]
+    assert external_configs[0].csv_options.skip_leading_rows == 1
+    query = client.queries[0]["query"]
+    assert query.startswith("INSERT INTO raw.asset_valuations_v2 ")
+    assert "column_3 AS product_name" in query
+    assert "PARSE_DATE('%Y-%m-%d', column_0) AS date" in query
+    assert "CAST(column_1 AS FLOAT64) AS value" in query
+    assert "_FILE_NAME" in query and "CURRENT_TIMESTAMP()" in query
+    assert len(repository.load_metrics.chunk_rows) == 2
+
+
+def test_dry_run_plans_generic_csv_uri_jobs(monkeypatch):
+    """
+    GIVEN a dry run repository and more URIs than fit into a single job
+    WHEN they are loaded
+    THEN the jobs should be planned, without rows inserted
+    """
+    monkeypatch.setattr(destination_repository, "MAX_URIS_PER_JOB", 2)
+    repository = destination_repository.DryRunDestinationRepository()
+
+    rows = repository.load_generic_csv_uris(
+        ["gs://bucket/a.csv", "gs://bucket/b.csv", "gs://bucket/c.csv"],
+        validation.GenericHeader(),
+    )
+
+    assert rows == 0
+    assert repository.last_load == (0, 0, 2)
+
+
+def test_load_generic_csv_uris_merges_latest_snapshot_of_files(monkeypatch):
+    """
+    GIVEN generic CSV files whose insert adds rows
+    WHEN they are loaded through the BigQuery repository
+    THEN the latest snapshot should be merged from the rows of these files only
+    """
+    monkeypatch.setattr(FakeQueryJob, "num_dml_affected_rows", 2)
+    client = FakeBigQueryClient()
+    repository = destination_repository.BiqQueryDestinationRepository(
+        bigquery_client=client  # type: ignore
+    )
+
+    repository.load_generic_csv_uris(
+        ["gs://bucket/in/generic_2018_12_29.csv"], validation.GenericHeader()
+    )
+
+    queries = [query["query"] for query in client.queries]
+    assert [query.split(" ")[0] for query in queries] == ["INSERT", "CREATE", "MERGE"]
+    assert "WHERE __source_file__ IN UNNEST(@source_files)" in queries[2]
+    (parameter,) = client.queries[2]["job_config"].query_parameters
+    assert parameter.values == ["in/generic_2018_12_29.csv"]
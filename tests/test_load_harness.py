@@ -0,0 +1,53 @@
+from tests.fakes import FakeStorageClient
+from tests.load_harness import (
+    ReplayBigQueryClient,
+    create_bucket,
+    percentile,
+    replay,
+    synthetic_files,
+    wired_handler,
+)
+
+
+def test_percentile():
+    """
+    GIVEN values in no particular order
+    WHEN percentiles are taken
+    THEN the nearest-rank value should be returned, 0 if there are no values
+    """
+    values = [5.0, 1.0, 4.0, 2.0, 3.0]
+
+    assert percentile(values, 50) == 3.0
+    assert percentile(values, 95) == 5.0
+    assert percentile(values, 0) == 1.0
+    assert percentile([], 99) == 0.0
+
+
+def test_replay_against_cloud_function_handler():
+    """
+    GIVEN finalize events of synthetic files, one with a wrong header
+    WHEN they are replayed against the Cloud Function handler wired to fakes
+    THEN every event should be handled once, the invalid one as an error, the first
+         event of each instance counted as cold, the valid files loaded and merged into
+         the latest snapshot, checked for once per instance
+    """
+    files = synthetic_files(6, rows=3)
+    invalid_name = sorted(files)[2]
+    files[invalid_name] = b"product,day,price\nFund 0,2000-01-03,1.0\n"
+    bucket, events = create_bucket(files)
+    bigquery_client = ReplayBigQueryClient()
+
+    with wired_handler(FakeStorageClient(bucket), bigquery_client) as handler:
+        report = replay(handler, events, rate=200, concurrency=2)
+
+    assert [invocation.blob_name for invocation in report.invocations] == list(files)
+    assert [
+        invocation.blob_name for invocation in report.invocations if invocation.error
+    ] == [invalid_name]
+    assert report.error_rate == 1 / 6
+    assert 1 <= len(report.latencies(cold=True)) <= 2
+    assert all(invocation.latency >= 0 for invocation in report.invocations)
+    assert bigquery_client.rows_loaded == 5 * 3
+    snapshot_checks = bigquery_client.jobs - 5 * 2
+    assert snapshot_checks == len(report.latencies(cold=True))
+    assert "errors: 1 (16.7%)" in report.summary()
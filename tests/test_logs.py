@@ -1,5 +1,15 @@
-from src.utils.logs import default_module_logger
+from src.utils import logs
+from src.utils.logs import (
+    default_module_logger,
+    flush_logs,
+    log_stage,
+    JsonFormatter,
+    RateLimitFilter,
+)
+import io
+import json
 import logging
+import pytest
 
 
 def test_default_module_logger_writes_messages_to_console(caplog):
@@ -15,3 +25,117 @@ def test_default_module_logger_writes_messages_to_console(caplog):
         logger.info(log_message)
 
     assert log_message in caplog.text
+
+
+def test_json_formatter_includes_structured_fields():
+    """
+    GIVEN a log record carrying file name, stage and duration
+    WHEN it is formatted by JsonFormatter
+    THEN it should be a JSON line with severity, message and the structured fields
+    """
+    record = logging.LogRecord(
+        "module", logging.INFO, __file__, 1, "Loaded %s rows", (3,), None
+    )
+    record.file_name = "generic_2019_01_01.csv"
+    record.stage = "pipeline"
+    record.duration = 0.5
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert entry["severity"] == "INFO"
+    assert entry["message"] == "Loaded 3 rows"
+    assert entry["file_name"] == "generic_2019_01_01.csv"
+    assert entry["stage"] == "pipeline"
+    assert entry["duration"] == 0.5
+
+
+def test_rate_limit_filter_suppresses_repeated_warnings():
+    """
+    GIVEN a rate limit of 2 records per interval
+    WHEN the same call site warns 5 times, opting into the rate limit, and then once
+         after the interval
+    THEN only 2 warnings should pass, and the next one should count the 3 suppressed
+    """
+    rate_limit = RateLimitFilter(limit=2, interval_seconds=60.0)
+
+    def warning() -> logging.LogRecord:
+        record = logging.LogRecord(
+            "module", logging.WARNING, __file__, 1, "Invalid row", None, None
+        )
+        record.rate_limited = True
+        return record
+
+    passed = [rate_limit.filter(warning()) for _ in range(5)]
+    rate_limit.interval_seconds = 0.0
+    record = warning()
+
+    assert passed == [True, True, False, False, False]
+    assert rate_limit.filter(record)
+    assert record.suppressed == 3
+
+
+def test_rate_limit_filter_lets_errors_through():
+    """
+    GIVEN a rate limit of 1 record per interval
+    WHEN the same call site logs 3 errors
+    THEN all of them should pass
+    """
+    rate_limit = RateLimitFilter(limit=1, interval_seconds=60.0)
+    record = logging.LogRecord(
+        "module", logging.ERROR, __file__, 1, "Failed", None, None
+    )
+
+    assert all(rate_limit.filter(record) for _ in range(3))
+
+
+def test_rate_limit_filter_lets_warnings_not_opted_in_through():
+    """
+    GIVEN a rate limit of 1 record per interval
+    WHEN the same call site warns 3 times without opting into the rate limit, e.g. once
+         per file
+    THEN all of them should pass
+    """
+    rate_limit = RateLimitFilter(limit=1, interval_seconds=60.0)
+    record = logging.LogRecord(
+        "module", logging.WARNING, __file__, 1, "Quarantined", None, None
+    )
+
+    assert all(rate_limit.filter(record) for _ in range(3))
+
+
+def test_flush_logs_writes_queued_records(monkeypatch):
+    """
+    GIVEN records queued by a module logger
+    WHEN the logs are flushed
+    THEN every record should be written by the time flush_logs returns
+    """
+    logger = default_module_logger(__file__)
+    logger.info("First record")
+    stream = io.StringIO()
+    monkeypatch.setattr(logs._start_listener().handlers[0], "stream", stream)
+
+    for i in range(100):
+        logger.info(f"Queued record {i}")
+    flush_logs()
+
+    assert "Queued record 99" in stream.getvalue()
+
+
+def test_log_stage_logs_duration(caplog):
+    """
+    GIVEN a module logger
+    WHEN a stage fails within log_stage
+    THEN the failure should be logged with the file name, stage and duration
+    """
+    logger = default_module_logger(__file__)
+
+    with caplog.at_level(logging.INFO):
+        with pytest.raises(ValueError):
+            with log_stage(logger, "pipeline", "hl_2023_11_24.csv"):
+                raise ValueError("broken file")
+
+    record = caplog.records[-1]
+    assert "failed" in record.getMessage()
+    assert record.file_name == "hl_2023_11_24.csv"
+    assert record.stage == "pipeline"
+    assert record.duration >= 0
@@ -0,0 +1,106 @@
+import threading
+from typing import List
+
+from src.source_repository import _read_ranges_in_parallel
+from src.utils.memory_budget import (
+    MemoryBudget,
+    configure_memory_budget,
+    estimate_rows_bytes,
+    get_memory_budget,
+)
+
+
+def test_memory_budget_accounts_stages_and_peak():
+    """
+    GIVEN a memory budget of 100 bytes
+    WHEN stages take, track and release bytes
+    THEN bytes over the limit should be refused unless nothing else is in flight, and
+         the peak overall and by stage reported
+    """
+    budget = MemoryBudget(100)
+
+    assert budget.try_acquire(150, "parse")
+    assert not budget.try_acquire(1, "parse")
+    budget.release(150, "parse")
+    assert budget.try_acquire(60, "parse")
+    assert budget.try_acquire(40, "read")
+    budget.track(30, "serialise")
+    budget.release(60, "parse")
+    budget.release(40, "read")
+    budget.release(30, "serialise")
+
+    assert budget.in_flight_bytes == 0
+    assert budget.peak_bytes == 150
+    assert budget.stage_peak_bytes == {"parse": 150, "read": 40, "serialise": 30}
+    assert budget.summary() == (
+        "100 bytes, peak 150 bytes in flight (parse 150, read 40, serialise 30), "
+        "0 waits, waited 0.00s"
+    )
+
+
+def test_memory_budget_blocks_producers_until_released():
+    """
+    GIVEN a memory budget spent by a batch in flight
+    WHEN a producer acquires more bytes
+    THEN it should wait until the batch releases its bytes
+    """
+    budget = MemoryBudget(100)
+    budget.acquire(80, "parse")
+    acquired = threading.Event()
+
+    def produce():
+        budget.acquire(50, "parse")
+        acquired.set()
+
+    producer = threading.Thread(target=produce)
+    producer.start()
+    assert not acquired.wait(0.1)
+
+    budget.release(80, "parse")
+    producer.join(1)
+
+    assert acquired.is_set()
+    assert budget.in_flight_bytes == 50
+    assert budget.waits == 1 and budget.wait_seconds > 0
+
+
+def test_memory_budget_from_env(monkeypatch, process_budget):
+    """
+    GIVEN the MEMORY_BUDGET_BYTES environment variable
+    WHEN the memory budget of the process is configured again
+    THEN its limit should be read from the variable
+    """
+    monkeypatch.setenv("MEMORY_BUDGET_BYTES", "1024")
+    configure_memory_budget()
+
+    assert get_memory_budget().limit_bytes == 1024
+
+    configure_memory_budget(2048)
+
+    assert get_memory_budget().limit_bytes == 2048
+
+
+def test_read_ranges_in_parallel_reads_ahead_within_budget(process_budget):
+    """
+    GIVEN a memory budget fitting a single range of rows
+    WHEN ranges are read with several streams
+    THEN no range should be read ahead of the one consumed, and all be yielded in order
+    """
+    configure_memory_budget(estimate_rows_bytes(10))
+    budget = get_memory_budget()
+    in_flight: List[int] = []
+
+    def read_range(start: int, size: int) -> List[int]:
+        in_flight.append(budget.in_flight_bytes)
+        return list(range(start, start + size))
+
+    batches = list(
+        _read_ranges_in_parallel(
+            read_range, [(0, 10), (10, 10), (20, 10)], streams=4  # type: ignore
+        )
+    )
+
+    assert batches == [list(range(i, i + 10)) for i in (0, 10, 20)]
+    assert max(in_flight) == estimate_rows_bytes(10)
+    assert budget.peak_bytes == estimate_rows_bytes(10)
+    assert budget.in_flight_bytes == 0
@@ -3,6 +3,7 @@ import pytest
 from typing import Any
 
 from src import model
+from src.utils.memory_budget import NATURAL_KEY_BYTES, configure_memory_budget
 
 
 def test_asset_valuation_equality():
@@ -81,3 +82,93 @@ def test_asset_valuation_inequality_other(value: Any):
     THEN the result should be that are NOT equal
     """
     assert model.AssetValuation(dt.datetime.now(), 0.1, "GBP", "file.csv") != value
+
+
+def test_asset_valuation_hash_matches_equality():
+    """
+    GIVEN 2 equal asset valuations coming from different files
+    WHEN they are added to a set
+    THEN they should hash equal and the set should hold only one of them
+    """
+    left = model.AssetValuation(dt.date(2021, 10, 10), 0.05, "product", "file1.csv")
+    right = model.AssetValuation(dt.date(2021, 10, 10), 0.05, "product", "file2.csv")
+
+    assert hash(left) == hash(right)
+    assert len({left, right}) == 1
+    assert left.natural_key == (dt.date(2021, 10, 10), 0.05, "product")
+
+
+def test_deduplicate_asset_valuations():
+    """
+    GIVEN a batch with repeated asset valuations and the keys of those already seen
+    WHEN the batch is deduplicated
+    THEN first occurrences not seen before should be kept, in order
+    """
+    date = dt.date(2021, 10, 10)
+    asset_valuations = [
+        model.AssetValuation(date, 1.0, "product 1", "file.csv"),
+        model.AssetValuation(date, 2.0, "product 2", "file.csv"),
+        model.AssetValuation(date, 1.0, "product 1", "file.csv"),
+        model.AssetValuation(date, 3.0, "product 3", "file.csv"),
+    ]
+    seen_keys = {(date, 3.0, "product 3")}
+
+    deduplicated = model.deduplicate_asset_valuations(asset_valuations, seen_keys)
+
+    assert [asset_valuation.value for asset_valuation in deduplicated] == [1.0, 2.0]
+    assert seen_keys == {(date, 3.0, "product 3")}
+
+
+def test_seen_keys_evict_the_oldest_keys_once_full():
+    """
+    GIVEN seen keys bounded to 2 keys
+    WHEN 3 keys are added, one of them twice
+    THEN the oldest key should be evicted, and the repeated one kept once
+    """
+    date = dt.date(2021, 10, 10)
+    seen_keys = model.SeenKeys(max_keys=2)
+
+    seen_keys.update([(date, 1.0, "product 1"), (date, 2.0, "product 2")])
+    seen_keys.add((date, 2.0, "product 2"))
+    seen_keys.add((date, 3.0, "product 3"))
+
+    assert seen_keys == {(date, 2.0, "product 2"), (date, 3.0, "product 3")}
+    assert seen_keys.evicted == 1
+
+
+def test_seen_keys_fit_in_the_memory_budget():
+    """
+    GIVEN a memory budget limit
+    WHEN seen keys are created without a bound
+    THEN they should be bounded to a share of the limit
+    """
+    configure_memory_budget(100 * NATURAL_KEY_BYTES)
+
+    seen_keys = model.SeenKeys()
+
+    assert seen_keys.max_keys == int(100 * model.SEEN_KEYS_BUDGET_SHARE)
+    configure_memory_budget()
+
+
+def test_latest_asset_valuations():
+    """
+    GIVEN valuations of two products over several dates, one date loaded twice
+    WHEN the latest valuation of each product is picked
+    THEN the latest date, then creation date, should win, the last one on a tie
+    """
+    created = dt.datetime(2024, 1, 1)
+    later = dt.datetime(2024, 2, 1)
+    asset_valuations = [
+        model.AssetValuation(dt.date(2021, 1, 2), 1.0, "product 1", "a.csv", created),
+        model.AssetValuation(dt.date(2021, 1, 1), 2.0, "product 2", "a.csv", created),
+        model.AssetValuation(dt.date(2021, 1, 1), 3.0, "product 1", "b.csv", later),
+        model.AssetValuation(dt.date(2021, 1, 2), 4.0, "product 2", "b.csv", created),
+        model.AssetValuation(dt.date(2021, 1, 2), 5.0, "product 2", "c.csv", created),
+    ]
+
+    latest = model.latest_asset_valuations(asset_valuations)
+
+    assert [(row.product_name, row.value) for row in latest] == [
+        ("product 1", 1.0),
+        ("product 2", 5.0),
+    ]
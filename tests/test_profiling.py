@@ -0,0 +1,43 @@
+import pstats
+
+from src.utils.profiling import CommandProfiler
+
+
+def hot_function() -> int:
+    return sum(i * i for i in range(10_000))
+
+
+def test_command_profiler_writes_profile_and_summary(tmp_path):
+    """
+    GIVEN a command profiler with an output path and memory tracing
+    WHEN some code runs between start() and stop()
+    THEN a profile file and a summary naming the hot function should be written
+    """
+    output_path = str(tmp_path / "command.prof")
+    profiler = CommandProfiler(output_path, top_n=5, trace_memory=True)
+
+    profiler.start()
+    hot_function()
+    summary = profiler.stop()
+
+    assert "hot_function" in summary
+    assert "Peak traced memory" in summary
+    assert pstats.Stats(output_path).total_calls > 0
+    with open(f"{output_path}.txt", encoding="utf-8") as f:
+        assert "hot_function" in f.read()
+
+
+def test_command_profiler_memory_only():
+    """
+    GIVEN a command profiler without output path and with memory tracing
+    WHEN some code runs between start() and stop()
+    THEN only the peak memory should be reported
+    """
+    profiler = CommandProfiler(None, trace_memory=True)
+
+    profiler.start()
+    data = [bytes(1024) for _ in range(1000)]
+    summary = profiler.stop()
+
+    assert len(data) == 1000
+    assert summary.startswith("Peak traced memory")
@@ -0,0 +1,153 @@
+from typing import List
+
+from google.api_core import exceptions
+from google.auth import exceptions as auth_exceptions
+import pytest
+import requests
+
+from src.utils import rate_limiting
+from src.utils.rate_limiting import (
+    RateLimiter,
+    RetryPolicy,
+    TokenBucket,
+    is_retryable,
+    policy_from_env,
+)
+
+
+@pytest.fixture
+def sleeps(monkeypatch) -> List[float]:
+    """
+    Fixture that records the waits of the rate limiting module instead of sleeping.
+
+    Returns:
+        List[float]: seconds of each wait, in order.
+    """
+    sleeps: List[float] = []
+    monkeypatch.setattr(rate_limiting.time, "sleep", sleeps.append)
+
+    return sleeps
+
+
+def flaky(errors: List[Exception], result: str = "done"):
+    """
+    Returns a function raising the given errors on its first calls, then returning result.
+    """
+
+    def call() -> str:
+        if errors:
+            raise errors.pop(0)
+        return result
+
+    return call
+
+
+def test_token_bucket_waits_once_burst_is_spent(sleeps):
+    """
+    GIVEN a token bucket of capacity 2 refilled at 10 tokens per second
+    WHEN 4 tokens are taken at once
+    THEN the burst should be served without waiting and later callers queued 0.1s apart
+    """
+    bucket = TokenBucket(rate=10, capacity=2)
+
+    waits = [bucket.acquire() for _ in range(4)]
+
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2] == pytest.approx(0.1, abs=0.01)
+    assert waits[3] == pytest.approx(0.2, abs=0.01)
+    assert sleeps == waits[2:]
+
+
+def test_rate_limiter_retries_transient_errors_with_jittered_backoff(sleeps):
+    """
+    GIVEN a call failing twice with throttling and server errors before succeeding
+    WHEN it is made through a rate limiter
+    THEN it should be retried after backoffs bounded by the policy, and counted
+    """
+    limiter = RateLimiter(
+        "gcs", RetryPolicy(requests_per_second=1000, burst=10, max_attempts=3)
+    )
+
+    result = limiter.call(
+        flaky([exceptions.TooManyRequests("slow down"), exceptions.BadGateway("oops")])
+    )
+
+    assert result == "done"
+    assert len(sleeps) == 2
+    assert 0 <= sleeps[0] <= 0.5 and 0 <= sleeps[1] <= 1.0
+    assert (limiter.counters.calls, limiter.counters.retries) == (1, 2)
+    assert limiter.counters.failures == 0
+    assert limiter.counters.backoff_seconds == pytest.approx(sum(sleeps))
+    assert limiter.summary().startswith("gcs: 1 calls, 2 retries, 0 failures")
+
+
+def test_rate_limiter_retries_network_errors_of_google_clients(sleeps):
+    """
+    GIVEN a call failing with the network errors raised by the Google clients: requests
+          connection errors and timeouts, and google.auth transport errors
+    WHEN it is made through a rate limiter
+    THEN it should be retried until it succeeds
+    """
+    limiter = RateLimiter(
+        "bigquery", RetryPolicy(requests_per_second=1000, burst=10, max_attempts=4)
+    )
+    errors = [
+        requests.exceptions.ConnectionError("connection aborted"),
+        requests.exceptions.ReadTimeout("read timed out"),
+        auth_exceptions.TransportError("token refresh failed"),
+    ]
+
+    assert limiter.call(flaky(errors)) == "done"
+    assert limiter.counters.retries == 3
+    assert len(sleeps) == 3
+
+
+def test_rate_limiter_gives_up(sleeps):
+    """
+    GIVEN a call failing with a non retryable error, and one always failing transiently
+    WHEN they are made through a rate limiter
+    THEN the first should be raised at once and the second after max_attempts attempts
+    """
+    limiter = RateLimiter(
+        "bigquery", RetryPolicy(requests_per_second=1000, burst=10, max_attempts=3)
+    )
+
+    with pytest.raises(exceptions.BadRequest):
+        limiter.call(flaky([exceptions.BadRequest("invalid row")]))
+    assert limiter.counters.retries == 0
+
+    with pytest.raises(exceptions.ServiceUnavailable):
+        limiter.call(flaky([exceptions.ServiceUnavailable("down")] * 3))
+    assert limiter.counters.retries == 2
+    assert limiter.counters.failures == 2
+
+
+def test_is_retryable_by_reason():
+    """
+    GIVEN BigQuery errors with and without a retryable reason, and other errors
+    WHEN checked for being retryable
+    THEN only throttling, server and network errors should be
+    """
+    assert is_retryable(
+        exceptions.Forbidden("quota", errors=[{"reason": "rateLimitExceeded"}])
+    )
+    assert not is_retryable(
+        exceptions.Forbidden("denied", errors=[{"reason": "accessDenied"}])
+    )
+    assert is_retryable(ConnectionResetError())
+    assert not is_retryable(ValueError())
+
+
+def test_policy_from_env(monkeypatch):
+    """
+    GIVEN environment variables overriding part of the policy of an API
+    WHEN the policy is read
+    THEN set variables should override the default and the rest be kept
+    """
+    monkeypatch.setenv("GCS_REQUESTS_PER_SECOND", "50")
+    monkeypatch.setenv("GCS_MAX_ATTEMPTS", "2")
+    default = RetryPolicy(requests_per_second=200, burst=100)
+
+    assert policy_from_env("gcs", default) == RetryPolicy(
+        requests_per_second=50, burst=100, max_attempts=2
+    )
@@ -0,0 +1,62 @@
+import pytest
+
+from src.utils.run_report import RunReport, merge_run_reports
+
+
+def test_run_report_save_and_load(tmp_path):
+    """
+    GIVEN a run report with files loaded and failed
+    WHEN it is saved and loaded back
+    THEN the loaded report should be equal to the original
+    """
+    report = RunReport("bucket", "2023/", [1], 3)
+    report.record_loaded("2023/hl_1.csv", 4)
+    report.record_failed("2023/hl_2.csv", "boom")
+    path = str(tmp_path / "report.json")
+
+    report.save(path)
+
+    assert RunReport.load(path) == report
+    assert report.rows_loaded() == 4
+
+
+def test_merge_run_reports():
+    """
+    GIVEN the run reports of some shards of a run
+    WHEN they are merged
+    THEN the merged report should add up all of them and point out missing shards
+    """
+    shard_0 = RunReport("bucket", None, [0], 3)
+    shard_0.record_loaded("hl_1.csv", 4)
+    shard_2 = RunReport("bucket", None, [2], 3)
+    shard_2.record_loaded("hl_2.csv", 5)
+    shard_2.record_failed("hl_3.csv", "boom")
+
+    merged = merge_run_reports([shard_2, shard_0])
+
+    assert merged.shard_indexes == [0, 2]
+    assert merged.rows_loaded() == 9
+    assert merged.files_failed == {"hl_3.csv": "boom"}
+    assert merged.missing_shards() == [1]
+    assert merged.summary() == (
+        "Bucket 'bucket', shards [0, 2] of 3: 2 files loaded (9 rows), "
+        "1 files failed [hl_3.csv]. Missing shards: [1]"
+    )
+
+
+@pytest.mark.parametrize(
+    "other",
+    [
+        RunReport("other_bucket", None, [1], 3),
+        RunReport("bucket", None, [1], 4),
+        RunReport("bucket", None, [0], 3),
+    ],
+)
+def test_merge_run_reports_of_different_runs(other: RunReport):
+    """
+    GIVEN run reports from different runs or repeating a shard
+    WHEN they are merged
+    THEN ValueError has to be raised
+    """
+    with pytest.raises(ValueError):
+        merge_run_reports([RunReport("bucket", None, [0], 3), other])
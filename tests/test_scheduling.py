@@ -0,0 +1,54 @@
+import datetime as dt
+
+import pytest
+
+from src.utils.scheduling import ScheduledFile, order_files, pack_batches
+
+FILES = [
+    ScheduledFile("generic_2018_12_29.csv", 300, dt.datetime(2019, 1, 2)),
+    ScheduledFile("hl_2023_11_24.csv", 100, dt.datetime(2023, 11, 25)),
+    ScheduledFile("generic_2021_01_01.csv", 900, None),
+    ScheduledFile("generic_2021_06_30.csv", 300, dt.datetime(2021, 7, 1)),
+]
+
+
+def test_order_files():
+    """
+    GIVEN files of different sizes and update times, one of unknown update time
+    WHEN they are ordered largest first, newest first and as listed
+    THEN they should be sorted by size or update time, ties by name, newest name first
+    """
+    largest = order_files(FILES, "largest")
+    newest = order_files(FILES, "newest")
+
+    assert [file.name for file in largest] == [
+        "generic_2021_01_01.csv",
+        "generic_2021_06_30.csv",
+        "generic_2018_12_29.csv",
+        "hl_2023_11_24.csv",
+    ]
+    assert [file.name for file in newest] == [
+        "hl_2023_11_24.csv",
+        "generic_2021_06_30.csv",
+        "generic_2018_12_29.csv",
+        "generic_2021_01_01.csv",
+    ]
+    assert order_files(iter(FILES), "listing") == FILES
+    with pytest.raises(ValueError):
+        order_files(FILES, "smallest")
+
+
+def test_pack_batches():
+    """
+    GIVEN files in the order to load them
+    WHEN they are packed into batches by number of files and by bytes
+    THEN batches should keep the order and be closed before going over either limit
+    """
+    assert list(pack_batches(FILES)) == [[file] for file in FILES]
+    assert list(pack_batches(FILES, max_files=3)) == [FILES[:3], FILES[3:]]
+    assert list(pack_batches(FILES, max_files=10, max_bytes=500)) == [
+        FILES[:2],
+        FILES[2:3],
+        FILES[3:],
+    ]
+    assert list(pack_batches([])) == []
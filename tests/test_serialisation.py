@@ -0,0 +1,66 @@
+import datetime as dt
+import io
+import json
+
+from src import model, serialisation
+
+
+def test_ndjson_serialiser_matches_json_rows():
+    """
+    GIVEN Asset Valuations with repeated dates and names needing JSON escaping
+    WHEN they are written by the NDJSON serialiser
+    THEN every line should decode to the row expected by the destination table
+    """
+    creation_date = dt.datetime(2024, 1, 2, 3, 4, 5)
+    asset_valuations = [
+        model.AssetValuation(
+            dt.date(2020, 1, 1), 1200.5, 'fund "A" \\ £', "f.csv", creation_date
+        ),
+        model.AssetValuation(dt.date(2020, 1, 1), 3, "fund B", "f.csv", creation_date),
+        model.AssetValuation(
+            dt.date(2021, 2, 3), 1e-7, 'fund "A" \\ £', "f.csv", creation_date
+        ),
+    ]
+    buffer = io.BytesIO()
+
+    n_bytes = serialisation.NdjsonSerialiser().write(asset_valuations, buffer)
+
+    lines = buffer.getvalue().splitlines()
+    assert n_bytes == len(buffer.getvalue())
+    assert [json.loads(line) for line in lines] == [
+        {
+            "date": asset_valuation.date.strftime("%Y-%m-%d"),
+            "value": float(asset_valuation.value),
+            "product_name": asset_valuation.product_name,
+            "__source_file__": asset_valuation.source_file,
+            "__creation_date__": "2024-01-02 03:04:05",
+        }
+        for asset_valuation in asset_valuations
+    ]
+
+
+def test_ndjson_deserialiser_reads_back_serialised_rows():
+    """
+    GIVEN Asset Valuations written by the NDJSON serialiser
+    WHEN the lines are read back by the NDJSON deserialiser
+    THEN every field should be restored, creation date included
+    """
+    creation_date = dt.datetime(2024, 1, 2, 3, 4, 5)
+    asset_valuations = [
+        model.AssetValuation(
+            dt.date(2020, 1, 1), 1200.5, 'fund "A" \\ £', "f.csv", creation_date
+        ),
+        model.AssetValuation(dt.date(2021, 2, 3), 3, "fund B", "g.csv", creation_date),
+    ]
+    buffer = io.BytesIO()
+    serialisation.NdjsonSerialiser().write(asset_valuations, buffer)
+
+    read_back = serialisation.NdjsonDeserialiser().deserialise(buffer.getvalue())
+
+    assert [
+        (a.date, a.value, a.product_name, a.source_file, a.creation_date)
+        for a in read_back
+    ] == [
+        (a.date, float(a.value), a.product_name, a.source_file, a.creation_date)
+        for a in asset_valuations
+    ]
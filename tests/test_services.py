@@ -1,8 +1,48 @@
+import datetime as dt
 import os
+import shutil
 from typing import List, Tuple
 
-from src import services, source_repository, destination_repository, model
-from tests.data.asset_valuations import ASSET_VALUATIONS_2021, ASSET_VALUATIONS_HL
+import pytest
+from click.testing import CliRunner
+
+from src import services, source_repository, destination_repository, model, delta_index
+from src.custom_errors import SpoolFlushLockedError
+from src.entrypoints.cli.load_file import (
+    load_all_files_from_bucket,
+    rebuild_delta_index,
+    reprocess_table,
+)
+from src.utils.memory_budget import (
+    configure_memory_budget,
+    estimate_parse_bytes,
+    estimate_rows_bytes,
+    get_memory_budget,
+)
+from tests.data.asset_valuations import (
+    ASSET_VALUATIONS_2018,
+    ASSET_VALUATIONS_2021,
+    ASSET_VALUATIONS_HL,
+)
+from tests.test_delta_index import valuation
+from tests.test_destination_repository_sqlite import read_asset_valuations
+from tests.test_source_repository_table import ASSET_VALUATIONS
+from tests.test_spool import asset_valuations
+
+
+class FailingDestinationRepository(destination_repository.SqliteDestinationRepository):
+    """
+    SQLite destination whose loads fail while unavailable is set.
+    """
+
+    unavailable = True
+    loads = 0
+
+    def load_asset_valuations(self, asset_valuations: list[model.AssetValuation]):
+        self.loads += 1
+        if self.unavailable:
+            raise ConnectionError("destination unavailable")
+        super().load_asset_valuations(asset_valuations)
 
 
 def test_asset_valuation_pipeline_generic(
@@ -75,3 +115,414 @@ def test_asset_valuation_pipeline_hl(
     assert len(expected_asset_valuations) == len(results_asset_valuations)
     for asset_valuation in expected_asset_valuations:
         assert asset_valuation in results_asset_valuations
+
+
+def test_reprocess_table_looks_up_each_batch_in_the_destination_table(
+    tmp_path,
+    sqlite_repository: destination_repository.SqliteDestinationRepository,
+):
+    """
+    GIVEN a SQLite table holding some Asset Valuations twice, and a destination table
+          holding some of them already
+    WHEN it is reprocessed in batches into the destination table, twice, looking each
+         batch up in it
+    THEN each Asset Valuation should be loaded once, without keeping the keys loaded
+    """
+    sqlite_repository.load_asset_valuations(ASSET_VALUATIONS_2018)
+    sqlite_repository.load_asset_valuations(ASSET_VALUATIONS_2021)
+    sqlite_repository.load_asset_valuations(ASSET_VALUATIONS_2018)
+    source = source_repository.SqliteTableSource(
+        sqlite_repository.database_path, batch_rows=3
+    )
+    destination = destination_repository.SqliteDestinationRepository(
+        str(tmp_path / "copy.db")
+    )
+    destination.load_asset_valuations(ASSET_VALUATIONS_2021[:1])
+    destination_table = source_repository.SqliteTableSource(destination.database_path)
+
+    rows = [
+        services.reprocess_table(
+            source, destination, destination_table=destination_table
+        )
+        for _ in range(2)
+    ]
+
+    assert rows == [len(ASSET_VALUATIONS_2018 + ASSET_VALUATIONS_2021) - 1, 0]
+    assert sorted(
+        read_asset_valuations(destination), key=lambda row: row.natural_key
+    ) == sorted(
+        ASSET_VALUATIONS_2018 + ASSET_VALUATIONS_2021, key=lambda row: row.natural_key
+    )
+    destination.close()
+
+
+def test_flush_spool_holds_the_flusher_lock_and_reserves_memory(
+    tmp_path, process_budget
+):
+    """
+    GIVEN Asset Valuations spooled over two segments, flushed one segment per batch
+    WHEN the spool is flushed while another flusher holds its lock, then alone
+    THEN the first flush should fail loading nothing, and the second reserve the memory
+         of each batch from the memory budget, releasing it once loaded
+    """
+    spool_repository = destination_repository.SpoolDestinationRepository(
+        str(tmp_path / "spool"), segment_max_bytes=1
+    )
+    spool_repository.load_asset_valuations(asset_valuations(30, "a.csv"))
+    spool_repository.load_asset_valuations(asset_valuations(20, "b.csv"))
+    spool_repository.close()
+    spool = spool_repository.spool
+    destination = FailingDestinationRepository(str(tmp_path / "valuations.db"))
+    destination.unavailable = False
+    configure_memory_budget()
+
+    with spool.lock_flusher():
+        with pytest.raises(SpoolFlushLockedError):
+            services.flush_spool(spool, destination, max_batch_bytes=1)
+    loaded = services.flush_spool(spool, destination, max_batch_bytes=1)
+
+    budget = get_memory_budget()
+    assert destination.loads == 2
+    assert loaded == 50
+    assert budget.stage_peak_bytes["flush"] == estimate_rows_bytes(30)
+    assert budget.in_flight_bytes == 0
+    destination.close()
+
+
+def test_asset_valuation_batch_pipeline_skips_failed_files(
+    tmp_path, sqlite_repository: destination_repository.SqliteDestinationRepository
+):
+    """
+    GIVEN a micro-batch of a HL file, a generic file and a file with a wrong header
+    WHEN it runs through the batch pipeline
+    THEN the valid files should be loaded with a single load and the invalid one reported
+    """
+    for name in ("hl_2023_11_24.csv", "generic_2018_12_29.csv"):
+        shutil.copy(os.path.join("tests/data", name), tmp_path / name)
+    (tmp_path / "generic_2020_01_01.csv").write_text("product,date,value\n")
+    files = [
+        source_repository.LocalFileSource(str(tmp_path / name))
+        for name in (
+            "hl_2023_11_24.csv",
+            "generic_2020_01_01.csv",
+            "generic_2018_12_29.csv",
+        )
+    ]
+    seen_keys: set = set()
+
+    loaded, failed = services.asset_valuation_batch_pipeline(
+        files, sqlite_repository, seen_keys=seen_keys
+    )
+
+    assert list(failed) == [str(tmp_path / "generic_2020_01_01.csv")]
+    assert loaded == {
+        str(tmp_path / "hl_2023_11_24.csv"): 4,
+        str(tmp_path / "generic_2018_12_29.csv"): 5,
+    }
+    assert len(read_asset_valuations(sqlite_repository)) == 9
+    assert len(seen_keys) == 9
+
+
+def test_batch_pipeline_parses_files_concurrently(
+    tmp_path, sqlite_repository: destination_repository.SqliteDestinationRepository
+):
+    """
+    GIVEN a batch of files, one with a wrong header
+    WHEN it runs through the batch pipeline with a pool of parse workers
+    THEN the result should be that of parsing the files one by one
+    """
+    for name in ("hl_2023_11_24.csv", "generic_2018_12_29.csv"):
+        shutil.copy(os.path.join("tests/data", name), tmp_path / name)
+    (tmp_path / "generic_2020_01_01.csv").write_text("product,date,value\n")
+    files = [
+        source_repository.LocalFileSource(str(tmp_path / name))
+        for name in (
+            "generic_2018_12_29.csv",
+            "generic_2020_01_01.csv",
+            "hl_2023_11_24.csv",
+        )
+    ]
+
+    loaded, failed = services.asset_valuation_batch_pipeline(
+        files, sqlite_repository, parse_workers=3
+    )
+
+    assert list(failed) == [str(tmp_path / "generic_2020_01_01.csv")]
+    assert list(loaded.items()) == [
+        (str(tmp_path / "generic_2018_12_29.csv"), 5),
+        (str(tmp_path / "hl_2023_11_24.csv"), 4),
+    ]
+    assert len(read_asset_valuations(sqlite_repository)) == 9
+
+
+def test_batch_pipeline_loads_early_once_budget_is_spent(
+    tmp_path,
+    monkeypatch,
+    process_budget,
+    sqlite_repository: destination_repository.SqliteDestinationRepository,
+):
+    """
+    GIVEN a memory budget fitting the parse estimate of one of two files
+    WHEN a batch of the two files runs through the batch pipeline
+    THEN the first file should be loaded before the second is parsed, and both loaded
+    """
+    names = ("hl_2023_11_24.csv", "generic_2018_12_29.csv")
+    for name in names:
+        shutil.copy(os.path.join("tests/data", name), tmp_path / name)
+    configure_memory_budget(estimate_parse_bytes(os.path.getsize(tmp_path / names[1])))
+    loads: List[int] = []
+    load = sqlite_repository.load_asset_valuations
+
+    def record_load(asset_valuations):
+        loads.append(len(asset_valuations))
+        load(asset_valuations)
+
+    monkeypatch.setattr(sqlite_repository, "load_asset_valuations", record_load)
+    files = [source_repository.LocalFileSource(str(tmp_path / name)) for name in names]
+
+    loaded, failed = services.asset_valuation_batch_pipeline(
+        files, sqlite_repository, parse_workers=2
+    )
+
+    assert failed == {}
+    assert loaded == {str(tmp_path / names[0]): 4, str(tmp_path / names[1]): 5}
+    assert loads == [4, 5]
+    assert get_memory_budget().in_flight_bytes == 0
+
+
+def test_flush_spool_loads_batches_and_resumes_after_failure(tmp_path):
+    """
+    GIVEN Asset Valuations spooled over several segments, and a destination unavailable
+          on the first flush
+    WHEN the spool is flushed twice, with batches large enough for all segments
+    THEN the first flush should keep every segment and the second load them all at once,
+         removing the segments
+    """
+    spool_repository = destination_repository.SpoolDestinationRepository(
+        str(tmp_path / "spool"), segment_max_bytes=2000
+    )
+    spooled = asset_valuations(30, "a.csv") + asset_valuations(20, "b.csv")
+    spool_repository.load_asset_valuations(spooled[:30])
+    spool_repository.load_asset_valuations(spooled[30:])
+    spool_repository.close()
+    spool = spool_repository.spool
+    segments = len(spool.sealed_segments())
+    destination = FailingDestinationRepository(str(tmp_path / "valuations.db"))
+
+    with pytest.raises(ConnectionError):
+        services.flush_spool(spool, destination, max_batch_bytes=1024 * 1024)
+    assert len(spool.sealed_segments()) == segments
+    assert len(spool_repository.get_latest_asset_valuations()) == 30
+
+    destination.unavailable = False
+    loaded = services.flush_spool(spool, destination, max_batch_bytes=1024 * 1024)
+
+    assert segments > 1
+    assert loaded == 50
+    assert destination.loads == 2
+    assert spool.sealed_segments() == []
+    assert [
+        (a.date, a.value, a.product_name, a.source_file, a.creation_date)
+        for a in read_asset_valuations(destination)
+    ] == [
+        (a.date, a.value, a.product_name, a.source_file, a.creation_date)
+        for a in spooled
+    ]
+    destination.close()
+
+
+def test_flush_spool_bounds_batches_by_bytes(tmp_path):
+    """
+    GIVEN several spooled segments
+    WHEN the spool is flushed with batches smaller than two segments
+    THEN each segment should be loaded on its own
+    """
+    spool_repository = destination_repository.SpoolDestinationRepository(
+        str(tmp_path / "spool"), segment_max_bytes=1
+    )
+    for source_file in ("a.csv", "b.csv", "c.csv"):
+        spool_repository.load_asset_valuations(asset_valuations(10, source_file))
+    spool_repository.close()
+    destination = FailingDestinationRepository(str(tmp_path / "valuations.db"))
+    destination.unavailable = False
+
+    loaded = services.flush_spool(
+        spool_repository.spool, destination, max_batch_bytes=1
+    )
+
+    assert loaded == 30
+    assert destination.loads == 3
+    destination.close()
+
+
+def test_rebuild_delta_index_command_refuses_a_spool(
+    tmp_path,
+    sqlite_repository: destination_repository.SqliteDestinationRepository,
+):
+    """
+    GIVEN a SQLite destination holding valuations
+    WHEN the delta index is rebuilt from it, and from a spool
+    THEN the index should be rebuilt from SQLite, and a spool refused as it only holds
+         the valuations not flushed yet
+    """
+    sqlite_repository.load_asset_valuations([valuation(10, 1.0, "a")])
+    index_path = str(tmp_path / "index.json")
+    runner = CliRunner()
+
+    refused = runner.invoke(rebuild_delta_index, ["-d", "spool", "-di", index_path])
+    rebuilt = runner.invoke(
+        rebuild_delta_index,
+        ["-d", "sqlite", "-db", sqlite_repository.database_path, "-di", index_path],
+    )
+
+    assert refused.exit_code == 2
+    assert "'spool' is not one of" in refused.output
+    assert rebuilt.exit_code == 0
+    assert delta_index.create_delta_index(index_path).entries == {
+        "a": (dt.date(2020, 1, 10), 1.0)
+    }
+
+
+def test_asset_valuation_pipeline_with_delta_index(
+    tmp_path, sqlite_repository: destination_repository.SqliteDestinationRepository
+):
+    """
+    GIVEN a generic source file loaded once through a pipeline with a delta index
+    WHEN the same file is loaded again
+    THEN nothing should be loaded the second time
+    """
+    index = delta_index.create_delta_index(str(tmp_path / "index.json"))
+    file = source_repository.LocalFileSource("tests/data/generic_2018_12_29.csv")
+
+    first = services.asset_valuation_pipeline(file, sqlite_repository, index)
+    second = services.asset_valuation_pipeline(file, sqlite_repository, index)
+
+    rows: List[tuple] = sqlite_repository.connection.execute(
+        "SELECT * FROM asset_valuations"
+    ).fetchall()
+    assert (first, second) == (len(ASSET_VALUATIONS_2018), 0)
+    assert len(rows) == len(ASSET_VALUATIONS_2018)
+    assert len(delta_index.create_delta_index(index.index_path).entries) == 5
+
+
+def test_asset_valuation_pipeline_dry_run_does_not_save_delta_index(tmp_path):
+    """
+    GIVEN a generic source file and a delta index
+    WHEN the file is run through the pipeline twice on a dry run
+    THEN the second run should be filtered by the first, but the index not saved
+    """
+    index = delta_index.create_delta_index(str(tmp_path / "index.json"))
+    file = source_repository.LocalFileSource("tests/data/generic_2018_12_29.csv")
+    dry_run = destination_repository.DryRunDestinationRepository()
+
+    first = services.asset_valuation_pipeline(file, dry_run, index, dry_run=True)
+    second = services.asset_valuation_pipeline(file, dry_run, index, dry_run=True)
+
+    assert (first, second) == (len(ASSET_VALUATIONS_2018), 0)
+    assert file.parse_seconds is not None
+    assert not (tmp_path / "index.json").exists()
+
+
+def test_reprocess_table_copies_batches_without_duplicates(
+    tmp_path,
+    sqlite_repository: destination_repository.SqliteDestinationRepository,
+):
+    """
+    GIVEN a SQLite table holding some Asset Valuations twice
+    WHEN it is reprocessed in batches into another database
+    THEN each Asset Valuation should be loaded once, provenance kept
+    """
+    sqlite_repository.load_asset_valuations(ASSET_VALUATIONS)
+    sqlite_repository.load_asset_valuations(ASSET_VALUATIONS_HL)
+    source = source_repository.SqliteTableSource(
+        sqlite_repository.database_path, batch_rows=4
+    )
+    destination = destination_repository.SqliteDestinationRepository(
+        str(tmp_path / "copy.db")
+    )
+
+    rows = services.reprocess_table(source, destination)
+
+    assert rows == len(ASSET_VALUATIONS)
+    copied = read_asset_valuations(destination)
+    assert copied == ASSET_VALUATIONS
+    assert [row.source_file for row in copied] == [
+        row.source_file for row in ASSET_VALUATIONS
+    ]
+    destination.close()
+
+
+def test_reprocess_table_command_refuses_self_copy_and_skips_loaded_rows(
+    tmp_path,
+    sqlite_repository: destination_repository.SqliteDestinationRepository,
+):
+    """
+    GIVEN a SQLite table of Asset Valuations
+    WHEN the reprocess-table command reads it back into itself, then twice into another
+         database
+    THEN the first run should be refused, and the others load each valuation once
+    """
+    sqlite_repository.load_asset_valuations(ASSET_VALUATIONS)
+    options = ["--source", "sqlite", "-sdb", sqlite_repository.database_path]
+    copy_options = ["--destination", "sqlite", "-db", str(tmp_path / "copy.db")]
+    runner = CliRunner()
+
+    refused = runner.invoke(
+        reprocess_table,
+        options + ["--destination", "sqlite", "-db", sqlite_repository.database_path],
+    )
+    runs = [runner.invoke(reprocess_table, options + copy_options) for _ in range(2)]
+
+    assert refused.exit_code == 2
+    assert "both read back and loaded into" in refused.output
+    wrong_table = runner.invoke(
+        reprocess_table, options + copy_options + ["--destination_table", "raw.copy"]
+    )
+    assert wrong_table.exit_code == 2
+    assert "'--destination_table'" in wrong_table.output
+    assert [run.exit_code for run in runs] == [0, 0]
+    assert len(read_asset_valuations(sqlite_repository)) == len(ASSET_VALUATIONS)
+    copy = destination_repository.SqliteDestinationRepository(str(tmp_path / "copy.db"))
+    assert read_asset_valuations(copy) == ASSET_VALUATIONS
+    copy.close()
+
+
+@pytest.mark.parametrize("destination", ["sqlite", "spool"])
+def test_reprocess_table_dry_run_refused_for_other_destinations(
+    tmp_path,
+    destination: str,
+    sqlite_repository: destination_repository.SqliteDestinationRepository,
+):
+    """
+    GIVEN a SQLite table of Asset Valuations
+    WHEN the reprocess-table command is dry run into a SQLite database or a spool
+    THEN it should be refused, as only BigQuery load jobs are planned, and nothing loaded
+    """
+    sqlite_repository.load_asset_valuations(ASSET_VALUATIONS)
+
+    result = CliRunner().invoke(
+        reprocess_table,
+        ["--source", "sqlite", "-sdb", sqlite_repository.database_path]
+        + ["--destination", destination, "--dry_run"]
+        + ["-db", str(tmp_path / "copy.db"), "-sd", str(tmp_path / "spool")],
+    )
+
+    assert result.exit_code == 2
+    assert "'--dry_run'" in result.output
+    assert not os.path.exists(tmp_path / "copy.db")
+    assert not os.path.exists(tmp_path / "spool")
+
+
+def test_parse_workers_need_batches():
+    """
+    GIVEN the load of a bucket with several parse workers
+    WHEN files are loaded one at a time
+    THEN the command should be refused before listing the bucket
+    """
+    result = CliRunner().invoke(
+        load_all_files_from_bucket, ["-bn", "dummy", "--parse_workers", "4"]
+    )
+
+    assert result.exit_code == 2
+    assert "'--parse_workers'" in result.output
+    assert "--batch_max_files" in result.output
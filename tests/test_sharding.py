@@ -0,0 +1,35 @@
+from src.utils.sharding import in_shard, shard_of
+
+
+def test_shard_of_is_stable_and_in_range():
+    """
+    GIVEN blob names and a number of shards
+    WHEN the shard of each blob is computed twice
+    THEN it should be the same both times and within the shard range
+    """
+    blob_names = [f"statements/hl_{i:05d}.csv" for i in range(1000)]
+
+    shards = [shard_of(blob_name, 7) for blob_name in blob_names]
+
+    assert shards == [shard_of(blob_name, 7) for blob_name in blob_names]
+    assert set(shards) == set(range(7))
+    assert shard_of("hl_2023_11_24.csv", 4) == 0
+
+
+def test_in_shard_partitions_blobs():
+    """
+    GIVEN blob names and a number of shards
+    WHEN each shard selects its blobs
+    THEN every blob should be selected by exactly one shard
+    """
+    blob_names = [f"generic_{i}.csv" for i in range(500)]
+    shard_count = 4
+
+    selected = [
+        [name for name in blob_names if in_shard(name, index, shard_count)]
+        for index in range(shard_count)
+    ]
+
+    assert sorted(name for shard in selected for name in shard) == sorted(blob_names)
+    assert all(len(shard) > 0 for shard in selected)
+    assert all(in_shard(name, 0, 1) for name in blob_names)
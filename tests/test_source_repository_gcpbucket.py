@@ -1,10 +1,15 @@
+from google.api_core import exceptions
+from google.cloud.storage import fileio
 from google.cloud.storage.bucket import Bucket
+import gzip
 import pytest
 import os
 from typing import Tuple, Optional
 
 from src import source_repository, custom_errors
 from tests.data.asset_valuations import ASSET_VALUATIONS_2018
+from tests.fakes import FakeBlob, FakeBucket, FakeStorageClient
+from src.utils import rate_limiting
 from src.utils.gcp_clients import create_storage_client
 
 
@@ -17,6 +22,7 @@ from src.utils.gcp_clients import create_storage_client
         ("my_file.csv", "csv"),
         ("my_path/my_file.txt", "txt"),
         ("my_file.txt", "txt"),
+        ("my_path/my_file.csv.gz", "csv"),
     ],
 )
 def test_file_format(file_path: str, file_format: str):
@@ -152,3 +158,75 @@ def test_header_do_not_match_generic_file(empty_bucket_and_project):
     )
     with pytest.raises(custom_errors.HeaderNotMatchError):
         file.get_asset_valuations()
+
+
+def test_only_hl_csv_blobs_are_read_in_small_chunks():
+    """
+    GIVEN HL and generic CSV blobs, one of them compressed
+    WHEN their Asset Valuations are read
+    THEN only the uncompressed HL blob should be read in ranges of hl_read_chunk_size
+         bytes, the others in ranges of the library default size
+    """
+    names = ["hl_2023_11_24.csv", "generic_2018_12_29.csv", "generic_2018_12_29.csv.gz"]
+    contents = {}
+    for name in names[:2]:
+        with open(os.path.join("tests/data", name), "rb") as f:
+            contents[name] = f.read()
+    contents[names[2]] = gzip.compress(contents[names[1]])
+    bucket = FakeBucket(names, contents=contents)
+    storage_client = FakeStorageClient(bucket)
+
+    for name in names:
+        source_repository.GcpBucketFileSource(
+            name, bucket.name, storage_client  # type: ignore
+        ).get_asset_valuations()
+
+    assert [bucket.blobs[name].ranges_read[0][1] for name in names] == [
+        source_repository.GcpBucketFileSource.hl_read_chunk_size,
+        fileio.DEFAULT_CHUNK_SIZE,
+        fileio.DEFAULT_CHUNK_SIZE,
+    ]
+
+
+class FlakyBlob(FakeBlob):
+    """
+    Fake blob whose download of its second range fails once with a transient error.
+    """
+
+    def download_as_bytes(self, start: int = 0, end=None, **kwargs) -> bytes:
+        if len(self.ranges_read) == 1:
+            self.ranges_read.append((start, end))
+            raise exceptions.ServiceUnavailable("try again")
+        return super().download_as_bytes(start, end)
+
+
+def test_each_ranged_download_is_rate_limited_and_retried(monkeypatch):
+    """
+    GIVEN a generic blob read in several ranges, whose second range fails once with a
+          transient error
+    WHEN its Asset Valuations are read
+    THEN every ranged download should go through the GCS rate limiter, and only the
+         failed range be downloaded again
+    """
+    monkeypatch.setattr(rate_limiting.time, "sleep", lambda seconds: None)
+    rate_limiting.configure_rate_limiter(
+        "gcs", rate_limiting.RetryPolicy(requests_per_second=1000, burst=10)
+    )
+    name = "generic_2018_12_29.csv"
+    rows = "".join(f"product {i},2018-12-29,1.0\n" for i in range(1000))
+    bucket = FakeBucket([])
+    blob = bucket.blobs[name] = FlakyBlob(
+        name, f"product_name,date,value\n{rows}".encode()
+    )
+    blob.chunk_size = 1024
+
+    asset_valuations = source_repository.GcpBucketFileSource(
+        name, bucket.name, FakeStorageClient(bucket)  # type: ignore
+    ).get_asset_valuations()
+
+    counters = rate_limiting.get_rate_limiter("gcs").counters
+    assert len(asset_valuations) == 1000
+    assert blob.ranges_read[1] == blob.ranges_read[2]
+    assert len(set(blob.ranges_read)) == len(blob.ranges_read) - 1
+    assert (counters.calls, counters.retries) == (len(blob.ranges_read) - 1, 1)
+    rate_limiting.configure_rate_limiter("gcs")
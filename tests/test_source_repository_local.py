@@ -1,7 +1,40 @@
+import bz2
+import gzip
+import os
 import pytest
+from typing import IO, Any, Callable, Iterator
+import zstandard
 
 from src import source_repository, custom_errors
-from tests.data.asset_valuations import ASSET_VALUATIONS_2018
+from tests.data.asset_valuations import ASSET_VALUATIONS_2018, ASSET_VALUATIONS_HL
+
+
+class LineCountingLocalFileSource(source_repository.LocalFileSource):
+    """
+    LocalFileSource that records how many lines the parsers pull from the file.
+    """
+
+    lines_read = 0
+
+    def _open(self) -> IO[Any]:
+        source = self
+
+        class _CountingFile:
+            def __init__(self, f: IO[Any]):
+                self.f = f
+
+            def __enter__(self) -> "_CountingFile":
+                return self
+
+            def __exit__(self, *args: Any) -> None:
+                self.f.close()
+
+            def __iter__(self) -> Iterator[str]:
+                for line in self.f:
+                    source.lines_read += 1
+                    yield line
+
+        return _CountingFile(super()._open())  # type: ignore
 
 
 @pytest.mark.parametrize(
@@ -13,6 +46,9 @@ from tests.data.asset_valuations import ASSET_VALUATIONS_2018
         ("my_file.csv", "csv"),
         ("my_path/my_file.txt", "txt"),
         ("my_file.txt", "txt"),
+        ("my_path/my_file.csv.gz", "csv"),
+        ("my_file.csv.zst", "csv"),
+        ("my_file.gz", "gz"),
     ],
 )
 def test_file_format(file_path, file_format):
@@ -45,6 +81,27 @@ def test_file_type(file_path, file_type):
     assert file.file_type == file_type
 
 
+@pytest.mark.parametrize(
+    "file_path, compression",
+    [
+        ("my_path/my_file.csv", None),
+        ("my_path/my_file.csv.gz", "gz"),
+        ("my_file.csv.BZ2", "bz2"),
+        ("my_file.csv.zst", "zst"),
+        ("my_file.zst", None),
+    ],
+)
+def test_compression(file_path, compression):
+    """
+    GIVEN file path
+    WHEN an object of class file is created
+    THEN the attribute compression should return the compression of the file, if any
+    """
+    file = source_repository.LocalFileSource(file_path)
+
+    assert file.compression == compression
+
+
 def test_open():
     """
     GIVEN file
@@ -72,6 +129,75 @@ def test_get_asset_valuations_from_generic_source():
         assert expected_asset_valuation in asset_valuations
 
 
+@pytest.mark.parametrize(
+    "source_path, compress",
+    [
+        ("tests/data/generic_2018_12_29.csv", gzip.compress),
+        ("tests/data/generic_2018_12_29.csv", bz2.compress),
+        ("tests/data/generic_2018_12_29.csv", zstandard.compress),
+        ("tests/data/hl_2023_11_24.csv", gzip.compress),
+    ],
+)
+def test_get_asset_valuations_from_compressed_source(
+    tmp_path, source_path: str, compress: Callable[[bytes], bytes]
+):
+    """
+    GIVEN a compressed source file
+    WHEN we call get_asset_valuations()
+    THEN it should return the same asset valuations as the uncompressed file
+    """
+    extension = {gzip.compress: "gz", bz2.compress: "bz2", zstandard.compress: "zst"}
+    with open(source_path, "rb") as f:
+        content = f.read()
+    file_path = tmp_path / f"{os.path.basename(source_path)}.{extension[compress]}"
+    file_path.write_bytes(compress(content))
+
+    expected = source_repository.LocalFileSource(source_path).get_asset_valuations()
+    asset_valuations = source_repository.LocalFileSource(
+        str(file_path)
+    ).get_asset_valuations()
+
+    assert asset_valuations == expected
+
+
+def test_get_asset_valuations_from_hl_source():
+    """
+    GIVEN a HL source file
+    WHEN we call get_asset_valuations()
+    THEN it should return a list of asset valuations with the expected values
+    """
+    file = source_repository.LocalFileSource("tests/data/hl_2023_11_24.csv")
+    asset_valuations = file.get_asset_valuations()
+
+    assert len(asset_valuations) == len(ASSET_VALUATIONS_HL)
+    for expected_asset_valuation in ASSET_VALUATIONS_HL:
+        assert expected_asset_valuation in asset_valuations
+
+
+def test_hl_source_stops_reading_at_end_of_holdings(tmp_path):
+    """
+    GIVEN a HL source file with a long trailing section after the holdings table
+    WHEN we call get_asset_valuations()
+    THEN it should return the holdings and stop reading at the totals row
+    """
+    with open("tests/data/hl_2023_11_24.csv", encoding="utf-8") as f:
+        content = f.read()
+    trailing_section = "".join(f'"Disclaimer line {i}",,,\n' for i in range(10_000))
+    file_path = tmp_path / "hl_2023_11_24.csv"
+    file_path.write_text(content + "\n" + trailing_section, encoding="utf-8")
+
+    file = LineCountingLocalFileSource(str(file_path))
+    asset_valuations = file.get_asset_valuations()
+
+    assert len(asset_valuations) == len(ASSET_VALUATIONS_HL)
+    for expected_asset_valuation in ASSET_VALUATIONS_HL:
+        assert expected_asset_valuation in asset_valuations
+    totals_row_number = [
+        line.startswith('"","Totals"') for line in content.splitlines()
+    ].index(True)
+    assert file.lines_read == totals_row_number + 1
+
+
 def test_error_file_type_no_implemented():
     """
     GIVEN a file type which method to extract has not been implemented
@@ -124,6 +250,40 @@ def test_value_error_hl_file():
         file.get_asset_valuations()
 
 
+def test_row_validation_error_generic_file():
+    """
+    GIVEN a generic file with several invalid rows
+    WHEN we call get_asset_valuations()
+    THEN RowValidationError has to be raised reporting all invalid rows
+    """
+    file = source_repository.LocalFileSource(
+        "tests/data/errors_check/generic_2019_01_01.csv"
+    )
+    with pytest.raises(
+        custom_errors.RowValidationError, match="4 invalid rows out of 6"
+    ):
+        file.get_asset_valuations()
+
+
+def test_quarantine_invalid_rows_generic_file():
+    """
+    GIVEN a generic file with several invalid rows and quarantine of invalid rows enabled
+    WHEN we call get_asset_valuations()
+    THEN valid rows should be returned and invalid ones recorded on the validation report
+    """
+    file = source_repository.LocalFileSource(
+        "tests/data/errors_check/generic_2019_01_01.csv", quarantine_invalid_rows=True
+    )
+    asset_valuations = file.get_asset_valuations()
+
+    assert [asset_valuation.product_name for asset_valuation in asset_valuations] == [
+        "product 1",
+        "product 4",
+    ]
+    assert file.validation_report is not None
+    assert sorted(file.validation_report.quarantined_rows) == [2, 3, 4, 6]
+
+
 def test_header_do_not_match_generic_file():
     """
     GIVEN a generic file which columns are not the expected ones
@@ -135,3 +295,78 @@ def test_header_do_not_match_generic_file():
     )
     with pytest.raises(custom_errors.HeaderNotMatchError):
         file.get_asset_valuations()
+
+
+def test_header_aliases_generic_file():
+    """
+    GIVEN a generic file which value column is named differently
+    WHEN we call get_asset_valuations() with an alias for that column
+    THEN the file should be parsed
+    """
+    file = source_repository.LocalFileSource(
+        "tests/data/errors_check/generic_2018_12_29.csv",
+        header_aliases={"Valuation": "value"},
+    )
+
+    asset_valuations = file.get_asset_valuations()
+
+    assert [asset_valuation.value for asset_valuation in asset_valuations] == [
+        1200.0,
+        5100.0,
+        31200.0,
+        2500.0,
+        100.0,
+    ]
+
+
+def test_reordered_and_extra_columns_generic_file(tmp_path):
+    """
+    GIVEN a generic file with columns in another order and extra columns
+    WHEN we call get_asset_valuations()
+    THEN the extra columns should be ignored and the same valuations be parsed
+    """
+    file_path = tmp_path / "generic_2018_12_29.csv"
+    with open("tests/data/generic_2018_12_29.csv", encoding="utf-8") as f:
+        rows = [line.rstrip("\n").split(",") for line in f if line.strip()]
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write("currency,Value,account,date,PRODUCT_NAME\n")
+        for product_name, date, value in rows[1:]:
+            f.write(f"GBP,{value},ISA,{date},{product_name}\n")
+    file = source_repository.LocalFileSource(str(file_path))
+
+    asset_valuations = file.get_asset_valuations()
+
+    assert asset_valuations == ASSET_VALUATIONS_2018
+
+
+@pytest.mark.parametrize(
+    "file_path, expected",
+    [
+        ("tests/data/generic_2018_12_29.xlsx", ASSET_VALUATIONS_2018),
+        ("tests/data/hl_2023_11_24.xlsx", ASSET_VALUATIONS_HL),
+    ],
+)
+def test_get_asset_valuations_from_xlsx_source(file_path, expected):
+    """
+    GIVEN generic and HL statements exported as xlsx workbooks
+    WHEN we call get_asset_valuations()
+    THEN the same asset valuations as from their CSV exports should be returned
+    """
+    file = source_repository.LocalFileSource(file_path)
+
+    assert file.get_asset_valuations() == expected
+
+
+def test_file_format_error_compressed_xlsx_file(tmp_path):
+    """
+    GIVEN a compressed xlsx workbook
+    WHEN we call get_asset_valuations()
+    THEN FileFormatError has to be raised
+    """
+    file_path = tmp_path / "generic_2018_12_29.xlsx.gz"
+    with open("tests/data/generic_2018_12_29.xlsx", "rb") as f:
+        file_path.write_bytes(gzip.compress(f.read()))
+    file = source_repository.LocalFileSource(str(file_path))
+
+    with pytest.raises(custom_errors.FileFormatError):
+        file.get_asset_valuations()
@@ -0,0 +1,201 @@
+import dataclasses
+import datetime as dt
+from typing import Any, Dict, List
+
+from google.api_core import exceptions
+
+from src import destination_repository, source_repository
+from src.source_repository import (
+    BigQueryTableSource,
+    SqliteTableSource,
+    ValuationFilter,
+)
+from tests.data.asset_valuations import (
+    ASSET_VALUATIONS_2018,
+    ASSET_VALUATIONS_2021,
+    ASSET_VALUATIONS_HL,
+)
+from tests.fakes import FakeBigQueryClient
+
+CREATION_DATE = dt.datetime(2024, 1, 1, 10, 30)
+ASSET_VALUATIONS = [
+    dataclasses.replace(asset_valuation, creation_date=CREATION_DATE)
+    for asset_valuation in ASSET_VALUATIONS_2018
+    + ASSET_VALUATIONS_2021
+    + ASSET_VALUATIONS_HL
+]
+
+
+def to_table_rows(asset_valuations) -> List[Dict[str, Any]]:
+    """
+    Returns the rows of the BigQuery destination table holding the Asset Valuations.
+    """
+    return [
+        {
+            "date": asset_valuation.date,
+            "value": asset_valuation.value,
+            "product_name": asset_valuation.product_name,
+            "__source_file__": asset_valuation.source_file,
+            "__creation_date__": asset_valuation.creation_date,
+        }
+        for asset_valuation in asset_valuations
+    ]
+
+
+def test_bigquery_table_source_pushes_down_filters_and_reads_in_parallel():
+    """
+    GIVEN a BigQuery table source filtered on dates and products
+    WHEN its Asset Valuations are read in batches of 4 rows by 3 streams
+    THEN a single parameterised query should project and filter the table, and its
+         result be read back by ranges, batches yielded in order
+    """
+    client = FakeBigQueryClient(query_rows=to_table_rows(ASSET_VALUATIONS))
+    source = BigQueryTableSource(
+        client,  # type: ignore
+        row_filter=ValuationFilter(
+            dt.date(2018, 1, 1), dt.date(2021, 12, 31), ("product 1", "product 2")
+        ),
+        streams=3,
+        batch_rows=4,
+    )
+
+    batches = list(source.iter_asset_valuation_batches())
+
+    assert len(client.queries) == 1
+    query = client.queries[0]["query"]
+    assert query == (
+        "SELECT date, value, product_name, __source_file__, __creation_date__ "
+        "FROM raw.asset_valuations_v2 WHERE TRUE AND date >= @start_date "
+        "AND date <= @end_date AND product_name IN UNNEST(@product_names)"
+    )
+    parameters = client.queries[0]["job_config"].query_parameters
+    assert [parameter.name for parameter in parameters] == [
+        "start_date",
+        "end_date",
+        "product_names",
+    ]
+    assert parameters[2].values == ["product 1", "product 2"]
+    assert sorted(client.row_reads) == [(0, 4), (4, 4), (8, 4), (12, 2)]
+    assert [len(batch) for batch in batches] == [4, 4, 4, 2]
+    asset_valuations = [row for batch in batches for row in batch]
+    assert asset_valuations == ASSET_VALUATIONS
+    assert [row.creation_date for row in asset_valuations] == [CREATION_DATE] * 14
+
+
+def test_bigquery_table_source_projects_out_provenance():
+    """
+    GIVEN a BigQuery table source not reading provenance columns
+    WHEN its Asset Valuations are read
+    THEN only date, value and product name should be queried, and the table be given as
+         source file
+    """
+    rows = [
+        {key: row[key] for key in ("date", "value", "product_name")}
+        for row in to_table_rows(ASSET_VALUATIONS_HL)
+    ]
+    client = FakeBigQueryClient(query_rows=rows)
+    source = BigQueryTableSource(
+        client, table="raw.history", with_provenance=False  # type: ignore
+    )
+
+    asset_valuations = source.get_asset_valuations()
+
+    assert client.queries[0]["query"] == (
+        "SELECT date, value, product_name FROM raw.history WHERE TRUE"
+    )
+    assert asset_valuations == ASSET_VALUATIONS_HL
+    assert {row.source_file for row in asset_valuations} == {"raw.history"}
+
+
+def test_sqlite_table_source_filters_and_reads_in_batches(
+    sqlite_repository: destination_repository.SqliteDestinationRepository,
+):
+    """
+    GIVEN a SQLite table of Asset Valuations of several dates and products
+    WHEN it is read back in batches of 3 row ids by 2 streams, unfiltered and filtered
+    THEN all rows should be read in order, and filtered reads only return matching rows
+    """
+    sqlite_repository.load_asset_valuations(ASSET_VALUATIONS)
+
+    source = SqliteTableSource(sqlite_repository.database_path, streams=2, batch_rows=3)
+    batches = list(source.iter_asset_valuation_batches())
+    assert [len(batch) for batch in batches] == [3, 3, 3, 3, 2]
+    asset_valuations = [row for batch in batches for row in batch]
+    assert asset_valuations == ASSET_VALUATIONS
+    assert [row.source_file for row in asset_valuations] == [
+        row.source_file for row in ASSET_VALUATIONS
+    ]
+    assert {row.creation_date for row in asset_valuations} == {CREATION_DATE}
+
+    filtered = SqliteTableSource(
+        sqlite_repository.database_path,
+        row_filter=ValuationFilter(
+            start_date=dt.date(2021, 1, 1), product_names=("product 1", "HL - Cash")
+        ),
+        with_provenance=False,
+        batch_rows=3,
+    )
+    assert filtered.get_asset_valuations() == [
+        ASSET_VALUATIONS_2021[0],
+        ASSET_VALUATIONS_HL[0],
+    ]
+    assert {row.source_file for row in filtered.get_asset_valuations()} == {
+        "asset_valuations"
+    }
+
+
+def test_sqlite_table_source_finds_natural_keys(
+    sqlite_repository: destination_repository.SqliteDestinationRepository,
+    monkeypatch,
+):
+    """
+    GIVEN a SQLite table of Asset Valuations, filtered out by its row filter
+    WHEN Asset Valuations held and not held are looked up, a few keys per query
+    THEN the natural keys of those held should be found, whatever the row filter
+    """
+    monkeypatch.setattr(source_repository, "MAX_KEYS_PER_SQLITE_LOOKUP", 2)
+    sqlite_repository.load_asset_valuations(ASSET_VALUATIONS_2018)
+    source = SqliteTableSource(
+        sqlite_repository.database_path,
+        row_filter=ValuationFilter(start_date=dt.date(2030, 1, 1)),
+    )
+
+    found = source.find_natural_keys(ASSET_VALUATIONS_2018 + ASSET_VALUATIONS_2021)
+
+    assert found == {
+        asset_valuation.natural_key for asset_valuation in ASSET_VALUATIONS_2018
+    }
+    assert source.find_natural_keys([]) == set()
+
+
+def test_bigquery_table_source_finds_natural_keys_server_side():
+    """
+    GIVEN a BigQuery table source, and one of a table not created yet
+    WHEN Asset Valuations are looked up
+    THEN a single query should join the table with the distinct keys sent as a
+         parameter, and a missing table hold none
+    """
+    client = FakeBigQueryClient(
+        query_rows=[
+            {key: row[key] for key in ("date", "value", "product_name")}
+            for row in to_table_rows(ASSET_VALUATIONS_HL)
+        ]
+    )
+    source = BigQueryTableSource(client, table="raw.history")  # type: ignore
+
+    found = source.find_natural_keys(ASSET_VALUATIONS_HL * 2 + ASSET_VALUATIONS_2021)
+
+    assert found == {
+        asset_valuation.natural_key for asset_valuation in ASSET_VALUATIONS_HL
+    }
+    (query,) = client.queries
+    assert "FROM raw.history AS held JOIN UNNEST(@keys) AS key" in query["query"]
+    (parameter,) = query["job_config"].query_parameters
+    assert len(parameter.values) == len(ASSET_VALUATIONS_HL + ASSET_VALUATIONS_2021)
+
+    class MissingTableClient(FakeBigQueryClient):
+        def query(self, query, job_config=None, job_id=None):
+            raise exceptions.NotFound("raw.history")
+
+    missing = BigQueryTableSource(MissingTableClient(), table="raw.history")  # type: ignore
+    assert missing.find_natural_keys(ASSET_VALUATIONS_HL) == set()
@@ -0,0 +1,117 @@
+import datetime as dt
+import os
+from typing import List
+
+import pytest
+
+from src import destination_repository, model
+from src.custom_errors import SpoolFlushLockedError, SpoolLockedError
+from src.serialisation import NdjsonDeserialiser
+from src.spool import FRAME_HEADER, Spool
+
+
+def asset_valuations(n: int, source_file: str) -> List[model.AssetValuation]:
+    return [
+        model.AssetValuation(
+            dt.date(2020, 1, 1 + i % 28),
+            float(i),
+            f"product {i}",
+            source_file,
+            dt.datetime(2024, 1, 1),
+        )
+        for i in range(n)
+    ]
+
+
+def test_spool_seals_segments_by_size_and_reports_depth(tmp_path):
+    """
+    GIVEN a spool sealing segments over 100 bytes
+    WHEN batches are appended and the spool closed
+    THEN each full segment should be sealed, batches read back in order, and depth
+         reported from frame headers
+    """
+    with Spool(str(tmp_path), segment_max_bytes=100, fsync=False) as spool:
+        for i in range(5):
+            spool.append_batch(f"batch {i}\n".encode() * 5, rows=5)
+        spool.append_batch(b"", rows=0)
+
+    segments = spool.sealed_segments()
+    metrics = spool.metrics()
+
+    assert len(segments) == 3
+    assert [
+        payload for segment in segments for _, payload in spool.read_segment(segment)
+    ] == [f"batch {i}\n".encode() * 5 for i in range(5)]
+    assert (metrics.segments, metrics.rows) == (3, 25)
+    assert metrics.bytes == sum(os.path.getsize(segment) for segment in segments)
+    assert metrics.oldest_age_seconds >= 0
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".open")]
+
+
+def test_spool_recovers_segments_left_open_by_a_crash(tmp_path):
+    """
+    GIVEN a segment left open by a writer that crashed while appending a batch
+    WHEN the spool is recovered
+    THEN the torn batch should be cut off and the complete ones sealed for flushing
+    """
+    crashed = Spool(str(tmp_path), fsync=False)
+    crashed.append_batch(b"complete\n", rows=1)
+    crashed.append_batch(b"complete too\n", rows=1)
+    (open_segment,) = [name for name in os.listdir(tmp_path) if name.endswith(".open")]
+    with open(tmp_path / open_segment, "ab") as segment:
+        segment.write(FRAME_HEADER.pack(100, 1, 0) + b"torn")
+    # the writer lock of a process is released when it dies
+    crashed._unlock_writer()
+
+    spool = Spool(str(tmp_path))
+
+    assert spool.recover() == 1
+    (segment,) = spool.sealed_segments()
+    assert list(spool.read_segment(segment)) == [
+        (1, b"complete\n"),
+        (1, b"complete too\n"),
+    ]
+
+
+def test_spool_has_a_single_writer(tmp_path):
+    """
+    GIVEN a writer appending into a spool
+    WHEN a second writer appends into, or recovers, the same spool
+    THEN it should fail without touching the open segment of the first, and succeed once
+         the first is closed
+    """
+    first = destination_repository.SpoolDestinationRepository(str(tmp_path))
+    first.load_asset_valuations(asset_valuations(2, "a.csv"))
+    second = destination_repository.SpoolDestinationRepository(str(tmp_path))
+
+    with pytest.raises(SpoolLockedError):
+        second.load_asset_valuations(asset_valuations(2, "b.csv"))
+    with pytest.raises(SpoolLockedError):
+        Spool(str(tmp_path)).recover()
+    first.load_asset_valuations(asset_valuations(2, "c.csv"))
+    first.close()
+    second.load_asset_valuations(asset_valuations(2, "b.csv"))
+    second.close()
+
+    assert [
+        asset_valuation.source_file
+        for segment in first.spool.sealed_segments()
+        for _, payload in first.spool.read_segment(segment)
+        for asset_valuation in NdjsonDeserialiser().deserialise(payload)
+    ] == ["a.csv", "a.csv", "c.csv", "c.csv", "b.csv", "b.csv"]
+
+
+def test_spool_has_a_single_flusher(tmp_path):
+    """
+    GIVEN a spool whose flusher lock is held
+    WHEN another flusher of the same spool directory takes the lock
+    THEN it should fail until the first releases the lock
+    """
+    first, second = Spool(str(tmp_path)), Spool(str(tmp_path))
+
+    with first.lock_flusher():
+        with pytest.raises(SpoolFlushLockedError):
+            with second.lock_flusher():
+                pass
+    with second.lock_flusher():
+        pass
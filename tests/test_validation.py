@@ -0,0 +1,186 @@
+import datetime as dt
+import pytest
+
+from src import validation, model, custom_errors
+
+
+def test_validate_generic_rows_all_valid():
+    """
+    GIVEN a batch of valid generic rows
+    WHEN they are validated
+    THEN all rows should become Asset Valuations and the report should be valid
+    """
+    rows = [
+        ["product 1", "2018-12-29", "1200.0"],
+        ["product 2", "2018-12-29", "5100"],
+    ]
+    asset_valuations, report = validation.validate_generic_rows(rows, "file.csv")
+
+    assert report.is_valid()
+    assert report.rows_checked == 2
+    assert asset_valuations == [
+        model.AssetValuation(dt.date(2018, 12, 29), 1200.0, "product 1", "file.csv"),
+        model.AssetValuation(dt.date(2018, 12, 29), 5100.0, "product 2", "file.csv"),
+    ]
+
+
+@pytest.mark.parametrize(
+    "row, column",
+    [
+        (["product 1", "29-12-2018", "1200.0"], "date"),
+        (["product 1", "1850-01-01", "1200.0"], "date"),
+        (["product 1", "2999-01-01", "1200.0"], "date"),
+        (["product 1", "2018-12-29", "1,200.0"], "value"),
+        (["product 1", "2018-12-29", "nan"], "value"),
+        (["", "2018-12-29", "1200.0"], "product_name"),
+        (["product 1", "2018-12-29"], "row"),
+    ],
+)
+def test_validate_generic_rows_invalid_row(row, column):
+    """
+    GIVEN a batch with a valid row and an invalid one
+    WHEN they are validated
+    THEN the valid row should become an Asset Valuation and the invalid one be reported
+    """
+    rows = [["product 0", "2018-12-29", "1.0"], row]
+    asset_valuations, report = validation.validate_generic_rows(rows, "file.csv")
+
+    assert len(asset_valuations) == 1
+    assert not report.is_valid()
+    assert [error.column for error in report.errors] == [column]
+    assert report.errors[0].row_number == 2
+    assert report.quarantined_rows == {2: row}
+
+
+def test_validate_generic_rows_duplicates():
+    """
+    GIVEN a batch where a product is valued twice on the same date
+    WHEN they are validated
+    THEN the first occurrence should be kept and the repetition reported
+    """
+    rows = [
+        ["product 1", "2018-12-29", "1200.0"],
+        ["product 1", "2018-12-29", "1300.0"],
+    ]
+    asset_valuations, report = validation.validate_generic_rows(rows, "file.csv")
+
+    assert [asset_valuation.value for asset_valuation in asset_valuations] == [1200.0]
+    assert list(report.quarantined_rows) == [2]
+    assert "first seen on row 1" in report.errors[0].reason
+
+
+def test_validate_generic_rows_exact_duplicates_dropped():
+    """
+    GIVEN a batch where a row is repeated exactly
+    WHEN they are validated
+    THEN the repetition should be dropped without being reported as invalid
+    """
+    rows = [
+        ["product 1", "2018-12-29", "1200.0"],
+        ["product 1", "2018-12-29", "1200"],
+        ["product 2", "2018-12-29", "10.0"],
+    ]
+    asset_valuations, report = validation.validate_generic_rows(rows, "file.csv")
+
+    assert [asset_valuation.product_name for asset_valuation in asset_valuations] == [
+        "product 1",
+        "product 2",
+    ]
+    assert report.is_valid()
+    assert report.duplicates_dropped == 1
+
+
+def test_validation_report_summary_and_quarantine_csv(tmp_path):
+    """
+    GIVEN a report with several invalid rows
+    WHEN its summary is requested and its quarantine CSV written
+    THEN both should describe every invalid row
+    """
+    rows = [
+        ["product 1", "2018-12-29", "abc"],
+        ["product 2", "bad date", "abc"],
+        ["product 3", "2018-12-29", "1.0"],
+    ]
+    _, report = validation.validate_generic_rows(rows, "file.csv")
+
+    assert report.summary().startswith("2 invalid rows out of 3 in file 'file.csv'")
+    assert "and 2 more" in report.summary(max_errors=1)
+
+    quarantine_path = tmp_path / "file.csv.rejected.csv"
+    report.write_quarantine_csv(str(quarantine_path))
+    lines = quarantine_path.read_text(encoding="utf-8").splitlines()
+
+    assert lines[0] == "row_number,product_name,date,value,errors"
+    assert len(lines) == 3
+    assert lines[2].startswith("2,product 2,bad date,abc,date:")
+
+
+@pytest.mark.parametrize(
+    "header, aliases, width, indexes",
+    [
+        (["product_name", "date", "value"], None, 3, (0, 1, 2)),
+        (["Value", "Date", "Product_Name"], None, 3, (2, 1, 0)),
+        (["id", "product_name", "ccy", "date", "value"], None, 5, (1, 3, 4)),
+        (
+            ["fund", "date", "valuation"],
+            {"Fund": "product_name", "valuation": "value"},
+            3,
+            (0, 1, 2),
+        ),
+    ],
+)
+def test_generic_header_resolve(header, aliases, width, indexes):
+    """
+    GIVEN a header with columns reordered, extra columns or aliases
+    WHEN it is resolved
+    THEN the width and the indexes of product_name, date and value should be found
+    """
+    resolved = validation.GenericHeader.resolve(header, "file.csv", aliases)
+
+    assert resolved == validation.GenericHeader(width, indexes)
+
+
+@pytest.mark.parametrize(
+    "header",
+    [
+        ["product_name", "date", "valuation"],
+        ["product_name", "date", "value", "Value"],
+    ],
+)
+def test_generic_header_resolve_missing_or_repeated_column(header):
+    """
+    GIVEN a header missing a column or repeating one
+    WHEN it is resolved
+    THEN HeaderNotMatchError should be raised
+    """
+    with pytest.raises(custom_errors.HeaderNotMatchError):
+        validation.GenericHeader.resolve(header, "file.csv")
+
+
+def test_validate_generic_rows_by_header_indexes():
+    """
+    GIVEN rows with reordered and extra columns, one of them malformed
+    WHEN they are validated with the header resolved from the file
+    THEN values should be read by index and the malformed row be reported
+    """
+    header = validation.GenericHeader.resolve(
+        ["value", "ccy", "date", "product_name"], "file.csv"
+    )
+    rows = [
+        ["1200.0", "GBP", "2018-12-29", "product 1"],
+        ["abc", "GBP", "2018-12-29", "product 2"],
+        ["1200.0", "2018-12-29", "product 3"],
+    ]
+
+    asset_valuations, report = validation.validate_generic_rows(
+        rows, "file.csv", header=header
+    )
+
+    assert asset_valuations == [
+        model.AssetValuation(dt.date(2018, 12, 29), 1200.0, "product 1", "file.csv")
+    ]
+    assert report.quarantined_rows == {
+        2: ["product 2", "2018-12-29", "abc"],
+        3: ["1200.0", "2018-12-29", "product 3"],
+    }
+    assert "expected 4 columns" in report.errors[-1].reason
@@ -0,0 +1,98 @@
+import io
+from typing import List
+import zipfile
+
+from src.xlsx_reader import XlsxRowReader
+
+MAIN_NAMESPACE = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+
+
+def workbook(
+    sheet_data: str, shared_strings: str = "", date1904: bool = False
+) -> io.BytesIO:
+    """
+    Builds an in-memory xlsx workbook with a single worksheet, with style 1 formatting
+    dates and style 2 formatting numbers.
+    """
+    stream = io.BytesIO()
+    with zipfile.ZipFile(stream, "w") as z:
+        z.writestr(
+            "xl/workbook.xml",
+            f'<workbook xmlns="{MAIN_NAMESPACE}">'
+            f'<workbookPr date1904="{int(date1904)}"/>'
+            '<sheets><sheet name="Sheet1" sheetId="1"/></sheets></workbook>',
+        )
+        z.writestr(
+            "xl/styles.xml",
+            f'<styleSheet xmlns="{MAIN_NAMESPACE}">'
+            '<numFmts><numFmt numFmtId="164" formatCode="#,##0.00&quot;d&quot;"/>'
+            "</numFmts>"
+            '<cellXfs><xf numFmtId="0"/><xf numFmtId="14"/><xf numFmtId="164"/>'
+            "</cellXfs></styleSheet>",
+        )
+        z.writestr(
+            "xl/sharedStrings.xml",
+            f'<sst xmlns="{MAIN_NAMESPACE}">{shared_strings}</sst>',
+        )
+        z.writestr(
+            "xl/worksheets/sheet1.xml",
+            f'<worksheet xmlns="{MAIN_NAMESPACE}"><sheetData>{sheet_data}</sheetData>'
+            "</worksheet>",
+        )
+    stream.seek(0)
+
+    return stream
+
+
+def test_xlsx_row_reader_cell_types():
+    """
+    GIVEN a worksheet with shared, rich and inline strings, numbers, dates and booleans
+    WHEN its rows are read
+    THEN each cell should be converted to text as a CSV export would hold it
+    """
+    stream = workbook(
+        '<row r="1"><c r="A1" t="s"><v>0</v></c><c r="B1" t="s"><v>1</v></c>'
+        '<c r="C1" t="inlineStr"><is><t>inline</t></is></c></row>'
+        '<row r="2"><c r="A2"><v>1200.5</v></c><c r="B2" s="1"><v>43463</v></c>'
+        '<c r="C2" s="1"><v>43463.75</v></c><c r="D2" s="2"><v>3</v></c>'
+        '<c r="E2" t="b"><v>1</v></c><c r="F2" t="str"><v>formula</v></c></row>',
+        "<si><t>product_name</t></si>"
+        "<si><r><t>rich </t></r><r><t>text</t></r><rPh><t>hint</t></rPh></si>",
+    )
+
+    rows: List[List[str]] = list(XlsxRowReader(stream))
+
+    assert rows == [
+        ["product_name", "rich text", "inline"],
+        ["1200.5", "2018-12-29", "2018-12-29 18:00:00", "3", "TRUE", "formula"],
+    ]
+
+
+def test_xlsx_row_reader_sparse_rows():
+    """
+    GIVEN a worksheet with missing cells, empty trailing cells and an empty row
+    WHEN its rows are read
+    THEN missing cells should be empty strings, trailing ones left out and the row skipped
+    """
+    stream = workbook(
+        '<row r="1"><c r="B1"><v>1</v></c><c r="D1"><v>2</v></c><c r="E1"/></row>'
+        '<row r="2"><c r="A2"/></row>'
+        '<row r="4"><c r="AA4"><v>3</v></c></row>'
+    )
+
+    rows = list(XlsxRowReader(stream))
+
+    assert rows[:1] == [["", "1", "", "2"]]
+    assert len(rows) == 2
+    assert rows[1][26:] == ["3"]
+
+
+def test_xlsx_row_reader_1904_dates():
+    """
+    GIVEN a workbook whose dates count from 1904
+    WHEN a date cell is read
+    THEN it should be converted from the 1904 epoch
+    """
+    stream = workbook('<row r="1"><c r="A1" s="1"><v>0</v></c></row>', date1904=True)
+
+    assert list(XlsxRowReader(stream)) == [["1904-01-01"]]